@@ -1,6 +1,8 @@
 # activos_fijos/agents/corps/general_activos.py
 import os
+import asyncio
 from dotenv import load_dotenv
+from utils.micro_graph import transmitir_eventos
 from activos_fijos.agents.corps.units.capitan_activos import ActivosCaptain
 
 # Cargar variables de entorno
@@ -31,6 +33,15 @@ class GeneralActivos:
         print(f"General de Activos: Misión completada. Respuesta final: {response}")
         return response
 
+    async def stream_command(self, query: str):
+        """
+        Versión en streaming de process_command: ejecuta la orden en un hilo y entrega como iterador
+        asíncrono los tokens del LLM a medida que llegan ({"tipo": "token", "texto": ...}). El último
+        evento es {"tipo": "fin", "resultado": <respuesta final>}.
+        """
+        async for evento in transmitir_eventos(asyncio.to_thread(self.process_command, query)):
+            yield evento
+
 # Ejemplo de uso
 if __name__ == '__main__':
     general = GeneralActivos()
@@ -8,6 +8,7 @@ Este archivo centraliza las herramientas tácticas que los agentes del módulo d
 from activos_fijos.logic import (
     registrar_activo,
     ejecutar_proceso_depreciacion_mensual,
+    ejecutar_depreciacion_atrasada,
 )
 
 # Para que el agente de activos fijos pueda consultar el PUC,
@@ -18,6 +19,7 @@ from contabilidad.puc_logic import obtener_cuentas, obtener_cuenta_por_codigo
 activos_fijos_tools = [
     registrar_activo,
     ejecutar_proceso_depreciacion_mensual,
+    ejecutar_depreciacion_atrasada,
     obtener_cuentas,
     obtener_cuenta_por_codigo,
 ]
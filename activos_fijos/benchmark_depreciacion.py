@@ -0,0 +1,73 @@
+# activos_fijos/benchmark_depreciacion.py
+"""
+Mide el recálculo de los programas de depreciación y la latencia de la proyección del
+gasto sobre un registro sintético de activos fijos.
+
+Uso:
+    python -m activos_fijos.benchmark_depreciacion                 # 2.000 activos
+    python -m activos_fijos.benchmark_depreciacion --activos 20000 --meses 24
+    python -m activos_fijos.benchmark_depreciacion --db ruta/benchmark.db  # Conserva la base generada
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+from activos_fijos import logic as activos_fijos_logic
+from database import db_manager
+
+def generar_activos_sinteticos(num_activos: int) -> None:
+    """Registra activos de 60 meses adquiridos entre 2020 y 2025, alternando línea recta y saldo decreciente."""
+    with db_manager.conexion(db_manager.DB_CONTABILIDAD_PATH) as conn:
+        conn.executemany(
+            "INSERT INTO activos_fijos (nombre, fecha_adquisicion, costo_adquisicion, valor_residual, vida_util_meses, metodo_depreciacion, "
+            "cuenta_activo, cuenta_depreciacion_acumulada, cuenta_gasto_depreciacion) VALUES (?, ?, ?, 0, 60, ?, '1540', '1592', ?)",
+            [(f"Activo {i}", f"{2020 + i % 6}-{i % 12 + 1:02d}-01", 6000.0 + i, ("linea_recta", "saldo_decreciente")[i % 2], f"51{60 + i % 5}")
+             for i in range(num_activos)]
+        )
+        conn.commit()
+
+def medir_proyeccion(meses: int, desde: str, repeticiones: int = 20) -> Dict[str, Any]:
+    """Mide el recálculo inicial de los programas y los milisegundos promedio de la proyección ya precalculada."""
+    inicio = time.perf_counter()
+    recalculados = activos_fijos_logic.actualizar_programas_depreciacion()
+    segundos_programas = time.perf_counter() - inicio
+    cuentas = len(activos_fijos_logic.proyectar_gasto_depreciacion(meses, desde))
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        activos_fijos_logic.proyectar_gasto_depreciacion(meses, desde)
+    return {"activos": recalculados, "segundos_programas": segundos_programas, "cuentas": cuentas,
+            "milisegundos_proyeccion": (time.perf_counter() - inicio) / repeticiones * 1000}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mide los programas y la proyección de depreciación.")
+    parser.add_argument("--activos", type=int, default=2000, help="Número de activos sintéticos.")
+    parser.add_argument("--meses", type=int, default=12, help="Meses de la proyección.")
+    parser.add_argument("--desde", default="2025-01", help="Primer período 'AAAA-MM' de la proyección.")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Repeticiones de la proyección para promediar.")
+    parser.add_argument("--db", default=None, help="Ruta de la base de datos a generar (por defecto, un archivo temporal).")
+    args = parser.parse_args(argv)
+
+    directorio: Optional[tempfile.TemporaryDirectory] = None
+    if args.db:
+        db_manager.DB_CONTABILIDAD_PATH = args.db
+    else:
+        directorio = tempfile.TemporaryDirectory()
+        db_manager.DB_CONTABILIDAD_PATH = os.path.join(directorio.name, "benchmark_depreciacion.db")
+    try:
+        db_manager.init_db()
+        print(f"Generando {args.activos} activos sintéticos...")
+        generar_activos_sinteticos(args.activos)
+        r = medir_proyeccion(args.meses, args.desde, args.repeticiones)
+    finally:
+        db_manager.cerrar_pools()
+        if directorio:
+            directorio.cleanup()
+
+    print(f"Programas recalculados: {r['activos']} activos en {r['segundos_programas']:.2f} s")
+    print(f"Proyección de {args.meses} meses desde {args.desde}: {r['cuentas']} cuentas en {r['milisegundos_proyeccion']:.2f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,20 +3,25 @@
 Módulo para la lógica de negocio de la Gestión de Activos Fijos.
 """
 import logging
+import calendar
 import datetime
-from typing import List, Dict, Any, Optional
+import re
+import sqlite3
+from typing import List, Dict, Any, Optional, Tuple
 from database import db_manager
 from contabilidad import contabilidad_logic
 from langchain_core.tools import tool
 
 logger = logging.getLogger(__name__)
 
+METODOS_DEPRECIACION = ('linea_recta', 'saldo_decreciente', 'unidades_produccion')
+
 @tool
 def registrar_activo(
     nombre: str, descripcion: str, fecha_adquisicion: str, costo_adquisicion: float,
     valor_residual: float, vida_util_meses: int, metodo_depreciacion: str,
     cuenta_activo: str, cuenta_dep_acum: str, cuenta_gasto_dep: str,
-    cuenta_contrapartida: str, usuario_id: int = 1
+    cuenta_contrapartida: str, usuario_id: int = 1, unidades_totales: Optional[float] = None
 ) -> str:
     """
     Registra un nuevo activo fijo y su asiento contable de adquisición inicial.
@@ -28,22 +33,27 @@ def registrar_activo(
         costo_adquisicion (float): El costo total de compra del activo.
         valor_residual (float): El valor estimado del activo al final de su vida útil.
         vida_util_meses (int): La vida útil del activo en meses.
-        metodo_depreciacion (str): Método de depreciación a usar. Actualmente soportado: 'linea_recta'.
+        metodo_depreciacion (str): Método de depreciación a usar: 'linea_recta', 'saldo_decreciente' o 'unidades_produccion'.
         cuenta_activo (str): El código de la cuenta contable del activo (ej: '1528').
         cuenta_dep_acum (str): El código de la cuenta de depreciación acumulada (ej: '1592').
         cuenta_gasto_dep (str): El código de la cuenta para el gasto de depreciación (ej: '5160').
         cuenta_contrapartida (str): El código de la cuenta con la que se pagó o se generó la deuda (ej: '1110' para bancos, '2205' para proveedores).
         usuario_id (int): ID del usuario que registra. Por defecto es 1.
+        unidades_totales (float, opcional): Unidades que producirá el activo en su vida útil (solo para 'unidades_produccion').
 
     Returns:
         str: Un mensaje de éxito o error.
     """
+    if metodo_depreciacion.lower() not in METODOS_DEPRECIACION:
+        return f"Error: Método de depreciación '{metodo_depreciacion}' no válido. Use uno de: {', '.join(METODOS_DEPRECIACION)}."
+    if metodo_depreciacion.lower() == 'unidades_produccion' and not (unidades_totales or 0) > 0:
+        return "Error: El método 'unidades_produccion' requiere unidades_totales mayores que cero."
     success, activo_id = db_manager.crear_activo_fijo_db(
         nombre=nombre, descripcion=descripcion, fecha_adquisicion=fecha_adquisicion,
         costo_adquisicion=costo_adquisicion, valor_residual=valor_residual,
         vida_util_meses=vida_util_meses, metodo_depreciacion=metodo_depreciacion,
         cuenta_activo=cuenta_activo, cuenta_depreciacion_acumulada=cuenta_dep_acum,
-        cuenta_gasto_depreciacion=cuenta_gasto_dep
+        cuenta_gasto_depreciacion=cuenta_gasto_dep, unidades_totales=unidades_totales
     )
     if not success:
         return "Error: No se pudo crear el registro del activo fijo en la base de datos."
@@ -67,18 +77,260 @@ def registrar_activo(
 
     return f"Éxito: Activo '{nombre}' (ID: {activo_id}) y su asiento de adquisición han sido registrados. {resultado_contable}"
 
-def _calcular_depreciacion_un_mes(activo: Dict[str, Any]) -> float:
+def _es_periodo_valido(periodo: Any) -> bool:
+    """Indica si `periodo` tiene el formato 'AAAA-MM' con un mes entre 01 y 12."""
+    return isinstance(periodo, str) and re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", periodo) is not None
+
+def _periodo_siguiente(periodo: str) -> str:
+    """Período 'AAAA-MM' posterior a `periodo`."""
+    ano, mes = int(periodo[:4]), int(periodo[5:7])
+    return f"{ano + 1}-01" if mes == 12 else f"{ano}-{mes + 1:02d}"
+
+def _periodos_entre(periodo_inicio: str, periodo_fin: str) -> List[str]:
+    """Lista de períodos 'AAAA-MM' desde `periodo_inicio` hasta `periodo_fin`, ambos incluidos."""
+    periodos = []
+    periodo = periodo_inicio
+    while periodo <= periodo_fin:
+        periodos.append(periodo)
+        periodo = _periodo_siguiente(periodo)
+    return periodos
+
+def _meses_desde_adquisicion(activo: Dict[str, Any], periodo: str) -> int:
+    """Meses completos transcurridos entre el mes de adquisición y `periodo` (0 en el mes de compra)."""
+    adquisicion = activo['fecha_adquisicion']
+    return (int(periodo[:4]) - int(adquisicion[:4])) * 12 + int(periodo[5:7]) - int(adquisicion[5:7])
+
+def _calcular_cargo_periodo(activo: Dict[str, Any], acumulada: float, meses: int, unidades: float = 0.0) -> float:
+    """
+    Cargo de depreciación de un activo en un período, dado lo ya depreciado y los meses
+    transcurridos desde su adquisición. Nunca supera lo que falta de la base depreciable.
+
+    - 'linea_recta': base depreciable / vida útil; en el último mes de la vida útil se carga todo
+      lo pendiente, para que los centavos del redondeo no queden para después.
+    - 'saldo_decreciente': doble saldo decreciente sobre el valor en libros, pasando a línea recta
+      sobre la vida restante cuando esta da un cargo mayor, para terminar en el valor residual.
+    - 'unidades_produccion': base depreciable * unidades del período / unidades totales.
+    """
+    base = activo['costo_adquisicion'] - activo['valor_residual']
+    pendiente = round(base - acumulada, 2)
+    vida_util = activo['vida_util_meses']
+    if pendiente <= 0 or vida_util <= 0:
+        return 0.0
+
+    metodo = activo['metodo_depreciacion'].lower()
+    if metodo == 'linea_recta':
+        if meses >= vida_util - 1:
+            return pendiente
+        cargo = base / vida_util
+    elif metodo == 'saldo_decreciente':
+        restantes = vida_util - meses
+        if restantes <= 0:
+            return pendiente
+        valor_libros = activo['costo_adquisicion'] - acumulada
+        cargo = max(valor_libros * 2 / vida_util, pendiente / restantes)
+    elif metodo == 'unidades_produccion':
+        unidades_totales = activo.get('unidades_totales') or 0
+        cargo = base * unidades / unidades_totales if unidades_totales > 0 else 0.0
+    else:
+        return 0.0
+    return min(round(cargo, 2), pendiente)
+
+def calcular_depreciacion_periodos(activos: List[Dict[str, Any]], periodos: List[str], registrada: Dict[int, Dict[str, float]],
+                                   uso: Optional[Dict[Tuple[int, str], float]] = None) -> Dict[str, List[Tuple[Dict[str, Any], float, float]]]:
     """
-    Calcula la depreciación para un solo mes de un activo dado.
-    Por ahora, solo implementa el método de línea recta.
+    Calcula en una pasada los cargos de todos los activos para varios períodos consecutivos.
+
+    `registrada` es el libro existente ({activo_id: {periodo: cargo}}): los períodos ya depreciados
+    de un activo no se vuelven a cargar, pero cuentan en su acumulado. `uso` da las unidades
+    producidas por (activo_id, periodo) para el método de unidades de producción.
+    Devuelve {periodo: [(activo, cargo, acumulada_tras_el_cargo)]} solo con los cargos positivos.
     """
-    if activo['metodo_depreciacion'].lower() == 'linea_recta':
-        costo = activo['costo_adquisicion']
-        residual = activo['valor_residual']
-        vida_util = activo['vida_util_meses']
-        if vida_util > 0:
-            return (costo - residual) / vida_util
-    return 0.0
+    uso = uso or {}
+    cargos: Dict[str, List[Tuple[Dict[str, Any], float, float]]] = {periodo: [] for periodo in periodos}
+    if not periodos:
+        return cargos
+    for activo in activos:
+        previos = registrada.get(activo['id'], {})
+        acumulada = sum(cargo for periodo, cargo in previos.items() if periodo < periodos[0])
+        for periodo in periodos:
+            if periodo in previos:
+                acumulada += previos[periodo]
+                continue
+            meses = _meses_desde_adquisicion(activo, periodo)
+            if meses < 0:
+                continue
+            cargo = _calcular_cargo_periodo(activo, acumulada, meses, uso.get((activo['id'], periodo), 0.0))
+            if cargo > 0:
+                acumulada = round(acumulada + cargo, 2)
+                cargos[periodo].append((activo, cargo, acumulada))
+    return cargos
+
+def _movimientos_depreciacion(cargos: List[Tuple[Dict[str, Any], float, float]], periodo: str) -> List[Dict[str, Any]]:
+    """Agrupa los cargos de un período por par de cuentas (gasto, depreciación acumulada)."""
+    resumen_depreciacion: Dict[Tuple[str, str], float] = {}  # { (gasto_cta, dep_acum_cta): total_monto }
+    for activo, cargo, _ in cargos:
+        llave = (activo['cuenta_gasto_depreciacion'], activo['cuenta_depreciacion_acumulada'])
+        resumen_depreciacion[llave] = round(resumen_depreciacion.get(llave, 0.0) + cargo, 2)
+    movimientos = []
+    for (gasto_cta, dep_acum_cta), monto in resumen_depreciacion.items():
+        movimientos.append({"cuenta_codigo": gasto_cta, "descripcion_detalle": f"Depreciación {periodo}", "debito": monto, "credito": 0})
+        movimientos.append({"cuenta_codigo": dep_acum_cta, "descripcion_detalle": f"Depreciación {periodo}", "debito": 0, "credito": monto})
+    return movimientos
+
+def ejecutar_depreciacion(periodo_inicio: str, periodo_fin: str, usuario_id: int = 1) -> Tuple[bool, Any]:
+    """
+    Deprecia todos los activos en estado 'Activo' para los períodos 'AAAA-MM' del rango, en una
+    sola transacción: un comprobante por mes (fechado el último día) y una fila por activo y mes
+    en `depreciacion_acumulada`. Los períodos que un activo ya tiene registrados se omiten, de
+    modo que el proceso puede repetirse o usarse para ponerse al día sin duplicar cargos.
+
+    Devuelve (True, resumen) con 'periodos' (período, comprobante_id y total de cada mes con
+    cargos) y 'total', o (False, mensaje) si no se pudo registrar.
+    """
+    for periodo in (periodo_inicio, periodo_fin):
+        if not _es_periodo_valido(periodo):
+            return False, f"Período inválido: '{periodo}'. Use el formato 'AAAA-MM'."
+    if periodo_fin < periodo_inicio:
+        return False, "El período final es anterior al inicial."
+    activos = db_manager.obtener_activos_fijos_db(estado="Activo")
+    periodos = _periodos_entre(periodo_inicio, periodo_fin)
+
+    conn = None
+    try:
+        conn = db_manager.get_db_connection(db_manager.DB_CONTABILIDAD_PATH)
+        conn.execute("BEGIN IMMEDIATE;")
+        cargos = calcular_depreciacion_periodos(
+            activos, periodos, db_manager.obtener_depreciacion_registrada_db(conn, periodo_fin),
+            db_manager.obtener_uso_activos_db(conn, periodo_inicio, periodo_fin)
+        )
+        con_cargos = [periodo for periodo in periodos if cargos[periodo]]
+        comprobante_ids = db_manager.insertar_lote_comprobantes_db(conn, [
+            {'fecha': f"{periodo}-{calendar.monthrange(int(periodo[:4]), int(periodo[5:7]))[1]:02d}", 'tipo': "Depreciación",
+             'descripcion': f"Depreciación para el período {periodo}", 'movimientos': _movimientos_depreciacion(cargos[periodo], periodo),
+             'usuario_id': usuario_id}
+            for periodo in con_cargos
+        ])
+        db_manager.insertar_depreciacion_acumulada_db(conn, [
+            (activo['id'], periodo, cargo, acumulada, comprobante_id)
+            for periodo, comprobante_id in zip(con_cargos, comprobante_ids) for activo, cargo, acumulada in cargos[periodo]
+        ])
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Error en el proceso de depreciación {periodo_inicio}..{periodo_fin}: {e}")
+        if conn:
+            conn.rollback()
+        return False, f"Error en el proceso de depreciación: {e}"
+    finally:
+        db_manager.close_connection(conn)
+
+    resumen = {"periodos": [{"periodo": periodo, "comprobante_id": comprobante_id, "total": round(sum(c for _, c, _ in cargos[periodo]), 2)}
+                            for periodo, comprobante_id in zip(con_cargos, comprobante_ids)]}
+    resumen["total"] = round(sum(p["total"] for p in resumen["periodos"]), 2)
+    logger.info(f"Depreciación {periodo_inicio}..{periodo_fin}: {len(con_cargos)} comprobantes por un total de {resumen['total']:.2f}")
+    return True, resumen
+
+# --- Programa de depreciación y proyecciones ---
+
+# Límite de meses de un programa más allá de la vida útil (cubre activos con meses sin depreciar).
+MESES_EXTRA_PROGRAMA = 1200
+
+def _programa_activo(activo: Dict[str, Any], registrada: Dict[str, float], uso: Dict[str, float]) -> List[Tuple[str, float, float, bool]]:
+    """
+    Programa mensual completo de un activo: (periodo, cargo, acumulada, registrado).
+
+    Los períodos del libro se toman tal como se registraron y los anteriores al último registro
+    que no tienen cargo se consideran omitidos. Desde ahí se proyecta con el mismo cálculo del
+    proceso mensual hasta agotar la base depreciable. Para unidades de producción, los meses sin
+    uso registrado se proyectan con el uso promedio registrado del activo.
+    """
+    ultimo_registrado = max(registrada) if registrada else ""
+    uso_promedio = sum(uso.values()) / len(uso) if uso else 0.0
+    base = activo['costo_adquisicion'] - activo['valor_residual']
+    vida_util = activo['vida_util_meses']
+    limite = vida_util if activo['metodo_depreciacion'].lower() == 'unidades_produccion' else vida_util + MESES_EXTRA_PROGRAMA
+    proyectable = activo['estado'] == 'Activo'
+
+    programa = []
+    acumulada = 0.0
+    periodo = activo['fecha_adquisicion'][:7]
+    meses = 0
+    while periodo <= ultimo_registrado or (proyectable and meses < limite and round(base - acumulada, 2) > 0):
+        if periodo in registrada:
+            cargo, registrado = registrada[periodo], True
+        elif periodo < ultimo_registrado or not proyectable:
+            cargo, registrado = 0.0, False
+        else:
+            cargo, registrado = _calcular_cargo_periodo(activo, acumulada, meses, uso.get(periodo, uso_promedio)), False
+        if cargo > 0:
+            acumulada = round(acumulada + cargo, 2)
+            programa.append((periodo, cargo, acumulada, registrado))
+        periodo = _periodo_siguiente(periodo)
+        meses += 1
+    return programa
+
+def actualizar_programas_depreciacion() -> int:
+    """
+    Recalcula el programa de depreciación de los activos nuevos o cuyo programa quedó obsoleto
+    (el activo cambió, se registró depreciación o uso). Devuelve cuántos activos se recalcularon.
+    """
+    conn = None
+    try:
+        conn = db_manager.get_db_connection(db_manager.DB_CONTABILIDAD_PATH)
+        conn.execute("BEGIN IMMEDIATE;")
+        activos = db_manager.obtener_activos_programa_desactualizado_db(conn)
+        if not activos:
+            conn.commit()
+            return 0
+        registrada = db_manager.obtener_depreciacion_registrada_db(conn, "9999-12")
+        uso_por_activo: Dict[int, Dict[str, float]] = {}
+        for (activo_id, periodo), unidades in db_manager.obtener_uso_activos_db(conn, "0000-01", "9999-12").items():
+            uso_por_activo.setdefault(activo_id, {})[periodo] = unidades
+        filas = [
+            (activo['id'], periodo, activo['cuenta_gasto_depreciacion'], cargo, acumulada,
+             round(activo['costo_adquisicion'] - acumulada, 2), int(registrado))
+            for activo in activos
+            for periodo, cargo, acumulada, registrado in _programa_activo(activo, registrada.get(activo['id'], {}), uso_por_activo.get(activo['id'], {}))
+        ]
+        db_manager.reemplazar_programa_depreciacion_db(conn, [activo['id'] for activo in activos], filas)
+        conn.commit()
+        logger.info(f"Programa de depreciación recalculado para {len(activos)} activos ({len(filas)} períodos).")
+        return len(activos)
+    except sqlite3.Error as e:
+        logger.error(f"Error al actualizar los programas de depreciación: {e}")
+        if conn:
+            conn.rollback()
+        return 0
+    finally:
+        db_manager.close_connection(conn)
+
+def proyectar_gasto_depreciacion(meses: int = 12, desde: Optional[str] = None, por_periodo: bool = False) -> List[Dict[str, Any]]:
+    """
+    Gasto de depreciación programado por cuenta de gasto para los `meses` períodos que empiezan
+    en `desde` ('AAAA-MM', por defecto el mes actual). Con `por_periodo` se desglosa por mes.
+    """
+    desde = desde or datetime.date.today().strftime("%Y-%m")
+    hasta = desde
+    for _ in range(max(meses, 1) - 1):
+        hasta = _periodo_siguiente(hasta)
+    actualizar_programas_depreciacion()
+    return db_manager.obtener_proyeccion_depreciacion_db(desde, hasta, por_periodo)
+
+def obtener_programa_depreciacion(activo_id: int) -> List[Dict[str, Any]]:
+    """Programa mensual de un activo (cargo, acumulada, valor en libros y si ya se registró)."""
+    actualizar_programas_depreciacion()
+    return db_manager.obtener_programa_depreciacion_db(activo_id)
+
+def obtener_valor_libros_proyectado(activo_id: int, periodo: str) -> Optional[float]:
+    """Valor en libros de un activo al cierre de `periodo` según su programa, o None si el activo no existe."""
+    activo = db_manager.obtener_activo_fijo_por_id_db(activo_id)
+    if activo is None:
+        return None
+    acumulada = 0.0
+    for fila in obtener_programa_depreciacion(activo_id):
+        if fila['periodo'] > periodo:
+            break
+        acumulada = fila['acumulada']
+    return round(activo['costo_adquisicion'] - acumulada, 2)
 
 @tool
 def ejecutar_proceso_depreciacion_mensual(ano: int, mes: int, usuario_id: int = 1) -> str:
@@ -93,44 +345,33 @@ def ejecutar_proceso_depreciacion_mensual(ano: int, mes: int, usuario_id: int =
     Returns:
         str: Un resumen del resultado del proceso.
     """
-    activos = db_manager.obtener_activos_fijos_db(estado="Activo")
-    if not activos:
-        logger.info("No hay activos para depreciar.")
-        return True
-
-    fecha_proceso = f"{ano}-{mes:02d}-{datetime.date(ano, mes, 1).max.day}"
-    resumen_depreciacion = {} # { (gasto_cta, dep_acum_cta): total_monto }
-
-    for activo in activos:
-        # Simple validación para no depreciar más allá de la vida útil
-        # Una lógica más compleja consideraría la depreciación acumulada hasta la fecha.
-        depreciacion_mes = _calcular_depreciacion_un_mes(activo)
-        if depreciacion_mes > 0:
-            llave = (activo['cuenta_gasto_depreciacion'], activo['cuenta_depreciacion_acumulada'])
-            resumen_depreciacion[llave] = resumen_depreciacion.get(llave, 0) + depreciacion_mes
-
-    if not resumen_depreciacion:
+    periodo = f"{ano}-{mes:02d}"
+    success, resultado = ejecutar_depreciacion(periodo, periodo, usuario_id)
+    if not success:
+        logger.error("Fallo al generar el comprobante de depreciación del mes.")
+        return False
+    if not resultado["periodos"]:
         logger.info("No se calculó depreciación para ningún activo este mes.")
-        return True
-
-    # Construir los movimientos para el comprobante contable
-    movimientos = []
-    total_depreciacion_mes = 0
-    for (gasto_cta, dep_acum_cta), monto in resumen_depreciacion.items():
-        movimientos.append({"cuenta_codigo": gasto_cta, "descripcion_detalle": "Depreciación del mes", "debito": monto, "credito": 0})
-        movimientos.append({"cuenta_codigo": dep_acum_cta, "descripcion_detalle": "Depreciación del mes", "debito": 0, "credito": monto})
-        total_depreciacion_mes += monto
-
-    descripcion_asiento = f"Depreciación para el período {ano}-{mes:02d}"
+    else:
+        logger.info(f"Comprobante de depreciación generado exitosamente por un total de {resultado['total']:.2f}")
+    return True
 
-    success, _ = contabilidad_logic.registrar_nuevo_comprobante(
-        fecha=fecha_proceso, tipo="Depreciación",
-        descripcion=descripcion_asiento, movimientos=movimientos, usuario_id=usuario_id
-    )
+@tool
+def ejecutar_depreciacion_atrasada(periodo_inicio: str, periodo_fin: str, usuario_id: int = 1) -> str:
+    """
+    Pone al día la depreciación de todos los activos entre dos períodos, generando un comprobante por mes.
+    Los meses ya depreciados de cada activo se omiten.
 
-    if success:
-        logger.info(f"Comprobante de depreciación generado exitosamente por un total de {total_depreciacion_mes:.2f}")
-    else:
-        logger.error("Fallo al generar el comprobante de depreciación del mes.")
+    Args:
+        periodo_inicio (str): Primer período a depreciar, en formato 'AAAA-MM' (ej: '2020-01').
+        periodo_fin (str): Último período a depreciar, en formato 'AAAA-MM' (ej: '2026-09').
+        usuario_id (int): ID del usuario que ejecuta el proceso. Por defecto es 1.
 
-    return success
+    Returns:
+        str: Un resumen del resultado del proceso.
+    """
+    success, resultado = ejecutar_depreciacion(periodo_inicio, periodo_fin, usuario_id)
+    if not success:
+        return f"Error: {resultado}"
+    return (f"Éxito: Depreciación de {periodo_inicio} a {periodo_fin} registrada en {len(resultado['periodos'])} "
+            f"comprobantes por un total de {resultado['total']:.2f}.")
@@ -1,6 +1,8 @@
 # analisis_financiero/agents/corps/general_analisis.py
 import os
+import asyncio
 from dotenv import load_dotenv
+from utils.micro_graph import transmitir_eventos
 from analisis_financiero.agents.corps.units.capitan_analisis import AnalisisCaptain
 
 # Cargar variables de entorno
@@ -30,6 +32,15 @@ class GeneralAnalisis:
         print(f"General de Análisis: Misión completada. Respuesta final: {response}")
         return response
 
+    async def stream_command(self, query: str):
+        """
+        Versión en streaming de process_command: ejecuta la orden en un hilo y entrega como iterador
+        asíncrono los tokens del LLM a medida que llegan ({"tipo": "token", "texto": ...}). El último
+        evento es {"tipo": "fin", "resultado": <respuesta final>}.
+        """
+        async for evento in transmitir_eventos(asyncio.to_thread(self.process_command, query)):
+            yield evento
+
 # Ejemplo de uso
 if __name__ == '__main__':
     general = GeneralAnalisis()
@@ -8,10 +8,12 @@ Este archivo centraliza las herramientas tácticas que los agentes del módulo d
 from analisis_financiero.logic import (
     generar_analisis_financiero_completo,
     generar_historial_de_ratio,
+    proyectar_gasto_depreciacion,
 )
 
 # Lista de todas las herramientas disponibles para el agente de análisis financiero
 analisis_financiero_tools = [
     generar_analisis_financiero_completo,
     generar_historial_de_ratio,
+    proyectar_gasto_depreciacion,
 ]
@@ -4,8 +4,10 @@ Módulo para la lógica de negocio del Análisis Financiero.
 Contiene las funciones para calcular los diferentes ratios.
 """
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from contabilidad import reportes_logic
+from activos_fijos import logic as activos_fijos_logic
+import calendar
 import datetime
 from langchain_core.tools import tool
 import json
@@ -98,33 +100,21 @@ def calcular_ratios_mercado(datos: Dict[str, Any]) -> Dict[str, Any]:
         "rentabilidad_por_dividendo": _safe_div(dividendo_anual_accion, precio_accion) * 100 if precio_accion > 0 else 0.0
     }
 
-@tool
-def generar_analisis_financiero_completo(fecha: str) -> str:
+def _datos_consolidados(estados: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Orquesta la generación de todos los ratios financieros para una fecha específica.
-
-    Args:
-        fecha (str): La fecha de corte para el análisis, en formato 'AAAA-MM-DD'.
-
-    Returns:
-        str: Un string en formato JSON con todos los ratios calculados, agrupados por categoría.
+    Extrae de un paquete de estados financieros (ver `reportes_logic.generar_estados_financieros`)
+    las magnitudes que usan los cálculos de ratios.
     """
-    logger.info(f"Iniciando análisis financiero completo para la fecha {fecha}")
-
-    balance = reportes_logic.generar_balance_general(fecha)
-    if not balance.get('total_activos'):
-        return "Error: No se pudieron generar los datos del Balance General para la fecha dada. No hay datos para analizar."
-
-    ano = datetime.datetime.strptime(fecha, '%Y-%m-%d').year
-    fecha_inicio_ano = f"{ano}-01-01"
-    estado_resultados = reportes_logic.generar_estado_resultados(fecha_inicio_ano, fecha)
+    balance = estados['balance_general']
+    estado_resultados = estados['estado_resultados']
+    grupos = estados['totales_por_grupo']
 
     datos_consolidados = {
         "activo_corriente": balance.get('total_activos_corrientes', 0.0),
         "pasivo_corriente": balance.get('total_pasivos_corrientes', 0.0),
-        "inventario": next((a['saldo_final'] for a in balance.get('activos', []) if a['codigo'].startswith('14')), 0.0),
-        "caja_y_bancos": next((a['saldo_final'] for a in balance.get('activos', []) if a['codigo'].startswith('11')), 0.0),
-        "cuentas_por_cobrar": next((a['saldo_final'] for a in balance.get('activos', []) if a['codigo'].startswith('13')), 0.0),
+        "inventario": grupos.get('14', 0.0),
+        "caja_y_bancos": grupos.get('11', 0.0),
+        "cuentas_por_cobrar": grupos.get('13', 0.0),
         "ventas_a_credito": estado_resultados.get('total_ingresos', 0.0),
         "costo_de_venta": estado_resultados.get('total_costos', 0.0),
         "ventas_totales": estado_resultados.get('total_ingresos', 0.0),
@@ -139,8 +129,11 @@ def generar_analisis_financiero_completo(fecha: str) -> str:
     datos_consolidados['valor_contable_por_accion'] = _safe_div(datos_consolidados['patrimonio_neto'], datos_consolidados['acciones_en_circulacion'])
     datos_consolidados['capitalizacion_de_mercado'] = datos_consolidados['precio_por_accion'] * datos_consolidados['acciones_en_circulacion']
     datos_consolidados['ventas_anuales'] = datos_consolidados['ventas_totales']
+    return datos_consolidados
 
-    analisis_final = {
+def _calcular_todos_los_ratios(datos_consolidados: Dict[str, Any]) -> Dict[str, Any]:
+    """Calcula todos los ratios, agrupados por categoría."""
+    return {
         "Ratios de Liquidez": calcular_ratios_liquidez(datos_consolidados),
         "Ratios de Gestión": calcular_ratios_gestion(datos_consolidados),
         "Ratios de Endeudamiento": calcular_ratios_endeudamiento(datos_consolidados),
@@ -148,9 +141,38 @@ def generar_analisis_financiero_completo(fecha: str) -> str:
         "Ratios de Mercado": calcular_ratios_mercado(datos_consolidados),
     }
 
+@tool
+def generar_analisis_financiero_completo(fecha: str) -> str:
+    """
+    Orquesta la generación de todos los ratios financieros para una fecha específica.
+
+    Args:
+        fecha (str): La fecha de corte para el análisis, en formato 'AAAA-MM-DD'.
+
+    Returns:
+        str: Un string en formato JSON con todos los ratios calculados, agrupados por categoría.
+    """
+    logger.info(f"Iniciando análisis financiero completo para la fecha {fecha}")
+
+    # Balance General y Estado de Resultados del ejercicio en una sola pasada por el libro
+    estados = reportes_logic.generar_estados_financieros(fecha)
+    if not estados['balance_general'].get('total_activos'):
+        return "Error: No se pudieron generar los datos del Balance General para la fecha dada. No hay datos para analizar."
+
+    analisis_final = _calcular_todos_los_ratios(_datos_consolidados(estados))
+
     logger.info("Análisis financiero completado.")
     return json.dumps(analisis_final, indent=2, ensure_ascii=False)
 
+def _cierres_de_mes(fecha_referencia: datetime.date, num_meses: int) -> List[datetime.date]:
+    """Devuelve el último día de los `num_meses` meses que terminan en el mes de `fecha_referencia`, del más antiguo al más reciente."""
+    cierres = []
+    indice_mes = fecha_referencia.year * 12 + fecha_referencia.month - 1
+    for i in range(num_meses - 1, -1, -1):
+        ano, mes = divmod(indice_mes - i, 12)
+        cierres.append(datetime.date(ano, mes + 1, calendar.monthrange(ano, mes + 1)[1]))
+    return cierres
+
 @tool
 def generar_historial_de_ratio(nombre_ratio: str, categoria_ratio: str, num_meses: int = 6) -> str:
     """
@@ -166,26 +188,40 @@ def generar_historial_de_ratio(nombre_ratio: str, categoria_ratio: str, num_mese
     """
     logger.info(f"Generando historial para el ratio '{nombre_ratio}' en los últimos {num_meses} meses.")
 
-    historial = {"labels": [], "values": []}
-    today = datetime.date.today()
+    if nombre_ratio not in _calcular_todos_los_ratios({}).get(categoria_ratio, {}):
+        return f"Error: El ratio '{nombre_ratio}' no existe en la categoría '{categoria_ratio}'."
 
-    for i in range(num_meses - 1, -1, -1):
-        # Calcular el último día del mes para cada período anterior
-        primer_dia_mes_actual = today.replace(day=1)
-        mes_objetivo = primer_dia_mes_actual - datetime.timedelta(days=i * 30) # Aproximación
-        ultimo_dia_mes_objetivo = (mes_objetivo.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+    cortes = _cierres_de_mes(datetime.date.today(), num_meses)
+    historial = {"labels": [corte.strftime("%b %Y") for corte in cortes], "values": []}
 
-        fecha_calculo = ultimo_dia_mes_objetivo.isoformat()
+    # Todos los cortes salen de una sola lectura de los saldos mensuales
+    serie = reportes_logic.generar_serie_estados_financieros([corte.isoformat() for corte in cortes])
+    for estados in serie:
+        if not estados['balance_general'].get('total_activos'):
+            historial["values"].append(0) # Sin datos para el mes
+            continue
+        ratios = _calcular_todos_los_ratios(_datos_consolidados(estados))
+        historial["values"].append(ratios[categoria_ratio][nombre_ratio])
 
-        try:
-            analisis_mes = generar_analisis_financiero_completo(fecha_calculo)
-            valor_ratio = analisis_mes[categoria_ratio][nombre_ratio]
+    return json.dumps(historial, ensure_ascii=False)
 
-            historial["labels"].append(ultimo_dia_mes_objetivo.strftime("%b %Y"))
-            historial["values"].append(valor_ratio)
-        except Exception as e:
-            logger.error(f"No se pudo calcular el ratio para {fecha_calculo}: {e}")
-            historial["labels"].append(ultimo_dia_mes_objetivo.strftime("%b %Y"))
-            historial["values"].append(0) # Añadir 0 si hay un error
+@tool
+def proyectar_gasto_depreciacion(num_meses: int = 12, desde: Optional[str] = None) -> str:
+    """
+    Proyecta el gasto de depreciación de los activos fijos por cuenta de gasto para los próximos meses,
+    a partir del programa de depreciación precalculado. Útil para presupuestos.
 
-    return historial
+    Args:
+        num_meses (int): Número de meses a proyectar. Por defecto 12.
+        desde (str, opcional): Primer período a proyectar, en formato 'AAAA-MM'. Por defecto el mes actual.
+
+    Returns:
+        str: Un string en formato JSON con el total por cuenta, el desglose mensual y el total general.
+    """
+    por_cuenta = activos_fijos_logic.proyectar_gasto_depreciacion(num_meses, desde)
+    por_periodo = activos_fijos_logic.proyectar_gasto_depreciacion(num_meses, desde, por_periodo=True)
+    return json.dumps({
+        "por_cuenta": {fila['cuenta_gasto_depreciacion']: round(fila['total'], 2) for fila in por_cuenta},
+        "por_periodo": por_periodo,
+        "total": round(sum(fila['total'] for fila in por_cuenta), 2),
+    }, ensure_ascii=False)
@@ -3,6 +3,7 @@ import flet as ft
 import asyncio
 import json
 from analisis_financiero.agents.corps.general_analisis import GeneralAnalisis
+from utils.helpers import ActualizadorPorLotes
 
 # --- Clases para la Interfaz de Chat ---
 class Message:
@@ -11,16 +12,21 @@ class Message:
         self.text = text
         self.message_type = message_type
 
+def formatear_texto(text: str) -> str:
+    """Muestra como bloque de código las respuestas que son JSON; el resto se deja igual."""
+    try:
+        parsed_json = json.loads(text)
+        return f"```json\n{json.dumps(parsed_json, indent=2, ensure_ascii=False)}\n```"
+    except (json.JSONDecodeError, TypeError):
+        return text
+
 class ChatMessage(ft.Row):
     def __init__(self, message: Message):
         super().__init__(vertical_alignment=ft.CrossAxisAlignment.START)
 
         # Intentar formatear el texto si es un JSON
-        try:
-            parsed_json = json.loads(message.text)
-            display_text = f"```json\n{json.dumps(parsed_json, indent=2, ensure_ascii=False)}\n```"
-        except (json.JSONDecodeError, TypeError):
-            display_text = message.text
+        display_text = formatear_texto(message.text)
+        self.content_control = ft.Markdown(display_text, selectable=True, extension_set="gitweblinks", code_theme="atom-one-dark")
 
         self.controls = [
             ft.CircleAvatar(
@@ -31,7 +37,7 @@ class ChatMessage(ft.Row):
             ft.Column(
                 [
                     ft.Text(message.user_name, weight=ft.FontWeight.BOLD),
-                    ft.Markdown(display_text, selectable=True, extension_set="gitweblinks", code_theme="atom-one-dark"),
+                    self.content_control,
                 ],
                 tight=True,
                 spacing=5,
@@ -81,9 +87,11 @@ class AnalisisFinancieroViewContent(ft.UserControl):
             expand=True
         )
 
-    def add_message(self, message: Message):
-        self.chat_list.controls.append(ChatMessage(message))
+    def add_message(self, message: Message) -> ChatMessage:
+        chat_message = ChatMessage(message)
+        self.chat_list.controls.append(chat_message)
         self.update()
+        return chat_message
 
     async def send_message_click(self, e):
         user_message_text = self.new_message.value
@@ -94,11 +102,22 @@ class AnalisisFinancieroViewContent(ft.UserControl):
         self.progress_ring.visible = True
         self.update()
 
+        respuesta = None
+        texto = ""
+        actualizador = ActualizadorPorLotes(self.update)
         try:
-            bot_response_text = await asyncio.to_thread(
-                self.general_analisis.process_command, user_message_text
-            )
-            self.add_message(Message("General Análisis", bot_response_text, "bot_message"))
+            # Los tokens se muestran a medida que llegan, con actualizaciones de la página por lotes.
+            async for evento in self.general_analisis.stream_command(user_message_text):
+                if respuesta is None:
+                    self.progress_ring.visible = False
+                    respuesta = self.add_message(Message("General Análisis", "", "bot_message"))
+                if evento["tipo"] == "token":
+                    texto += evento["texto"]
+                    respuesta.content_control.value = texto
+                elif evento["tipo"] == "fin":
+                    respuesta.content_control.value = formatear_texto(evento["resultado"])
+                actualizador.solicitar()
+            actualizador.vaciar()
         except Exception as ex:
             self.add_message(Message("Error", f"Ocurrió un error: {ex}", "bot_message"))
         finally:
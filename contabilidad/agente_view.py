@@ -1,7 +1,8 @@
 # views/agente_view.py
 import flet as ft
 import asyncio
-from contabilidad.agents.corps.general_contable import ContabilidadGeneral
+from contabilidad.agents.corps.general_contable import ContabilidadWorkflow
+from utils.helpers import ActualizadorPorLotes
 
 class Message:
     """Clase de datos para un mensaje en el chat."""
@@ -15,6 +16,9 @@ class ChatMessage(ft.Row):
     def __init__(self, message: Message):
         super().__init__()
         self.vertical_alignment = ft.CrossAxisAlignment.START
+        # Controles que se actualizan mientras llega una respuesta en streaming.
+        self.text_control = ft.Text(message.text, selectable=True, width=700) # Ancho para evitar desbordamiento
+        self.status_control = ft.Text("", size=12, italic=True, color=ft.Colors.GREY, visible=False)
         self.controls = [
             ft.CircleAvatar(
                 content=ft.Text(self.get_initials(message.user_name)),
@@ -24,7 +28,8 @@ class ChatMessage(ft.Row):
             ft.Column(
                 [
                     ft.Text(message.user_name, weight=ft.FontWeight.BOLD),
-                    ft.Text(message.text, selectable=True, width=700), # Ancho para evitar desbordamiento
+                    self.status_control,
+                    self.text_control,
                 ],
                 tight=True,
                 spacing=5,
@@ -49,7 +54,7 @@ class AgenteViewContent(ft.UserControl):
         self.page = page
         # Instanciar el nuevo General Contable
         try:
-            self.general_contable = ContabilidadGeneral()
+            self.general_contable = ContabilidadWorkflow()
             self.agent_ready = True
         except ValueError as e:
             self.general_contable = None
@@ -101,9 +106,11 @@ class AgenteViewContent(ft.UserControl):
             expand=True,
         )
 
-    def add_message(self, message: Message):
-        self.chat_list.controls.append(ChatMessage(message))
+    def add_message(self, message: Message) -> ChatMessage:
+        chat_message = ChatMessage(message)
+        self.chat_list.controls.append(chat_message)
         self.update()
+        return chat_message
 
     async def send_message_click(self, e):
         user_message_text = self.new_message.value
@@ -115,14 +122,27 @@ class AgenteViewContent(ft.UserControl):
         self.progress_ring.visible = True
         self.update()
 
+        respuesta = None
+        actualizador = ActualizadorPorLotes(self.update)
         try:
-            # Ejecutar el proceso síncrono del agente en un hilo separado
-            # para no bloquear el bucle de eventos de la UI de Flet.
-            bot_response_text = await asyncio.to_thread(
-                self.general_contable.process_command,
-                user_message_text
-            )
-            self.add_message(Message("General Contable", bot_response_text, "bot_message"))
+            # La respuesta se pinta a medida que llegan los eventos del grafo; los tokens se
+            # acumulan y la página se actualiza por lotes para no saturar la conexión de Flet.
+            async for evento in self.general_contable.stream_command(user_message_text):
+                if respuesta is None:
+                    self.progress_ring.visible = False
+                    respuesta = self.add_message(Message("General Contable", "", "bot_message"))
+                if evento["tipo"] == "nodo_inicio":
+                    # Cada nodo empieza su propia respuesta; las decisiones de enrutamiento no se acumulan.
+                    respuesta.status_control.value = f"Trabajando en: {evento['nodo']}"
+                    respuesta.status_control.visible = True
+                    respuesta.text_control.value = ""
+                elif evento["tipo"] == "token":
+                    respuesta.text_control.value += evento["texto"]
+                elif evento["tipo"] == "fin":
+                    respuesta.status_control.visible = False
+                    respuesta.text_control.value = evento["resultado"]
+                actualizador.solicitar()
+            actualizador.vaciar()
         except Exception as ex:
             self.add_message(Message("Error", f"Ocurrió un error crítico durante la ejecución: {ex}", "bot_message"))
         finally:
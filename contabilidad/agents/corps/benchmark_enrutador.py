@@ -0,0 +1,54 @@
+# contabilidad/agents/corps/benchmark_enrutador.py
+"""
+Mide la latencia de la ruta rápida del enrutador local (reglas y clasificador de n-gramas)
+con las tablas del General y del Capitán de Períodos.
+
+Uso:
+    python -m contabilidad.agents.corps.benchmark_enrutador
+    python -m contabilidad.agents.corps.benchmark_enrutador --repeticiones 5000
+"""
+import argparse
+import sys
+import time
+from typing import Dict, Iterable
+
+from contabilidad.agents.corps.enrutador_local import (EnrutadorLocal, EJEMPLOS_GENERAL, REGLAS_GENERAL,
+                                                        EJEMPLOS_PERIODOS, REGLAS_PERIODOS)
+
+ORDENES_GENERAL = (
+    "Necesito abrir el periodo contable de Diciembre 2025",  # Regla
+    "Cuánto debemos a los acreedores",                      # Clasificador
+    "Hola, ¿cómo estás?",                                    # Respaldo al LLM
+    "Cierra el periodo y genera el balance general",         # Orden compuesta
+)
+ORDENES_PERIODOS = ("Reabre el periodo de marzo", "Termina el periodo de abril")
+
+def medir_clasificacion(enrutador: EnrutadorLocal, ordenes: Iterable[str], repeticiones: int = 1000) -> Dict[str, Dict[str, object]]:
+    """Devuelve, por orden, la fuente que la resolvió y los microsegundos promedio de `clasificar`."""
+    resultados = {}
+    for orden in ordenes:
+        _, _, fuente = enrutador.clasificar(orden)
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            enrutador.clasificar(orden)
+        resultados[orden] = {"fuente": fuente, "microsegundos": (time.perf_counter() - inicio) / repeticiones * 1e6}
+    return resultados
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la latencia de la ruta rápida del enrutador local.")
+    parser.add_argument("--repeticiones", type=int, default=1000, help="Repeticiones de cada orden para promediar.")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    enrutadores = {"General": (EnrutadorLocal(EJEMPLOS_GENERAL, REGLAS_GENERAL), ORDENES_GENERAL),
+                   "Períodos": (EnrutadorLocal(EJEMPLOS_PERIODOS, REGLAS_PERIODOS), ORDENES_PERIODOS)}
+    print(f"Entrenamiento de los enrutadores: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    print(f"{'Enrutador':<10}{'Fuente':<14}{'Promedio (µs)':>15}  Orden")
+    for nombre, (enrutador, ordenes) in enrutadores.items():
+        for orden, r in medir_clasificacion(enrutador, ordenes, args.repeticiones).items():
+            print(f"{nombre:<10}{r['fuente']:<14}{r['microsegundos']:>15.1f}  {orden}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,16 @@
 from langchain_core.prompts import ChatPromptTemplate
 from ..agent_state import AgentState
+from ..enrutador_local import EnrutadorLocal, EJEMPLOS_PERIODOS, REGLAS_PERIODOS
 
 class CapitanPeriodosContablesNode:
     """
     El nodo del Capitán de Periodos Contables.
     Su responsabilidad es analizar la orden del General y delegarla al equipo táctico correcto.
+    Las órdenes que el enrutador local resuelve con confianza no llegan al LLM.
     """
     def __init__(self, llm):
         self.llm = llm
+        self.enrutador = EnrutadorLocal(EJEMPLOS_PERIODOS, REGLAS_PERIODOS)
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", "Eres el Capitán de Periodos Contables. Tu única tarea es analizar la orden y decidir cuál de tus equipos tácticos debe ejecutarla. Responde únicamente con el nombre del equipo. Tus equipos son: [equipo_tactico_apertura_de_periodos, equipo_tactico_cierre_de_periodos, equipo_tactico_bloqueo_desbloqueo_de_periodos]."),
             ("human", "{query}")
@@ -19,6 +22,11 @@ class CapitanPeriodosContablesNode:
         order = state['messages'][-1].content
         print(f"Recibida orden del General: '{order}'")
 
+        next_node, confianza, fuente = self.enrutador.enrutar(order)
+        if next_node is not None:
+            print(f"Decisión del Capitán (ruta rápida por {fuente}, confianza {confianza:.2f}): Delegar a '{next_node}'")
+            return {"next": next_node}
+
         response = await self.chain.ainvoke({"query": order})
         next_node = response.content.strip()
 
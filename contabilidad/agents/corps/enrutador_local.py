@@ -0,0 +1,260 @@
+import math
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+def normalizar_texto(texto: str) -> str:
+    """Pasa el texto a minúsculas, sin tildes y con los espacios colapsados."""
+    sin_tildes = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", sin_tildes).split())
+
+def _ngramas(texto: str, tamanos: Sequence[int] = (3, 4, 5)) -> Counter:
+    """Cuenta los n-gramas de caracteres de cada palabra, con un espacio como marca de inicio y fin."""
+    conteo = Counter()
+    for palabra in texto.split():
+        marcada = f" {palabra} "
+        for n in tamanos:
+            conteo.update(marcada[i:i + n] for i in range(len(marcada) - n + 1))
+    return conteo
+
+class EnrutadorLocal:
+    """
+    Enrutador determinista que se consulta antes del LLM en los nodos del General y de los Capitanes.
+
+    Primero aplica una tabla de reglas (expresiones regulares sobre el texto normalizado): si todas las
+    reglas que coinciden apuntan al mismo destino, la decisión es inmediata con confianza 1.0; si apuntan
+    a destinos distintos la orden es compuesta y se deja al LLM. Si ninguna coincide, compara la orden
+    con un centroide TF-IDF de n-gramas de caracteres por destino, entrenado con el nombre del nodo y
+    sus órdenes de ejemplo. La decisión solo se acepta si la similitud coseno supera `umbral` y le saca
+    al menos `margen` al segundo destino; en otro caso devuelve None y el nodo consulta al LLM.
+    """
+    def __init__(self, ejemplos: Dict[str, List[str]], reglas: Sequence[Tuple[str, str]] = (),
+                 umbral: float = 0.3, margen: float = 0.05):
+        self.destinos = list(ejemplos)
+        self.umbral = umbral
+        self.margen = margen
+        self.reglas = []
+        for patron, destino in reglas:
+            if destino not in ejemplos:
+                raise ValueError(f"La regla '{patron}' apunta a un destino desconocido: '{destino}'.")
+            self.reglas.append((re.compile(patron), destino))
+        self.consultas = 0
+        self.aciertos_reglas = 0
+        self.aciertos_clasificador = 0
+        self.segundos_ruta_rapida = 0.0
+        self._entrenar(ejemplos)
+
+    def _entrenar(self, ejemplos: Dict[str, List[str]]) -> None:
+        """Calcula el IDF de cada n-grama y el centroide normalizado de cada destino."""
+        documentos = {}
+        for destino, ordenes in ejemplos.items():
+            nombre = destino.replace("_", " ")
+            documentos[destino] = [_ngramas(normalizar_texto(texto)) for texto in [nombre, *ordenes]]
+        todos = [doc for docs in documentos.values() for doc in docs]
+        frecuencia_documental = Counter(ngrama for doc in todos for ngrama in doc)
+        self.idf = {ngrama: math.log((1 + len(todos)) / (1 + df)) + 1.0 for ngrama, df in frecuencia_documental.items()}
+
+        # Índice invertido n-grama -> [(destino, peso)]: puntuar una orden solo recorre sus propios n-gramas.
+        self.indice: Dict[str, List[Tuple[str, float]]] = {}
+        for destino, docs in documentos.items():
+            centroide = Counter()
+            for doc in docs:
+                for ngrama, peso in self._vector(doc).items():
+                    centroide[ngrama] += peso
+            for ngrama, peso in self._normalizar(centroide).items():
+                self.indice.setdefault(ngrama, []).append((destino, peso))
+
+    def _vector(self, conteo: Counter) -> Dict[str, float]:
+        """Vector TF-IDF normalizado; los n-gramas que no se vieron al entrenar se ignoran."""
+        return self._normalizar({ngrama: (1 + math.log(tf)) * self.idf[ngrama]
+                                 for ngrama, tf in conteo.items() if ngrama in self.idf})
+
+    @staticmethod
+    def _normalizar(vector: Dict[str, float]) -> Dict[str, float]:
+        norma = math.sqrt(sum(peso * peso for peso in vector.values()))
+        return {ngrama: peso / norma for ngrama, peso in vector.items()} if norma else {}
+
+    def puntajes(self, texto: str) -> List[Tuple[str, float]]:
+        """Similitud coseno de la orden con cada destino, de mayor a menor."""
+        puntajes = dict.fromkeys(self.destinos, 0.0)
+        for ngrama, peso in self._vector(_ngramas(normalizar_texto(texto))).items():
+            for destino, peso_destino in self.indice[ngrama]:
+                puntajes[destino] += peso * peso_destino
+        return sorted(puntajes.items(), key=lambda p: p[1], reverse=True)
+
+    def clasificar(self, texto: str) -> Tuple[Optional[str], float, str]:
+        """
+        Devuelve (destino, confianza, fuente) sin modificar las estadísticas. La fuente es 'regla',
+        'clasificador' o 'llm'; en este último caso el destino es None.
+        """
+        normalizado = normalizar_texto(texto)
+        por_reglas = {destino for patron, destino in self.reglas if patron.search(normalizado)}
+        if len(por_reglas) == 1:
+            return por_reglas.pop(), 1.0, "regla"
+        if por_reglas:
+            return None, 0.0, "llm"
+
+        puntajes = self.puntajes(texto)
+        mejor, confianza = puntajes[0]
+        segundo = puntajes[1][1] if len(puntajes) > 1 else 0.0
+        if confianza >= self.umbral and confianza - segundo >= self.margen:
+            return mejor, confianza, "clasificador"
+        return None, confianza, "llm"
+
+    def enrutar(self, texto: str) -> Tuple[Optional[str], float, str]:
+        """Igual que clasificar, pero registra la consulta en las estadísticas de la ruta rápida."""
+        inicio = time.perf_counter()
+        destino, confianza, fuente = self.clasificar(texto)
+        self.consultas += 1
+        if fuente == "regla":
+            self.aciertos_reglas += 1
+        elif fuente == "clasificador":
+            self.aciertos_clasificador += 1
+        if destino is not None:
+            self.segundos_ruta_rapida += time.perf_counter() - inicio
+        return destino, confianza, fuente
+
+    @property
+    def tasa_aciertos(self) -> float:
+        """Fracción de las consultas resueltas sin llamar al LLM."""
+        return (self.aciertos_reglas + self.aciertos_clasificador) / self.consultas if self.consultas else 0.0
+
+    def estadisticas(self) -> Dict[str, float]:
+        aciertos = self.aciertos_reglas + self.aciertos_clasificador
+        return {
+            "consultas": self.consultas,
+            "aciertos_reglas": self.aciertos_reglas,
+            "aciertos_clasificador": self.aciertos_clasificador,
+            "consultas_llm": self.consultas - aciertos,
+            "tasa_aciertos": self.tasa_aciertos,
+            "microsegundos_promedio": self.segundos_ruta_rapida / aciertos * 1e6 if aciertos else 0.0,
+        }
+
+# --- Tablas de enrutamiento ---
+
+EJEMPLOS_GENERAL: Dict[str, List[str]] = {
+    "capitan_plan_de_cuentas_y_politicas": [
+        "Crea la cuenta 110505 Caja general en el plan de cuentas",
+        "Modifica el nombre de una cuenta del PUC",
+        "Actualiza las políticas contables de la empresa",
+    ],
+    "capitan_periodos_contables": [
+        "Necesito abrir el periodo contable de diciembre 2025",
+        "Cierra el periodo contable de marzo",
+        "Bloquea el periodo de enero para que nadie registre",
+        "Desbloquea el periodo de febrero",
+    ],
+    "capitan_cuentas_por_cobrar_clientes": [
+        "Muéstrame la cartera vencida de los clientes",
+        "Registra el recaudo de la factura del cliente",
+        "Cuánto nos deben los clientes a 90 días",
+    ],
+    "capitan_cuentas_por_pagar_proveedores": [
+        "Programa el pago a proveedores de esta semana",
+        "Cuánto le debemos al proveedor",
+        "Registra la factura de compra del proveedor",
+    ],
+    "capitan_tesoreria_y_bancos": [
+        "Haz la conciliación bancaria de la cuenta corriente",
+        "Cuál es el saldo en bancos hoy",
+        "Registra la transferencia entre cuentas bancarias",
+        "Proyecta el flujo de caja de tesorería",
+    ],
+    "capitan_libro_diario_y_mayor": [
+        "Registra un asiento contable de ajuste",
+        "Muéstrame el libro mayor de la cuenta caja",
+        "Consulta el libro diario de mayo",
+        "Anula el comprobante de diario 45",
+    ],
+    "capitan_activos_fijos_contabilidad": [
+        "Calcula la depreciación del mes",
+        "Registra la compra de un vehículo como activo fijo",
+        "Da de baja el computador totalmente depreciado",
+    ],
+    "capitan_nomina_contabilidad": [
+        "Contabiliza la nómina de la quincena",
+        "Calcula las prestaciones sociales de los empleados",
+        "Liquida la seguridad social y los parafiscales",
+    ],
+    "capitan_inventarios_contabilidad": [
+        "Muéstrame el kardex del producto",
+        "Ajusta el inventario por faltantes del conteo físico",
+        "Calcula el costo de ventas del mes",
+    ],
+    "capitan_impuestos_sobre_las_ventas_iva": [
+        "Prepara la declaración de IVA del bimestre",
+        "Calcula el IVA generado y el IVA descontable",
+        "Cuánto IVA tenemos que pagar",
+    ],
+    "capitan_retenciones_y_otros_impuestos": [
+        "Calcula la retención en la fuente de los pagos",
+        "Genera los certificados de retención",
+        "Liquida el ICA y la reteica del año",
+    ],
+    "capitan_cierre_mensual_y_anual": [
+        "Haz el cierre mensual de la contabilidad",
+        "Ejecuta el cierre anual y traslada las utilidades",
+        "Cancela las cuentas de resultado al cierre del ejercicio",
+    ],
+    "capitan_estados_financieros": [
+        "Genera el balance general a diciembre",
+        "Muéstrame el estado de resultados del trimestre",
+        "Prepara el estado de flujos de efectivo",
+        "Calcula los indicadores financieros",
+    ],
+    "capitan_presupuesto_y_control": [
+        "Compara el presupuesto con la ejecución real",
+        "Crea el presupuesto de gastos del próximo año",
+        "Explícame las desviaciones presupuestales",
+    ],
+    "capitan_auditoria_y_cumplimiento_niif": [
+        "Revisa el cumplimiento de las NIIF",
+        "Prepara los papeles de trabajo para la auditoría",
+        "Muéstrame la pista de auditoría de los cambios",
+    ],
+}
+
+# Las reglas se evalúan sobre el texto normalizado (minúsculas y sin tildes).
+REGLAS_GENERAL: List[Tuple[str, str]] = [
+    (r"\bperiodos? contables?\b|\b(abrir|abre|apertura|cerrar|cierra|bloquear|bloquea|desbloquear|desbloquea|reabrir|reabre)\b.*\bperiodo", "capitan_periodos_contables"),
+    (r"\bplan de cuentas\b|\bpuc\b|\bpoliticas? contables?\b", "capitan_plan_de_cuentas_y_politicas"),
+    (r"\bcartera\b|\bcuentas? por cobrar\b|\brecaudo", "capitan_cuentas_por_cobrar_clientes"),
+    (r"\bcuentas? por pagar\b|\bproveedor(es)?\b", "capitan_cuentas_por_pagar_proveedores"),
+    (r"\bconciliacion bancaria\b|\bbancos?\b|\btesoreria\b", "capitan_tesoreria_y_bancos"),
+    (r"\blibro (diario|mayor)\b|\basientos?\b", "capitan_libro_diario_y_mayor"),
+    (r"\bdeprecia|\bactivos? fijos?\b", "capitan_activos_fijos_contabilidad"),
+    (r"\bnomina\b|\bprestaciones sociales\b|\bseguridad social\b|\bparafiscales\b", "capitan_nomina_contabilidad"),
+    (r"\binventarios?\b|\bkardex\b|\bcosto de ventas?\b", "capitan_inventarios_contabilidad"),
+    (r"\biva\b", "capitan_impuestos_sobre_las_ventas_iva"),
+    (r"\bretencion(es)?\b|\bretefuente\b|\breteica\b|\bica\b", "capitan_retenciones_y_otros_impuestos"),
+    (r"\bcierre (mensual|anual|del ejercicio)\b", "capitan_cierre_mensual_y_anual"),
+    (r"\bbalance general\b|\bestados? de (resultados|situacion financiera|flujos? de efectivo)\b|\bestados financieros\b", "capitan_estados_financieros"),
+    (r"\bpresupuest", "capitan_presupuesto_y_control"),
+    (r"\bauditoria\b|\bniif\b", "capitan_auditoria_y_cumplimiento_niif"),
+]
+
+EJEMPLOS_PERIODOS: Dict[str, List[str]] = {
+    "equipo_tactico_apertura_de_periodos": [
+        "Necesito abrir el periodo contable de diciembre 2025",
+        "Habilita el periodo de enero para registrar",
+        "Inicia el nuevo periodo contable",
+    ],
+    "equipo_tactico_cierre_de_periodos": [
+        "Cierra el periodo contable de marzo",
+        "Haz el cierre del periodo de junio",
+        "Da por terminado el periodo de abril",
+    ],
+    "equipo_tactico_bloqueo_desbloqueo_de_periodos": [
+        "Bloquea el periodo de enero para que nadie registre",
+        "Desbloquea el periodo de febrero",
+        "Reabre el periodo de mayo para un ajuste",
+    ],
+}
+
+REGLAS_PERIODOS: List[Tuple[str, str]] = [
+    (r"\b(abrir|abre|apertura|aperturar|habilita\w*|inicia\w*)\b", "equipo_tactico_apertura_de_periodos"),
+    (r"\b(cerrar|cierra|cierre|clausura\w*)\b", "equipo_tactico_cierre_de_periodos"),
+    (r"\b(bloque\w*|desbloque\w*|reabr\w*|congela\w*)\b", "equipo_tactico_bloqueo_desbloqueo_de_periodos"),
+]
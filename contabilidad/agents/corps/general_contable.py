@@ -5,16 +5,20 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
 from utils.micro_graph import MicroGraph, END
+from utils.cache_llm import obtener_cache_llm
 from .agent_state import AgentState
+from .enrutador_local import EnrutadorLocal, EJEMPLOS_GENERAL, REGLAS_GENERAL
 from .capitanes.capitan_periodos_contables import CapitanPeriodosContablesNode
 from .capitanes.capitan_periodos_contables.equipos_tacticos.equipo_tactico_apertura_de_periodos.soldado import SoldadoAperturaPeriodoNode
 
 class GeneralContableNode:
     """
     El nodo del General. Su responsabilidad es enrutar la tarea al Capitán correcto.
+    Las órdenes que el enrutador local resuelve con confianza no llegan al LLM.
     """
     def __init__(self, llm):
         self.llm = llm
+        self.enrutador = EnrutadorLocal(EJEMPLOS_GENERAL, REGLAS_GENERAL)
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", "Eres el General del sistema de contabilidad. Tu única tarea es analizar la siguiente solicitud del usuario y decidir cuál de tus 15 capitanes es el más adecuado para manejarla. Debes responder únicamente con el nombre del nodo del capitán elegido de la siguiente lista: [capitan_plan_de_cuentas_y_politicas, capitan_periodos_contables, capitan_cuentas_por_cobrar_clientes, capitan_cuentas_por_pagar_proveedores, capitan_tesoreria_y_bancos, capitan_libro_diario_y_mayor, capitan_activos_fijos_contabilidad, capitan_nomina_contabilidad, capitan_inventarios_contabilidad, capitan_impuestos_sobre_las_ventas_iva, capitan_retenciones_y_otros_impuestos, capitan_cierre_mensual_y_anual, capitan_estados_financieros, capitan_presupuesto_y_control, capitan_auditoria_y_cumplimiento_niif]"),
             ("human", "{query}")
@@ -26,6 +30,11 @@ class GeneralContableNode:
         user_query = state['messages'][-1].content
         print(f"Analizando orden: '{user_query}'")
 
+        next_node, confianza, fuente = self.enrutador.enrutar(user_query)
+        if next_node is not None:
+            print(f"Decisión del General (ruta rápida por {fuente}, confianza {confianza:.2f}): Delegar a '{next_node}'")
+            return {"next": next_node}
+
         response = await self.chain.ainvoke({"query": user_query})
         next_node = response.content.strip()
 
@@ -49,7 +58,7 @@ class ContabilidadWorkflow:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY no encontrada.")
-        self.llm = ChatOpenAI(api_key=api_key, model="gpt-4o", temperature=0)
+        self.llm = ChatOpenAI(api_key=api_key, model="gpt-4o", temperature=0, cache=obtener_cache_llm())
         self.workflow = self._build_graph()
 
     def _build_graph(self):
@@ -58,6 +67,7 @@ class ContabilidadWorkflow:
         # Nodos
         general_node = GeneralContableNode(self.llm)
         capitan_periodos_node = CapitanPeriodosContablesNode(self.llm)
+        self.enrutadores = {"general": general_node.enrutador, "capitan_periodos_contables": capitan_periodos_node.enrutador}
         soldado_apertura_node = SoldadoAperturaPeriodoNode()
 
         workflow.add_node("general", general_node.execute)
@@ -89,11 +99,32 @@ class ContabilidadWorkflow:
 
         return workflow.compile()
 
+    def estadisticas_enrutamiento(self) -> dict:
+        """Estadísticas de la ruta rápida (aciertos sin LLM) de cada nodo enrutador."""
+        return {nombre: enrutador.estadisticas() for nombre, enrutador in self.enrutadores.items()}
+
+    async def stream_command(self, query: str):
+        """
+        Versión en streaming de process_command: entrega los eventos del grafo (inicio y fin de cada
+        nodo, transiciones y tokens del LLM) a medida que ocurren. El último evento es
+        {"tipo": "fin", "resultado": <texto del último mensaje>}.
+        """
+        initial_state = {"messages": [HumanMessage(content=query)], "next": ""}
+        async for evento in self.workflow.stream(initial_state):
+            if evento["tipo"] == "fin":
+                mensajes = evento["resultado"]["messages"]
+                evento = {**evento, "resultado": mensajes[-1].content if len(mensajes) > 1 else "Proceso completado."}
+            yield evento
+
     async def process_command(self, query: str):
         initial_state = {"messages": [HumanMessage(content=query)], "next": ""}
         final_state = await self.workflow.run(initial_state)
         print("\n--- ESTADO FINAL ---")
         print(final_state)
+        for nombre, estadisticas in self.estadisticas_enrutamiento().items():
+            print(f"Ruta rápida de {nombre}: {estadisticas['tasa_aciertos']:.0%} de {estadisticas['consultas']} órdenes sin LLM")
+        cache = obtener_cache_llm().estadisticas()
+        print(f"Caché de LLM: {cache['tasa_aciertos']:.0%} de aciertos, {cache['segundos_ahorrados']:.1f} s ahorrados")
         return "Proceso completado."
 
 async def main():
@@ -3,11 +3,11 @@
 Módulo para la lógica de negocio relacionada con las Compras y Cuentas por Pagar.
 """
 import logging
-import datetime
-from typing import List, Dict, Any, Optional
+import sqlite3
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from database import db_manager
 from contabilidad import contabilidad_logic
-from inventario import inventario_logic
 
 logger = logging.getLogger(__name__)
 
@@ -21,18 +21,18 @@ def obtener_todas_las_compras(limit: int = 50) -> List[Dict[str, Any]]:
 
 # --- Lógica de Escritura ---
 
-def _generar_asiento_contable_de_compra(compra_id: int, tercero_id: int, items: List[Dict[str, Any]], concepto_retencion: str, usuario_id: int) -> Optional[int]:
+# Códigos de cuenta (hardcodeados por ahora, deberían ser configurables)
+CUENTA_PROVEEDORES = "220501"
+CUENTA_INVENTARIO = "1435"  # Mercancías no fabricadas por la empresa
+CUENTA_GASTO_DEFAULT = "5135"
+CUENTA_IVA_DESCONTABLE = "240810"
+CUENTA_RETEFUENTE_PAGAR = "236540"
+
+def _movimientos_asiento_de_compra(compra_id: int, tercero_id: int, items: List[Dict[str, Any]], concepto_retencion: str) -> List[Dict[str, Any]]:
     """
-    Función interna para generar el comprobante contable de una factura de compra.
+    Construye los movimientos del comprobante contable de una factura de compra.
     Distingue entre compras de inventario y compras de gastos.
     """
-    # Códigos de cuenta (hardcodeados por ahora, deberían ser configurables)
-    CUENTA_PROVEEDORES = "220501"
-    CUENTA_INVENTARIO = "1435"  # Mercancías no fabricadas por la empresa
-    CUENTA_GASTO_DEFAULT = "5135"
-    CUENTA_IVA_DESCONTABLE = "240810"
-    CUENTA_RETEFUENTE_PAGAR = "236540"
-
     subtotal_inventario = sum(item['subtotal'] for item in items if 'producto_id' in item)
     subtotal_gasto = sum(item['subtotal'] for item in items if 'producto_id' not in item)
     subtotal_base = subtotal_inventario + subtotal_gasto
@@ -46,7 +46,6 @@ def _generar_asiento_contable_de_compra(compra_id: int, tercero_id: int, items:
     )
 
     total_a_pagar = subtotal_base + total_iva - total_retencion
-    descripcion_asiento = f"Registro de factura de compra Nro. {compra_id}"
 
     movimientos = []
     # Débito a Inventario si aplica
@@ -62,60 +61,119 @@ def _generar_asiento_contable_de_compra(compra_id: int, tercero_id: int, items:
         {"cuenta_codigo": CUENTA_PROVEEDORES, "descripcion_detalle": f"Factura de proveedor {compra_id}", "debito": 0, "credito": total_a_pagar, "tercero_id": tercero_id},
     ])
 
-    movimientos_reales = [m for m in movimientos if m['debito'] > 0 or m['credito'] > 0]
+    return [m for m in movimientos if m['debito'] > 0 or m['credito'] > 0]
 
-    success, comprobante_id = contabilidad_logic.registrar_nuevo_comprobante(
-        fecha=datetime.date.today().isoformat(),
-        tipo="Factura de Compra",
-        descripcion=descripcion_asiento,
-        movimientos=movimientos_reales,
-        usuario_id=usuario_id
-    )
+def _validar_compra(compra: Dict[str, Any], productos_existentes: set, cache_puc: db_manager.CachePUC) -> Optional[str]:
+    """Devuelve un mensaje de error si la compra no puede registrarse, o None."""
+    items = compra.get('items', [])
+    if not items:
+        return "La compra no tiene ítems."
+    for item in items:
+        if item.get('cantidad', 0) <= 0:
+            return f"La cantidad del ítem '{item.get('descripcion')}' debe ser positiva."
+        if item.get('producto_id') and item['producto_id'] not in productos_existentes:
+            return f"Producto con ID {item['producto_id']} no encontrado."
+    movimientos = _movimientos_asiento_de_compra(0, compra['tercero_id'], items, compra.get('concepto_retencion', ''))
+    if not contabilidad_logic.validar_partida_doble(movimientos):
+        return "El asiento de compra no cumple la partida doble."
+    faltantes = sorted({m['cuenta_codigo'] for m in movimientos if not cache_puc.obtener(m['cuenta_codigo'])})
+    if faltantes:
+        return f"Cuentas no encontradas en el PUC: {', '.join(faltantes)}."
+    return None
+
+def crear_compras_lote(compras: List[Dict[str, Any]], usuario_id: int, tamano_lote: int = 500) -> Dict[str, Any]:
+    """
+    Registra un lote de facturas de compra.
 
-    return comprobante_id if success else None
+    Cada compra es un dict con 'tercero_id', 'fecha_emision', 'items', 'concepto_retencion' y,
+    opcionalmente, 'fecha_vencimiento' y 'estado'. Primero se valida todo el lote (ítems, partida
+    doble, cuentas del PUC y existencia de los productos) y luego las compras válidas se escriben
+    en transacciones de `tamano_lote` documentos con `executemany`: cabeceras, ítems, asientos,
+    enlaces y entradas al Kardex.
 
+    Devuelve un dict con 'resultados' (uno por compra, en el mismo orden, con 'indice', 'exito',
+    'compra_id' y 'error'), 'registrados', 'rechazados' y 'documentos_por_segundo'.
+    """
+    inicio = time.perf_counter()
+    resultados = [{"indice": i, "exito": False, "compra_id": None, "error": None} for i in range(len(compras))]
+
+    # 1. Validación de todo el lote
+    cache_puc = db_manager.obtener_cache_puc()
+    productos_existentes = set(db_manager.obtener_existencias_productos_db(
+        [item['producto_id'] for c in compras for item in c.get('items', []) if item.get('producto_id')]
+    ))
+    validas = []
+    for indice, compra in enumerate(compras):
+        error = _validar_compra(compra, productos_existentes, cache_puc)
+        if error:
+            resultados[indice]["error"] = error
+            continue
+        items = compra['items']
+        iva_rate = items[0].get('impuesto_porcentaje', 19.0)
+        validas.append((indice, {'tercero_id': compra['tercero_id'], 'fecha_emision': compra['fecha_emision'],
+                                 'fecha_vencimiento': compra.get('fecha_vencimiento'), 'estado': compra.get('estado', 'Recibida'),
+                                 'items': items, 'concepto_retencion': compra.get('concepto_retencion', ''),
+                                 'total': sum(item['subtotal'] for item in items) * (1 + iva_rate / 100.0)}))
+
+    # 2. Escritura por bloques, cada uno en su propia transacción
+    conn = None
+    try:
+        conn = db_manager.get_db_connection(db_manager.DB_CONTABILIDAD_PATH)
+        for desde in range(0, len(validas), tamano_lote):
+            bloque = validas[desde:desde + tamano_lote]
+            documentos = [compra for _, compra in bloque]
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                compra_ids = db_manager.insertar_lote_compras_db(conn, documentos)
+                comprobante_ids = db_manager.insertar_lote_comprobantes_db(conn, [
+                    {'fecha': c['fecha_emision'], 'tipo': "Factura de Compra", 'descripcion': f"Registro de factura de compra Nro. {compra_id}",
+                     'movimientos': _movimientos_asiento_de_compra(compra_id, c['tercero_id'], c['items'], c['concepto_retencion']),
+                     'usuario_id': usuario_id}
+                    for compra_id, c in zip(compra_ids, documentos)
+                ])
+                db_manager.enlazar_comprobantes_a_compras_db(conn, list(zip(compra_ids, comprobante_ids)))
+                db_manager.registrar_movimientos_inventario_db(conn, [
+                    {'producto_id': item['producto_id'], 'tipo_movimiento': 'compra', 'cantidad': item['cantidad'],
+                     'costo_unitario': item['precio_unitario'], 'fecha': c['fecha_emision'], 'comprobante_id': comprobante_id}
+                    for c, comprobante_id in zip(documentos, comprobante_ids) for item in c['items'] if item.get('producto_id')
+                ])
+                conn.commit()
+            except (ValueError, sqlite3.Error) as e:
+                logger.error(f"Falló el bloque de compras {desde}-{desde + len(bloque) - 1}; se revierte: {e}")
+                conn.rollback()
+                for indice, _ in bloque:
+                    resultados[indice]["error"] = str(e)
+                continue
+            for (indice, _), compra_id in zip(bloque, compra_ids):
+                resultados[indice].update(exito=True, compra_id=compra_id)
+    except sqlite3.Error as e:
+        logger.error(f"Error de conexión al registrar el lote de compras: {e}")
+        for resultado in resultados:
+            if not resultado["exito"] and not resultado["error"]:
+                resultado["error"] = str(e)
+    finally:
+        db_manager.close_connection(conn)
+
+    duracion = time.perf_counter() - inicio
+    registrados = sum(1 for r in resultados if r['exito'])
+    resumen = {"resultados": resultados, "registrados": registrados, "rechazados": len(resultados) - registrados,
+               "documentos_por_segundo": len(resultados) / duracion if duracion > 0 else 0.0}
+    logger.info(f"Lote de compras: {registrados} registradas, {resumen['rechazados']} rechazadas, "
+                f"{resumen['documentos_por_segundo']:.0f} documentos/s")
+    return resumen
 
 def crear_nueva_compra(tercero_id: int, fecha_emision: str, items: List[Dict[str, Any]], concepto_retencion: str, usuario_id: int, fecha_vencimiento: Optional[str] = None, estado: str = 'Recibida') -> Tuple[bool, Optional[int]]:
     """
-    Orquesta la creación de una nueva compra, su asiento contable y la actualización del inventario.
+    Registra una compra con su asiento contable, el enlace y la entrada al inventario en una
+    sola transacción (es un lote de un documento).
     """
-    subtotal = sum(item['subtotal'] for item in items)
-    iva_rate = items[0].get('impuesto_porcentaje', 19.0)
-    total_compra = subtotal * (1 + iva_rate / 100.0)
-
-    # 1. Guardar la compra en la BD
-    success, compra_id = db_manager.crear_compra_db(
-        tercero_id=tercero_id, fecha_emision=fecha_emision, fecha_vencimiento=fecha_vencimiento,
-        total=total_compra, estado=estado, items=items
-    )
-    if not success:
+    resumen = crear_compras_lote([{
+        'tercero_id': tercero_id, 'fecha_emision': fecha_emision, 'items': items, 'concepto_retencion': concepto_retencion,
+        'fecha_vencimiento': fecha_vencimiento, 'estado': estado
+    }], usuario_id)
+    resultado = resumen['resultados'][0]
+    if not resultado['exito']:
+        logger.error(f"No se pudo registrar la compra: {resultado['error']}")
         return False, None
-
-    # 2. Generar asiento contable
-    comprobante_id = _generar_asiento_contable_de_compra(
-        compra_id=compra_id, tercero_id=tercero_id, items=items,
-        concepto_retencion=concepto_retencion, usuario_id=usuario_id
-    )
-    if not comprobante_id:
-        # En un caso real, se debería anular la compra o marcarla para revisión
-        logger.error(f"La compra {compra_id} se creó pero su asiento contable falló.")
-        return False, compra_id
-
-    # 3. Enlazar comprobante a la compra
-    db_manager.enlazar_comprobante_a_compra(compra_id, comprobante_id)
-
-    # 4. Actualizar inventario para los items que son productos
-    for item in items:
-        if 'producto_id' in item and item['producto_id']:
-            logger.info(f"Registrando entrada de inventario para producto ID {item['producto_id']}")
-            inventario_logic.registrar_movimiento_inventario(
-                producto_id=item['producto_id'],
-                tipo_movimiento='compra',
-                cantidad=item['cantidad'],
-                costo_unitario=item['precio_unitario'],
-                fecha=fecha_emision,
-                comprobante_id=comprobante_id
-            )
-
-    logger.info(f"Proceso de compra {compra_id} completado (Contabilidad e Inventario).")
-    return True, compra_id
+    logger.info(f"Proceso de compra {resultado['compra_id']} completado (Contabilidad e Inventario).")
+    return True, resultado['compra_id']
@@ -2,8 +2,17 @@
 """
 Módulo para la lógica de negocio de la Conciliación Bancaria.
 """
+import bisect
+import csv
+import datetime
+import hashlib
+import itertools
 import logging
-from typing import List, Dict, Any, Tuple
+import os
+import re
+import time
+import unicodedata
+from typing import List, Dict, Any, FrozenSet, Iterator, Optional, Tuple
 from database import db_manager
 
 logger = logging.getLogger(__name__)
@@ -12,42 +21,272 @@ def obtener_datos_para_conciliacion(cuenta_banco_codigo: str) -> Tuple[List[Dict
     """
     Obtiene los datos necesarios para iniciar un proceso de conciliación.
     Devuelve una tupla con: (lista de transacciones bancarias, lista de movimientos contables).
+    Las filas son compactas (con __slots__) y se leen igual que diccionarios: t['monto'], t.get('referencia').
     """
-    transacciones = db_manager.obtener_transacciones_bancarias_no_reconciliadas()
-    movimientos = db_manager.obtener_movimientos_contables_no_reconciliados(cuenta_banco_codigo)
+    transacciones = db_manager.obtener_transacciones_bancarias_no_reconciliadas(formato='filas')
+    movimientos = db_manager.obtener_movimientos_contables_no_reconciliados(cuenta_banco_codigo, formato='filas')
     return transacciones, movimientos
 
-def sugerir_coincidencias(transacciones: List[Dict[str, Any]], movimientos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _clave_centavos(monto: float) -> int:
+    return int(round(monto * 100))
+
+def _fecha_ordinal(fecha: Any) -> Optional[int]:
+    """Día ordinal de una fecha ISO o de extracto (ver `normalizar_fecha`); None si no se puede leer."""
+    try:
+        return datetime.date.fromisoformat(str(fecha)[:10]).toordinal()
+    except ValueError:
+        pass
+    try:
+        return datetime.date.fromisoformat(normalizar_fecha(fecha)).toordinal()
+    except ValueError:
+        return None
+
+def _tokens(*textos: Optional[str]) -> FrozenSet[str]:
+    """Palabras normalizadas (minúsculas, sin tildes) de uno o más textos, para comparar descripciones."""
+    normalizado = unicodedata.normalize("NFKD", " ".join(t for t in textos if t)).encode("ascii", "ignore").decode().lower()
+    return frozenset(t for t in re.findall(r"[a-z0-9]+", normalizado) if len(t) > 2 or t.isdigit())
+
+def _similitud(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _mas_cercanos(entradas: List[Tuple[int, int]], fecha: int, dias_tolerancia: Optional[int], es_candidato) -> Tuple[Optional[int], List[int]]:
+    """
+    Recorre una lista de (fecha_ordinal, posición) ordenada, desde `fecha` hacia
+    ambos lados, y devuelve la menor distancia en días con un candidato válido
+    junto con todas las posiciones que empatan a esa distancia.
+    """
+    derecha = bisect.bisect_left(entradas, (fecha, -1))
+    izquierda = derecha - 1
+    mejor_distancia, empatados = None, []
+    while izquierda >= 0 or derecha < len(entradas):
+        dist_izq = fecha - entradas[izquierda][0] if izquierda >= 0 else None
+        dist_der = entradas[derecha][0] - fecha if derecha < len(entradas) else None
+        if dist_der is None or (dist_izq is not None and dist_izq <= dist_der):
+            distancia, pos = dist_izq, entradas[izquierda][1]
+            izquierda -= 1
+        else:
+            distancia, pos = dist_der, entradas[derecha][1]
+            derecha += 1
+        if (mejor_distancia is not None and distancia > mejor_distancia) or (dias_tolerancia is not None and distancia > dias_tolerancia):
+            break
+        if es_candidato(pos):
+            mejor_distancia = distancia
+            empatados.append(pos)
+    return mejor_distancia, empatados
+
+def sugerir_coincidencias(transacciones: List[Dict[str, Any]], movimientos: List[Dict[str, Any]], dias_tolerancia: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Compara las transacciones bancarias y los movimientos contables para sugerir coincidencias.
-    Lógica inicial: buscar importes idénticos. El 'monto' de la transacción bancaria
-    se compara con el 'debito' (salida de dinero) o 'credito' (entrada de dinero) del movimiento.
+    El 'monto' de la transacción bancaria se compara con el 'debito' (salida de dinero) o
+    'credito' (entrada de dinero) del movimiento, con una tolerancia de 1 centavo.
+
+    Los movimientos se indexan por lado e importe en centavos; cada cubeta guarda sus
+    movimientos ordenados por fecha. Entre varios candidatos del mismo importe se prefiere
+    el de fecha más cercana a la transacción y, a igual fecha, el de descripción más
+    parecida (descripción y referencia bancarias frente al detalle del movimiento).
+    Con `dias_tolerancia` se descartan los candidatos más alejados que ese número de días.
+    Cada movimiento se sugiere a lo sumo una vez.
+
+    Si una fecha no se puede leer no hay cercanía que ordenar: una transacción sin fecha
+    compara todos los candidatos de su importe solo por descripción, y los movimientos sin
+    fecha quedan como último recurso. Con `dias_tolerancia` no se sugieren, porque no se
+    puede comprobar la ventana.
     """
+    indice: Dict[Tuple[str, int], List[Tuple[int, int]]] = {}
+    sin_fecha: Dict[Tuple[str, int], List[int]] = {}
+    rangos: Dict[Tuple[str, int], Tuple[float, float]] = {} # Importe mínimo y máximo de cada cubeta
+    for pos, mov in enumerate(movimientos):
+        fecha = _fecha_ordinal(mov['fecha'])
+        for lado in ('debito', 'credito'):
+            monto = mov.get(lado) or 0.0
+            if monto > 0:
+                clave = (lado, _clave_centavos(monto))
+                if fecha is None:
+                    sin_fecha.setdefault(clave, []).append(pos)
+                else:
+                    indice.setdefault(clave, []).append((fecha, pos))
+                minimo, maximo = rangos.get(clave, (monto, monto))
+                rangos[clave] = (min(minimo, monto), max(maximo, monto))
+    for entradas in indice.values():
+        entradas.sort()
+
     sugerencias = []
-    # Usar copias para poder eliminar items ya emparejados
-    movimientos_disponibles = list(movimientos)
+    usados = set()
+    tokens_movimientos: Dict[int, FrozenSet[str]] = {}
 
     for trans in transacciones:
         monto_transaccion = trans['monto']
+        # Si el monto de la transacción es negativo (un pago), buscar en los débitos del banco.
+        # Si el monto es positivo (un depósito), buscar en los créditos del banco.
+        lado = 'debito' if monto_transaccion < 0 else 'credito'
+        objetivo = abs(monto_transaccion)
+        fecha = _fecha_ordinal(trans['fecha'])
+
+        def es_candidato(pos: int) -> bool:
+            return pos not in usados and abs(objetivo - movimientos[pos][lado]) < 0.01 # Tolerancia de 1 centavo
 
-        for i, mov in enumerate(movimientos_disponibles):
-            # Si el monto de la transacción es negativo (un pago), buscar en los débitos del banco.
-            # Si el monto es positivo (un depósito), buscar en los créditos del banco.
-            monto_movimiento = mov['debito'] if monto_transaccion < 0 else mov['credito']
-
-            # Comparamos el valor absoluto
-            if abs(abs(monto_transaccion) - monto_movimiento) < 0.01: # Tolerancia de 1 centavo
-                sugerencias.append({
-                    "transaccion": trans,
-                    "movimiento": mov
-                })
-                # Eliminar el movimiento para que no se sugiera de nuevo
-                movimientos_disponibles.pop(i)
-                break # Pasar a la siguiente transacción bancaria
+        # La tolerancia de 1 centavo puede cruzar al centavo vecino por redondeo
+        mejor_distancia, empatados = None, []
+        clave = _clave_centavos(objetivo)
+        vecinas = [(lado, vecina) for vecina in (clave - 1, clave, clave + 1) if (lado, vecina) in rangos
+                   and objetivo - rangos[(lado, vecina)][1] < 0.01 and rangos[(lado, vecina)][0] - objetivo < 0.01]
+        for cubeta in vecinas:
+            entradas = indice.get(cubeta)
+            if not entradas:
+                continue
+            if fecha is None:
+                # Sin fecha no hay cercanía: todos los candidatos del importe empatan
+                if dias_tolerancia is None:
+                    empatados.extend(pos for _, pos in entradas if es_candidato(pos))
+                continue
+            distancia, posiciones = _mas_cercanos(entradas, fecha, dias_tolerancia, es_candidato)
+            if distancia is None:
+                continue
+            if mejor_distancia is None or distancia < mejor_distancia:
+                mejor_distancia, empatados = distancia, posiciones
+            elif distancia == mejor_distancia:
+                empatados.extend(posiciones)
+        if not empatados and dias_tolerancia is None:
+            empatados = [pos for cubeta in vecinas for pos in sin_fecha.get(cubeta, ()) if es_candidato(pos)]
+        if not empatados:
+            continue
+
+        if len(empatados) == 1:
+            elegido = empatados[0]
+        else:
+            tokens_transaccion = _tokens(trans.get('descripcion'), trans.get('referencia'))
+            for pos in empatados:
+                if pos not in tokens_movimientos:
+                    tokens_movimientos[pos] = _tokens(movimientos[pos].get('descripcion_detalle'), movimientos[pos].get('descripcion'))
+            elegido = min(empatados, key=lambda pos: (-_similitud(tokens_transaccion, tokens_movimientos[pos]), pos))
+
+        # Retirar el movimiento de su cubeta para que no se sugiera de nuevo
+        mov = movimientos[elegido]
+        cubeta, fecha_movimiento = (lado, _clave_centavos(mov[lado])), _fecha_ordinal(mov['fecha'])
+        if fecha_movimiento is None:
+            sin_fecha[cubeta].remove(elegido)
+        else:
+            entradas = indice[cubeta]
+            del entradas[bisect.bisect_left(entradas, (fecha_movimiento, elegido))]
+        usados.add(elegido)
+        sugerencias.append({
+            "transaccion": trans,
+            "movimiento": mov
+        })
 
     logger.info(f"Se encontraron {len(sugerencias)} coincidencias sugeridas.")
     return sugerencias
 
+def _buscar_combinacion(objetivo: int, candidatos: List[int], max_elementos: int, tolerancia: int, limite: float) -> Optional[Tuple[int, ...]]:
+    """
+    Busca entre 2 y `max_elementos` importes (en centavos) de `candidatos` cuya suma
+    quede a `tolerancia` centavos o menos de `objetivo`, probando primero los grupos
+    más pequeños. Usa encuentro a mitad de camino: las sumas de una mitad del grupo
+    se tabulan y la otra mitad busca su complemento. Devuelve las posiciones del
+    grupo, o None si no existe o si se alcanza el instante `limite` (perf_counter).
+    """
+    for tamano in range(2, max_elementos + 1):
+        tamano_a = tamano // 2
+        tabla: Dict[int, List[Tuple[int, ...]]] = {}
+        for combinacion in itertools.combinations(range(len(candidatos)), tamano - tamano_a):
+            if time.perf_counter() > limite:
+                return None
+            total = sum(candidatos[i] for i in combinacion)
+            if total <= objetivo + tolerancia:
+                tabla.setdefault(total, []).append(combinacion)
+        for combinacion in itertools.combinations(range(len(candidatos)), tamano_a):
+            if time.perf_counter() > limite:
+                return None
+            resto = objetivo - sum(candidatos[i] for i in combinacion)
+            for suma in range(resto - tolerancia, resto + tolerancia + 1):
+                for otra in tabla.get(suma, ()):
+                    # Cada grupo se parte una sola vez: sus primeras posiciones a un lado y las últimas al otro
+                    if combinacion[-1] < otra[0]:
+                        return combinacion + otra
+    return None
+
+def _ordenar_por_fecha(filas: List[Dict[str, Any]], excluidas: set) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Filas no excluidas con fecha legible, ordenadas por fecha, y sus fechas ordinales."""
+    pares = [(_fecha_ordinal(f['fecha']), f) for f in filas if id(f) not in excluidas]
+    pares = sorted((p for p in pares if p[0] is not None), key=lambda p: p[0])
+    return [f for _, f in pares], [fecha for fecha, _ in pares]
+
+def _candidatos_cercanos(fechas: List[int], fecha: int, dias_tolerancia: int, es_candidato, max_candidatos: int) -> List[int]:
+    """Posiciones válidas dentro de la ventana de fechas, las `max_candidatos` más cercanas a `fecha`."""
+    desde = bisect.bisect_left(fechas, fecha - dias_tolerancia)
+    hasta = bisect.bisect_right(fechas, fecha + dias_tolerancia)
+    posiciones = [i for i in range(desde, hasta) if es_candidato(i)]
+    posiciones.sort(key=lambda i: abs(fechas[i] - fecha))
+    return posiciones[:max_candidatos]
+
+def sugerir_coincidencias_agrupadas(transacciones: List[Dict[str, Any]], movimientos: List[Dict[str, Any]], max_elementos: int = 3,
+                                    dias_tolerancia: int = 7, tolerancia: float = 0.0, presupuesto_ms: float = 20.0,
+                                    max_candidatos: int = 40) -> List[Dict[str, Any]]:
+    """
+    Propone grupos de conciliación: primero las coincidencias 1:1 de `sugerir_coincidencias`
+    y, con lo que queda, combinaciones de hasta `max_elementos` movimientos cuya suma
+    coincide con una línea del extracto (p. ej. varios recaudos consignados juntos) y de
+    hasta `max_elementos` líneas del extracto que suman un movimiento (p. ej. un pago
+    partido en valor y comisiones).
+
+    Las coincidencias 1:1 no tienen ventana de fechas (entre importes iguales gana la fecha
+    más cercana). Solo se combinan elementos a `dias_tolerancia` días o menos de la línea o
+    movimiento objetivo, y la suma puede diferir en `tolerancia` (en pesos); las filas con fecha ilegible
+    no entran en grupos. Cada búsqueda tiene un presupuesto de `presupuesto_ms` milisegundos;
+    si se agota, esa línea queda sin sugerencia.
+
+    Devuelve una lista de {"transacciones": [...], "movimientos": [...]}.
+    """
+    grupos = [{"transacciones": [s['transaccion']], "movimientos": [s['movimiento']]}
+              for s in sugerir_coincidencias(transacciones, movimientos)]
+    trans_usadas = {id(g['transacciones'][0]) for g in grupos}
+    movs_usados = {id(g['movimientos'][0]) for g in grupos}
+    trans_libres, fechas_trans = _ordenar_por_fecha(transacciones, trans_usadas)
+    movs_libres, fechas_movs = _ordenar_por_fecha(movimientos, movs_usados)
+    tolerancia_centavos = _clave_centavos(tolerancia)
+
+    # Varios movimientos contra una línea del extracto
+    movs_agrupados, trans_agrupadas = set(), set()
+    for t, (trans, fecha) in enumerate(zip(trans_libres, fechas_trans)):
+        lado = 'debito' if trans['monto'] < 0 else 'credito'
+        objetivo = _clave_centavos(abs(trans['monto']))
+        posiciones = _candidatos_cercanos(
+            fechas_movs, fecha, dias_tolerancia,
+            lambda i: i not in movs_agrupados and 0 < (movs_libres[i].get(lado) or 0.0) and _clave_centavos(movs_libres[i][lado]) <= objetivo + tolerancia_centavos,
+            max_candidatos)
+        grupo = _buscar_combinacion(objetivo, [_clave_centavos(movs_libres[i][lado]) for i in posiciones], max_elementos,
+                                    tolerancia_centavos, time.perf_counter() + presupuesto_ms / 1000)
+        if grupo:
+            movs_agrupados.update(posiciones[j] for j in grupo)
+            trans_agrupadas.add(t)
+            grupos.append({"transacciones": [trans], "movimientos": [movs_libres[posiciones[j]] for j in grupo]})
+
+    # Varias líneas del extracto contra un movimiento
+    restantes = [t for t in range(len(trans_libres)) if t not in trans_agrupadas]
+    trans_libres = [trans_libres[t] for t in restantes]
+    fechas_trans = [fechas_trans[t] for t in restantes]
+    trans_agrupadas = set()
+    for i, (mov, fecha) in enumerate(zip(movs_libres, fechas_movs)):
+        lado = 'debito' if (mov.get('debito') or 0.0) > 0 else 'credito'
+        objetivo = _clave_centavos(mov.get(lado) or 0.0)
+        if i in movs_agrupados or objetivo <= 0:
+            continue
+        signo = -1 if lado == 'debito' else 1
+        posiciones = _candidatos_cercanos(
+            fechas_trans, fecha, dias_tolerancia,
+            lambda t: t not in trans_agrupadas and trans_libres[t]['monto'] * signo > 0 and _clave_centavos(abs(trans_libres[t]['monto'])) <= objetivo + tolerancia_centavos,
+            max_candidatos)
+        grupo = _buscar_combinacion(objetivo, [_clave_centavos(abs(trans_libres[t]['monto'])) for t in posiciones], max_elementos,
+                                    tolerancia_centavos, time.perf_counter() + presupuesto_ms / 1000)
+        if grupo:
+            trans_agrupadas.update(posiciones[j] for j in grupo)
+            grupos.append({"transacciones": [trans_libres[posiciones[j]] for j in grupo], "movimientos": [mov]})
+
+    logger.info(f"Se encontraron {len(grupos)} grupos de conciliación sugeridos.")
+    return grupos
+
 def reconciliar_par(movimiento_id: int, transaccion_id: int) -> bool:
     """
     Ejecuta la reconciliación de un par de movimiento y transacción.
@@ -55,10 +294,206 @@ def reconciliar_par(movimiento_id: int, transaccion_id: int) -> bool:
     logger.info(f"Intentando reconciliar movimiento {movimiento_id} con transacción {transaccion_id}")
     return db_manager.marcar_como_reconciliados(movimiento_id, transaccion_id)
 
+def reconciliar_grupo(movimiento_ids: List[int], transaccion_ids: List[int]) -> bool:
+    """
+    Reconcilia de una vez un grupo de movimientos contables con un grupo de
+    transacciones bancarias (p. ej. uno de los sugeridos por `sugerir_coincidencias_agrupadas`).
+    """
+    logger.info(f"Intentando reconciliar movimientos {movimiento_ids} con transacciones {transaccion_ids}")
+    return db_manager.marcar_grupo_como_reconciliado(movimiento_ids, transaccion_ids)
+
+def confirmar_grupos(grupos: List[Dict[str, Any]]) -> int:
+    """
+    Reconcilia los grupos aceptados por el usuario. Los pares 1:1 se confirman todos
+    juntos en una sola transacción; los grupos de varios elementos, uno por uno.
+    Devuelve cuántos grupos quedaron reconciliados.
+    """
+    pares = [(g['movimientos'][0]['id'], g['transacciones'][0]['id']) for g in grupos if len(g['movimientos']) == 1 and len(g['transacciones']) == 1]
+    confirmados = db_manager.marcar_pares_como_reconciliados(pares)
+    for grupo in grupos:
+        if len(grupo['movimientos']) > 1 or len(grupo['transacciones']) > 1:
+            if reconciliar_grupo([m['id'] for m in grupo['movimientos']], [t['id'] for t in grupo['transacciones']]):
+                confirmados += 1
+    logger.info(f"Se confirmaron {confirmados} de {len(grupos)} grupos de conciliación.")
+    return confirmados
+
+# --- Importación de extractos ---
+
+# Nombres de columna aceptados en los extractos CSV (normalizados: minúsculas, sin tildes).
+ALIAS_COLUMNAS_EXTRACTO = {
+    'fecha': ('fecha', 'date', 'fecha transaccion', 'fecha movimiento', 'fecha operacion'),
+    'descripcion': ('descripcion', 'concepto', 'detalle', 'description', 'memo'),
+    'monto': ('monto', 'valor', 'importe', 'amount'),
+    'debito': ('debito', 'debitos', 'retiro', 'retiros', 'cargo'),
+    'credito': ('credito', 'creditos', 'deposito', 'depositos', 'abono'),
+    'referencia': ('referencia', 'ref', 'documento', 'numero documento', 'comprobante'),
+    'tipo': ('tipo', 'tipo transaccion'),
+}
+
+def _normalizar_nombre(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return " ".join(texto.lower().replace("_", " ").split())
+
+# Entero agrupado por miles con un solo tipo de separador: '1.234', '15.000', '1,234,567'.
+_MILES = re.compile(r"[1-9]\d{0,2}(?:\.\d{3})+|[1-9]\d{0,2}(?:,\d{3})+")
+
+def normalizar_monto(valor: Any) -> float:
+    """
+    Convierte un importe de extracto CSV a float. Acepta separador decimal ',' o '.',
+    separadores de miles, símbolo de moneda y negativos con '-' o entre paréntesis.
+
+    Un importe sin decimales cuyos separadores forman grupos de miles ('15.000',
+    '1,234,567') se lee como entero; en cualquier otro caso el último separador es el
+    decimal, tenga los dígitos que tenga ('1234.5678', '0.125').
+    """
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).strip()
+    negativo = "-" in texto or (texto.startswith("(") and texto.endswith(")"))
+    limpio = re.sub(r"[^0-9,.]", "", texto)
+    if not re.search(r"\d", limpio):
+        raise ValueError(f"Importe inválido: '{valor}'")
+    separador = max(limpio.rfind(","), limpio.rfind("."))
+    if separador < 0 or _MILES.fullmatch(limpio):
+        entero, decimales = re.sub(r"[,.]", "", limpio), "0"
+    else:
+        entero, decimales = re.sub(r"[,.]", "", limpio[:separador]), limpio[separador + 1:] or "0"
+    monto = float(f"{entero or 0}.{decimales}")
+    return -monto if negativo else monto
+
+def normalizar_fecha(valor: Any) -> str:
+    """Convierte una fecha de extracto (AAAA-MM-DD, DD/MM/AAAA o AAAAMMDD de OFX) a 'AAAA-MM-DD'."""
+    texto = str(valor).strip()
+    if m := re.match(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})", texto):
+        ano, mes, dia = m.groups()
+    elif m := re.match(r"^(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})", texto):
+        dia, mes, ano = m.groups()
+    elif m := re.match(r"^(\d{4})(\d{2})(\d{2})", texto):
+        ano, mes, dia = m.groups()
+    else:
+        raise ValueError(f"Fecha inválida: '{valor}'")
+    return datetime.date(int(ano), int(mes), int(dia)).isoformat()
+
+def _filas_csv(lineas: Iterator[str]) -> Iterator[Dict[str, str]]:
+    """Lee un extracto CSV (delimitador detectado en el encabezado) y devuelve sus filas con columnas normalizadas."""
+    encabezado = next(lineas, None)
+    if encabezado is None:
+        return
+    try:
+        delimitador = csv.Sniffer().sniff(encabezado, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimitador = ","
+    columnas = [_normalizar_nombre(c) for c in next(csv.reader([encabezado], delimiter=delimitador))]
+    campos = {}
+    for campo, alias in ALIAS_COLUMNAS_EXTRACTO.items():
+        for i, columna in enumerate(columnas):
+            if columna in alias:
+                campos[campo] = i
+                break
+    for valores in csv.reader(lineas, delimiter=delimitador):
+        if any(v.strip() for v in valores):
+            yield {campo: valores[i] for campo, i in campos.items() if i < len(valores)}
+
+def _filas_ofx(lineas: Iterator[str]) -> Iterator[Dict[str, str]]:
+    """Lee los bloques <STMTTRN> de un extracto OFX (SGML o XML) sin cargar el archivo completo."""
+    etiquetas = {'DTPOSTED': 'fecha', 'TRNAMT': 'monto', 'FITID': 'referencia', 'TRNTYPE': 'tipo', 'NAME': 'nombre', 'MEMO': 'memo'}
+    actual = None
+    for linea in lineas:
+        for etiqueta, valor in re.findall(r"<(/?[A-Z0-9.]+)>([^<\r\n]*)", linea):
+            if etiqueta == 'STMTTRN':
+                actual = {}
+            elif etiqueta == '/STMTTRN' and actual is not None:
+                partes = [actual.pop('nombre', ''), actual.pop('memo', '')]
+                actual['descripcion'] = " - ".join(p for p in partes if p)
+                yield actual
+                actual = None
+            elif actual is not None and etiqueta in etiquetas:
+                actual[etiquetas[etiqueta]] = valor.strip()
+
+def _normalizar_transaccion(fila: Dict[str, str], repeticiones: Dict[Tuple[str, float, str], int], formato: str = "csv") -> Dict[str, Any]:
+    """
+    Convierte una fila leída del extracto a una transacción bancaria. Si el banco no
+    trae referencia se genera una estable a partir de fecha, importe, descripción y
+    número de repetición en el archivo, para que reimportar el mismo extracto no duplique.
+    En OFX el importe (TRNAMT) no lleva separadores de miles y se lee directamente.
+    """
+    fecha = normalizar_fecha(fila['fecha'])
+    if formato == "ofx":
+        monto = float(fila['monto'].replace(",", "."))
+    elif fila.get('monto', '').strip():
+        monto = normalizar_monto(fila['monto'])
+    else:
+        debito = normalizar_monto(fila['debito']) if fila.get('debito', '').strip() else 0.0
+        credito = normalizar_monto(fila['credito']) if fila.get('credito', '').strip() else 0.0
+        monto = credito - abs(debito)
+    descripcion = (fila.get('descripcion') or '').strip() or 'Sin descripción'
+    referencia = (fila.get('referencia') or '').strip()
+    if not referencia:
+        llave = (fecha, round(monto, 2), descripcion)
+        repeticiones[llave] = repeticiones.get(llave, 0) + 1
+        huella = hashlib.sha1(f"{fecha}|{monto:.2f}|{descripcion}|{repeticiones[llave]}".encode()).hexdigest()[:16]
+        referencia = f"auto-{huella}"
+    return {"fecha": fecha, "descripcion": descripcion, "monto": round(monto, 2), "tipo": (fila.get('tipo') or '').strip() or None, "referencia": referencia}
+
+def importar_extracto_por_lotes(ruta: str, tamano_lote: int = 1000, formato: Optional[str] = None, encoding: str = "utf-8-sig") -> Iterator[Dict[str, Any]]:
+    """
+    Importa un extracto CSV u OFX leyéndolo por bloques de `tamano_lote` filas, sin
+    cargarlo completo en memoria. Cada bloque se normaliza (fechas e importes) y se
+    inserta en una sola transacción; las referencias ya existentes se ignoran.
+
+    Es un generador: después de cada bloque entrega el progreso acumulado
+    {"leidas", "insertadas", "duplicadas", "errores", "fraccion", "completado"},
+    donde `fraccion` es la parte del archivo procesada (0 a 1). Las filas con fecha
+    o importe ilegibles se cuentan como errores y no detienen la importación.
+    """
+    formato = formato or ("ofx" if os.path.splitext(ruta)[1].lower() in (".ofx", ".qfx") else "csv")
+    tamano_total = os.path.getsize(ruta)
+    progreso = {"leidas": 0, "insertadas": 0, "duplicadas": 0, "errores": 0, "fraccion": 0.0, "completado": False}
+    repeticiones: Dict[Tuple[str, float, str], int] = {}
+    caracteres_leidos = 0
+
+    with open(ruta, encoding=encoding, newline="") as archivo:
+        def lineas():
+            nonlocal caracteres_leidos
+            for linea in archivo:
+                caracteres_leidos += len(linea)
+                yield linea
+
+        filas = _filas_ofx(lineas()) if formato == "ofx" else _filas_csv(lineas())
+        while True:
+            bloque = list(itertools.islice(filas, tamano_lote))
+            if not bloque:
+                break
+            lote = []
+            for fila in bloque:
+                progreso["leidas"] += 1
+                try:
+                    lote.append(_normalizar_transaccion(fila, repeticiones, formato))
+                except (KeyError, ValueError) as e:
+                    progreso["errores"] += 1
+                    logger.warning(f"Fila {progreso['leidas']} del extracto omitida: {e}")
+            insertadas = db_manager.insertar_lote_transacciones_bancarias(lote) if lote else 0
+            progreso["insertadas"] += insertadas
+            progreso["duplicadas"] += len(lote) - insertadas
+            progreso["fraccion"] = min(1.0, caracteres_leidos / tamano_total) if tamano_total else 1.0
+            yield dict(progreso)
+
+    progreso["fraccion"], progreso["completado"] = 1.0, True
+    logger.info(f"Extracto importado: {progreso}")
+    yield dict(progreso)
+
 def importar_extracto_bancario(transacciones: List[Dict[str, Any]]) -> bool:
     """
     Procesa la importación de un extracto bancario.
-    Aquí se podría añadir lógica de limpieza o transformación antes de insertar.
+    Las fechas se guardan como 'AAAA-MM-DD' (ver `normalizar_fecha`); las ilegibles se
+    conservan tal cual y la conciliación las trata como transacciones sin fecha.
     """
     logger.info(f"Importando {len(transacciones)} transacciones del extracto.")
-    return db_manager.insertar_transacciones_bancarias(transacciones)
+    normalizadas = []
+    for trans in transacciones:
+        try:
+            normalizadas.append({**trans, "fecha": normalizar_fecha(trans['fecha'])})
+        except ValueError:
+            logger.warning(f"Fecha ilegible en el extracto: '{trans['fecha']}'")
+            normalizadas.append(trans)
+    return db_manager.insertar_transacciones_bancarias(normalizadas)
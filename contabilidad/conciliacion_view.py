@@ -26,6 +26,20 @@ class ConciliacionView(ft.View):
         )
         self.cargar_datos_button = ft.ElevatedButton("Cargar Datos", icon=ft.icons.REFRESH, on_click=self.cargar_datos)
 
+        # Importación de extractos (CSV u OFX) con progreso por bloques. La vista se vuelve a
+        # construir en cada navegación: el FilePicker se agrega al overlay una sola vez y se reutiliza.
+        self.extracto_picker = next((c for c in page.overlay if isinstance(c, ft.FilePicker) and c.data == "extracto_conciliacion"), None)
+        if self.extracto_picker is None:
+            self.extracto_picker = ft.FilePicker(data="extracto_conciliacion")
+            page.overlay.append(self.extracto_picker)
+        self.extracto_picker.on_result = self.importar_extracto
+        self.importar_button = ft.ElevatedButton(
+            "Importar Extracto", icon=ft.icons.UPLOAD_FILE,
+            on_click=lambda _: self.extracto_picker.pick_files(allowed_extensions=["csv", "txt", "ofx", "qfx"])
+        )
+        self.importacion_progreso = ft.ProgressBar(width=300, value=0, visible=False)
+        self.importacion_estado = ft.Text("")
+
         # Tabla para Transacciones Bancarias (Izquierda)
         self.tabla_banco = ft.DataTable(
             columns=[
@@ -51,9 +65,13 @@ class ConciliacionView(ft.View):
 
         self.sugerir_button = ft.ElevatedButton("Sugerir Coincidencias", icon=ft.icons.LIGHTBULB_OUTLINE, on_click=self.sugerir, disabled=True)
         self.reconciliar_button = ft.ElevatedButton("Reconciliar Selección", icon=ft.icons.CHECK_CIRCLE_OUTLINE, on_click=self.reconciliar, disabled=True)
+        self.confirmar_button = ft.ElevatedButton("Confirmar Sugerencias", icon=ft.icons.DONE_ALL, on_click=self.confirmar_sugerencias, disabled=True)
+        self.confirmacion_estado = ft.Text("")
+        self.grupos_sugeridos = []
 
         self.controls = [
-            ft.Row([self.cuenta_banco_selector, self.cargar_datos_button], alignment=ft.MainAxisAlignment.START),
+            ft.Row([self.cuenta_banco_selector, self.cargar_datos_button, self.importar_button], alignment=ft.MainAxisAlignment.START),
+            ft.Row([self.importacion_progreso, self.importacion_estado]),
             ft.Divider(),
             ft.Row(
                 [
@@ -64,7 +82,7 @@ class ConciliacionView(ft.View):
                 expand=True,
                 vertical_alignment=ft.CrossAxisAlignment.START
             ),
-            ft.Row([self.sugerir_button, self.reconciliar_button], alignment=ft.MainAxisAlignment.CENTER)
+            ft.Row([self.sugerir_button, self.reconciliar_button, self.confirmar_button, self.confirmacion_estado], alignment=ft.MainAxisAlignment.CENTER)
         ]
 
     def cargar_datos(self, e):
@@ -115,41 +133,48 @@ class ConciliacionView(ft.View):
         selected_banco = [row for row in self.tabla_banco.rows if row.selected]
         selected_libros = [row for row in self.tabla_libros.rows if row.selected]
 
-        self.reconciliar_button.disabled = not (len(selected_banco) == 1 and len(selected_libros) == 1)
+        # Se admite 1:1, varias líneas del extracto contra un movimiento o varios movimientos contra una línea
+        self.reconciliar_button.disabled = not (selected_banco and selected_libros and (len(selected_banco) == 1 or len(selected_libros) == 1))
         self.update()
 
     def sugerir(self, e):
         """Llama a la lógica de sugerencias y resalta las filas."""
-        sugerencias = conciliacion_logic.sugerir_coincidencias(self.transacciones_cargadas, self.movimientos_cargados)
+        grupos = conciliacion_logic.sugerir_coincidencias_agrupadas(self.transacciones_cargadas, self.movimientos_cargados)
+        self.grupos_sugeridos = grupos
+        self.confirmar_button.disabled = not grupos
+        self.confirmacion_estado.value = ""
 
         # Resetear colores
         for row in self.tabla_banco.rows: row.color = ""
         for row in self.tabla_libros.rows: row.color = ""
 
-        color_sugerencia = ft.Colors.LIGHT_BLUE_100
-        for i, sugerencia in enumerate(sugerencias):
-            trans_id = sugerencia['transaccion']['id']
-            mov_id = sugerencia['movimiento']['id']
-
-            # Encontrar y colorear las filas correspondientes
-            for row in self.tabla_banco.rows:
-                if row.data['id'] == trans_id: row.color = color_sugerencia
-            for row in self.tabla_libros.rows:
-                if row.data['id'] == mov_id: row.color = color_sugerencia
+        # Colores alternos para distinguir grupos contiguos
+        colores_sugerencia = [ft.Colors.LIGHT_BLUE_100, ft.Colors.AMBER_100]
+        color_por_transaccion, color_por_movimiento = {}, {}
+        for i, grupo in enumerate(grupos):
+            color = colores_sugerencia[i % len(colores_sugerencia)]
+            for trans in grupo['transacciones']: color_por_transaccion[trans['id']] = color
+            for mov in grupo['movimientos']: color_por_movimiento[mov['id']] = color
+
+        # Colorear las filas correspondientes
+        for row in self.tabla_banco.rows:
+            if row.data['id'] in color_por_transaccion: row.color = color_por_transaccion[row.data['id']]
+        for row in self.tabla_libros.rows:
+            if row.data['id'] in color_por_movimiento: row.color = color_por_movimiento[row.data['id']]
         self.update()
 
     def reconciliar(self, e):
         """Toma las filas seleccionadas y las reconcilia."""
-        selected_banco_row = next((row for row in self.tabla_banco.rows if row.selected), None)
-        selected_libro_row = next((row for row in self.tabla_libros.rows if row.selected), None)
+        trans_ids = [row.data['id'] for row in self.tabla_banco.rows if row.selected]
+        mov_ids = [row.data['id'] for row in self.tabla_libros.rows if row.selected]
 
-        if not selected_banco_row or not selected_libro_row:
+        if not trans_ids or not mov_ids:
             return
 
-        trans_id = selected_banco_row.data['id']
-        mov_id = selected_libro_row.data['id']
-
-        success = conciliacion_logic.reconciliar_par(movimiento_id=mov_id, transaccion_id=trans_id)
+        if len(trans_ids) == 1 and len(mov_ids) == 1:
+            success = conciliacion_logic.reconciliar_par(movimiento_id=mov_ids[0], transaccion_id=trans_ids[0])
+        else:
+            success = conciliacion_logic.reconciliar_grupo(mov_ids, trans_ids)
 
         if success:
             # Recargar los datos para refrescar las listas
@@ -157,3 +182,45 @@ class ConciliacionView(ft.View):
         else:
             # Mostrar error
             pass
+
+    def confirmar_sugerencias(self, e):
+        """Reconcilia de una vez todos los grupos sugeridos."""
+        if not self.grupos_sugeridos:
+            return
+        seleccionados = len(self.grupos_sugeridos)
+        try:
+            confirmados = conciliacion_logic.confirmar_grupos(self.grupos_sugeridos)
+        except Exception as ex:
+            # La confirmación es una sola transacción: nada quedó reconciliado y las sugerencias siguen disponibles.
+            self.confirmacion_estado.value = f"Error al confirmar los grupos sugeridos: {ex}"
+            self.update()
+            return
+        self.confirmacion_estado.value = f"Se confirmaron {confirmados} de {seleccionados} grupos sugeridos."
+        if confirmados < seleccionados:
+            self.confirmacion_estado.value += " Los demás ya estaban reconciliados o cambiaron; vuelva a sugerir."
+        self.grupos_sugeridos = []
+        self.confirmar_button.disabled = True
+        self.cargar_datos(None)
+
+    def importar_extracto(self, e: ft.FilePickerResultEvent):
+        """Importa el extracto elegido por bloques, mostrando el avance."""
+        if not e.files:
+            return
+        self.importacion_progreso.visible = True
+        self.importacion_progreso.value = 0
+        self.importar_button.disabled = True
+        self.update()
+        try:
+            for progreso in conciliacion_logic.importar_extracto_por_lotes(e.files[0].path):
+                self.importacion_progreso.value = progreso['fraccion']
+                self.importacion_estado.value = (f"{progreso['leidas']} líneas leídas: {progreso['insertadas']} nuevas, "
+                                                 f"{progreso['duplicadas']} ya existentes, {progreso['errores']} con errores")
+                self.update()
+        except Exception as ex:
+            self.importacion_estado.value = f"Error al importar el extracto: {ex}"
+        finally:
+            self.importacion_progreso.visible = False
+            self.importar_button.disabled = False
+            self.update()
+        if self.cuenta_banco_selector.value:
+            self.cargar_datos(None)
@@ -1,7 +1,7 @@
 # logic/contabilidad_logic.py
 import logging
 from langchain_core.tools import tool
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from database import db_manager
 
 logger = logging.getLogger(__name__)
@@ -115,6 +115,13 @@ def obtener_lista_comprobantes(limit: int = 50) -> List[Dict[str, Any]]:
     """
     return db_manager.obtener_comprobantes(limit=limit)
 
+def paginar_comprobantes(tamano_pagina: int = 50, filtro_fecha: Optional[str] = None, filtro_tipo: Optional[str] = None) -> Iterator[List[Any]]:
+    """
+    Recorre los comprobantes recientes por páginas (paginación por clave, sin OFFSET).
+    Cada página es una lista de filas con acceso por nombre de columna.
+    """
+    return db_manager.paginar_comprobantes(filtro_fecha=filtro_fecha, filtro_tipo=filtro_tipo, tamano_pagina=tamano_pagina)
+
 def obtener_detalle_comprobante(comprobante_id: int) -> List[Dict[str, Any]]:
     """
     Obtiene los movimientos (detalles) de un comprobante específico.
@@ -4,10 +4,11 @@ Módulo para la lógica de negocio relacionada con la facturación.
 """
 import logging
 import datetime
+import sqlite3
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from database import db_manager
 from contabilidad import contabilidad_logic
-from inventario import inventario_logic
 
 logger = logging.getLogger(__name__)
 
@@ -27,107 +28,246 @@ def obtener_factura_por_id(factura_id: int) -> Optional[Dict[str, Any]]:
 
 # --- Lógica de Escritura ---
 
-def _generar_asiento_contable_de_factura(factura_id: int, tercero_id: int, total_factura: float, subtotal_ingresos: float, total_impuestos: float, usuario_id: int, fecha: str) -> Optional[int]:
+CUENTA_CLIENTES = "130505"
+CUENTA_INGRESOS = "4135"
+CUENTA_IVA_GENERADO = "240801"
+CUENTA_COSTO_VENTA = "6135"  # Costo de Mercancía Vendida
+CUENTA_INVENTARIO = "1435"   # Mercancías no fabricadas por la empresa
+
+def _movimientos_asiento_de_factura(factura_id: int, tercero_id: int, total_factura: float, subtotal_ingresos: float, total_impuestos: float) -> List[Dict[str, Any]]:
     """
-    Función interna para generar el comprobante contable de una factura de venta.
+    Construye los movimientos del comprobante contable de una factura de venta.
     """
-    CUENTA_CLIENTES = "130505"
-    CUENTA_INGRESOS = "4135"
-    CUENTA_IVA_GENERADO = "240801"
-
-    descripcion_asiento = f"Registro de factura de venta Nro. {factura_id}"
     movimientos = [
         {"cuenta_codigo": CUENTA_CLIENTES, "descripcion_detalle": f"Factura {factura_id}", "debito": total_factura, "credito": 0, "tercero_id": tercero_id},
         {"cuenta_codigo": CUENTA_INGRESOS, "descripcion_detalle": f"Ingreso por factura {factura_id}", "debito": 0, "credito": subtotal_ingresos, "tercero_id": tercero_id},
     ]
     if total_impuestos > 0:
         movimientos.append({"cuenta_codigo": CUENTA_IVA_GENERADO, "descripcion_detalle": f"IVA generado en factura {factura_id}", "debito": 0, "credito": total_impuestos, "tercero_id": tercero_id})
+    return movimientos
 
-    success, comprobante_id = contabilidad_logic.registrar_nuevo_comprobante(
-        fecha=fecha, tipo="Factura de Venta", descripcion=descripcion_asiento,
-        movimientos=movimientos, usuario_id=usuario_id
-    )
-    return comprobante_id if success else None
-
-def _generar_asiento_costo_venta(factura_id: int, total_costo: float, usuario_id: int, fecha: str) -> Optional[int]:
+def _movimientos_asiento_costo_venta(factura_id: int, total_costo: float) -> List[Dict[str, Any]]:
     """
-    Genera el asiento contable para el costo de venta (COGS).
+    Construye los movimientos del asiento de costo de venta (COGS).
     """
-    CUENTA_COSTO_VENTA = "6135"  # Costo de Mercancía Vendida
-    CUENTA_INVENTARIO = "1435"   # Mercancías no fabricadas por la empresa
-
     descripcion = f"Costo de venta para factura Nro. {factura_id}"
-    movimientos = [
+    return [
         {"cuenta_codigo": CUENTA_COSTO_VENTA, "descripcion_detalle": descripcion, "debito": total_costo, "credito": 0},
         {"cuenta_codigo": CUENTA_INVENTARIO, "descripcion_detalle": descripcion, "debito": 0, "credito": total_costo},
     ]
 
-    success, comprobante_id = contabilidad_logic.registrar_nuevo_comprobante(
-        fecha=fecha, tipo="Costo de Venta", descripcion=descripcion,
-        movimientos=movimientos, usuario_id=usuario_id
-    )
-    return comprobante_id if success else None
+def _validar_items_factura(items: List[Dict[str, Any]]) -> Optional[str]:
+    """Devuelve un mensaje de error si algún ítem no es válido, o None."""
+    if not items:
+        return "La factura no tiene ítems."
+    for item in items:
+        if item.get('cantidad', 0) <= 0:
+            return f"La cantidad del ítem '{item.get('descripcion')}' debe ser positiva."
+        if item.get('subtotal', 0) < 0:
+            return f"El subtotal del ítem '{item.get('descripcion')}' no puede ser negativo."
+    return None
 
-def crear_nueva_factura(tercero_id: int, fecha_emision: str, items: List[Dict[str, Any]], usuario_id: int, fecha_vencimiento: Optional[str] = None, estado: str = 'Enviada') -> Tuple[bool, Optional[int]]:
+def crear_nueva_factura(tercero_id: int, fecha_emision: str, items: List[Dict[str, Any]], usuario_id: int, fecha_vencimiento: Optional[str] = None, estado: str = 'Enviada', tiempos: Optional[Dict[str, float]] = None) -> Tuple[bool, Optional[int]]:
     """
-    Orquesta la creación de una factura, su asiento contable, la actualización de inventario y el asiento de costo de venta.
+    Registra una factura de venta completa en una sola transacción: cabecera e ítems, asiento de
+    venta, salidas de inventario, asiento de costo de venta y enlace del comprobante a la factura.
+
+    Si cualquier etapa falla se revierte todo, de modo que nunca queda una factura sin asiento ni
+    un asiento de venta sin su costo. Los costos de todos los productos se leen en una consulta.
+    Si se pasa el dict `tiempos`, se llena con la duración en segundos de cada etapa.
     """
+    error = _validar_items_factura(items)
+    if error:
+        logger.error(f"Factura rechazada: {error}")
+        return False, None
+
     # 1. Calcular totales
     subtotal_general = sum(item['subtotal'] for item in items)
     total_impuestos = sum(item['subtotal'] * (item.get('impuesto_porcentaje', 0.0) / 100.0) for item in items)
     total_factura = subtotal_general + total_impuestos
 
-    # 2. Guardar la factura en la BD
-    success, factura_id = db_manager.crear_factura_db(
-        tercero_id=tercero_id, fecha_emision=fecha_emision, fecha_vencimiento=fecha_vencimiento,
-        total=total_factura, estado=estado, items=items
-    )
-    if not success:
-        logger.error("No se pudo crear la factura en la base de datos. Abortando.")
-        return False, None
+    tiempos = tiempos if tiempos is not None else {}
+    marca = time.perf_counter()
 
-    # 3. Generar asiento contable de la Venta (Ingresos)
-    comprobante_venta_id = _generar_asiento_contable_de_factura(
-        factura_id=factura_id, tercero_id=tercero_id, total_factura=total_factura,
-        subtotal_ingresos=subtotal_general, total_impuestos=total_impuestos,
-        usuario_id=usuario_id, fecha=fecha_emision
-    )
-    if not comprobante_venta_id:
-        logger.error(f"La factura {factura_id} se creó pero su asiento de VENTA falló.")
-        return False, factura_id
-
-    db_manager.enlazar_comprobante_a_factura(factura_id, comprobante_venta_id)
-
-    # 4. Procesar inventario y costo de venta
-    items_inventario = [item for item in items if 'producto_id' in item and item['producto_id']]
-    total_costo_venta = 0
-    if items_inventario:
-        for item in items_inventario:
-            producto = db_manager.obtener_producto_por_id_db(item['producto_id'])
-            if not producto:
-                logger.warning(f"Producto ID {item['producto_id']} en factura {factura_id} no encontrado en inventario. Saltando.")
-                continue
+    def _cerrar_etapa(nombre: str):
+        nonlocal marca
+        ahora = time.perf_counter()
+        tiempos[nombre] = ahora - marca
+        marca = ahora
 
-            costo_item = producto['costo_unitario_promedio'] * item['cantidad']
-            total_costo_venta += costo_item
+    conn = None
+    try:
+        conn = db_manager.get_db_connection(db_manager.DB_CONTABILIDAD_PATH)
+        conn.execute("BEGIN IMMEDIATE;")
 
-            inventario_logic.registrar_movimiento_inventario(
-                producto_id=item['producto_id'],
-                tipo_movimiento='venta',
-                cantidad=item['cantidad'],
-                costo_unitario=producto['costo_unitario_promedio'], # El costo de salida es el promedio actual
-                fecha=fecha_emision,
-                comprobante_id=None # El comprobante de costo se genera después
-            )
+        # 2. Cabecera e ítems
+        factura_id = db_manager.insertar_factura_db(
+            conn, tercero_id=tercero_id, fecha_emision=fecha_emision, fecha_vencimiento=fecha_vencimiento,
+            total=total_factura, estado=estado, items=items
+        )
+        _cerrar_etapa('factura')
+
+        # 3. Asiento contable de la Venta (Ingresos)
+        movimientos_venta = _movimientos_asiento_de_factura(factura_id, tercero_id, total_factura, subtotal_general, total_impuestos)
+        if not contabilidad_logic.validar_partida_doble(movimientos_venta):
+            raise ValueError("El asiento de venta no cumple la partida doble.")
+        comprobante_venta_id = db_manager.insertar_comprobante_db(
+            conn, fecha_emision, "Factura de Venta", f"Registro de factura de venta Nro. {factura_id}", movimientos_venta, usuario_id
+        )
+        _cerrar_etapa('asiento_venta')
 
+        # 4. Salidas de inventario al costo promedio vigente de cada producto
+        salidas = [
+            {'producto_id': item['producto_id'], 'tipo_movimiento': 'venta', 'cantidad': item['cantidad'],
+             'costo_unitario': None, 'fecha': fecha_emision, 'comprobante_id': comprobante_venta_id}
+            for item in items if item.get('producto_id')
+        ]
+        costos = db_manager.registrar_movimientos_inventario_db(conn, salidas)
+        total_costo_venta = sum(salida['cantidad'] * costo for salida, costo in zip(salidas, costos))
+        _cerrar_etapa('inventario')
+
+        # 5. Asiento de costo de venta
         if total_costo_venta > 0:
-            comprobante_costo_id = _generar_asiento_costo_venta(
-                factura_id=factura_id, total_costo=total_costo_venta,
-                usuario_id=usuario_id, fecha=fecha_emision
+            db_manager.insertar_comprobante_db(
+                conn, fecha_emision, "Costo de Venta", f"Costo de venta para factura Nro. {factura_id}",
+                _movimientos_asiento_costo_venta(factura_id, total_costo_venta), usuario_id
             )
-            if not comprobante_costo_id:
-                logger.error(f"El asiento de VENTA para la factura {factura_id} se creó, pero el de COSTO falló.")
-                # Esto deja la contabilidad inconsistente, requiere atención.
+        _cerrar_etapa('costo_venta')
+
+        # 6. Enlace y confirmación
+        db_manager.enlazar_comprobante_a_factura_db(conn, factura_id, comprobante_venta_id)
+        _cerrar_etapa('enlace')
+        conn.commit()
+        _cerrar_etapa('commit')
+    except (ValueError, sqlite3.Error) as e:
+        logger.error(f"No se pudo registrar la factura; se revierte la transacción: {e}")
+        if conn:
+            conn.rollback()
+        return False, None
+    finally:
+        db_manager.close_connection(conn)
 
-    logger.info(f"Proceso de factura {factura_id} completado.")
+    tiempos['total'] = sum(tiempos.values())
+    logger.info(f"Factura {factura_id} registrada en {tiempos['total'] * 1000:.1f} ms: "
+                + ", ".join(f"{etapa}={segundos * 1000:.1f} ms" for etapa, segundos in tiempos.items() if etapa != 'total'))
     return True, factura_id
+
+def _resumen_lote(resultados: List[Dict[str, Any]], inicio: float) -> Dict[str, Any]:
+    """Resumen de un lote de documentos con el rendimiento en documentos por segundo."""
+    duracion = time.perf_counter() - inicio
+    registrados = sum(1 for r in resultados if r['exito'])
+    return {"resultados": resultados, "registrados": registrados, "rechazados": len(resultados) - registrados,
+            "documentos_por_segundo": len(resultados) / duracion if duracion > 0 else 0.0}
+
+def crear_facturas_lote(facturas: List[Dict[str, Any]], usuario_id: int, tamano_lote: int = 500) -> Dict[str, Any]:
+    """
+    Registra un lote de facturas de venta (por ejemplo, el cierre diario del POS).
+
+    Cada factura es un dict con 'tercero_id', 'fecha_emision', 'items' y, opcionalmente,
+    'fecha_vencimiento' y 'estado'. Primero se valida todo el lote: ítems, partida doble,
+    existencia de los productos y stock suficiente acumulando las salidas de todas las facturas
+    en orden. Las facturas válidas se escriben en transacciones de `tamano_lote` documentos con
+    `executemany` (cabeceras, ítems, asientos de venta y de costo, Kardex y enlaces).
+
+    Devuelve un dict con 'resultados' (uno por factura, en el mismo orden, con 'indice', 'exito',
+    'factura_id' y 'error'), 'registrados', 'rechazados' y 'documentos_por_segundo'.
+    """
+    inicio = time.perf_counter()
+    resultados = [{"indice": i, "exito": False, "factura_id": None, "error": None} for i in range(len(facturas))]
+
+    cache_puc = db_manager.obtener_cache_puc()
+    faltantes = [c for c in (CUENTA_CLIENTES, CUENTA_INGRESOS, CUENTA_IVA_GENERADO, CUENTA_COSTO_VENTA, CUENTA_INVENTARIO) if not cache_puc.obtener(c)]
+    if faltantes:
+        for resultado in resultados:
+            resultado["error"] = f"Cuentas no encontradas en el PUC: {', '.join(faltantes)}."
+        return _resumen_lote(resultados, inicio)
+
+    # 1. Validación de todo el lote, con el stock corriente de cada producto
+    existencias = db_manager.obtener_existencias_productos_db(
+        [item['producto_id'] for f in facturas for item in f.get('items', []) if item.get('producto_id')]
+    )
+    disponible = {producto_id: e['cantidad_disponible'] for producto_id, e in existencias.items()}
+    validas = []
+    for indice, factura in enumerate(facturas):
+        items = factura.get('items', [])
+        error = _validar_items_factura(items)
+        salidas: Dict[int, float] = {}
+        if not error:
+            for item in items:
+                if item.get('producto_id'):
+                    salidas[item['producto_id']] = salidas.get(item['producto_id'], 0.0) + item['cantidad']
+            for producto_id, cantidad in salidas.items():
+                if producto_id not in disponible:
+                    error = f"Producto con ID {producto_id} no encontrado."
+                    break
+                if disponible[producto_id] - cantidad < 0:
+                    error = f"Stock insuficiente para el producto ID {producto_id}."
+                    break
+        if not error:
+            subtotal = sum(item['subtotal'] for item in items)
+            impuestos = sum(item['subtotal'] * (item.get('impuesto_porcentaje', 0.0) / 100.0) for item in items)
+            if not contabilidad_logic.validar_partida_doble(_movimientos_asiento_de_factura(0, factura['tercero_id'], subtotal + impuestos, subtotal, impuestos)):
+                error = "El asiento de venta no cumple la partida doble."
+        if error:
+            resultados[indice]["error"] = error
+            continue
+        for producto_id, cantidad in salidas.items():
+            disponible[producto_id] -= cantidad
+        validas.append((indice, {'tercero_id': factura['tercero_id'], 'fecha_emision': factura['fecha_emision'],
+                                 'fecha_vencimiento': factura.get('fecha_vencimiento'), 'estado': factura.get('estado', 'Enviada'),
+                                 'items': items, 'subtotal': subtotal, 'impuestos': impuestos, 'total': subtotal + impuestos}))
+
+    # 2. Escritura por bloques, cada uno en su propia transacción
+    conn = None
+    try:
+        conn = db_manager.get_db_connection(db_manager.DB_CONTABILIDAD_PATH)
+        for desde in range(0, len(validas), tamano_lote):
+            bloque = validas[desde:desde + tamano_lote]
+            documentos = [factura for _, factura in bloque]
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                factura_ids = db_manager.insertar_lote_facturas_db(conn, documentos)
+                venta_ids = db_manager.insertar_lote_comprobantes_db(conn, [
+                    {'fecha': f['fecha_emision'], 'tipo': "Factura de Venta", 'descripcion': f"Registro de factura de venta Nro. {factura_id}",
+                     'movimientos': _movimientos_asiento_de_factura(factura_id, f['tercero_id'], f['total'], f['subtotal'], f['impuestos']),
+                     'usuario_id': usuario_id}
+                    for factura_id, f in zip(factura_ids, documentos)
+                ])
+                db_manager.enlazar_comprobantes_a_facturas_db(conn, list(zip(factura_ids, venta_ids)))
+
+                salidas, duenos = [], []
+                for posicion, (f, comprobante_id) in enumerate(zip(documentos, venta_ids)):
+                    for item in f['items']:
+                        if item.get('producto_id'):
+                            salidas.append({'producto_id': item['producto_id'], 'tipo_movimiento': 'venta', 'cantidad': item['cantidad'],
+                                            'costo_unitario': None, 'fecha': f['fecha_emision'], 'comprobante_id': comprobante_id})
+                            duenos.append(posicion)
+                costos_venta = [0.0] * len(documentos)
+                for posicion, salida, costo in zip(duenos, salidas, db_manager.registrar_movimientos_inventario_db(conn, salidas)):
+                    costos_venta[posicion] += salida['cantidad'] * costo
+                db_manager.insertar_lote_comprobantes_db(conn, [
+                    {'fecha': f['fecha_emision'], 'tipo': "Costo de Venta", 'descripcion': f"Costo de venta para factura Nro. {factura_id}",
+                     'movimientos': _movimientos_asiento_costo_venta(factura_id, costo), 'usuario_id': usuario_id}
+                    for factura_id, f, costo in zip(factura_ids, documentos, costos_venta) if costo > 0
+                ])
+                conn.commit()
+            except (ValueError, sqlite3.Error) as e:
+                logger.error(f"Falló el bloque de facturas {desde}-{desde + len(bloque) - 1}; se revierte: {e}")
+                conn.rollback()
+                for indice, _ in bloque:
+                    resultados[indice]["error"] = str(e)
+                continue
+            for (indice, _), factura_id in zip(bloque, factura_ids):
+                resultados[indice].update(exito=True, factura_id=factura_id)
+    except sqlite3.Error as e:
+        logger.error(f"Error de conexión al registrar el lote de facturas: {e}")
+        for resultado in resultados:
+            if not resultado["exito"] and not resultado["error"]:
+                resultado["error"] = str(e)
+    finally:
+        db_manager.close_connection(conn)
+
+    resumen = _resumen_lote(resultados, inicio)
+    logger.info(f"Lote de facturas: {resumen['registrados']} registradas, {resumen['rechazados']} rechazadas, "
+                f"{resumen['documentos_por_segundo']:.0f} documentos/s")
+    return resumen
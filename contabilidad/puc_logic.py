@@ -6,6 +6,13 @@ from typing import List, Dict, Any, Optional
 from database import db_manager
 from langchain_core.tools import tool
 
+def buscar_cuentas(filtro: Optional[str] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Busca cuentas por prefijo de código y/o palabras del nombre (sin distinguir tildes),
+    ordenadas por relevancia. Sin filtro, devuelve el plan ordenado por código.
+    """
+    return db_manager.obtener_cuentas_puc(filtro=filtro, limit=limite)
+
 @tool
 def obtener_cuentas(filtro: Optional[str] = None) -> str:
     """
@@ -15,12 +22,12 @@ def obtener_cuentas(filtro: Optional[str] = None) -> str:
     Puedes usarla para encontrar una cuenta por su nombre o código.
 
     Args:
-        filtro (Optional[str]): Un término de búsqueda para filtrar las cuentas. Puede ser parte del código (ej: '1105') o del nombre (ej: 'caja'). Si se omite, devuelve las primeras cuentas del plan.
+        filtro (Optional[str]): Un término de búsqueda para filtrar las cuentas. Puede ser el inicio del código (ej: '1105') o palabras del nombre, completas o por su comienzo y sin importar tildes (ej: 'caja', 'merc'). Si se omite, devuelve las primeras cuentas del plan.
 
     Returns:
         str: Una cadena formateada con la lista de cuentas encontradas, incluyendo su código, nombre y naturaleza (Débito/Crédito). Si no se encuentran, devuelve un mensaje indicándolo.
     """
-    cuentas = db_manager.obtener_cuentas_puc(filtro=filtro, limit=20) # Limitar para no abrumar
+    cuentas = buscar_cuentas(filtro, limite=20) # Limitar para no abrumar
     if not cuentas:
         return "No se encontraron cuentas con ese filtro."
 
@@ -100,7 +100,7 @@ class PUCViewContent(ft.UserControl):
 
     def cargar_cuentas(self, filtro: Optional[str] = None):
         """Carga las cuentas desde la BD y actualiza la tabla."""
-        cuentas_db = puc_logic.obtener_cuentas(filtro=filtro)
+        cuentas_db = puc_logic.buscar_cuentas(filtro)
         self.tabla_cuentas.rows.clear()
         for cuenta in cuentas_db:
             self.tabla_cuentas.rows.append(
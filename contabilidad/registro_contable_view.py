@@ -58,6 +58,10 @@ class RegistroContableViewContent(ft.UserControl):
              column_spacing=15,
              # expand=True
         )
+        # Páginas de comprobantes (paginación por clave: cada página nueva cuesta lo mismo que la primera)
+        self._paginas_comprobantes = None
+        self.cargar_mas_button = ft.TextButton("Cargar más", icon=ft.icons.EXPAND_MORE, visible=False, on_click=lambda e: self.cargar_siguiente_pagina_comprobantes())
+
         # Diálogo para ver detalles
         self.detalle_dlg = ft.AlertDialog(
              title=ft.Text("Detalle del Comprobante"),
@@ -150,7 +154,10 @@ class RegistroContableViewContent(ft.UserControl):
                     border=ft.border.all(1, ft.Colors.OUTLINE), # Borde opcional
                     border_radius=ft.border_radius.all(5)
                  ),
-                 ft.IconButton(icon=ft.icons.REFRESH, tooltip="Recargar Comprobantes", on_click=lambda e: self.cargar_comprobantes_recientes())
+                 ft.Row([
+                     self.cargar_mas_button,
+                     ft.IconButton(icon=ft.icons.REFRESH, tooltip="Recargar Comprobantes", on_click=lambda e: self.cargar_comprobantes_recientes()),
+                 ])
             ],
             scroll=ft.ScrollMode.ADAPTIVE,
             expand=True,
@@ -363,10 +370,16 @@ class RegistroContableViewContent(ft.UserControl):
         self.update()
 
     def cargar_comprobantes_recientes(self, limit=20):
-        """Carga los últimos comprobantes guardados."""
-        comprobantes_db = contabilidad_logic.obtener_lista_comprobantes(limit=limit)
+        """Carga la primera página de los últimos comprobantes guardados."""
+        self._paginas_comprobantes = contabilidad_logic.paginar_comprobantes(tamano_pagina=limit)
+        self._tamano_pagina_comprobantes = limit
         self.tabla_comprobantes.rows.clear()
-        for comp in comprobantes_db:
+        self.cargar_siguiente_pagina_comprobantes()
+
+    def cargar_siguiente_pagina_comprobantes(self):
+        """Añade a la tabla la siguiente página de comprobantes."""
+        pagina = next(self._paginas_comprobantes, []) if self._paginas_comprobantes else []
+        for comp in pagina:
             self.tabla_comprobantes.rows.append(
                 ft.DataRow(
                      [
@@ -386,6 +399,8 @@ class RegistroContableViewContent(ft.UserControl):
                      ]
                  )
             )
+        # Una página incompleta indica que no quedan más comprobantes
+        self.cargar_mas_button.visible = len(pagina) == self._tamano_pagina_comprobantes
         self.update()
 
     def mostrar_detalle_comprobante(self, e):
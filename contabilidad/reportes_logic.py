@@ -4,76 +4,51 @@ Módulo para la lógica de negocio de la generación de informes financieros.
 """
 import logging
 import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from database import db_manager
 
 logger = logging.getLogger(__name__)
 
-def generar_balance_comprobacion(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[Dict[str, Any]]:
-    """
-    Genera un balance de comprobación de saldos para un rango de fechas.
-
-    1. Obtiene todas las cuentas del plan.
-    2. Obtiene todos los movimientos del libro diario en el rango de fechas.
-    3. Calcula el saldo final para cada cuenta basado en su naturaleza.
-    4. Devuelve una lista de diccionarios, cada uno representando una cuenta con su saldo.
-    """
-    logger.info(f"Generando Balance de Comprobación desde {fecha_inicio} hasta {fecha_fin}")
-
-    # 1. Obtener todas las cuentas
-    plan_cuentas = db_manager.obtener_cuentas_puc()
-    if not plan_cuentas:
-        logger.warning("No hay cuentas en el plan para generar el balance.")
-        return []
-
-    # Crear un diccionario para almacenar los saldos de cada cuenta
-    saldos = {cuenta['codigo']: {'debito': 0.0, 'credito': 0.0, **cuenta} for cuenta in plan_cuentas}
+# Grupos del PUC que se clasifican como corrientes (realizables o exigibles en el corto plazo).
+PREFIJOS_ACTIVO_CORRIENTE = ('11', '12', '13', '14')
+PREFIJOS_PASIVO_CORRIENTE = ('21', '22', '23', '24', '25', '26')
 
-    # 2. Obtener todos los movimientos relevantes
-    movimientos = db_manager.obtener_libro_diario(fecha_inicio, fecha_fin)
-    logger.info(f"Procesando {len(movimientos)} movimientos.")
+# Número de dígitos del código en cada nivel de la jerarquía del PUC.
+NIVELES_PUC = {'clase': 1, 'grupo': 2, 'cuenta': 4, 'subcuenta': 6}
 
-    # 3. Calcular los totales de débito y crédito para cada cuenta
-    for mov in movimientos:
-        codigo = mov['cuenta_codigo']
-        if codigo in saldos:
-            saldos[codigo]['debito'] += mov.get('debito', 0.0)
-            saldos[codigo]['credito'] += mov.get('credito', 0.0)
-
-    # 4. Calcular el saldo final y formatear la salida
+def _balance_desde_totales(totales: List[Dict[str, Any]], clave_debito: str = 'total_debito', clave_credito: str = 'total_credito') -> List[Dict[str, Any]]:
+    """
+    Convierte totales de débito y crédito por cuenta en filas de balance,
+    calculando el saldo final según la naturaleza de cada cuenta.
+    Los totales se redondean a centavos: SQLite y `saldos_periodo` suman en otro
+    orden que la acumulación por asiento, y sin redondeo el mismo libro podría dar
+    1.0 en un camino y 0.9999999999999999 en otro.
+    """
     balance_final = []
-    for codigo, data in saldos.items():
-        debito_total = data['debito']
-        credito_total = data['credito']
-        naturaleza = data['naturaleza']
-        saldo = 0.0
+    for cuenta in totales:
+        debito_total = round(cuenta[clave_debito], 2)
+        credito_total = round(cuenta[clave_credito], 2)
+        naturaleza = cuenta['naturaleza']
 
         if naturaleza == 'Debito':
-            saldo = debito_total - credito_total
+            saldo = round(debito_total - credito_total, 2)
         else: # Naturaleza es 'Credito'
-            saldo = credito_total - debito_total
+            saldo = round(credito_total - debito_total, 2)
 
-        # Solo agregar al reporte si hubo movimientos o si queremos mostrar todas las cuentas
+        # Solo agregar al reporte las cuentas que tuvieron movimientos
         if debito_total > 0 or credito_total > 0:
             balance_final.append({
-                'codigo': codigo,
-                'nombre': data['nombre'],
+                'codigo': cuenta['codigo'],
+                'nombre': cuenta['nombre'],
                 'naturaleza': naturaleza,
                 'total_debito': debito_total,
                 'total_credito': credito_total,
                 'saldo_final': saldo
             })
+    return balance_final
 
-    logger.info(f"Balance de Comprobación generado con {len(balance_final)} cuentas con movimiento.")
-    return sorted(balance_final, key=lambda x: x['codigo'])
-
-def generar_estado_resultados(fecha_inicio: str, fecha_fin: str) -> Dict[str, Any]:
-    """
-    Genera un Estado de Resultados (Ingresos vs Gastos) para un período.
-    """
-    logger.info(f"Generando Estado de Resultados desde {fecha_inicio} hasta {fecha_fin}")
-    balance = generar_balance_comprobacion(fecha_inicio, fecha_fin)
-
+def _estado_resultados_desde_balance(balance: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Clasifica un balance de comprobación del período en ingresos, costos y gastos."""
     ingresos = []
     gastos = []
     costos = []
@@ -113,27 +88,18 @@ def generar_estado_resultados(fecha_inicio: str, fecha_fin: str) -> Dict[str, An
         "utilidad_antes_impuestos": utilidad_antes_impuestos
     }
 
-def generar_balance_general(fecha_fin: str) -> Dict[str, Any]:
-    """
-    Genera un Balance General (Activos, Pasivos, Patrimonio) a una fecha de corte.
-    """
-    logger.info(f"Generando Balance General a fecha {fecha_fin}")
-    # El balance debe ser desde el inicio de los tiempos hasta la fecha de corte
-    balance_historico = generar_balance_comprobacion(None, fecha_fin)
-
+def _balance_general_desde_balance(balance_historico: List[Dict[str, Any]], resultado_ejercicio: float) -> Dict[str, Any]:
+    """Clasifica un balance de comprobación acumulado en activos, pasivos y patrimonio."""
     activos = []
     pasivos = []
     patrimonio = []
 
     total_activos = 0.0
+    total_activos_corrientes = 0.0
     total_pasivos = 0.0
+    total_pasivos_corrientes = 0.0
     total_patrimonio_inicial = 0.0
 
-    # Calcular resultado del ejercicio actual para añadirlo al patrimonio
-    # Asumimos que el ejercicio contable es el año de la fecha de fin
-    inicio_ejercicio = f"{datetime.datetime.strptime(fecha_fin, '%Y-%m-%d').year}-01-01"
-    resultado_ejercicio = generar_estado_resultados(inicio_ejercicio, fecha_fin)['utilidad_antes_impuestos']
-
     for cuenta in balance_historico:
         codigo = cuenta['codigo']
         saldo = cuenta['saldo_final']
@@ -141,9 +107,13 @@ def generar_balance_general(fecha_fin: str) -> Dict[str, Any]:
         if codigo.startswith('1'): # Activos
             activos.append(cuenta)
             total_activos += saldo
+            if codigo.startswith(PREFIJOS_ACTIVO_CORRIENTE):
+                total_activos_corrientes += saldo
         elif codigo.startswith('2'): # Pasivos
             pasivos.append(cuenta)
             total_pasivos += saldo
+            if codigo.startswith(PREFIJOS_PASIVO_CORRIENTE):
+                total_pasivos_corrientes += saldo
         elif codigo.startswith('3'): # Patrimonio
             patrimonio.append(cuenta)
             total_patrimonio_inicial += saldo
@@ -156,11 +126,187 @@ def generar_balance_general(fecha_fin: str) -> Dict[str, Any]:
     return {
         "activos": activos,
         "total_activos": total_activos,
+        "total_activos_corrientes": total_activos_corrientes,
+        "total_activos_no_corrientes": total_activos - total_activos_corrientes,
         "pasivos": pasivos,
         "total_pasivos": total_pasivos,
+        "total_pasivos_corrientes": total_pasivos_corrientes,
+        "total_pasivos_no_corrientes": total_pasivos - total_pasivos_corrientes,
         "patrimonio": patrimonio,
         "total_patrimonio_inicial": total_patrimonio_inicial,
         "resultado_del_ejercicio": resultado_ejercicio,
         "total_patrimonio": total_patrimonio,
         "verificacion_ecuacion": ecuacion_check
     }
+
+def generar_balance_comprobacion(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Genera un balance de comprobación de saldos para un rango de fechas.
+
+    1. Obtiene de la base de datos los totales de débito y crédito por cuenta,
+       agregados en SQLite (solo viajan las cuentas con movimiento, no los asientos).
+    2. Calcula el saldo final para cada cuenta basado en su naturaleza.
+    3. Devuelve una lista de diccionarios, cada uno representando una cuenta con su saldo.
+    """
+    logger.info(f"Generando Balance de Comprobación desde {fecha_inicio} hasta {fecha_fin}")
+    balance_final = _balance_desde_totales(db_manager.obtener_totales_por_cuenta(fecha_inicio, fecha_fin))
+    logger.info(f"Balance de Comprobación generado con {len(balance_final)} cuentas con movimiento.")
+    return balance_final
+
+def consolidar_balance_por_nivel(balance: List[Dict[str, Any]], nivel: str) -> List[Dict[str, Any]]:
+    """
+    Agrupa un balance de comprobación al nivel indicado del PUC ('clase', 'grupo',
+    'cuenta' o 'subcuenta') sumando los totales de sus subcuentas. El nombre y la
+    naturaleza de cada agrupación salen de la caché del plan de cuentas, sin
+    consultar la base de datos; si el código agrupador no existe en el plan se
+    usa la naturaleza de la primera subcuenta.
+    """
+    digitos = NIVELES_PUC[nivel]
+    cache_puc = db_manager.obtener_cache_puc()
+    agrupado: Dict[str, Dict[str, Any]] = {}
+    for cuenta in balance:
+        codigo = cuenta['codigo'][:digitos]
+        fila = agrupado.get(codigo)
+        if fila is None:
+            cuenta_puc = cache_puc.obtener(codigo) or {'nombre': '', 'naturaleza': cuenta['naturaleza']}
+            fila = agrupado[codigo] = {
+                'codigo': codigo,
+                'nombre': cuenta_puc['nombre'],
+                'naturaleza': cuenta_puc['naturaleza'],
+                'total_debito': 0.0,
+                'total_credito': 0.0
+            }
+        fila['total_debito'] += cuenta['total_debito']
+        fila['total_credito'] += cuenta['total_credito']
+
+    for fila in agrupado.values():
+        fila['total_debito'] = round(fila['total_debito'], 2)
+        fila['total_credito'] = round(fila['total_credito'], 2)
+        if fila['naturaleza'] == 'Debito':
+            fila['saldo_final'] = round(fila['total_debito'] - fila['total_credito'], 2)
+        else:
+            fila['saldo_final'] = round(fila['total_credito'] - fila['total_debito'], 2)
+    return [agrupado[codigo] for codigo in sorted(agrupado)]
+
+def generar_balance_comprobacion_por_nivel(nivel: str, fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Genera el balance de comprobación de un rango agrupado al nivel indicado del PUC."""
+    logger.info(f"Generando Balance de Comprobación por {nivel} desde {fecha_inicio} hasta {fecha_fin}")
+    return consolidar_balance_por_nivel(generar_balance_comprobacion(fecha_inicio, fecha_fin), nivel)
+
+def paginar_libro_diario(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, tamano_pagina: int = 500) -> Iterator[List[Any]]:
+    """
+    Recorre el libro diario del período por páginas, sin cargarlo completo en memoria.
+    Cada página es una lista de filas con acceso por nombre de columna.
+    """
+    return db_manager.paginar_libro_diario(fecha_inicio, fecha_fin, tamano_pagina=tamano_pagina)
+
+def generar_estado_resultados(fecha_inicio: str, fecha_fin: str) -> Dict[str, Any]:
+    """
+    Genera un Estado de Resultados (Ingresos vs Gastos) para un período.
+    """
+    logger.info(f"Generando Estado de Resultados desde {fecha_inicio} hasta {fecha_fin}")
+    return _estado_resultados_desde_balance(generar_balance_comprobacion(fecha_inicio, fecha_fin))
+
+def _estados_desde_totales(fecha_corte: str, inicio_ejercicio: str, totales: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Arma el paquete de estados financieros a partir de los totales acumulados y del ejercicio por cuenta."""
+    balance_historico = _balance_desde_totales(totales)
+    balance_ejercicio = _balance_desde_totales(totales, 'debito_ejercicio', 'credito_ejercicio')
+    estado_resultados = _estado_resultados_desde_balance(balance_ejercicio)
+    balance_general = _balance_general_desde_balance(balance_historico, estado_resultados['utilidad_antes_impuestos'])
+
+    totales_por_grupo: Dict[str, float] = {}
+    for cuenta in balance_historico:
+        grupo = cuenta['codigo'][:2]
+        totales_por_grupo[grupo] = totales_por_grupo.get(grupo, 0.0) + cuenta['saldo_final']
+
+    return {
+        "fecha_corte": fecha_corte,
+        "inicio_ejercicio": inicio_ejercicio,
+        "balance_comprobacion": balance_historico,
+        "balance_comprobacion_ejercicio": balance_ejercicio,
+        "estado_resultados": estado_resultados,
+        "balance_general": balance_general,
+        "totales_por_grupo": totales_por_grupo
+    }
+
+def generar_estados_financieros(fecha_corte: str) -> Dict[str, Any]:
+    """
+    Genera en una sola pasada por la base de datos el balance de comprobación
+    acumulado, el Estado de Resultados del ejercicio (desde el 1 de enero del
+    año de corte) y el Balance General a la fecha de corte.
+
+    Además de los tres estados, expone `totales_por_grupo`: la suma de saldos
+    por grupo del PUC (dos dígitos), útil para los indicadores financieros.
+    """
+    logger.info(f"Generando estados financieros a fecha {fecha_corte}")
+    # Asumimos que el ejercicio contable es el año de la fecha de corte
+    inicio_ejercicio = f"{datetime.datetime.strptime(fecha_corte, '%Y-%m-%d').year}-01-01"
+    totales = db_manager.obtener_totales_por_cuenta_al_corte(fecha_corte, inicio_ejercicio)
+    return _estados_desde_totales(fecha_corte, inicio_ejercicio, totales)
+
+def _es_fin_de_mes(fecha: datetime.date) -> bool:
+    return (fecha + datetime.timedelta(days=1)).day == 1
+
+def generar_serie_estados_financieros(fechas_corte: List[str]) -> List[Dict[str, Any]]:
+    """
+    Genera el paquete de `generar_estados_financieros` para varias fechas de
+    corte, en el mismo orden en que se reciben.
+
+    Los cortes a fin de mes se resuelven con una sola lectura de `saldos_periodo`
+    (ordenada por período) que se acumula mes a mes: el acumulado histórico
+    nunca se reinicia y el del ejercicio se reinicia cada enero. Las fechas que
+    no son fin de mes se calculan por separado con `generar_estados_financieros`.
+    """
+    logger.info(f"Generando serie de estados financieros para {len(fechas_corte)} fechas de corte")
+    fechas = [datetime.datetime.strptime(f, '%Y-%m-%d').date() for f in fechas_corte]
+    cortes_mensuales: Dict[str, List[int]] = {}
+    resultado: List[Optional[Dict[str, Any]]] = [None] * len(fechas_corte)
+    for i, fecha in enumerate(fechas):
+        if _es_fin_de_mes(fecha):
+            cortes_mensuales.setdefault(fecha.strftime('%Y-%m'), []).append(i)
+        else:
+            resultado[i] = generar_estados_financieros(fechas_corte[i])
+
+    if cortes_mensuales:
+        pendientes = sorted(cortes_mensuales)
+        filas = db_manager.obtener_saldos_mensuales(pendientes[-1])
+        cuentas: Dict[str, Dict[str, Any]] = {}
+        ano_en_curso = None
+        siguiente_fila = 0
+
+        for periodo in pendientes:
+            ano = periodo[:4]
+            if ano != ano_en_curso:
+                for cuenta in cuentas.values():
+                    cuenta['debito_ejercicio'] = 0.0
+                    cuenta['credito_ejercicio'] = 0.0
+                ano_en_curso = ano
+
+            while siguiente_fila < len(filas) and filas[siguiente_fila]['periodo'] <= periodo:
+                fila = filas[siguiente_fila]
+                siguiente_fila += 1
+                cuenta = cuentas.get(fila['codigo'])
+                if cuenta is None:
+                    cuenta = cuentas[fila['codigo']] = {
+                        'codigo': fila['codigo'], 'nombre': fila['nombre'], 'naturaleza': fila['naturaleza'],
+                        'total_debito': 0.0, 'total_credito': 0.0, 'debito_ejercicio': 0.0, 'credito_ejercicio': 0.0
+                    }
+                cuenta['total_debito'] += fila['total_debito']
+                cuenta['total_credito'] += fila['total_credito']
+                if fila['periodo'][:4] == ano:
+                    cuenta['debito_ejercicio'] += fila['total_debito']
+                    cuenta['credito_ejercicio'] += fila['total_credito']
+
+            totales = [dict(cuentas[codigo]) for codigo in sorted(cuentas)]
+            for i in cortes_mensuales[periodo]:
+                resultado[i] = _estados_desde_totales(fechas_corte[i], f"{ano}-01-01", totales)
+
+    return resultado
+
+def generar_balance_general(fecha_fin: str) -> Dict[str, Any]:
+    """
+    Genera un Balance General (Activos, Pasivos, Patrimonio) a una fecha de corte.
+    El resultado del ejercicio se calcula en la misma pasada que los saldos acumulados.
+    """
+    logger.info(f"Generando Balance General a fecha {fecha_fin}")
+    return generar_estados_financieros(fecha_fin)['balance_general']
@@ -32,6 +32,7 @@ class ReportesViewContent(ft.UserControl):
                 ft.dropdown.Option("Balance de Comprobación"),
                 ft.dropdown.Option("Estado de Resultados"),
                 ft.dropdown.Option("Balance General"),
+                ft.dropdown.Option("Libro Diario"),
             ],
             value="Balance de Comprobación",
             on_change=self.tipo_reporte_changed, # Para ajustar visibilidad de fechas
@@ -53,6 +54,10 @@ class ReportesViewContent(ft.UserControl):
         )
         self.progreso = ft.ProgressRing(visible=False)
 
+        # El libro diario se lee por páginas para no cargar períodos de varios años en memoria
+        self._paginas_libro_diario = None
+        self.cargar_mas_button = ft.TextButton("Cargar más", icon=ft.icons.EXPAND_MORE, visible=False, on_click=self.cargar_siguiente_pagina_libro_diario)
+
     def _on_date_change(self, e):
         if e.control == self.fecha_inicio_picker and self.fecha_inicio_picker.value:
             self.fecha_inicio_display.value = self.fecha_inicio_picker.value.strftime('%Y-%m-%d')
@@ -78,6 +83,7 @@ class ReportesViewContent(ft.UserControl):
                 ))),
                 ft.Divider(height=10),
                 self.reporte_container,
+                self.cargar_mas_button,
             ],
             expand=True,
             spacing=10
@@ -98,6 +104,7 @@ class ReportesViewContent(ft.UserControl):
 
         self.progreso.visible = True
         self.tabla_reporte.rows.clear()
+        self.cargar_mas_button.visible = False
         self.update()
 
         try:
@@ -107,6 +114,8 @@ class ReportesViewContent(ft.UserControl):
                 self.mostrar_estado_resultados(fecha_inicio, fecha_fin)
             elif tipo_reporte == "Balance General":
                 self.mostrar_balance_general(fecha_fin)
+            elif tipo_reporte == "Libro Diario":
+                self.mostrar_libro_diario(fecha_inicio, fecha_fin)
         except Exception as ex:
             mostrar_snackbar(self.page, f"Error al generar el reporte: {ex}", ft.Colors.RED)
         finally:
@@ -155,6 +164,40 @@ class ReportesViewContent(ft.UserControl):
             ], color=ft.Colors.BLUE_GREY_50)
         )
 
+    TAMANO_PAGINA_LIBRO_DIARIO = 200
+
+    def mostrar_libro_diario(self, fecha_inicio, fecha_fin):
+        self.tabla_reporte.columns = [
+            ft.DataColumn(ft.Text("Fecha")),
+            ft.DataColumn(ft.Text("Comprobante")),
+            ft.DataColumn(ft.Text("Cuenta")),
+            ft.DataColumn(ft.Text("Detalle")),
+            ft.DataColumn(ft.Text("Débito"), numeric=True),
+            ft.DataColumn(ft.Text("Crédito"), numeric=True),
+        ]
+        self._paginas_libro_diario = reportes_logic.paginar_libro_diario(fecha_inicio, fecha_fin, tamano_pagina=self.TAMANO_PAGINA_LIBRO_DIARIO)
+        if not self.cargar_siguiente_pagina_libro_diario(None):
+            mostrar_snackbar(self.page, "No se encontraron movimientos para el periodo seleccionado.")
+
+    def cargar_siguiente_pagina_libro_diario(self, e) -> int:
+        """Añade la siguiente página del libro diario a la tabla y devuelve cuántas filas agregó."""
+        pagina = next(self._paginas_libro_diario, []) if self._paginas_libro_diario else []
+        for mov in pagina:
+            self.tabla_reporte.rows.append(
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(mov['fecha'])),
+                    ft.DataCell(ft.Text(f"{mov['comprobante_id']} - {mov['tipo_comprobante']}")),
+                    ft.DataCell(ft.Text(f"{mov['cuenta_codigo']} {mov['cuenta_nombre']}")),
+                    ft.DataCell(ft.Text(mov['descripcion_detalle'] or "")),
+                    ft.DataCell(ft.Text(format_currency(mov['debito']), text_align=ft.TextAlign.RIGHT)),
+                    ft.DataCell(ft.Text(format_currency(mov['credito']), text_align=ft.TextAlign.RIGHT)),
+                ])
+            )
+        self.cargar_mas_button.visible = len(pagina) == self.TAMANO_PAGINA_LIBRO_DIARIO
+        if e is not None:
+            self.update()
+        return len(pagina)
+
     def tipo_reporte_changed(self, e):
         # Ocultar fecha de inicio si el reporte es Balance General
         is_balance_general = self.tipo_reporte_selector.value == "Balance General"
@@ -0,0 +1,70 @@
+# database/benchmark_consultas.py
+"""
+Mide la latencia de las consultas interactivas de db_manager sobre datos sintéticos:
+la búsqueda en el plan de cuentas (prefijo de código e índice FTS5).
+
+Uso:
+    python -m database.benchmark_consultas                    # 5.000 cuentas
+    python -m database.benchmark_consultas --cuentas 50000 --repeticiones 100
+    python -m database.benchmark_consultas --db ruta/benchmark.db  # Conserva la base generada
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, Iterable, Optional
+from database import db_manager
+
+FILTROS_PUC = ("1500", "tema12", "caja", "15 tema7")
+
+def generar_plan_sintetico(num_cuentas: int) -> None:
+    """Agrega al plan de cuentas la cuenta Caja y `num_cuentas` subcuentas de la clase 15 con nombres repetidos por tema."""
+    with db_manager.conexion(db_manager.DB_CONTABILIDAD_PATH) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO plan_cuentas (codigo, nombre, naturaleza, clase) VALUES (?, ?, 'Debito', 'Activo')",
+            [("1105", "Caja")] + [(f"15{i:05d}", f"Subcuenta {i} de tema{i % 250}") for i in range(num_cuentas)]
+        )
+        conn.commit()
+
+def medir_busqueda_puc(filtros: Iterable[str] = FILTROS_PUC, repeticiones: int = 20, limite: int = 20) -> Dict[str, Dict[str, float]]:
+    """Devuelve, por filtro, el número de resultados y los milisegundos promedio de `buscar_cuentas_puc`."""
+    resultados = {}
+    for filtro in filtros:
+        encontradas = len(db_manager.buscar_cuentas_puc(filtro, limite))
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            db_manager.buscar_cuentas_puc(filtro, limite)
+        resultados[filtro] = {"resultados": encontradas, "milisegundos": (time.perf_counter() - inicio) / repeticiones * 1000}
+    return resultados
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la latencia de las consultas interactivas de db_manager.")
+    parser.add_argument("--cuentas", type=int, default=5000, help="Número de subcuentas sintéticas del plan de cuentas.")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Repeticiones de cada consulta para promediar.")
+    parser.add_argument("--db", default=None, help="Ruta de la base de datos a generar (por defecto, un archivo temporal).")
+    args = parser.parse_args(argv)
+
+    directorio: Optional[tempfile.TemporaryDirectory] = None
+    if args.db:
+        db_manager.DB_CONTABILIDAD_PATH = args.db
+    else:
+        directorio = tempfile.TemporaryDirectory()
+        db_manager.DB_CONTABILIDAD_PATH = os.path.join(directorio.name, "benchmark_consultas.db")
+    try:
+        db_manager.init_db()
+        print(f"Generando plan de cuentas sintético de {args.cuentas} cuentas...")
+        generar_plan_sintetico(args.cuentas)
+        busquedas = medir_busqueda_puc(repeticiones=args.repeticiones)
+    finally:
+        db_manager.cerrar_pools()
+        if directorio:
+            directorio.cleanup()
+
+    print(f"{'Búsqueda PUC':<16}{'Resultados':>12}{'Promedio (ms)':>16}")
+    for filtro, r in busquedas.items():
+        print(f"{filtro!r:<16}{r['resultados']:>12}{r['milisegundos']:>16.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# database/benchmark_memoria.py
+"""
+Compara la memoria que ocupa el libro diario en cada formato de resultado de db_manager
+('dict', 'filas' y 'columnas') sobre un libro sintético.
+
+Uso:
+    python -m database.benchmark_memoria                      # 1.000.000 de movimientos
+    python -m database.benchmark_memoria --movimientos 200000
+    python -m database.benchmark_memoria --db ruta/benchmark.db  # Conserva la base generada
+"""
+import argparse
+import datetime
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, Optional
+from database import db_manager
+
+def generar_libro_sintetico(num_movimientos: int, num_cuentas: int = 250) -> None:
+    """
+    Llena la base de datos actual con comprobantes de dos movimientos repartidos en tres años.
+    Inserta directamente en las tablas (sin saldos_periodo), porque solo se usa para leer el libro.
+    """
+    fecha_inicial = datetime.date(2022, 1, 1)
+    cuentas = [(f"{1105 + i:04d}{i % 100:02d}", f"Cuenta sintética {i}", "Debito" if i % 2 else "Credito", "Activo")
+               for i in range(num_cuentas)]
+    num_comprobantes = num_movimientos // 2
+    with db_manager.conexion(db_manager.DB_CONTABILIDAD_PATH) as conn:
+        conn.executemany("INSERT OR IGNORE INTO plan_cuentas (codigo, nombre, naturaleza, clase) VALUES (?, ?, ?, ?)", cuentas)
+        conn.executemany(
+            "INSERT INTO comprobantes (id, fecha, tipo, descripcion, total_debito, total_credito, usuario_id) VALUES (?, ?, 'Diario', ?, ?, ?, 1)",
+            ((i, (fecha_inicial + datetime.timedelta(days=i % 1095)).isoformat(), f"Comprobante {i}", 100.0 + i % 997, 100.0 + i % 997)
+             for i in range(1, num_comprobantes + 1))
+        )
+        conn.executemany(
+            "INSERT INTO movimientos (comprobante_id, cuenta_codigo, descripcion_detalle, debito, credito) VALUES (?, ?, ?, ?, ?)",
+            ((i // 2 + 1, cuentas[(i * 7) % num_cuentas][0], f"Detalle {i}",
+              100.0 + (i // 2) % 997 if i % 2 == 0 else 0.0, 0.0 if i % 2 == 0 else 100.0 + (i // 2) % 997)
+             for i in range(num_comprobantes * 2))
+        )
+        conn.commit()
+
+def medir_formatos(formatos=db_manager.FORMATOS_RESULTADO) -> Dict[str, Dict[str, Any]]:
+    """
+    Lee el libro diario completo en cada formato y devuelve, por formato, la memoria que
+    retiene el resultado, el pico durante la lectura (en bytes) y el tiempo en segundos.
+    """
+    resultados = {}
+    for formato in formatos:
+        # El tiempo se mide sin tracemalloc, que encarece cada asignación.
+        inicio = time.perf_counter()
+        libro = db_manager.obtener_libro_diario(formato=formato)
+        duracion = time.perf_counter() - inicio
+        del libro
+        gc.collect()
+        tracemalloc.start()
+        libro = db_manager.obtener_libro_diario(formato=formato)
+        retenida, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultados[formato] = {"filas": len(libro), "memoria_retenida": retenida, "memoria_pico": pico, "segundos": duracion}
+        del libro
+    return resultados
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compara la memoria de los formatos de resultado del libro diario.")
+    parser.add_argument("--movimientos", type=int, default=1_000_000, help="Número de movimientos del libro sintético.")
+    parser.add_argument("--db", default=None, help="Ruta de la base de datos a generar (por defecto, un archivo temporal).")
+    args = parser.parse_args(argv)
+
+    directorio: Optional[tempfile.TemporaryDirectory] = None
+    if args.db:
+        db_manager.DB_CONTABILIDAD_PATH = args.db
+    else:
+        directorio = tempfile.TemporaryDirectory()
+        db_manager.DB_CONTABILIDAD_PATH = os.path.join(directorio.name, "benchmark_memoria.db")
+    try:
+        db_manager.init_db()
+        print(f"Generando libro sintético de {args.movimientos} movimientos...")
+        generar_libro_sintetico(args.movimientos)
+        resultados = medir_formatos()
+    finally:
+        db_manager.cerrar_pools()
+        if directorio:
+            directorio.cleanup()
+
+    base = resultados['dict']['memoria_retenida'] or 1
+    print(f"{'Formato':<10}{'Filas':>10}{'Retenida (MB)':>16}{'Pico (MB)':>12}{'Tiempo (s)':>12}{'vs dict':>10}")
+    for formato, r in resultados.items():
+        print(f"{formato:<10}{r['filas']:>10}{r['memoria_retenida'] / 2**20:>16.1f}{r['memoria_pico'] / 2**20:>12.1f}"
+              f"{r['segundos']:>12.2f}{r['memoria_retenida'] / base:>9.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,14 @@
 # database/db_manager.py
 import sqlite3
+import json
 import logging
 import os
-from typing import List, Dict, Any, Optional, Tuple
+import datetime
+import threading
+from array import array
+from contextlib import contextmanager
+from dataclasses import make_dataclass
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 
 # Configuración básica de logging
 logging.basicConfig(level=logging.INFO)
@@ -16,23 +22,478 @@ DB_CONTABILIDAD_PATH = os.path.join(DATA_DIR, 'contabilidad.db')
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Parámetros del pool de conexiones (configurables por variables de entorno)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Movimientos de Kardex que se acumulan sobre un producto antes de guardar un corte automático
+KARDEX_MOVIMIENTOS_POR_CORTE = int(os.getenv("KARDEX_MOVIMIENTOS_POR_CORTE", "200"))
+
 # --- Funciones de Conexión ---
 
-def get_db_connection(db_path: str) -> sqlite3.Connection:
-    """Establece conexión con la base de datos SQLite."""
-    try:
-        conn = sqlite3.connect(db_path)
+class _ConexionAgrupada(sqlite3.Connection):
+    """Conexión SQLite que recuerda el pool al que pertenece."""
+    pool: Optional["ConnectionPool"] = None
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite reutilizables para una misma ruta de base de datos.
+
+    Cada conexión se configura una sola vez al crearse (WAL, synchronous=NORMAL,
+    mmap, caché y busy timeout). Un checkout entrega la conexión en exclusiva a
+    quien la pidió (hilo o tarea) hasta que la devuelve con `release`.
+    `size` es el número máximo de conexiones inactivas retenidas: si todas están
+    en uso se abre una conexión adicional que se cierra al devolverla, de modo
+    que un checkout nunca bloquea.
+    """
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._inactivas: List[_ConexionAgrupada] = []
+        self._lock = threading.Lock()
+        self._identidad_archivo: Optional[Tuple[int, int]] = None
+        self.creadas = 0
+        self.reutilizadas = 0
+
+    def _leer_identidad_archivo(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.db_path)
+            return (st.st_dev, st.st_ino)
+        except OSError:
+            return None
+
+    def _crear_conexion(self) -> _ConexionAgrupada:
+        conn = sqlite3.connect(self.db_path, factory=_ConexionAgrupada, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS};")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB};")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE};")
         conn.execute("PRAGMA foreign_keys = ON;")
+        conn.pool = self
+        with self._lock:
+            self._identidad_archivo = self._leer_identidad_archivo()
+            self.creadas += 1
         return conn
+
+    def checkout(self) -> sqlite3.Connection:
+        """Entrega una conexión inactiva del pool o crea una nueva."""
+        identidad = self._leer_identidad_archivo()
+        with self._lock:
+            if self._inactivas and identidad != self._identidad_archivo:
+                # El archivo fue borrado o reemplazado: las conexiones retenidas apuntan al anterior.
+                self._cerrar_inactivas()
+            if self._inactivas:
+                self.reutilizadas += 1
+                return self._inactivas.pop()
+        return self._crear_conexion()
+
+    def release(self, conn: _ConexionAgrupada):
+        """Devuelve una conexión al pool, descartando cualquier transacción abierta."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            logger.warning(f"Descartando conexión defectuosa de {self.db_path}: {e}")
+            sqlite3.Connection.close(conn)
+            return
+        with self._lock:
+            if len(self._inactivas) < self.size:
+                self._inactivas.append(conn)
+                return
+        sqlite3.Connection.close(conn)
+
+    def _cerrar_inactivas(self):
+        for conn in self._inactivas:
+            sqlite3.Connection.close(conn)
+        self._inactivas.clear()
+
+    def close(self):
+        """Cierra todas las conexiones inactivas del pool."""
+        with self._lock:
+            self._cerrar_inactivas()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "tamano": self.size,
+                "inactivas": len(self._inactivas),
+                "creadas": self.creadas,
+                "reutilizadas": self.reutilizadas,
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def _obtener_pool(db_path: str) -> ConnectionPool:
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_path, ConnectionPool(db_path))
+    return pool
+
+def configurar_pool(tamano: int):
+    """Cambia el tamaño de los pools existentes y de los que se creen en adelante."""
+    global DB_POOL_SIZE
+    DB_POOL_SIZE = tamano
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.size = tamano
+
+def cerrar_pools():
+    """Cierra las conexiones inactivas de todos los pools (p. ej. al salir de la aplicación)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+def estadisticas_pools() -> List[Dict[str, Any]]:
+    """Devuelve contadores de uso de cada pool de conexiones."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.estadisticas() for pool in pools]
+
+def get_db_connection(db_path: str) -> sqlite3.Connection:
+    """Obtiene una conexión del pool de la base de datos SQLite indicada."""
+    try:
+        if db_path == ":memory:":
+            conn = sqlite3.connect(db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON;")
+            return conn
+        return _obtener_pool(db_path).checkout()
     except sqlite3.Error as e:
         logger.error(f"Error al conectar con la base de datos {db_path}: {e}")
         raise
 
 def close_connection(conn: Optional[sqlite3.Connection]):
-    """Cierra la conexión a la base de datos."""
+    """Devuelve la conexión a su pool, o la cierra si no pertenece a ninguno."""
     if conn:
-        conn.close()
+        pool = getattr(conn, "pool", None)
+        if pool is not None:
+            pool.release(conn)
+        else:
+            conn.close()
+
+@contextmanager
+def conexion(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Checkout de una conexión del pool durante un bloque `with`."""
+    conn = get_db_connection(db_path)
+    try:
+        yield conn
+    finally:
+        close_connection(conn)
+
+# --- Migraciones de Esquema ---
+
+# Cada migración es (versión, descripción, sentencias). Las versiones son
+# consecutivas y nunca se modifican una vez publicadas: los cambios nuevos
+# se agregan al final de la lista. Una sentencia puede ser una función que
+# recibe la conexión, para pasos de datos que no caben en un solo SQL.
+
+def _sembrar_depreciacion_historica(conn: sqlite3.Connection):
+    """
+    Lleva al libro `depreciacion_acumulada` los comprobantes de depreciación registrados antes de
+    que existiera (sin filas en el libro), para que el motor no vuelva a cargar esos meses.
+
+    Aquellos comprobantes agrupaban por cuenta y cargaban a cada activo en línea recta
+    (costo - residual) / vida útil, así que el crédito de cada cuenta de depreciación acumulada se
+    reparte entre sus activos en línea recta en esa proporción; el redondeo queda en el último.
+    Los créditos sin activos a los que atribuirlos solo se registran en el log.
+    """
+    activos_por_cuenta: Dict[str, List[Tuple[int, float]]] = {}
+    for row in conn.execute(
+        "SELECT id, cuenta_depreciacion_acumulada, (costo_adquisicion - valor_residual) * 1.0 / vida_util_meses AS cargo_mensual "
+        "FROM activos_fijos WHERE LOWER(metodo_depreciacion) = 'linea_recta' AND vida_util_meses > 0 AND costo_adquisicion > valor_residual ORDER BY id"
+    ):
+        activos_por_cuenta.setdefault(row['cuenta_depreciacion_acumulada'], []).append((row['id'], row['cargo_mensual']))
+
+    creditos = conn.execute("""
+        SELECT c.id, substr(c.fecha, 1, 7) AS periodo, m.cuenta_codigo, SUM(m.credito) AS credito
+        FROM comprobantes c JOIN movimientos m ON m.comprobante_id = c.id
+        WHERE c.anulado = FALSE AND c.tipo = 'Depreciación' AND m.credito > 0
+          AND NOT EXISTS (SELECT 1 FROM depreciacion_acumulada d WHERE d.comprobante_id = c.id)
+        GROUP BY c.id, m.cuenta_codigo ORDER BY c.fecha, c.id
+    """).fetchall()
+    filas = []
+    for row in creditos:
+        activos = activos_por_cuenta.get(row['cuenta_codigo'])
+        if not activos:
+            logger.warning(f"Comprobante de depreciación {row['id']}: {row['credito']:.2f} en la cuenta {row['cuenta_codigo']} sin activos en línea recta a los que atribuirlo.")
+            continue
+        peso_total = sum(cargo_mensual for _, cargo_mensual in activos)
+        asignado = 0.0
+        for i, (activo_id, cargo_mensual) in enumerate(activos):
+            cargo = round(row['credito'] - asignado, 2) if i == len(activos) - 1 else round(row['credito'] * cargo_mensual / peso_total, 2)
+            asignado = round(asignado + cargo, 2)
+            filas.append((activo_id, row['periodo'], cargo, row['id']))
+    if not filas:
+        return
+    # Un mes que ya tiene cargo (de otro comprobante) suma el atribuido; el acumulado se recalcula abajo.
+    conn.executemany(
+        "INSERT INTO depreciacion_acumulada (activo_id, periodo, cargo, acumulada, comprobante_id) VALUES (?, ?, ?, 0, ?) "
+        "ON CONFLICT (activo_id, periodo) DO UPDATE SET cargo = ROUND(cargo + excluded.cargo, 2)",
+        filas
+    )
+    conn.execute(f"""
+        UPDATE depreciacion_acumulada SET acumulada = (
+            SELECT ROUND(SUM(d.cargo), 2) FROM depreciacion_acumulada d
+            WHERE d.activo_id = depreciacion_acumulada.activo_id AND d.periodo <= depreciacion_acumulada.periodo
+        ) WHERE activo_id IN ({','.join('?' * len({f[0] for f in filas}))})
+    """, list({f[0] for f in filas}))
+    logger.info(f"Libro de depreciación sembrado con {len(filas)} cargos de {len({f[3] for f in filas})} comprobantes anteriores.")
+MIGRACIONES: List[Tuple[int, str, List[Any]]] = [
+    (1, "Índices secundarios para libro diario, kardex, conciliación y listados", [
+        "CREATE INDEX IF NOT EXISTS idx_comprobantes_anulado_fecha ON comprobantes(anulado, fecha, id);",
+        "CREATE INDEX IF NOT EXISTS idx_comprobantes_anulado_tipo_fecha ON comprobantes(anulado, tipo, fecha, id);",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_comprobante ON movimientos(comprobante_id);",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_cuenta_conciliacion ON movimientos(cuenta_codigo, reconciliado, anulado);",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_producto_fecha ON movimientos_inventario(producto_id, fecha, id);",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_comprobante ON movimientos_inventario(comprobante_id);",
+        "CREATE INDEX IF NOT EXISTS idx_transacciones_bancarias_pendientes ON transacciones_bancarias(movimiento_contable_id, fecha);",
+        "CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas(fecha_emision, id);",
+        "CREATE INDEX IF NOT EXISTS idx_facturas_tercero ON facturas(tercero_id);",
+        "CREATE INDEX IF NOT EXISTS idx_factura_items_factura ON factura_items(factura_id);",
+        "CREATE INDEX IF NOT EXISTS idx_compras_fecha ON compras(fecha_emision, id);",
+        "CREATE INDEX IF NOT EXISTS idx_compras_tercero ON compras(tercero_id);",
+        "CREATE INDEX IF NOT EXISTS idx_compra_items_compra ON compra_items(compra_id);",
+        "CREATE INDEX IF NOT EXISTS idx_terceros_tipo_nombre ON terceros(tipo, nombre);",
+    ]),
+    (2, "Índice de movimientos por comprobante que cubre cuenta e importes", [
+        "DROP INDEX IF EXISTS idx_movimientos_comprobante;",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_comprobante_importes ON movimientos(comprobante_id, cuenta_codigo, debito, credito);",
+    ]),
+    (3, "Tabla materializada de saldos por cuenta y período (mes)", [
+        """
+        CREATE TABLE IF NOT EXISTS saldos_periodo (
+            periodo TEXT NOT NULL,
+            cuenta_codigo TEXT NOT NULL,
+            total_debito REAL NOT NULL DEFAULT 0.0,
+            total_credito REAL NOT NULL DEFAULT 0.0,
+            PRIMARY KEY (periodo, cuenta_codigo),
+            FOREIGN KEY (cuenta_codigo) REFERENCES plan_cuentas(codigo) ON UPDATE CASCADE
+        ) WITHOUT ROWID;
+        """,
+        "DELETE FROM saldos_periodo;",
+        """
+        INSERT INTO saldos_periodo (periodo, cuenta_codigo, total_debito, total_credito)
+        SELECT substr(c.fecha, 1, 7), m.cuenta_codigo, SUM(m.debito), SUM(m.credito)
+        FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id
+        WHERE c.anulado = FALSE
+        GROUP BY substr(c.fecha, 1, 7), m.cuenta_codigo;
+        """,
+    ]),
+    (4, "Índice de texto completo (FTS5) sobre los nombres del plan de cuentas", [
+        # `remove_diacritics 2` hace que 'credito' encuentre 'Crédito'. El código se guarda sin indexar
+        # para enlazar con plan_cuentas; la búsqueda por código usa la clave primaria.
+        "CREATE VIRTUAL TABLE IF NOT EXISTS plan_cuentas_fts USING fts5(codigo UNINDEXED, nombre, tokenize = 'unicode61 remove_diacritics 2');",
+        "DELETE FROM plan_cuentas_fts;",
+        "INSERT INTO plan_cuentas_fts (codigo, nombre) SELECT codigo, nombre FROM plan_cuentas;",
+        """
+        CREATE TRIGGER IF NOT EXISTS plan_cuentas_fts_insertar AFTER INSERT ON plan_cuentas BEGIN
+            INSERT INTO plan_cuentas_fts (codigo, nombre) VALUES (new.codigo, new.nombre);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS plan_cuentas_fts_actualizar AFTER UPDATE OF codigo, nombre ON plan_cuentas BEGIN
+            DELETE FROM plan_cuentas_fts WHERE codigo = old.codigo;
+            INSERT INTO plan_cuentas_fts (codigo, nombre) VALUES (new.codigo, new.nombre);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS plan_cuentas_fts_eliminar AFTER DELETE ON plan_cuentas BEGIN
+            DELETE FROM plan_cuentas_fts WHERE codigo = old.codigo;
+        END;
+        """,
+    ]),
+    (5, "Partidas de conciliación bancaria (grupos de transacciones y movimientos)", [
+        """
+        CREATE TABLE IF NOT EXISTS conciliacion_partidas (
+            transaccion_id INTEGER NOT NULL,
+            movimiento_id INTEGER NOT NULL,
+            PRIMARY KEY (transaccion_id, movimiento_id),
+            FOREIGN KEY (transaccion_id) REFERENCES transacciones_bancarias(id),
+            FOREIGN KEY (movimiento_id) REFERENCES movimientos(id)
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_conciliacion_partidas_movimiento ON conciliacion_partidas(movimiento_id);",
+        """
+        INSERT OR IGNORE INTO conciliacion_partidas (transaccion_id, movimiento_id)
+        SELECT id, movimiento_contable_id FROM transacciones_bancarias WHERE movimiento_contable_id IS NOT NULL;
+        """,
+    ]),
+    (6, "Cortes (checkpoints) del Kardex por producto", [
+        # Un corte guarda el estado del producto tras reproducir en orden (fecha, id) todos sus
+        # movimientos hasta (fecha, movimiento_id) inclusive.
+        """
+        CREATE TABLE IF NOT EXISTS kardex_cortes (
+            producto_id INTEGER NOT NULL,
+            fecha DATE NOT NULL,
+            movimiento_id INTEGER NOT NULL,
+            cantidad REAL NOT NULL,
+            costo_promedio REAL NOT NULL,
+            valor REAL NOT NULL,
+            PRIMARY KEY (producto_id, fecha, movimiento_id),
+            FOREIGN KEY (producto_id) REFERENCES productos(id)
+        ) WITHOUT ROWID;
+        """,
+        # Un movimiento con fecha anterior a un corte lo deja obsoleto; los posteriores se reproducen desde él.
+        """
+        CREATE TRIGGER IF NOT EXISTS kardex_cortes_invalidar_insertar AFTER INSERT ON movimientos_inventario BEGIN
+            DELETE FROM kardex_cortes WHERE producto_id = new.producto_id AND fecha > new.fecha;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS kardex_cortes_invalidar_actualizar AFTER UPDATE ON movimientos_inventario BEGIN
+            DELETE FROM kardex_cortes WHERE producto_id IN (old.producto_id, new.producto_id) AND fecha >= min(old.fecha, new.fecha);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS kardex_cortes_invalidar_eliminar AFTER DELETE ON movimientos_inventario BEGIN
+            DELETE FROM kardex_cortes WHERE producto_id = old.producto_id AND fecha >= old.fecha;
+        END;
+        """,
+    ]),
+    (7, "Libro de depreciación acumulada por activo y período, y uso para unidades de producción", [
+        "ALTER TABLE activos_fijos ADD COLUMN unidades_totales REAL;",
+        # Una fila por activo y período ('AAAA-MM') depreciado: el cargo del mes y el acumulado tras él.
+        """
+        CREATE TABLE IF NOT EXISTS depreciacion_acumulada (
+            activo_id INTEGER NOT NULL,
+            periodo TEXT NOT NULL,
+            cargo REAL NOT NULL,
+            acumulada REAL NOT NULL,
+            comprobante_id INTEGER,
+            PRIMARY KEY (activo_id, periodo),
+            FOREIGN KEY (activo_id) REFERENCES activos_fijos(id),
+            FOREIGN KEY (comprobante_id) REFERENCES comprobantes(id)
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_depreciacion_acumulada_periodo ON depreciacion_acumulada(periodo);",
+        """
+        CREATE TABLE IF NOT EXISTS activos_fijos_uso (
+            activo_id INTEGER NOT NULL,
+            periodo TEXT NOT NULL,
+            unidades REAL NOT NULL,
+            PRIMARY KEY (activo_id, periodo),
+            FOREIGN KEY (activo_id) REFERENCES activos_fijos(id)
+        ) WITHOUT ROWID;
+        """,
+    ]),
+    (8, "Programa de depreciación precalculado por activo y período", [
+        # Tabla completa de cada activo: los períodos ya registrados y la proyección hasta el fin de su vida útil.
+        """
+        CREATE TABLE IF NOT EXISTS depreciacion_programada (
+            activo_id INTEGER NOT NULL,
+            periodo TEXT NOT NULL,
+            cuenta_gasto_depreciacion TEXT NOT NULL,
+            cargo REAL NOT NULL,
+            acumulada REAL NOT NULL,
+            valor_libros REAL NOT NULL,
+            registrado INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (activo_id, periodo),
+            FOREIGN KEY (activo_id) REFERENCES activos_fijos(id)
+        ) WITHOUT ROWID;
+        """,
+        # Cubre las proyecciones por cuenta en un rango de períodos sin tocar la tabla.
+        "CREATE INDEX IF NOT EXISTS idx_depreciacion_programada_periodo ON depreciacion_programada(periodo, cuenta_gasto_depreciacion, cargo);",
+        # Activos cuyo programa está al día; los triggers lo marcan como obsoleto cuando cambia algo de lo que depende.
+        "CREATE TABLE IF NOT EXISTS depreciacion_programa_vigente (activo_id INTEGER PRIMARY KEY);",
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_activo_actualizado AFTER UPDATE ON activos_fijos BEGIN
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = old.id;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_activo_eliminado AFTER DELETE ON activos_fijos BEGIN
+            DELETE FROM depreciacion_programada WHERE activo_id = old.id;
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = old.id;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_cargo_registrado AFTER INSERT ON depreciacion_acumulada BEGIN
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = new.activo_id;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_uso_insertado AFTER INSERT ON activos_fijos_uso BEGIN
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = new.activo_id;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_uso_actualizado AFTER UPDATE ON activos_fijos_uso BEGIN
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = new.activo_id;
+        END;
+        """,
+    ]),
+    (9, "Invalidar el programa de depreciación al modificar o retirar cargos del libro", [
+        # Anular un comprobante de depreciación retira sus cargos del libro (ver anular_comprobante).
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_cargo_eliminado AFTER DELETE ON depreciacion_acumulada BEGIN
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = old.activo_id;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS depreciacion_programa_cargo_actualizado AFTER UPDATE ON depreciacion_acumulada BEGIN
+            DELETE FROM depreciacion_programa_vigente WHERE activo_id = old.activo_id;
+        END;
+        """,
+    ]),
+    (10, "Sembrar el libro de depreciación con los comprobantes de depreciación anteriores", [
+        # También lo usan anular_comprobante y la siembra para buscar los cargos de un comprobante.
+        "CREATE INDEX IF NOT EXISTS idx_depreciacion_acumulada_comprobante ON depreciacion_acumulada(comprobante_id);",
+        _sembrar_depreciacion_historica,
+    ]),
+]
+
+def obtener_version_esquema(conn: sqlite3.Connection) -> int:
+    """Devuelve la última versión de migración aplicada (0 si no hay ninguna)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS esquema_migraciones (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            aplicada_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    row = conn.execute("SELECT MAX(version) FROM esquema_migraciones").fetchone()
+    return row[0] or 0
+
+def aplicar_migraciones(conn: sqlite3.Connection) -> int:
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción,
+    y registra la versión aplicada en `esquema_migraciones`.
+    Devuelve la versión final del esquema.
+    """
+    version_actual = obtener_version_esquema(conn)
+    for version, descripcion, sentencias in MIGRACIONES:
+        if version <= version_actual:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            for sentencia in sentencias:
+                if callable(sentencia):
+                    sentencia(conn)
+                else:
+                    conn.execute(sentencia)
+            conn.execute("INSERT INTO esquema_migraciones (version, descripcion) VALUES (?, ?)", (version, descripcion))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error al aplicar la migración {version} ({descripcion}): {e}")
+            raise
+        version_actual = version
+        logger.info(f"Migración {version} aplicada: {descripcion}")
+    conn.execute("PRAGMA optimize;")
+    return version_actual
 
 # --- Inicialización de Tablas ---
 
@@ -232,6 +693,9 @@ def init_db():
 
         conn_cont.commit()
         logger.info("Tablas de 'contabilidad' verificadas/creadas.")
+
+        aplicar_migraciones(conn_cont)
+        invalidar_cache_puc()
     except sqlite3.Error as e:
         logger.error(f"Error al inicializar DB contabilidad: {e}")
     finally:
@@ -307,6 +771,61 @@ def crear_producto_db(nombre: str, sku: str, descripcion: str, costo: float, can
     finally:
         close_connection(conn)
 
+def obtener_skus_productos_db() -> set:
+    """Devuelve el conjunto de SKUs registrados, para validar importaciones sin consultar fila a fila."""
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT sku FROM productos WHERE sku IS NOT NULL")
+        return {row['sku'] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener los SKUs de productos: {e}")
+        return set()
+    finally:
+        close_connection(conn)
+
+def insertar_lote_productos_db(productos: List[Dict[str, Any]], fecha: str) -> List[str]:
+    """
+    Inserta un lote de productos en una sola transacción, con su stock y costo iniciales
+    y el movimiento 'ajuste_positivo' de apertura en el Kardex para los que tienen cantidad.
+
+    Cada producto es un dict con 'nombre', 'sku', 'descripcion', 'costo' y 'cantidad'.
+    Los SKUs que ya existan se omiten. Devuelve los SKUs efectivamente insertados.
+    Lanza sqlite3.Error si la transacción falla (el lote no se aplica).
+    """
+    if not productos:
+        return []
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE;")
+        ultimo_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM productos").fetchone()[0]
+        cursor.executemany(
+            "INSERT OR IGNORE INTO productos (nombre, sku, descripcion, costo_unitario_promedio, cantidad_disponible) VALUES (?, ?, ?, ?, ?)",
+            [(p['nombre'], p['sku'], p['descripcion'], p['costo'] if p['cantidad'] > 0 else 0.0, p['cantidad']) for p in productos]
+        )
+        # La transacción es exclusiva para escritura: los ids posteriores al máximo previo son de este lote.
+        cursor.execute(
+            "SELECT id, sku, cantidad_disponible, costo_unitario_promedio FROM productos WHERE id > ? ORDER BY id",
+            (ultimo_id,)
+        )
+        insertados = cursor.fetchall()
+        cursor.executemany(
+            "INSERT INTO movimientos_inventario (producto_id, fecha, tipo_movimiento, cantidad, costo_unitario) VALUES (?, ?, 'ajuste_positivo', ?, ?)",
+            [(row['id'], fecha, row['cantidad_disponible'], row['costo_unitario_promedio']) for row in insertados if row['cantidad_disponible'] > 0]
+        )
+        conn.commit()
+        return [row['sku'] for row in insertados]
+    except sqlite3.Error as e:
+        logger.error(f"Error al insertar el lote de productos: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        close_connection(conn)
+
 def obtener_productos_db() -> List[Dict[str, Any]]:
     conn = None
     try:
@@ -325,7 +844,8 @@ def obtener_productos_db() -> List[Dict[str, Any]]:
 def crear_activo_fijo_db(
     nombre: str, descripcion: str, fecha_adquisicion: str, costo_adquisicion: float,
     valor_residual: float, vida_util_meses: int, metodo_depreciacion: str,
-    cuenta_activo: str, cuenta_depreciacion_acumulada: str, cuenta_gasto_depreciacion: str
+    cuenta_activo: str, cuenta_depreciacion_acumulada: str, cuenta_gasto_depreciacion: str,
+    unidades_totales: Optional[float] = None
 ) -> Tuple[bool, Optional[int]]:
     conn = None
     try:
@@ -333,10 +853,10 @@ def crear_activo_fijo_db(
         cursor = conn.cursor()
         cursor.execute(
             """
-            INSERT INTO activos_fijos (nombre, descripcion, fecha_adquisicion, costo_adquisicion, valor_residual, vida_util_meses, metodo_depreciacion, cuenta_activo, cuenta_depreciacion_acumulada, cuenta_gasto_depreciacion)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO activos_fijos (nombre, descripcion, fecha_adquisicion, costo_adquisicion, valor_residual, vida_util_meses, metodo_depreciacion, cuenta_activo, cuenta_depreciacion_acumulada, cuenta_gasto_depreciacion, unidades_totales)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            (nombre, descripcion, fecha_adquisicion, costo_adquisicion, valor_residual, vida_util_meses, metodo_depreciacion, cuenta_activo, cuenta_depreciacion_acumulada, cuenta_gasto_depreciacion)
+            (nombre, descripcion, fecha_adquisicion, costo_adquisicion, valor_residual, vida_util_meses, metodo_depreciacion, cuenta_activo, cuenta_depreciacion_acumulada, cuenta_gasto_depreciacion, unidades_totales)
         )
         conn.commit()
         return True, cursor.lastrowid
@@ -365,6 +885,148 @@ def obtener_activos_fijos_db(estado: Optional[str] = None) -> List[Dict[str, Any
     finally:
         close_connection(conn)
 
+def obtener_activo_fijo_por_id_db(activo_id: int) -> Optional[Dict[str, Any]]:
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.execute("SELECT * FROM activos_fijos WHERE id = ?", (activo_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener el activo fijo {activo_id}: {e}")
+        return None
+    finally:
+        close_connection(conn)
+
+def registrar_uso_activo_db(activo_id: int, periodo: str, unidades: float) -> bool:
+    """Registra (o reemplaza) las unidades producidas por un activo en un período 'AAAA-MM'."""
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        conn.execute(
+            "INSERT INTO activos_fijos_uso (activo_id, periodo, unidades) VALUES (?, ?, ?) "
+            "ON CONFLICT(activo_id, periodo) DO UPDATE SET unidades = excluded.unidades",
+            (activo_id, periodo, unidades)
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error al registrar el uso del activo {activo_id}: {e}")
+        return False
+    finally:
+        close_connection(conn)
+
+def obtener_uso_activos_db(conn: sqlite3.Connection, periodo_inicio: str, periodo_fin: str) -> Dict[Tuple[int, str], float]:
+    """Devuelve {(activo_id, periodo): unidades} del rango de períodos, usando una conexión existente."""
+    cursor = conn.execute(
+        "SELECT activo_id, periodo, unidades FROM activos_fijos_uso WHERE periodo BETWEEN ? AND ?",
+        (periodo_inicio, periodo_fin)
+    )
+    return {(row['activo_id'], row['periodo']): row['unidades'] for row in cursor.fetchall()}
+
+def obtener_depreciacion_registrada_db(conn: sqlite3.Connection, periodo_fin: str) -> Dict[int, Dict[str, float]]:
+    """
+    Devuelve {activo_id: {periodo: cargo}} con la depreciación ya registrada hasta `periodo_fin`
+    inclusive, usando una conexión existente (para leerla dentro de la transacción del proceso).
+    """
+    cursor = conn.execute(
+        "SELECT activo_id, periodo, cargo FROM depreciacion_acumulada WHERE periodo <= ? ORDER BY activo_id, periodo",
+        (periodo_fin,)
+    )
+    registrada: Dict[int, Dict[str, float]] = {}
+    for row in cursor.fetchall():
+        registrada.setdefault(row['activo_id'], {})[row['periodo']] = row['cargo']
+    return registrada
+
+def insertar_depreciacion_acumulada_db(conn: sqlite3.Connection, filas: List[Tuple[int, str, float, float, Optional[int]]]):
+    """
+    Inserta filas (activo_id, periodo, cargo, acumulada, comprobante_id) en el libro de depreciación
+    usando una conexión existente. La clave primaria impide depreciar dos veces el mismo período.
+    """
+    conn.executemany(
+        "INSERT INTO depreciacion_acumulada (activo_id, periodo, cargo, acumulada, comprobante_id) VALUES (?, ?, ?, ?, ?)",
+        filas
+    )
+
+def obtener_depreciacion_acumulada_db(activo_id: int) -> List[Dict[str, Any]]:
+    """Devuelve el libro de depreciación de un activo, en orden de período."""
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.execute(
+            "SELECT periodo, cargo, acumulada, comprobante_id FROM depreciacion_acumulada WHERE activo_id = ? ORDER BY periodo",
+            (activo_id,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener la depreciación acumulada del activo {activo_id}: {e}")
+        return []
+    finally:
+        close_connection(conn)
+
+def obtener_activos_programa_desactualizado_db(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Activos cuyo programa de depreciación falta o quedó obsoleto, usando una conexión existente."""
+    cursor = conn.execute(
+        "SELECT * FROM activos_fijos WHERE id NOT IN (SELECT activo_id FROM depreciacion_programa_vigente) ORDER BY id"
+    )
+    return [dict(row) for row in cursor.fetchall()]
+
+def reemplazar_programa_depreciacion_db(conn: sqlite3.Connection, activo_ids: List[int], filas: List[Tuple[int, str, str, float, float, float, int]]):
+    """
+    Reemplaza el programa de depreciación de los activos indicados y los marca como vigentes,
+    usando una conexión existente. Cada fila es (activo_id, periodo, cuenta_gasto_depreciacion,
+    cargo, acumulada, valor_libros, registrado).
+    """
+    ids = json.dumps(activo_ids)
+    conn.execute("DELETE FROM depreciacion_programada WHERE activo_id IN (SELECT value FROM json_each(?))", (ids,))
+    conn.executemany(
+        "INSERT INTO depreciacion_programada (activo_id, periodo, cuenta_gasto_depreciacion, cargo, acumulada, valor_libros, registrado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        filas
+    )
+    conn.execute("INSERT OR IGNORE INTO depreciacion_programa_vigente (activo_id) SELECT value FROM json_each(?)", (ids,))
+
+def obtener_proyeccion_depreciacion_db(periodo_inicio: str, periodo_fin: str, por_periodo: bool = False) -> List[Dict[str, Any]]:
+    """
+    Suma el gasto de depreciación programado por cuenta de gasto entre dos períodos 'AAAA-MM'
+    (ambos incluidos) y, si `por_periodo`, también por período.
+    """
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        columnas = "periodo, cuenta_gasto_depreciacion" if por_periodo else "cuenta_gasto_depreciacion"
+        cursor = conn.execute(
+            f"""
+            SELECT {columnas}, SUM(cargo) AS total
+            FROM depreciacion_programada
+            WHERE periodo BETWEEN ? AND ?
+            GROUP BY {columnas}
+            ORDER BY {columnas}
+            """,
+            (periodo_inicio, periodo_fin)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener la proyección de depreciación: {e}")
+        return []
+    finally:
+        close_connection(conn)
+
+def obtener_programa_depreciacion_db(activo_id: int) -> List[Dict[str, Any]]:
+    """Devuelve el programa de depreciación de un activo, en orden de período."""
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.execute(
+            "SELECT periodo, cargo, acumulada, valor_libros, registrado FROM depreciacion_programada WHERE activo_id = ? ORDER BY periodo",
+            (activo_id,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener el programa de depreciación del activo {activo_id}: {e}")
+        return []
+    finally:
+        close_connection(conn)
+
 def obtener_producto_por_id_db(producto_id: int) -> Optional[Dict[str, Any]]:
     conn = None
     try:
@@ -395,13 +1057,268 @@ def actualizar_stock_producto_db(conn: sqlite3.Connection, producto_id: int, nue
         (nueva_cantidad, nuevo_costo, producto_id)
     )
 
-def obtener_movimientos_de_un_producto_db(producto_id: int) -> List[Dict[str, Any]]:
+def obtener_existencias_productos_db(producto_ids: List[int]) -> Dict[int, Dict[str, float]]:
+    """
+    Devuelve {producto_id: {'cantidad_disponible', 'costo_unitario_promedio'}} para los productos
+    indicados, en una sola consulta. Los IDs que no existen no aparecen en el resultado.
+    """
+    if not producto_ids:
+        return {}
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, cantidad_disponible, costo_unitario_promedio FROM productos WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(sorted(set(producto_ids))),)
+        )
+        return {row['id']: {'cantidad_disponible': row['cantidad_disponible'], 'costo_unitario_promedio': row['costo_unitario_promedio']}
+                for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener las existencias de productos: {e}")
+        return {}
+    finally:
+        close_connection(conn)
+
+TIPOS_ENTRADA_INVENTARIO = ('compra', 'ajuste_positivo')
+TIPOS_SALIDA_INVENTARIO = ('venta', 'ajuste_negativo')
+
+def _costo_promedio_tras_entrada(cantidad: float, costo: float, cantidad_entrada: float, costo_entrada: float) -> float:
+    """Costo promedio ponderado después de una entrada de inventario."""
+    nueva = cantidad + cantidad_entrada
+    return (cantidad * costo + cantidad_entrada * costo_entrada) / nueva if nueva > 0 else costo_entrada
+
+def registrar_movimientos_inventario_db(conn: sqlite3.Connection, movimientos: List[Dict[str, Any]]) -> List[float]:
+    """
+    Aplica un lote de movimientos de Kardex usando una conexión existente, dentro de la
+    transacción del llamador (que debe haberla abierto con BEGIN IMMEDIATE).
+
+    Lee el stock y el costo de todos los productos del lote en una sola consulta y devuelve el
+    costo unitario registrado para cada movimiento. Lanza ValueError si un producto no existe o
+    no tiene stock suficiente; el llamador decide si revierte la transacción.
+    """
+    if not movimientos:
+        return []
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, cantidad_disponible, costo_unitario_promedio FROM productos WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted({mov['producto_id'] for mov in movimientos})),)
+    )
+    # producto_id -> [cantidad inicial, cantidad corriente, costo corriente, salida neta máxima]
+    estado = {row['id']: [row['cantidad_disponible'], row['cantidad_disponible'], row['costo_unitario_promedio'], 0.0]
+              for row in cursor.fetchall()}
+
+    costos, filas_kardex = [], []
+    for mov in movimientos:
+        producto = estado.get(mov['producto_id'])
+        if producto is None:
+            raise ValueError(f"Producto con ID {mov['producto_id']} no encontrado.")
+        inicial, cantidad, costo, _ = producto
+        if mov['tipo_movimiento'] in TIPOS_ENTRADA_INVENTARIO:
+            costo_mov = mov.get('costo_unitario') or 0.0
+            producto[2] = _costo_promedio_tras_entrada(cantidad, costo, mov['cantidad'], costo_mov)
+            producto[1] = cantidad + mov['cantidad']
+        else:
+            costo_mov = mov['costo_unitario'] if mov.get('costo_unitario') is not None else costo
+            if cantidad - mov['cantidad'] < 0:
+                logger.error(f"Stock insuficiente para el producto ID {mov['producto_id']}. Stock: {cantidad}, se intenta sacar: {mov['cantidad']}")
+                raise ValueError("Stock insuficiente")
+            producto[1] = cantidad - mov['cantidad']
+            producto[3] = max(producto[3], inicial - producto[1])
+        costos.append(costo_mov)
+        filas_kardex.append((mov['producto_id'], mov['fecha'], mov['tipo_movimiento'], mov['cantidad'], costo_mov, mov.get('comprobante_id')))
+
+    cursor.executemany(
+        "INSERT INTO movimientos_inventario (producto_id, fecha, tipo_movimiento, cantidad, costo_unitario, comprobante_id) VALUES (?, ?, ?, ?, ?, ?)",
+        filas_kardex
+    )
+    cambios_antes = conn.total_changes
+    cursor.executemany(
+        "UPDATE productos SET cantidad_disponible = cantidad_disponible + ?, costo_unitario_promedio = ? WHERE id = ? AND cantidad_disponible >= ?",
+        [(cantidad - inicial, costo, producto_id, salida_maxima) for producto_id, (inicial, cantidad, costo, salida_maxima) in estado.items()]
+    )
+    if conn.total_changes - cambios_antes != len(estado):
+        raise ValueError("Stock insuficiente")
+    _registrar_cortes_automaticos(cursor, list(estado))
+    return costos
+
+def aplicar_movimientos_inventario_db(movimientos: List[Dict[str, Any]]) -> Tuple[bool, Any]:
+    """
+    Aplica un lote de movimientos de Kardex, de uno o varios productos, en una sola transacción.
+
+    Cada movimiento es un dict con 'producto_id', 'tipo_movimiento', 'cantidad', 'fecha' y,
+    opcionalmente, 'costo_unitario' y 'comprobante_id'. Los movimientos se aplican en el orden
+    recibido: las entradas recalculan el costo promedio ponderado y las salidas sin
+    'costo_unitario' salen al promedio vigente en ese punto del lote.
+
+    El stock se lee dentro de la transacción y se escribe con un UPDATE condicional sobre
+    `cantidad_disponible`, de modo que dos lotes concurrentes sobre el mismo producto no
+    pueden dejarlo en negativo. Si algún movimiento no es válido no se aplica ninguno.
+
+    Devuelve (True, costos) con el costo unitario registrado para cada movimiento, o
+    (False, mensaje) si el lote se rechazó.
+    """
+    if not movimientos:
+        return True, []
+    for mov in movimientos:
+        if mov['tipo_movimiento'] not in TIPOS_ENTRADA_INVENTARIO + TIPOS_SALIDA_INVENTARIO:
+            return False, f"Tipo de movimiento '{mov['tipo_movimiento']}' no válido."
+        if mov['cantidad'] <= 0:
+            return False, f"La cantidad del movimiento para el producto ID {mov['producto_id']} debe ser positiva."
+
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        conn.execute("BEGIN IMMEDIATE;")
+        costos = registrar_movimientos_inventario_db(conn, movimientos)
+        conn.commit()
+        return True, costos
+    except ValueError as e:
+        conn.rollback()
+        return False, str(e)
+    except sqlite3.Error as e:
+        logger.error(f"Error al aplicar el lote de movimientos de inventario: {e}")
+        if conn:
+            conn.rollback()
+        return False, f"Error en la transacción de movimiento de inventario: {e}"
+    finally:
+        close_connection(conn)
+
+# --- Cortes del Kardex ---
+
+# Último corte de cada producto con fecha <= ? (NULL si no tiene). El segundo parámetro es
+# la lista JSON de productos o NULL para todos.
+_SQL_ULTIMO_CORTE_KARDEX = """
+    SELECT p.id AS producto_id, c.fecha AS corte_fecha, c.movimiento_id AS corte_movimiento_id,
+           COALESCE(c.cantidad, 0.0) AS corte_cantidad, COALESCE(c.costo_promedio, 0.0) AS corte_costo
+    FROM productos p
+    LEFT JOIN kardex_cortes c ON c.producto_id = p.id AND (c.fecha, c.movimiento_id) = (
+        SELECT fecha, movimiento_id FROM kardex_cortes
+        WHERE producto_id = p.id AND fecha <= ?1
+        ORDER BY fecha DESC, movimiento_id DESC LIMIT 1
+    )
+    WHERE ?2 IS NULL OR p.id IN (SELECT value FROM json_each(?2))
+"""
+
+# Movimientos posteriores al corte y hasta la fecha ?1: el límite inferior sobre `fecha`
+# permite recorrer solo la cola en idx_movimientos_inventario_producto_fecha.
+_SQL_COLA_KARDEX = """
+    movimientos_inventario m ON m.producto_id = u.producto_id
+        AND m.fecha >= COALESCE(u.corte_fecha, '') AND m.fecha <= ?1
+        AND (u.corte_fecha IS NULL OR m.fecha > u.corte_fecha OR m.id > u.corte_movimiento_id)
+"""
+
+def _estado_kardex_a_fecha(cursor: sqlite3.Cursor, fecha_corte: Optional[str], producto_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Reconstruye cantidad y costo promedio de cada producto al final de `fecha_corte` (o con
+    todos sus movimientos si es None), partiendo del último corte y reproduciendo solo la cola.
+    """
+    cursor.execute(
+        f"""
+        WITH ultimo AS ({_SQL_ULTIMO_CORTE_KARDEX})
+        SELECT u.*, m.id, m.fecha, m.tipo_movimiento, m.cantidad, m.costo_unitario
+        FROM ultimo u LEFT JOIN {_SQL_COLA_KARDEX}
+        ORDER BY u.producto_id, m.fecha, m.id
+        """,
+        (fecha_corte or '9999-12-31', None if producto_ids is None else json.dumps(producto_ids))
+    )
+    estados: Dict[int, Dict[str, Any]] = {}
+    for row in cursor.fetchall():
+        estado = estados.get(row['producto_id'])
+        if estado is None:
+            estado = estados[row['producto_id']] = {
+                'producto_id': row['producto_id'], 'cantidad': row['corte_cantidad'], 'costo_promedio': row['corte_costo'],
+                'fecha': row['corte_fecha'], 'movimiento_id': row['corte_movimiento_id'], 'reproducidos': 0,
+            }
+        if row['id'] is None:
+            continue
+        if row['tipo_movimiento'] in TIPOS_ENTRADA_INVENTARIO:
+            estado['costo_promedio'] = _costo_promedio_tras_entrada(estado['cantidad'], estado['costo_promedio'], row['cantidad'], row['costo_unitario'])
+            estado['cantidad'] += row['cantidad']
+        else:
+            estado['cantidad'] -= row['cantidad']
+        estado['fecha'], estado['movimiento_id'] = row['fecha'], row['id']
+        estado['reproducidos'] += 1
+    for estado in estados.values():
+        estado['valor'] = estado['cantidad'] * estado['costo_promedio']
+    return estados
+
+def _guardar_cortes_kardex(cursor: sqlite3.Cursor, estados: List[Dict[str, Any]], fecha: Optional[str] = None):
+    """Guarda un corte por estado, fechado en `fecha` o en la del último movimiento reproducido."""
+    cursor.executemany(
+        "INSERT OR REPLACE INTO kardex_cortes (producto_id, fecha, movimiento_id, cantidad, costo_promedio, valor) VALUES (?, ?, ?, ?, ?, ?)",
+        [(e['producto_id'], fecha or e['fecha'], e['movimiento_id'], e['cantidad'], e['costo_promedio'], e['valor']) for e in estados]
+    )
+
+def _registrar_cortes_automaticos(cursor: sqlite3.Cursor, producto_ids: List[int]):
+    """Guarda un corte para los productos que acumulan KARDEX_MOVIMIENTOS_POR_CORTE movimientos desde el último."""
+    cursor.execute(
+        f"""
+        WITH ultimo AS ({_SQL_ULTIMO_CORTE_KARDEX})
+        SELECT u.producto_id FROM ultimo u JOIN {_SQL_COLA_KARDEX}
+        GROUP BY u.producto_id HAVING COUNT(*) >= ?3
+        """,
+        ('9999-12-31', json.dumps(producto_ids), KARDEX_MOVIMIENTOS_POR_CORTE)
+    )
+    pendientes = [row['producto_id'] for row in cursor.fetchall()]
+    if pendientes:
+        _guardar_cortes_kardex(cursor, list(_estado_kardex_a_fecha(cursor, None, pendientes).values()))
+
+def registrar_cortes_kardex_db(fecha_corte: str) -> int:
+    """
+    Guarda el corte de todos los productos con movimientos al cierre de `fecha_corte`
+    (normalmente el último día del mes). Devuelve el número de cortes guardados.
+    """
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE;")
+        estados = [e for e in _estado_kardex_a_fecha(cursor, fecha_corte).values() if e['reproducidos'] > 0]
+        _guardar_cortes_kardex(cursor, estados, fecha_corte)
+        conn.commit()
+        return len(estados)
+    except sqlite3.Error as e:
+        logger.error(f"Error al registrar los cortes del Kardex al {fecha_corte}: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        close_connection(conn)
+
+def obtener_existencias_a_fecha_db(fecha_corte: str, producto_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Devuelve cantidad, costo promedio y valor de cada producto (o de `producto_ids`) al cierre
+    de `fecha_corte`, cargando el corte más cercano y reproduciendo solo los movimientos posteriores.
+    """
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        estados = _estado_kardex_a_fecha(cursor, fecha_corte, producto_ids)
+        cursor.execute(
+            "SELECT id, sku, nombre FROM productos WHERE ?1 IS NULL OR id IN (SELECT value FROM json_each(?1)) ORDER BY nombre, id",
+            (None if producto_ids is None else json.dumps(producto_ids),)
+        )
+        return [{'producto_id': row['id'], 'sku': row['sku'], 'nombre': row['nombre'],
+                 'cantidad': estados[row['id']]['cantidad'], 'costo_promedio': estados[row['id']]['costo_promedio'],
+                 'valor': estados[row['id']]['valor']} for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener existencias al {fecha_corte}: {e}")
+        return []
+    finally:
+        close_connection(conn)
+
+def obtener_movimientos_de_un_producto_db(producto_id: int, formato: str = 'dict') -> Any:
+    """Kardex completo de un producto en orden (fecha, id), en el `formato` pedido (ver FORMATOS_RESULTADO)."""
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM movimientos_inventario WHERE producto_id = ? ORDER BY fecha, id", (producto_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        return _leer_resultado(cursor, formato, "MovimientoKardex",
+                               numericas={'id': 'q', 'producto_id': 'q', 'cantidad': 'd', 'costo_unitario': 'd'},
+                               compartidas=('fecha', 'tipo_movimiento'))
     except sqlite3.Error as e:
         logger.error(f"Error al obtener kardex para producto {producto_id}: {e}")
         return []
@@ -435,6 +1352,171 @@ def obtener_terceros_por_tipo(tipo_tercero: str) -> List[Dict[str, Any]]:
     finally:
         close_connection(conn)
 
+# --- Caché del Plan de Cuentas (PUC) ---
+
+class _NodoPUC:
+    """Nodo del trie de códigos: un carácter del código por nivel."""
+    __slots__ = ("hijos", "cuenta")
+
+    def __init__(self):
+        self.hijos: Dict[str, "_NodoPUC"] = {}
+        self.cuenta: Optional[Dict[str, Any]] = None
+
+
+class CachePUC:
+    """
+    Caché de lectura del plan de cuentas de una base de datos, organizado como
+    un trie de prefijos sobre el código de cuenta.
+
+    La primera consulta carga el plan completo con una sola lectura; las
+    siguientes se sirven desde memoria hasta que una escritura del PUC en este
+    proceso llama a `invalidar`, o hasta que el archivo de la base de datos es
+    reemplazado. Las cuentas se entregan como copias, de modo que el llamador
+    puede modificarlas sin alterar la caché.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._raiz: Optional[_NodoPUC] = None
+        self._por_codigo: Dict[str, Dict[str, Any]] = {}
+        self._identidad_archivo: Optional[Tuple[int, int]] = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _leer_identidad_archivo(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.db_path)
+            return (st.st_dev, st.st_ino)
+        except OSError:
+            return None
+
+    def _cargar(self, identidad: Optional[Tuple[int, int]]):
+        conn = None
+        try:
+            conn = get_db_connection(self.db_path)
+            filas = conn.execute("SELECT codigo, nombre, naturaleza, clase, grupo_niif FROM plan_cuentas ORDER BY codigo").fetchall()
+        finally:
+            close_connection(conn)
+        raiz = _NodoPUC()
+        por_codigo = {}
+        for fila in filas:
+            cuenta = dict(fila)
+            nodo = raiz
+            for caracter in cuenta['codigo']:
+                nodo = nodo.hijos.setdefault(caracter, _NodoPUC())
+            nodo.cuenta = cuenta
+            por_codigo[cuenta['codigo']] = cuenta
+        self._raiz, self._por_codigo, self._identidad_archivo = raiz, por_codigo, identidad
+
+    def _asegurar_cargada(self) -> Tuple[_NodoPUC, Dict[str, Dict[str, Any]]]:
+        """
+        Devuelve (raíz del trie, cuentas por código), cargándolos si la caché está vacía o
+        desactualizada. Ambos se toman bajo el lock y una carga nueva crea estructuras nuevas,
+        así que el llamador puede leer de esta foto aunque otro hilo llame a `invalidar`.
+        """
+        identidad = self._leer_identidad_archivo()
+        with self._lock:
+            if self._raiz is None or identidad != self._identidad_archivo:
+                self.fallos += 1
+                self._cargar(identidad)
+            else:
+                self.aciertos += 1
+            return self._raiz, self._por_codigo
+
+    def invalidar(self):
+        with self._lock:
+            self._raiz = None
+            self._por_codigo = {}
+
+    def _nodo(self, prefijo: str) -> Optional[_NodoPUC]:
+        nodo, _ = self._asegurar_cargada()
+        for caracter in prefijo:
+            nodo = nodo.hijos.get(caracter)
+            if nodo is None:
+                return None
+        return nodo
+
+    @staticmethod
+    def _recorrer(nodo: _NodoPUC, solo_primer_nivel: bool = False) -> List[Dict[str, Any]]:
+        """Cuentas bajo `nodo` (excluido), en orden de código."""
+        cuentas = []
+        pendientes = [nodo.hijos[c] for c in sorted(nodo.hijos, reverse=True)]
+        while pendientes:
+            actual = pendientes.pop()
+            if actual.cuenta is not None:
+                cuentas.append(dict(actual.cuenta))
+                if solo_primer_nivel:
+                    continue
+            pendientes.extend(actual.hijos[c] for c in sorted(actual.hijos, reverse=True))
+        return cuentas
+
+    def obtener(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la cuenta con el código exacto, o None si no existe."""
+        _, por_codigo = self._asegurar_cargada()
+        cuenta = por_codigo.get(codigo)
+        return dict(cuenta) if cuenta else None
+
+    def todas(self) -> List[Dict[str, Any]]:
+        """Devuelve el plan completo ordenado por código."""
+        return self._recorrer(self._asegurar_cargada()[0])
+
+    def padre(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la cuenta de nivel superior más cercana ('110505' -> '1105'), o None si no tiene."""
+        nodo, _ = self._asegurar_cargada()
+        padre = None
+        for caracter in codigo[:-1]:
+            nodo = nodo.hijos.get(caracter)
+            if nodo is None:
+                break
+            if nodo.cuenta is not None:
+                padre = nodo.cuenta
+        return dict(padre) if padre else None
+
+    def hijas(self, codigo: str) -> List[Dict[str, Any]]:
+        """Devuelve las subcuentas inmediatas de una cuenta (las que la tienen como padre)."""
+        nodo = self._nodo(codigo)
+        return self._recorrer(nodo, solo_primer_nivel=True) if nodo else []
+
+    def descendientes(self, prefijo: str) -> List[Dict[str, Any]]:
+        """Devuelve todas las cuentas cuyo código empieza por `prefijo`, incluida la propia, ordenadas por código."""
+        nodo = self._nodo(prefijo)
+        if nodo is None:
+            return []
+        cuentas = [dict(nodo.cuenta)] if nodo.cuenta is not None else []
+        return cuentas + self._recorrer(nodo)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "cuentas": len(self._por_codigo),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
+
+
+_caches_puc: Dict[str, CachePUC] = {}
+_caches_puc_lock = threading.Lock()
+
+def obtener_cache_puc() -> CachePUC:
+    """Devuelve la caché del plan de cuentas de la base de datos de contabilidad actual."""
+    cache = _caches_puc.get(DB_CONTABILIDAD_PATH)
+    if cache is None:
+        with _caches_puc_lock:
+            cache = _caches_puc.setdefault(DB_CONTABILIDAD_PATH, CachePUC(DB_CONTABILIDAD_PATH))
+    return cache
+
+def invalidar_cache_puc():
+    """Descarta la caché del plan de cuentas; la siguiente consulta lo recarga."""
+    cache = _caches_puc.get(DB_CONTABILIDAD_PATH)
+    if cache is not None:
+        cache.invalidar()
+
+def estadisticas_cache_puc() -> Dict[str, Any]:
+    """Devuelve aciertos, fallos y número de cuentas de la caché del plan de cuentas."""
+    return obtener_cache_puc().estadisticas()
+
 # --- Funciones CRUD para Plan de Cuentas (PUC) ---
 
 def agregar_cuenta_puc(codigo: str, nombre: str, naturaleza: str, clase: str, grupo_niif: Optional[str] = None) -> bool:
@@ -444,6 +1526,7 @@ def agregar_cuenta_puc(codigo: str, nombre: str, naturaleza: str, clase: str, gr
         cursor = conn.cursor()
         cursor.execute("INSERT INTO plan_cuentas (codigo, nombre, naturaleza, clase, grupo_niif) VALUES (?, ?, ?, ?, ?)", (codigo, nombre, naturaleza, clase, grupo_niif))
         conn.commit()
+        invalidar_cache_puc()
         return True
     except sqlite3.IntegrityError:
         logger.warning(f"El código de cuenta PUC '{codigo}' ya existe.")
@@ -454,55 +1537,185 @@ def agregar_cuenta_puc(codigo: str, nombre: str, naturaleza: str, clase: str, gr
     finally:
         close_connection(conn)
 
-def obtener_cuentas_puc(filtro: Optional[str] = None) -> List[Dict[str, Any]]:
+def actualizar_cuenta_puc(codigo: str, nombre: str, naturaleza: str, clase: str, grupo_niif: Optional[str] = None) -> bool:
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
         cursor = conn.cursor()
-        query = "SELECT codigo, nombre, naturaleza, clase, grupo_niif FROM plan_cuentas"
-        params = []
-        if filtro:
-            query += " WHERE codigo LIKE ? OR nombre LIKE ?"
-            params.extend([f'%{filtro}%', f'%{filtro}%'])
-        query += " ORDER BY codigo"
+        cursor.execute("UPDATE plan_cuentas SET nombre = ?, naturaleza = ?, clase = ?, grupo_niif = ? WHERE codigo = ?", (nombre, naturaleza, clase, grupo_niif, codigo))
+        conn.commit()
+        invalidar_cache_puc()
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Error al actualizar cuenta PUC '{codigo}': {e}")
+        return False
+    finally:
+        close_connection(conn)
+
+def eliminar_cuenta_puc(codigo: str) -> bool:
+    """Elimina una cuenta del plan, salvo que ya tenga movimientos contables."""
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM movimientos WHERE cuenta_codigo = ? LIMIT 1", (codigo,))
+        if cursor.fetchone():
+            logger.warning(f"La cuenta PUC '{codigo}' tiene movimientos y no puede eliminarse.")
+            return False
+        cursor.execute("DELETE FROM plan_cuentas WHERE codigo = ?", (codigo,))
+        conn.commit()
+        invalidar_cache_puc()
+        return cursor.rowcount > 0
+    except sqlite3.IntegrityError:
+        logger.warning(f"La cuenta PUC '{codigo}' está referenciada y no puede eliminarse.")
+        return False
+    except sqlite3.Error as e:
+        logger.error(f"Error al eliminar cuenta PUC '{codigo}': {e}")
+        return False
+    finally:
+        close_connection(conn)
+
+def _consulta_busqueda_puc(texto: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Separa un texto de búsqueda en prefijos de código (términos numéricos) y en
+    una expresión MATCH de FTS5 con búsqueda por prefijo para el resto de términos.
+    """
+    prefijos, terminos = [], []
+    for termino in texto.split():
+        if termino.isdigit():
+            prefijos.append(termino)
+        else:
+            terminos.append('"' + termino.replace('"', '""') + '"*')
+    return prefijos, " AND ".join(terminos) or None
+
+def buscar_cuentas_puc(texto: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Busca cuentas del PUC por prefijo de código y/o por palabras del nombre.
+
+    Los términos numéricos filtran por la jerarquía de códigos ('1105' devuelve
+    1105, 110505, ...) usando la clave primaria. Las palabras se buscan en el
+    índice FTS5 sin distinguir tildes ni mayúsculas, como prefijos ('merc'
+    encuentra 'Mercancías') y se ordenan por relevancia (bm25). Si solo hay
+    términos numéricos, primero van las cuentas de mayor nivel en la jerarquía.
+    """
+    prefijos, consulta_fts = _consulta_busqueda_puc(texto)
+    if not prefijos and not consulta_fts:
+        return obtener_cuentas_puc(limit=limit)
+
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        params: List[Any] = []
+        # GLOB (a diferencia de LIKE) respeta la colación binaria y usa la clave primaria.
+        filtro_codigo = "".join(" AND codigo GLOB ?" for _ in prefijos)
+        params.extend(f"{prefijo}*" for prefijo in prefijos)
+        if consulta_fts:
+            # El límite se aplica dentro de FTS5, que ordena por `rank` (bm25) sin materializar todo el resultado.
+            query = f"""
+                SELECT p.codigo, p.nombre, p.naturaleza, p.clase, p.grupo_niif
+                FROM (SELECT codigo, rank FROM plan_cuentas_fts WHERE plan_cuentas_fts MATCH ?{filtro_codigo} ORDER BY rank LIMIT ?) f
+                JOIN plan_cuentas p ON p.codigo = f.codigo
+                ORDER BY f.rank, length(p.codigo), p.codigo
+            """
+            params.insert(0, consulta_fts)
+        else:
+            query = f"SELECT codigo, nombre, naturaleza, clase, grupo_niif FROM plan_cuentas WHERE 1{filtro_codigo} ORDER BY length(codigo), codigo LIMIT ?"
+        params.append(limit if limit is not None else -1)
         cursor.execute(query, params)
         return [dict(row) for row in cursor.fetchall()]
     except sqlite3.Error as e:
-        logger.error(f"Error al obtener cuentas PUC: {e}")
+        logger.error(f"Error al buscar cuentas PUC con '{texto}': {e}")
         return []
     finally:
         close_connection(conn)
 
+def obtener_cuentas_puc(filtro: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Devuelve el plan de cuentas ordenado por código; con `filtro`, delega en `buscar_cuentas_puc`."""
+    if filtro and filtro.strip():
+        return buscar_cuentas_puc(filtro, limit)
+    try:
+        cuentas = obtener_cache_puc().todas()
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener cuentas PUC: {e}")
+        return []
+    return cuentas[:limit] if limit is not None else cuentas
+
 def obtener_cuenta_puc_por_codigo(codigo: str) -> Optional[Dict[str, Any]]:
-    conn = None
+    """Devuelve una cuenta por su código exacto, servida desde la caché del plan de cuentas."""
     try:
-        conn = get_db_connection(DB_CONTABILIDAD_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT codigo, nombre, naturaleza, clase FROM plan_cuentas WHERE codigo = ?", (codigo,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        return obtener_cache_puc().obtener(codigo)
     except sqlite3.Error as e:
         logger.error(f"Error al obtener cuenta PUC por código '{codigo}': {e}")
         return None
-    finally:
-        close_connection(conn)
 
 # --- Funciones CRUD para Comprobantes y Movimientos ---
 
-def agregar_comprobante_y_movimientos(fecha: str, tipo: str, descripcion: str, movimientos: List[Dict[str, Any]], usuario_id: int) -> Tuple[bool, Optional[int]]:
-    conn = None
+def insertar_comprobante_db(conn: sqlite3.Connection, fecha: str, tipo: str, descripcion: str, movimientos: List[Dict[str, Any]], usuario_id: int) -> int:
+    """
+    Inserta un comprobante con sus movimientos y actualiza saldos_periodo usando una conexión
+    existente, dentro de la transacción del llamador. Devuelve el ID del comprobante.
+    """
+    cursor = conn.cursor()
     total_debito = sum(float(m.get('debito', 0) or 0) for m in movimientos)
     total_credito = sum(float(m.get('credito', 0) or 0) for m in movimientos)
+    cursor.execute("INSERT INTO comprobantes (fecha, tipo, descripcion, total_debito, total_credito, usuario_id) VALUES (?, ?, ?, ?, ?, ?)", (fecha, tipo, descripcion, total_debito, total_credito, usuario_id))
+    comprobante_id = cursor.lastrowid
+    if not comprobante_id:
+        raise sqlite3.Error("No se pudo obtener el ID del comprobante insertado.")
+    mov_to_insert = [(comprobante_id, m['cuenta_codigo'], m.get('descripcion_detalle'), float(m.get('debito', 0) or 0), float(m.get('credito', 0) or 0), m.get('tercero_id')) for m in movimientos]
+    cursor.executemany("INSERT INTO movimientos (comprobante_id, cuenta_codigo, descripcion_detalle, debito, credito, tercero_id) VALUES (?, ?, ?, ?, ?, ?)", mov_to_insert)
+    _acumular_saldos_periodo(cursor, fecha, [(m[1], m[3], m[4]) for m in mov_to_insert])
+    return comprobante_id
+
+def _ids_insertados_desde(cursor: sqlite3.Cursor, tabla: str, ultimo_id: int) -> List[int]:
+    """
+    IDs de `tabla` posteriores a `ultimo_id`, en orden de inserción. Dentro de una transacción
+    BEGIN IMMEDIATE son exactamente las filas que insertó el lote actual.
+    """
+    return [row[0] for row in cursor.execute(f"SELECT id FROM {tabla} WHERE id > ? ORDER BY id", (ultimo_id,))]
+
+def insertar_lote_comprobantes_db(conn: sqlite3.Connection, comprobantes: List[Dict[str, Any]]) -> List[int]:
+    """
+    Inserta varios comprobantes con sus movimientos usando `executemany`, dentro de la transacción
+    del llamador (abierta con BEGIN IMMEDIATE), y actualiza saldos_periodo una vez por período.
+
+    Cada comprobante es un dict con 'fecha', 'tipo', 'descripcion', 'movimientos' y 'usuario_id'.
+    Devuelve los IDs asignados, en el mismo orden.
+    """
+    if not comprobantes:
+        return []
+    cursor = conn.cursor()
+    ultimo_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM comprobantes").fetchone()[0]
+    cursor.executemany(
+        "INSERT INTO comprobantes (fecha, tipo, descripcion, total_debito, total_credito, usuario_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [(c['fecha'], c['tipo'], c['descripcion'],
+          sum(float(m.get('debito', 0) or 0) for m in c['movimientos']),
+          sum(float(m.get('credito', 0) or 0) for m in c['movimientos']), c['usuario_id']) for c in comprobantes]
+    )
+    comprobante_ids = _ids_insertados_desde(cursor, "comprobantes", ultimo_id)
+    if len(comprobante_ids) != len(comprobantes):
+        raise sqlite3.Error("No se pudieron obtener los IDs de los comprobantes insertados.")
+
+    mov_to_insert = []
+    por_periodo: Dict[str, List[Tuple[str, float, float]]] = {}
+    for comprobante_id, comprobante in zip(comprobante_ids, comprobantes):
+        saldos = por_periodo.setdefault(comprobante['fecha'][:7], [])
+        for m in comprobante['movimientos']:
+            debito, credito = float(m.get('debito', 0) or 0), float(m.get('credito', 0) or 0)
+            mov_to_insert.append((comprobante_id, m['cuenta_codigo'], m.get('descripcion_detalle'), debito, credito, m.get('tercero_id')))
+            saldos.append((m['cuenta_codigo'], debito, credito))
+    cursor.executemany("INSERT INTO movimientos (comprobante_id, cuenta_codigo, descripcion_detalle, debito, credito, tercero_id) VALUES (?, ?, ?, ?, ?, ?)", mov_to_insert)
+    for periodo, saldos in por_periodo.items():
+        _acumular_saldos_periodo(cursor, periodo, saldos)
+    return comprobante_ids
+
+def agregar_comprobante_y_movimientos(fecha: str, tipo: str, descripcion: str, movimientos: List[Dict[str, Any]], usuario_id: int) -> Tuple[bool, Optional[int]]:
+    conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
-        cursor = conn.cursor()
         conn.execute("BEGIN TRANSACTION;")
-        cursor.execute("INSERT INTO comprobantes (fecha, tipo, descripcion, total_debito, total_credito, usuario_id) VALUES (?, ?, ?, ?, ?, ?)", (fecha, tipo, descripcion, total_debito, total_credito, usuario_id))
-        comprobante_id = cursor.lastrowid
-        if not comprobante_id:
-            raise sqlite3.Error("No se pudo obtener el ID del comprobante insertado.")
-        mov_to_insert = [(comprobante_id, m['cuenta_codigo'], m.get('descripcion_detalle'), float(m.get('debito', 0) or 0), float(m.get('credito', 0) or 0), m.get('tercero_id')) for m in movimientos]
-        cursor.executemany("INSERT INTO movimientos (comprobante_id, cuenta_codigo, descripcion_detalle, debito, credito, tercero_id) VALUES (?, ?, ?, ?, ?, ?)", mov_to_insert)
+        comprobante_id = insertar_comprobante_db(conn, fecha, tipo, descripcion, movimientos, usuario_id)
         conn.commit()
         return True, comprobante_id
     except (sqlite3.Error, ValueError) as e:
@@ -513,6 +1726,45 @@ def agregar_comprobante_y_movimientos(fecha: str, tipo: str, descripcion: str, m
     finally:
         close_connection(conn)
 
+def anular_comprobante(comprobante_id: int) -> bool:
+    """
+    Anula un comprobante y sus movimientos, y recalcula en la misma transacción
+    los saldos por período de las cuentas afectadas. Si es un comprobante de
+    depreciación, sus cargos salen del libro de depreciación acumulada para que
+    el período pueda volver a depreciarse.
+    """
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE;")
+        cursor.execute("SELECT fecha FROM comprobantes WHERE id = ? AND anulado = FALSE", (comprobante_id,))
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            logger.warning(f"El comprobante {comprobante_id} no existe o ya está anulado.")
+            return False
+        cursor.execute("UPDATE comprobantes SET anulado = TRUE WHERE id = ?", (comprobante_id,))
+        cursor.execute("UPDATE movimientos SET anulado = TRUE WHERE comprobante_id = ?", (comprobante_id,))
+        cursor.execute("SELECT DISTINCT cuenta_codigo FROM movimientos WHERE comprobante_id = ?", (comprobante_id,))
+        cuentas = [r[0] for r in cursor.fetchall()]
+        _recalcular_saldos_periodo(cursor, row['fecha'][:7], cuentas)
+        cursor.execute("SELECT activo_id, periodo, cargo FROM depreciacion_acumulada WHERE comprobante_id = ?", (comprobante_id,))
+        cargos = cursor.fetchall()
+        # Los meses siguientes dejan de incluir el cargo anulado en su acumulado
+        cursor.executemany("UPDATE depreciacion_acumulada SET acumulada = ROUND(acumulada - ?, 2) WHERE activo_id = ? AND periodo > ?",
+                           [(c['cargo'], c['activo_id'], c['periodo']) for c in cargos])
+        cursor.execute("DELETE FROM depreciacion_acumulada WHERE comprobante_id = ?", (comprobante_id,))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error al anular el comprobante {comprobante_id}: {e}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        close_connection(conn)
+
 def obtener_comprobantes(limit: int = 50, offset: int = 0, filtro_fecha: Optional[str] = None, filtro_tipo: Optional[str] = None) -> List[Dict[str, Any]]:
     """Obtiene una lista de comprobantes con filtros y paginación."""
     conn = None
@@ -554,7 +1806,11 @@ def obtener_movimientos_por_comprobante(comprobante_id: int) -> List[Dict[str, A
     finally:
         close_connection(conn)
 
-def obtener_libro_diario(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[Dict[str, Any]]:
+def obtener_libro_diario(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, formato: str = 'dict') -> Any:
+    """
+    Movimientos no anulados en orden (fecha, comprobante, movimiento). Con `formato` 'filas' o
+    'columnas' (ver FORMATOS_RESULTADO) el resultado ocupa una fracción de la memoria de 'dict'.
+    """
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
@@ -569,13 +1825,465 @@ def obtener_libro_diario(fecha_inicio: Optional[str] = None, fecha_fin: Optional
             params.append(fecha_fin)
         query += " ORDER BY c.fecha, c.id, m.id"
         cursor.execute(query, params)
-        return [dict(row) for row in cursor.fetchall()]
+        return _leer_resultado(cursor, formato, "MovimientoDiario",
+                               numericas={'comprobante_id': 'q', 'debito': 'd', 'credito': 'd'},
+                               compartidas=('fecha', 'tipo_comprobante', 'cuenta_codigo', 'cuenta_nombre'))
     except sqlite3.Error as e:
         logger.error(f"Error al obtener libro diario: {e}")
         return []
     finally:
         close_connection(conn)
 
+# --- Formatos compactos de resultado ---
+
+# 'dict': una lista de diccionarios (formato histórico). 'filas': una lista de dataclasses con
+# __slots__. 'columnas': un ResultadoColumnar con un array por columna numérica.
+FORMATOS_RESULTADO = ('dict', 'filas', 'columnas')
+
+class FilaCompacta:
+    """
+    Base de las filas del formato 'filas': dataclasses con __slots__, sin diccionario por
+    instancia. Admiten fila['campo'], fila.get('campo') y dict(fila), de modo que el código
+    escrito para diccionarios las puede leer sin cambios.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, clave: str) -> Any:
+        try:
+            return getattr(self, clave)
+        except AttributeError:
+            raise KeyError(clave) from None
+
+    def get(self, clave: str, defecto: Any = None) -> Any:
+        return getattr(self, clave, defecto)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+class ResultadoColumnar:
+    """
+    Resultado orientado a columnas: las columnas numéricas se guardan en `array` ('d' para
+    importes, 'q' para ids) y las de texto en listas con las cadenas repetidas compartidas.
+    `resultado['debito']` devuelve la columna completa.
+    """
+    __slots__ = ("columnas", "_longitud")
+
+    def __init__(self, columnas: Dict[str, Any], longitud: int):
+        self.columnas = columnas
+        self._longitud = longitud
+
+    def __len__(self) -> int:
+        return self._longitud
+
+    def __getitem__(self, columna: str) -> Any:
+        return self.columnas[columna]
+
+    def fila(self, indice: int) -> Dict[str, Any]:
+        return {nombre: valores[indice] for nombre, valores in self.columnas.items()}
+
+    def filas(self) -> Iterator[Dict[str, Any]]:
+        for indice in range(self._longitud):
+            yield self.fila(indice)
+
+_CLASES_FILA: Dict[Tuple[str, Tuple[str, ...]], type] = {}
+_TAMANO_BLOQUE_LECTURA = 10000
+
+def _clase_fila(nombre: str, campos: Tuple[str, ...]) -> type:
+    """Dataclass con __slots__ para un conjunto de columnas; se crea una sola vez por consulta."""
+    clase = _CLASES_FILA.get((nombre, campos))
+    if clase is None:
+        clase = make_dataclass(nombre, campos, bases=(FilaCompacta,), slots=True)
+        _CLASES_FILA[(nombre, campos)] = clase
+    return clase
+
+def _leer_resultado(cursor: sqlite3.Cursor, formato: str, nombre_fila: str,
+                    numericas: Optional[Dict[str, str]] = None, compartidas: Tuple[str, ...] = ()) -> Any:
+    """
+    Convierte el resultado de `cursor` al `formato` pedido, leyéndolo fila a fila.
+
+    `numericas` indica el typecode de array de las columnas numéricas (solo formato 'columnas';
+    un NULL se guarda como 0); `compartidas` son columnas de texto de pocos valores distintos (códigos,
+    nombres de cuenta, fechas) cuyas cadenas iguales se comparten entre filas.
+    """
+    if formato == 'dict':
+        return [dict(row) for row in cursor.fetchall()]
+    if formato not in FORMATOS_RESULTADO:
+        raise ValueError(f"Formato de resultado '{formato}' no válido. Opciones: {FORMATOS_RESULTADO}")
+
+    campos = tuple(d[0] for d in cursor.description)
+    cadenas: Dict[str, str] = {}
+    compartir = lambda valor: cadenas.setdefault(valor, valor) if valor is not None else None
+
+    if formato == 'filas':
+        clase = _clase_fila(nombre_fila, campos)
+        indices_compartidos = [i for i, campo in enumerate(campos) if campo in compartidas]
+        filas = []
+        while bloque := cursor.fetchmany(_TAMANO_BLOQUE_LECTURA):
+            for row in bloque:
+                valores = list(row)
+                for i in indices_compartidos:
+                    valores[i] = compartir(valores[i])
+                filas.append(clase(*valores))
+        return filas
+
+    # Por columnas: cada bloque se transpone y se agrega columna a columna.
+    numericas = numericas or {}
+    columnas = {campo: array(numericas[campo]) if campo in numericas else [] for campo in campos}
+    longitud = 0
+    while bloque := cursor.fetchmany(_TAMANO_BLOQUE_LECTURA):
+        for campo, valores in zip(campos, zip(*bloque)):
+            if campo in numericas:
+                columnas[campo].extend(0 if v is None else v for v in valores)
+            elif campo in compartidas:
+                columnas[campo].extend(map(compartir, valores))
+            else:
+                columnas[campo].extend(valores)
+        longitud += len(bloque)
+    return ResultadoColumnar(columnas, longitud)
+
+# --- Lectura paginada por clave (keyset) ---
+
+def _paginas_por_clave(consulta: str, condiciones: List[str], params: List[Any], clave: List[Tuple[str, str]],
+                       descendente: bool, tamano_pagina: int, despues_de: Optional[Tuple] = None,
+                       condicion_indice: Optional[str] = None) -> Iterator[List[sqlite3.Row]]:
+    """
+    Recorre una consulta por páginas de `tamano_pagina` filas usando como cursor la última
+    clave entregada en lugar de OFFSET, de modo que la página N cuesta lo mismo que la primera.
+
+    `clave` es la lista de (expresión SQL, columna del resultado) que ordena de forma única.
+    `condicion_indice`, si se da, es una condición más amplia sobre el prefijo indexado de la
+    clave (con un parámetro por columna de ese prefijo) que permite al planificador saltar
+    directamente a la posición del cursor.
+
+    Cada página usa su propia conexión del pool y se entrega como lista de sqlite3.Row
+    (tuplas con acceso por nombre), sin copiar a diccionarios. El llamador puede guardar
+    la clave de la última fila y pasarla como `despues_de` para continuar más tarde.
+    """
+    expresiones = [expr for expr, _ in clave]
+    columnas = [col for _, col in clave]
+    direccion = "DESC" if descendente else "ASC"
+    orden = ", ".join(f"{expr} {direccion}" for expr in expresiones)
+    comparador = "<" if descendente else ">"
+    ultima_clave = tuple(despues_de) if despues_de is not None else None
+
+    while True:
+        condiciones_pagina, params_pagina = list(condiciones), list(params)
+        if ultima_clave is not None:
+            if condicion_indice:
+                condiciones_pagina.append(condicion_indice)
+                params_pagina.extend(ultima_clave[:condicion_indice.count("?")])
+            condiciones_pagina.append(f"({', '.join(expresiones)}) {comparador} ({', '.join('?' * len(expresiones))})")
+            params_pagina.extend(ultima_clave)
+        sql = consulta
+        if condiciones_pagina:
+            sql += " WHERE " + " AND ".join(condiciones_pagina)
+        sql += f" ORDER BY {orden} LIMIT ?"
+
+        conn = None
+        try:
+            conn = get_db_connection(DB_CONTABILIDAD_PATH)
+            filas = conn.execute(sql, params_pagina + [tamano_pagina]).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error al leer página de datos: {e}")
+            return
+        finally:
+            close_connection(conn)
+
+        if not filas:
+            return
+        yield filas
+        if len(filas) < tamano_pagina:
+            return
+        ultima_clave = tuple(filas[-1][col] for col in columnas)
+
+def paginar_libro_diario(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, tamano_pagina: int = 500,
+                         despues_de: Optional[Tuple[str, int, int]] = None) -> Iterator[List[sqlite3.Row]]:
+    """
+    Libro diario por páginas, en orden (fecha, comprobante_id, movimiento_id).
+    Mismas columnas que `obtener_libro_diario` más `movimiento_id`, que completa la clave.
+    """
+    condiciones, params = ["c.anulado = FALSE"], []
+    if fecha_inicio:
+        condiciones.append("c.fecha >= ?")
+        params.append(fecha_inicio)
+    if fecha_fin:
+        condiciones.append("c.fecha <= ?")
+        params.append(fecha_fin)
+    return _paginas_por_clave(
+        "SELECT c.fecha, c.id as comprobante_id, m.id as movimiento_id, c.tipo as tipo_comprobante, m.cuenta_codigo, "
+        "p.nombre as cuenta_nombre, m.descripcion_detalle, m.debito, m.credito "
+        "FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id JOIN plan_cuentas p ON m.cuenta_codigo = p.codigo",
+        condiciones, params, [("c.fecha", "fecha"), ("c.id", "comprobante_id"), ("m.id", "movimiento_id")],
+        False, tamano_pagina, despues_de, condicion_indice="(c.fecha, c.id) >= (?, ?)"
+    )
+
+def paginar_comprobantes(filtro_fecha: Optional[str] = None, filtro_tipo: Optional[str] = None, tamano_pagina: int = 50,
+                         despues_de: Optional[Tuple[str, int]] = None) -> Iterator[List[sqlite3.Row]]:
+    """Comprobantes no anulados por páginas, del más reciente al más antiguo (fecha, id)."""
+    condiciones, params = ["anulado = FALSE"], []
+    if filtro_fecha:
+        condiciones.append("fecha = ?")
+        params.append(filtro_fecha)
+    if filtro_tipo:
+        condiciones.append("tipo = ?")
+        params.append(filtro_tipo)
+    return _paginas_por_clave(
+        "SELECT id, fecha, tipo, descripcion, total_debito, total_credito FROM comprobantes",
+        condiciones, params, [("fecha", "fecha"), ("id", "id")], True, tamano_pagina, despues_de
+    )
+
+def paginar_facturas(tamano_pagina: int = 50, despues_de: Optional[Tuple[str, int]] = None) -> Iterator[List[sqlite3.Row]]:
+    """Facturas por páginas, de la más reciente a la más antigua (fecha_emision, id)."""
+    return _paginas_por_clave(
+        "SELECT f.id, f.fecha_emision, f.total, f.estado, t.nombre as cliente_nombre FROM facturas f JOIN terceros t ON f.tercero_id = t.id",
+        [], [], [("f.fecha_emision", "fecha_emision"), ("f.id", "id")], True, tamano_pagina, despues_de
+    )
+
+def paginar_compras(tamano_pagina: int = 50, despues_de: Optional[Tuple[str, int]] = None) -> Iterator[List[sqlite3.Row]]:
+    """Compras por páginas, de la más reciente a la más antigua (fecha_emision, id)."""
+    return _paginas_por_clave(
+        "SELECT c.id, c.fecha_emision, c.total, c.estado, t.nombre as proveedor_nombre FROM compras c JOIN terceros t ON c.tercero_id = t.id",
+        [], [], [("c.fecha_emision", "fecha_emision"), ("c.id", "id")], True, tamano_pagina, despues_de
+    )
+
+def paginar_kardex_producto(producto_id: int, tamano_pagina: int = 500, despues_de: Optional[Tuple[str, int]] = None) -> Iterator[List[sqlite3.Row]]:
+    """Kardex de un producto por páginas, en orden (fecha, id)."""
+    return _paginas_por_clave(
+        "SELECT * FROM movimientos_inventario", ["producto_id = ?"], [producto_id],
+        [("fecha", "fecha"), ("id", "id")], False, tamano_pagina, despues_de
+    )
+
+def _subconsultas_totales(fecha_inicio: Optional[str], fecha_fin: Optional[str], fecha_inicio_ejercicio: Optional[str] = None) -> Tuple[List[str], List[Any]]:
+    """
+    Construye las subconsultas (unidas con UNION ALL) que devuelven
+    (cuenta_codigo, debito, credito, en_ejercicio) para un rango de fechas:
+    los meses completos salen de `saldos_periodo` y los meses parciales de los
+    extremos salen de `movimientos`. `en_ejercicio` marca las filas con fecha
+    igual o posterior a `fecha_inicio_ejercicio`, que debe ser primer día de mes.
+    """
+    partes, params = [], []
+    periodo_desde, periodo_hasta, tramos = _dividir_rango_en_periodos(fecha_inicio, fecha_fin)
+    if periodo_desde is not False:
+        sub = "SELECT cuenta_codigo, total_debito AS debito, total_credito AS credito, "
+        if fecha_inicio_ejercicio:
+            sub += "periodo >= ? AS en_ejercicio FROM saldos_periodo"
+            params.append(fecha_inicio_ejercicio[:7])
+        else:
+            sub += "0 AS en_ejercicio FROM saldos_periodo"
+        condiciones = []
+        if periodo_desde:
+            condiciones.append("periodo >= ?")
+            params.append(periodo_desde)
+        if periodo_hasta:
+            condiciones.append("periodo <= ?")
+            params.append(periodo_hasta)
+        if condiciones:
+            sub += " WHERE " + " AND ".join(condiciones)
+        partes.append(sub)
+    for desde, hasta, hasta_exclusivo in tramos:
+        sub = "SELECT m.cuenta_codigo, m.debito, m.credito, "
+        if fecha_inicio_ejercicio:
+            sub += "c.fecha >= ? AS en_ejercicio"
+            params.append(fecha_inicio_ejercicio)
+        else:
+            sub += "0 AS en_ejercicio"
+        sub += " FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id WHERE c.anulado = FALSE"
+        if desde:
+            sub += " AND c.fecha >= ?"
+            params.append(desde)
+        if hasta:
+            sub += " AND c.fecha < ?" if hasta_exclusivo else " AND c.fecha <= ?"
+            params.append(hasta)
+        partes.append(sub)
+    return partes, params
+
+def obtener_totales_por_cuenta(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Suma en SQLite los débitos y créditos de cada cuenta del plan en un rango de fechas.
+    Los meses completos del rango se leen de `saldos_periodo`; solo los meses
+    parciales de los extremos se suman desde `movimientos`.
+    Devuelve una fila por cuenta con movimientos (codigo, nombre, naturaleza,
+    total_debito, total_credito), ordenadas por código.
+    """
+    conn = None
+    try:
+        partes, params = _subconsultas_totales(fecha_inicio, fecha_fin)
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        query = f"SELECT p.codigo, p.nombre, p.naturaleza, SUM(t.debito) AS total_debito, SUM(t.credito) AS total_credito FROM ({' UNION ALL '.join(partes)}) t JOIN plan_cuentas p ON t.cuenta_codigo = p.codigo GROUP BY p.codigo ORDER BY p.codigo"
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener totales por cuenta: {e}")
+        return []
+    finally:
+        close_connection(conn)
+
+def obtener_totales_por_cuenta_al_corte(fecha_corte: str, fecha_inicio_ejercicio: str) -> List[Dict[str, Any]]:
+    """
+    En una sola consulta, obtiene por cuenta los totales acumulados desde el
+    inicio de los registros hasta `fecha_corte` (total_debito, total_credito) y
+    los del ejercicio entre `fecha_inicio_ejercicio` y `fecha_corte`
+    (debito_ejercicio, credito_ejercicio).
+    """
+    conn = None
+    try:
+        partes, params = _subconsultas_totales(None, fecha_corte, fecha_inicio_ejercicio)
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        query = (
+            "SELECT p.codigo, p.nombre, p.naturaleza, SUM(t.debito) AS total_debito, SUM(t.credito) AS total_credito, "
+            "SUM(CASE WHEN t.en_ejercicio THEN t.debito ELSE 0.0 END) AS debito_ejercicio, "
+            "SUM(CASE WHEN t.en_ejercicio THEN t.credito ELSE 0.0 END) AS credito_ejercicio "
+            f"FROM ({' UNION ALL '.join(partes)}) t JOIN plan_cuentas p ON t.cuenta_codigo = p.codigo GROUP BY p.codigo ORDER BY p.codigo"
+        )
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener totales por cuenta al corte {fecha_corte}: {e}")
+        return []
+    finally:
+        close_connection(conn)
+
+# --- Saldos Materializados por Período ---
+
+def _periodo_siguiente(periodo: str) -> str:
+    ano, mes = int(periodo[:4]), int(periodo[5:7])
+    return f"{ano + mes // 12}-{mes % 12 + 1:02d}"
+
+def _periodo_anterior(periodo: str) -> str:
+    ano, mes = int(periodo[:4]), int(periodo[5:7])
+    return f"{ano - 1}-12" if mes == 1 else f"{ano}-{mes - 1:02d}"
+
+def _dividir_rango_en_periodos(fecha_inicio: Optional[str], fecha_fin: Optional[str]):
+    """
+    Divide un rango de fechas en meses completos (servidos por `saldos_periodo`)
+    y tramos parciales en los extremos (servidos por `movimientos`).
+    Devuelve (periodo_desde, periodo_hasta, tramos). Un periodo en None indica
+    rango abierto; `periodo_desde` en False indica que no hay meses completos.
+    Cada tramo es (desde, hasta, hasta_exclusivo).
+    """
+    try:
+        inicio = datetime.date.fromisoformat(fecha_inicio) if fecha_inicio else None
+        fin = datetime.date.fromisoformat(fecha_fin) if fecha_fin else None
+    except ValueError:
+        return False, False, [(fecha_inicio, fecha_fin, False)]
+
+    periodo_desde = None
+    if inicio:
+        periodo_desde = inicio.strftime("%Y-%m")
+        if inicio.day != 1:
+            periodo_desde = _periodo_siguiente(periodo_desde)
+    periodo_hasta = None
+    if fin:
+        periodo_hasta = fin.strftime("%Y-%m")
+        if (fin + datetime.timedelta(days=1)).day != 1:
+            periodo_hasta = _periodo_anterior(periodo_hasta)
+
+    if periodo_desde and periodo_hasta and periodo_desde > periodo_hasta:
+        return False, False, [(fecha_inicio, fecha_fin, False)]
+
+    tramos = []
+    if inicio and inicio.day != 1:
+        tramos.append((fecha_inicio, f"{periodo_desde}-01", True))
+    if fin and periodo_hasta != fin.strftime("%Y-%m"):
+        tramos.append((f"{fin.strftime('%Y-%m')}-01", fecha_fin, False))
+    return periodo_desde, periodo_hasta, tramos
+
+def _acumular_saldos_periodo(cursor: sqlite3.Cursor, fecha: str, movimientos: List[Tuple[str, float, float]]):
+    """
+    Suma (cuenta_codigo, debito, credito) al saldo del período de `fecha`.
+    Debe ejecutarse dentro de la misma transacción que inserta los movimientos.
+    """
+    periodo = fecha[:7]
+    acumulado: Dict[str, List[float]] = {}
+    for cuenta_codigo, debito, credito in movimientos:
+        totales = acumulado.setdefault(cuenta_codigo, [0.0, 0.0])
+        totales[0] += debito
+        totales[1] += credito
+    cursor.executemany(
+        """
+        INSERT INTO saldos_periodo (periodo, cuenta_codigo, total_debito, total_credito) VALUES (?, ?, ?, ?)
+        ON CONFLICT(periodo, cuenta_codigo) DO UPDATE SET
+            total_debito = total_debito + excluded.total_debito,
+            total_credito = total_credito + excluded.total_credito
+        """,
+        [(periodo, cuenta, d, c) for cuenta, (d, c) in acumulado.items()]
+    )
+
+def _recalcular_saldos_periodo(cursor: sqlite3.Cursor, periodo: str, cuentas: List[str]):
+    """Recalcula desde `movimientos` el saldo de las cuentas indicadas en un período."""
+    cursor.executemany(
+        """
+        UPDATE saldos_periodo SET
+            total_debito = COALESCE((SELECT SUM(m.debito) FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id
+                                     WHERE c.anulado = FALSE AND c.fecha >= ? AND c.fecha < ? AND m.cuenta_codigo = saldos_periodo.cuenta_codigo), 0.0),
+            total_credito = COALESCE((SELECT SUM(m.credito) FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id
+                                      WHERE c.anulado = FALSE AND c.fecha >= ? AND c.fecha < ? AND m.cuenta_codigo = saldos_periodo.cuenta_codigo), 0.0)
+        WHERE periodo = ? AND cuenta_codigo = ?
+        """,
+        [(periodo, _periodo_siguiente(periodo), periodo, _periodo_siguiente(periodo), periodo, cuenta) for cuenta in cuentas]
+    )
+
+_SQL_SALDOS_DESDE_MOVIMIENTOS = """
+    SELECT substr(c.fecha, 1, 7) AS periodo, m.cuenta_codigo, SUM(m.debito) AS total_debito, SUM(m.credito) AS total_credito
+    FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id
+    WHERE c.anulado = FALSE
+    GROUP BY substr(c.fecha, 1, 7), m.cuenta_codigo
+"""
+
+def reconstruir_saldos_periodo() -> int:
+    """Recalcula desde cero la tabla `saldos_periodo`. Devuelve el número de filas generadas."""
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE;")
+        cursor.execute("DELETE FROM saldos_periodo")
+        cursor.execute(f"INSERT INTO saldos_periodo (periodo, cuenta_codigo, total_debito, total_credito) {_SQL_SALDOS_DESDE_MOVIMIENTOS}")
+        filas = cursor.rowcount
+        conn.commit()
+        logger.info(f"Tabla saldos_periodo reconstruida con {filas} filas.")
+        return filas
+    except sqlite3.Error as e:
+        logger.error(f"Error al reconstruir saldos_periodo: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        close_connection(conn)
+
+def verificar_saldos_periodo(tolerancia: float = 0.005) -> List[Dict[str, Any]]:
+    """
+    Compara `saldos_periodo` con los saldos recalculados desde `movimientos`.
+    Devuelve las diferencias (vacío si la tabla es consistente).
+    """
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT periodo, cuenta_codigo, total_debito, total_credito FROM saldos_periodo")
+        tabla = {(r['periodo'], r['cuenta_codigo']): (r['total_debito'], r['total_credito']) for r in cursor.fetchall()}
+        cursor.execute(_SQL_SALDOS_DESDE_MOVIMIENTOS)
+        real = {(r['periodo'], r['cuenta_codigo']): (r['total_debito'], r['total_credito']) for r in cursor.fetchall()}
+    except sqlite3.Error as e:
+        logger.error(f"Error al verificar saldos_periodo: {e}")
+        raise
+    finally:
+        close_connection(conn)
+
+    diferencias = []
+    for llave in sorted(tabla.keys() | real.keys()):
+        debito_tabla, credito_tabla = tabla.get(llave, (0.0, 0.0))
+        debito_real, credito_real = real.get(llave, (0.0, 0.0))
+        if abs(debito_tabla - debito_real) > tolerancia or abs(credito_tabla - credito_real) > tolerancia:
+            diferencias.append({
+                "periodo": llave[0], "cuenta_codigo": llave[1],
+                "debito_tabla": debito_tabla, "debito_real": debito_real,
+                "credito_tabla": credito_tabla, "credito_real": credito_real,
+            })
+    return diferencias
+
 # --- Funciones para Compras y Facturas ---
 
 def obtener_facturas(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
@@ -592,18 +2300,55 @@ def obtener_facturas(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
     finally:
         close_connection(conn)
 
+def insertar_factura_db(conn: sqlite3.Connection, tercero_id: int, fecha_emision: str, fecha_vencimiento: Optional[str], total: float, estado: str, items: List[Dict[str, Any]]) -> int:
+    """Inserta la cabecera y los ítems de una factura usando una conexión existente. Devuelve el ID de la factura."""
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO facturas (tercero_id, fecha_emision, fecha_vencimiento, total, estado) VALUES (?, ?, ?, ?, ?)", (tercero_id, fecha_emision, fecha_vencimiento, total, estado))
+    factura_id = cursor.lastrowid
+    if not factura_id:
+        raise sqlite3.Error("No se pudo obtener el ID de la factura insertada.")
+    items_to_insert = [(factura_id, item['descripcion'], item['cantidad'], item['precio_unitario'], item['subtotal'], item.get('impuesto_porcentaje', 0.0)) for item in items]
+    cursor.executemany("INSERT INTO factura_items (factura_id, descripcion, cantidad, precio_unitario, subtotal, impuesto_porcentaje) VALUES (?, ?, ?, ?, ?, ?)", items_to_insert)
+    return factura_id
+
+def enlazar_comprobante_a_factura_db(conn: sqlite3.Connection, factura_id: int, comprobante_id: int):
+    """Enlaza el comprobante de venta a la factura usando una conexión existente."""
+    conn.execute("UPDATE facturas SET comprobante_id = ? WHERE id = ?", (comprobante_id, factura_id))
+
+def insertar_lote_facturas_db(conn: sqlite3.Connection, facturas: List[Dict[str, Any]]) -> List[int]:
+    """
+    Inserta varias facturas y sus ítems con `executemany` dentro de la transacción del llamador.
+    Cada factura es un dict con 'tercero_id', 'fecha_emision', 'fecha_vencimiento', 'total',
+    'estado' e 'items'. Devuelve los IDs asignados, en el mismo orden.
+    """
+    if not facturas:
+        return []
+    cursor = conn.cursor()
+    ultimo_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM facturas").fetchone()[0]
+    cursor.executemany(
+        "INSERT INTO facturas (tercero_id, fecha_emision, fecha_vencimiento, total, estado) VALUES (?, ?, ?, ?, ?)",
+        [(f['tercero_id'], f['fecha_emision'], f.get('fecha_vencimiento'), f['total'], f['estado']) for f in facturas]
+    )
+    factura_ids = _ids_insertados_desde(cursor, "facturas", ultimo_id)
+    if len(factura_ids) != len(facturas):
+        raise sqlite3.Error("No se pudieron obtener los IDs de las facturas insertadas.")
+    cursor.executemany(
+        "INSERT INTO factura_items (factura_id, descripcion, cantidad, precio_unitario, subtotal, impuesto_porcentaje) VALUES (?, ?, ?, ?, ?, ?)",
+        [(factura_id, item['descripcion'], item['cantidad'], item['precio_unitario'], item['subtotal'], item.get('impuesto_porcentaje', 0.0))
+         for factura_id, factura in zip(factura_ids, facturas) for item in factura['items']]
+    )
+    return factura_ids
+
+def enlazar_comprobantes_a_facturas_db(conn: sqlite3.Connection, enlaces: List[Tuple[int, int]]):
+    """Enlaza varios pares (factura_id, comprobante_id) usando una conexión existente."""
+    conn.executemany("UPDATE facturas SET comprobante_id = ? WHERE id = ?", [(comprobante_id, factura_id) for factura_id, comprobante_id in enlaces])
+
 def crear_factura_db(tercero_id: int, fecha_emision: str, fecha_vencimiento: Optional[str], total: float, estado: str, items: List[Dict[str, Any]]) -> Tuple[bool, Optional[int]]:
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
-        cursor = conn.cursor()
         conn.execute("BEGIN TRANSACTION;")
-        cursor.execute("INSERT INTO facturas (tercero_id, fecha_emision, fecha_vencimiento, total, estado) VALUES (?, ?, ?, ?, ?)", (tercero_id, fecha_emision, fecha_vencimiento, total, estado))
-        factura_id = cursor.lastrowid
-        if not factura_id:
-            raise sqlite3.Error("No se pudo obtener el ID de la factura insertada.")
-        items_to_insert = [(factura_id, item['descripcion'], item['cantidad'], item['precio_unitario'], item['subtotal'], item.get('impuesto_porcentaje', 0.0)) for item in items]
-        cursor.executemany("INSERT INTO factura_items (factura_id, descripcion, cantidad, precio_unitario, subtotal, impuesto_porcentaje) VALUES (?, ?, ?, ?, ?, ?)", items_to_insert)
+        factura_id = insertar_factura_db(conn, tercero_id, fecha_emision, fecha_vencimiento, total, estado, items)
         conn.commit()
         return True, factura_id
     except sqlite3.Error as e:
@@ -641,6 +2386,34 @@ def obtener_compras(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
     finally:
         close_connection(conn)
 
+def insertar_lote_compras_db(conn: sqlite3.Connection, compras: List[Dict[str, Any]]) -> List[int]:
+    """
+    Inserta varias compras y sus ítems con `executemany` dentro de la transacción del llamador.
+    Cada compra es un dict con 'tercero_id', 'fecha_emision', 'fecha_vencimiento', 'total',
+    'estado' e 'items'. Devuelve los IDs asignados, en el mismo orden.
+    """
+    if not compras:
+        return []
+    cursor = conn.cursor()
+    ultimo_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM compras").fetchone()[0]
+    cursor.executemany(
+        "INSERT INTO compras (tercero_id, fecha_emision, fecha_vencimiento, total, estado) VALUES (?, ?, ?, ?, ?)",
+        [(c['tercero_id'], c['fecha_emision'], c.get('fecha_vencimiento'), c['total'], c['estado']) for c in compras]
+    )
+    compra_ids = _ids_insertados_desde(cursor, "compras", ultimo_id)
+    if len(compra_ids) != len(compras):
+        raise sqlite3.Error("No se pudieron obtener los IDs de las compras insertadas.")
+    cursor.executemany(
+        "INSERT INTO compra_items (compra_id, descripcion, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?)",
+        [(compra_id, item['descripcion'], item['cantidad'], item['precio_unitario'], item['subtotal'])
+         for compra_id, compra in zip(compra_ids, compras) for item in compra['items']]
+    )
+    return compra_ids
+
+def enlazar_comprobantes_a_compras_db(conn: sqlite3.Connection, enlaces: List[Tuple[int, int]]):
+    """Enlaza varios pares (compra_id, comprobante_id) usando una conexión existente."""
+    conn.executemany("UPDATE compras SET comprobante_id = ? WHERE id = ?", [(comprobante_id, compra_id) for compra_id, comprobante_id in enlaces])
+
 def crear_compra_db(tercero_id: int, fecha_emision: str, fecha_vencimiento: Optional[str], total: float, estado: str, items: List[Dict[str, Any]]) -> Tuple[bool, Optional[int]]:
     conn = None
     try:
@@ -679,39 +2452,58 @@ def enlazar_comprobante_a_compra(compra_id: int, comprobante_id: int) -> bool:
 # --- Funciones para Conciliación Bancaria ---
 
 def insertar_transacciones_bancarias(transacciones: List[Dict[str, Any]]) -> bool:
+    try:
+        insertar_lote_transacciones_bancarias(transacciones)
+        return True
+    except sqlite3.Error:
+        return False
+
+def insertar_lote_transacciones_bancarias(transacciones: List[Dict[str, Any]]) -> int:
+    """
+    Inserta un lote de transacciones bancarias en una sola transacción con una
+    sentencia preparada. Las que repiten una `referencia` existente se ignoran.
+    Devuelve cuántas se insertaron realmente.
+    """
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
         cursor = conn.cursor()
+        cambios_previos = conn.total_changes
+        conn.execute("BEGIN IMMEDIATE;")
         cursor.executemany("INSERT OR IGNORE INTO transacciones_bancarias (fecha, descripcion, monto, tipo, referencia) VALUES (?, ?, ?, ?, ?)", [(t['fecha'], t['descripcion'], t['monto'], t.get('tipo'), t.get('referencia')) for t in transacciones])
         conn.commit()
-        return True
+        return conn.total_changes - cambios_previos
     except sqlite3.Error as e:
         logger.error(f"Error al insertar transacciones bancarias: {e}")
-        return False
+        if conn:
+            conn.rollback()
+        raise
     finally:
         close_connection(conn)
 
-def obtener_transacciones_bancarias_no_reconciliadas() -> List[Dict[str, Any]]:
+def obtener_transacciones_bancarias_no_reconciliadas(formato: str = 'dict') -> Any:
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM transacciones_bancarias WHERE movimiento_contable_id IS NULL ORDER BY fecha")
-        return [dict(row) for row in cursor.fetchall()]
+        return _leer_resultado(cursor, formato, "TransaccionBancaria",
+                               numericas={'id': 'q', 'monto': 'd'}, compartidas=('fecha', 'tipo'))
     except sqlite3.Error as e:
         logger.error(f"Error al obtener transacciones bancarias no reconciliadas: {e}")
         return []
     finally:
         close_connection(conn)
 
-def obtener_movimientos_contables_no_reconciliados(cuenta_banco_codigo: str) -> List[Dict[str, Any]]:
+def obtener_movimientos_contables_no_reconciliados(cuenta_banco_codigo: str, formato: str = 'dict') -> Any:
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM movimientos WHERE cuenta_codigo = ? AND reconciliado = FALSE AND anulado = FALSE ORDER BY fecha", (cuenta_banco_codigo,))
-        return [dict(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT m.*, c.fecha FROM movimientos m JOIN comprobantes c ON m.comprobante_id = c.id WHERE m.cuenta_codigo = ? AND m.reconciliado = FALSE AND m.anulado = FALSE ORDER BY c.fecha, m.id", (cuenta_banco_codigo,))
+        return _leer_resultado(cursor, formato, "MovimientoContable",
+                               numericas={'id': 'q', 'comprobante_id': 'q', 'debito': 'd', 'credito': 'd'},
+                               compartidas=('fecha', 'cuenta_codigo'))
     except sqlite3.Error as e:
         logger.error(f"Error al obtener movimientos contables no reconciliados: {e}")
         return []
@@ -719,15 +2511,42 @@ def obtener_movimientos_contables_no_reconciliados(cuenta_banco_codigo: str) ->
         close_connection(conn)
 
 def marcar_como_reconciliados(movimiento_id: int, transaccion_id: int) -> bool:
+    return marcar_grupo_como_reconciliado([movimiento_id], [transaccion_id])
+
+def marcar_grupo_como_reconciliado(movimiento_ids: List[int], transaccion_ids: List[int]) -> bool:
+    """
+    Reconcilia en una sola transacción un grupo de movimientos contables con un
+    grupo de transacciones bancarias (1:1, varios movimientos contra una línea del
+    extracto o una línea partida en varias). Cada par queda registrado en
+    `conciliacion_partidas`; las transacciones apuntan al primer movimiento del
+    grupo en `movimiento_contable_id`. Si algún elemento no existe o ya estaba
+    reconciliado no se modifica nada.
+    """
+    movimiento_ids = sorted(set(movimiento_ids))
+    transaccion_ids = sorted(set(transaccion_ids))
+    if not movimiento_ids or not transaccion_ids:
+        return False
     conn = None
     try:
         conn = get_db_connection(DB_CONTABILIDAD_PATH)
         cursor = conn.cursor()
-        conn.execute("BEGIN TRANSACTION;")
-        cursor.execute("UPDATE movimientos SET reconciliado = TRUE WHERE id = ?", (movimiento_id,))
-        cursor.execute("UPDATE transacciones_bancarias SET movimiento_contable_id = ? WHERE id = ?", (movimiento_id, transaccion_id))
-        if cursor.rowcount == 0:
-            raise sqlite3.Error("La transacción bancaria no fue encontrada para actualizar.")
+        conn.execute("BEGIN IMMEDIATE;")
+        cursor.execute(
+            f"UPDATE movimientos SET reconciliado = TRUE WHERE id IN ({','.join('?' * len(movimiento_ids))}) AND reconciliado = FALSE AND anulado = FALSE",
+            movimiento_ids
+        )
+        if cursor.rowcount != len(movimiento_ids):
+            raise sqlite3.Error("Algún movimiento contable no existe, está anulado o ya fue reconciliado.")
+        cursor.execute(
+            f"UPDATE transacciones_bancarias SET movimiento_contable_id = ? WHERE id IN ({','.join('?' * len(transaccion_ids))}) AND movimiento_contable_id IS NULL",
+            [movimiento_ids[0], *transaccion_ids]
+        )
+        if cursor.rowcount != len(transaccion_ids):
+            raise sqlite3.Error("Alguna transacción bancaria no fue encontrada o ya fue reconciliada.")
+        cursor.executemany(
+            "INSERT INTO conciliacion_partidas (transaccion_id, movimiento_id) VALUES (?, ?)",
+            [(t, m) for t in transaccion_ids for m in movimiento_ids]
+        )
         conn.commit()
         return True
     except sqlite3.Error as e:
@@ -737,3 +2556,75 @@ def marcar_como_reconciliados(movimiento_id: int, transaccion_id: int) -> bool:
         return False
     finally:
         close_connection(conn)
+
+def marcar_pares_como_reconciliados(pares: List[Tuple[int, int]]) -> int:
+    """
+    Reconcilia en una sola transacción una lista de pares (movimiento_id, transaccion_id).
+    Los pares cuyo movimiento o transacción no existe, ya está reconciliado o se repite
+    dentro de la lista se omiten. Devuelve el número de pares reconciliados.
+    """
+    if not pares:
+        return 0
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE;")
+        cursor.execute(
+            "SELECT id FROM movimientos WHERE id IN (SELECT value FROM json_each(?)) AND reconciliado = FALSE AND anulado = FALSE",
+            (json.dumps([m for m, _ in pares]),)
+        )
+        movimientos_libres = {row['id'] for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT id FROM transacciones_bancarias WHERE id IN (SELECT value FROM json_each(?)) AND movimiento_contable_id IS NULL",
+            (json.dumps([t for _, t in pares]),)
+        )
+        transacciones_libres = {row['id'] for row in cursor.fetchall()}
+
+        validos = []
+        for movimiento_id, transaccion_id in pares:
+            if movimiento_id in movimientos_libres and transaccion_id in transacciones_libres:
+                movimientos_libres.discard(movimiento_id)
+                transacciones_libres.discard(transaccion_id)
+                validos.append((movimiento_id, transaccion_id))
+        if len(validos) < len(pares):
+            logger.warning(f"Se omitieron {len(pares) - len(validos)} pares ya reconciliados, repetidos o inexistentes.")
+
+        cursor.executemany("UPDATE movimientos SET reconciliado = TRUE WHERE id = ?", [(m,) for m, _ in validos])
+        cursor.executemany("UPDATE transacciones_bancarias SET movimiento_contable_id = ? WHERE id = ?", validos)
+        cursor.executemany("INSERT INTO conciliacion_partidas (transaccion_id, movimiento_id) VALUES (?, ?)", [(t, m) for m, t in validos])
+        conn.commit()
+        return len(validos)
+    except sqlite3.Error as e:
+        logger.error(f"Error al marcar pares como reconciliados: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        close_connection(conn)
+
+def obtener_saldos_mensuales(periodo_hasta: str) -> List[Dict[str, Any]]:
+    """
+    Devuelve los totales materializados de cada cuenta y mes ('AAAA-MM') hasta
+    `periodo_hasta` inclusive, con el nombre y la naturaleza de la cuenta,
+    ordenados por período y código para poder acumularlos en una sola pasada.
+    """
+    conn = None
+    try:
+        conn = get_db_connection(DB_CONTABILIDAD_PATH)
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT s.periodo, p.codigo, p.nombre, p.naturaleza, s.total_debito, s.total_credito
+            FROM saldos_periodo s JOIN plan_cuentas p ON s.cuenta_codigo = p.codigo
+            WHERE s.periodo <= ?
+            ORDER BY s.periodo, p.codigo
+            """,
+            (periodo_hasta,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al obtener saldos mensuales hasta {periodo_hasta}: {e}")
+        return []
+    finally:
+        close_connection(conn)
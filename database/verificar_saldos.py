@@ -0,0 +1,42 @@
+# database/verificar_saldos.py
+"""
+Comando de mantenimiento de la tabla materializada `saldos_periodo`.
+
+Uso:
+    python -m database.verificar_saldos              # Compara la tabla con los movimientos
+    python -m database.verificar_saldos --reconstruir  # La recalcula desde cero y verifica
+    python -m database.verificar_saldos --db ruta/contabilidad.db
+"""
+import argparse
+import sys
+from database import db_manager
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Verifica o reconstruye la tabla saldos_periodo.")
+    parser.add_argument("--db", default=None, help="Ruta de la base de datos de contabilidad.")
+    parser.add_argument("--reconstruir", action="store_true", help="Recalcula la tabla desde los movimientos antes de verificar.")
+    parser.add_argument("--tolerancia", type=float, default=0.005, help="Diferencia máxima aceptada por cuenta y período.")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db_manager.DB_CONTABILIDAD_PATH = args.db
+    db_manager.init_db()
+
+    if args.reconstruir:
+        filas = db_manager.reconstruir_saldos_periodo()
+        print(f"saldos_periodo reconstruida: {filas} filas.")
+
+    diferencias = db_manager.verificar_saldos_periodo(args.tolerancia)
+    if not diferencias:
+        print("saldos_periodo es consistente con los movimientos.")
+        return 0
+
+    print(f"Se encontraron {len(diferencias)} diferencias:")
+    for d in diferencias:
+        print(f"  {d['periodo']} {d['cuenta_codigo']}: "
+              f"débito {d['debito_tabla']:.2f} (tabla) vs {d['debito_real']:.2f} (real), "
+              f"crédito {d['credito_tabla']:.2f} (tabla) vs {d['credito_real']:.2f} (real)")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
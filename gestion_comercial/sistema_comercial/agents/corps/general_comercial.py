@@ -1,6 +1,8 @@
 # gestion_comercial/sistema_comercial/agents/corps/general_comercial.py
 import os
+import asyncio
 from dotenv import load_dotenv
+from utils.micro_graph import transmitir_eventos
 from gestion_comercial.sistema_comercial.agents.corps.units.capitan_ventas import VentasCaptain
 
 # Cargar variables de entorno
@@ -29,3 +31,12 @@ class GeneralComercial:
 
         print(f"General Comercial: Misión completada. Respuesta final: {response}")
         return response
+
+    async def stream_command(self, query: str):
+        """
+        Versión en streaming de process_command: ejecuta la orden en un hilo y entrega como iterador
+        asíncrono los tokens del LLM a medida que llegan ({"tipo": "token", "texto": ...}). El último
+        evento es {"tipo": "fin", "resultado": <respuesta final>}.
+        """
+        async for evento in transmitir_eventos(asyncio.to_thread(self.process_command, query)):
+            yield evento
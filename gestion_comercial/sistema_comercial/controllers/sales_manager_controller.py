@@ -1,5 +1,6 @@
 import flet as ft
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from utils.helpers import ActualizadorPorLotes
 from models.sales_model import SalesModel
 from views.sales_manager_view import SalesManagerView
 
@@ -17,17 +18,19 @@ class SalesManagerController:
         # Add initial greeting
         self.add_message_to_chat("Agente", "Hola, soy tu agente de ventas. Puedes pedirme que busque un cliente o actualice su estado.")
 
-    def add_message_to_chat(self, user: str, text: str, is_user: bool = False):
-        """Helper to add a message to the chat history view."""
+    def add_message_to_chat(self, user: str, text: str, is_user: bool = False) -> ft.Text:
+        """Helper to add a message to the chat history view. Returns the text control so it can be streamed into."""
+        text_control = ft.Text(text, selectable=True, color=ft.Colors.WHITE if not is_user else ft.Colors.BLACK)
         self.view.chat_history.controls.append(
             ft.Container(
-                content=ft.Text(text, selectable=True, color=ft.Colors.WHITE if not is_user else ft.Colors.BLACK),
+                content=text_control,
                 bgcolor=ft.Colors.BLUE_GREY_600 if not is_user else ft.Colors.BLUE_100,
                 padding=10,
                 border_radius=10,
             )
         )
         self.view.update()
+        return text_control
 
     async def send_message_async(self, e):
         """Handles sending a message to the agent and displaying the response."""
@@ -41,15 +44,28 @@ class SalesManagerController:
         self.view.send_button.disabled = True
         self.view.update()
 
+        response_control = None
+        updater = ActualizadorPorLotes(self.view.update)
         try:
             config = {"configurable": {"thread_id": "test_thread"}}
             agent_input = {"messages": [HumanMessage(content=user_text)]}
 
-            response_text = ""
-            # Using ainvoke for simplicity to get the final result
-            final_state = await self.agent_executor.ainvoke(agent_input, config=config)
-            agent_response = final_state["messages"][-1]
+            # Stream LLM tokens ("messages") as they arrive and keep the latest full state ("values").
+            final_state = None
+            async for mode, data in self.agent_executor.astream(agent_input, config=config, stream_mode=["messages", "values"]):
+                if mode == "values":
+                    final_state = data
+                    continue
+                chunk, _metadata = data
+                if isinstance(chunk, AIMessageChunk) and isinstance(chunk.content, str) and chunk.content:
+                    if response_control is None:
+                        self.view.progress_ring.visible = False
+                        response_control = self.add_message_to_chat("Agente", "")
+                    response_control.value += chunk.content
+                    updater.solicitar()
+            updater.vaciar()
 
+            agent_response = final_state["messages"][-1]
             if agent_response.tool_calls:
                 # If the agent ends with a tool call, we show that for debugging.
                 # A more advanced version might parse this into a clearer message.
@@ -57,7 +73,10 @@ class SalesManagerController:
             else:
                 response_text = agent_response.content
 
-            self.add_message_to_chat("Agente", response_text)
+            if response_control is None:
+                self.add_message_to_chat("Agente", response_text)
+            else:
+                response_control.value = response_text
 
         except Exception as ex:
             # Display error message in chat
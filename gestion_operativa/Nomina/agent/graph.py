@@ -8,12 +8,14 @@ from langchain_core.messages import AIMessage
 # Import the tools
 from tools.employee_tools import add_employee, list_employees
 from tools.payroll_tools import calculate_social_security, calculate_parafiscals, calculate_social_benefits, calculate_withholding_tax
+from agent.simple_tool_executor import SimpleToolExecutor
 
 # 1. Define the tools for the agent
 employee_tools = [add_employee, list_employees]
 payroll_tools = [calculate_social_security, calculate_parafiscals, calculate_social_benefits, calculate_withholding_tax]
 tools = employee_tools + payroll_tools
 tool_map = {tool.name: tool for tool in tools}
+tool_executor = SimpleToolExecutor(tool_map)
 
 # 2. Define the model
 # Ensure OPENAI_API_KEY is set in your environment
@@ -40,21 +42,11 @@ def call_model(state):
     return {"messages": [response]}
 
 def call_tool(state):
-    """Executes tool calls and returns the results."""
+    """Executes the tool calls of the last message concurrently and returns the results in order."""
     last_message: AIMessage = state['messages'][-1]
-    tool_messages = []
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call["name"]
-        if tool_name in tool_map:
-            tool_function = tool_map[tool_name]
-            tool_args = tool_call["args"]
-            try:
-                result = tool_function.invoke(tool_args)
-                tool_messages.append(ToolMessage(content=str(result), tool_call_id=tool_call['id']))
-            except Exception as e:
-                tool_messages.append(ToolMessage(content=f"Error executing tool {tool_name}: {e}", tool_call_id=tool_call['id']))
-        else:
-            tool_messages.append(ToolMessage(content=f"Error: Tool '{tool_name}' not found.", tool_call_id=tool_call['id']))
+    results = tool_executor.batch([(tool_call["name"], tool_call["args"]) for tool_call in last_message.tool_calls])
+    tool_messages = [ToolMessage(content=str(result), tool_call_id=tool_call['id'])
+                     for tool_call, result in zip(last_message.tool_calls, results)]
     return {"messages": tool_messages}
 
 # 5. Define the Graph Logic (Conditional Edges)
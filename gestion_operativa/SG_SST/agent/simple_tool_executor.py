@@ -1,36 +1,108 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
 from langchain_core.messages import FunctionMessage
+from langchain_core.tools import BaseTool
 
 class SimpleToolExecutor:
     """
     Reemplazo directo de ToolExecutor para LangGraph moderno.
     Se encarga de ejecutar un conjunto de tools registrados.
+
+    Las llamadas de un mismo turno del LLM son independientes, así que se ejecutan a la vez:
+    las tools asíncronas (coroutines o tools de LangChain definidas con `async def`) se esperan
+    en el event loop y las síncronas, que suelen consultar la base de datos, van a un pool de
+    hilos acotado a `max_workers`. Los resultados conservan el orden de las llamadas.
     """
 
-    def __init__(self, tools: dict):
+    def __init__(self, tools: dict, max_workers: int = 4, timeout: Optional[float] = None,
+                 tool_timeouts: Optional[Dict[str, float]] = None):
         """
         tools: diccionario {tool_name: callable}
+        timeout: tiempo límite en segundos de cada llamada (None = sin límite). Por defecto no hay
+            límite: una tool síncrona no se puede cancelar y, si escribe en la base de datos, puede
+            terminar confirmando la operación después de que se le dio por vencida.
+        tool_timeouts: tiempos límite por nombre de tool, que reemplazan a `timeout`.
         """
         self.tools = tools
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.ultimas_metricas: List[Dict[str, Any]] = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
 
-    def batch(self, calls: list[tuple[str, dict]]):
+    def _obtener_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            return self._pool
+
+    def _preparar(self, tool: Any, args: dict):
+        """Devuelve la coroutine a esperar: la propia tool si es asíncrona o su ejecución en el pool de hilos."""
+        if isinstance(tool, BaseTool):
+            if getattr(tool, "coroutine", None) is not None:
+                return tool.ainvoke(args or {})
+            llamada = functools.partial(tool.invoke, args or {})
+        elif inspect.iscoroutinefunction(tool):
+            return tool(**args) if args else tool()
+        else:
+            llamada = functools.partial(tool, **args) if args else tool
+        return asyncio.get_running_loop().run_in_executor(self._obtener_pool(), llamada)
+
+    async def _ejecutar(self, name: str, args: dict) -> Tuple[Any, Dict[str, Any]]:
+        inicio = time.perf_counter()
+        tool = self.tools.get(name)
+        if tool is None:
+            resultado, estado = f"Error: Tool '{name}' not found", "no_encontrada"
+        else:
+            limite = self.tool_timeouts.get(name, self.timeout)
+            try:
+                resultado = await asyncio.wait_for(self._preparar(tool, args), limite)
+                estado = "completada"
+            except asyncio.TimeoutError:
+                # Una tool síncrona no se puede interrumpir: su hilo termina en segundo plano y el resultado se descarta,
+                # así que la operación pudo completarse. El mensaje le pide al LLM que no la repita.
+                resultado = (f"Error ejecutando {name}: superó el tiempo límite de {limite} s. El resultado es desconocido: "
+                             f"la operación pudo haberse completado. No la repitas; verifica su estado antes de continuar.")
+                estado = "tiempo_agotado"
+            except Exception as e:
+                resultado, estado = f"Error ejecutando {name}: {str(e)}", "error"
+        return resultado, {"tool": name, "estado": estado, "segundos": time.perf_counter() - inicio}
+
+    async def abatch(self, calls: list[tuple[str, dict]]) -> list:
         """
-        Ejecuta múltiples llamadas a herramientas.
+        Ejecuta múltiples llamadas a herramientas de forma concurrente.
         calls: lista de tuplas (tool_name, args_dict)
         """
-        results = []
-        for name, args in calls:
-            tool = self.tools.get(name)
-            if tool is None:
-                results.append(f"Error: Tool '{name}' not found")
-                continue
+        inicio = time.perf_counter()
+        salidas = await asyncio.gather(*(self._ejecutar(name, args) for name, args in calls))
+        self.ultimas_metricas = [metrica for _, metrica in salidas]
+        total = time.perf_counter() - inicio
+        print(f"[SimpleToolExecutor] {len(calls)} tools en {total:.3f} s "
+              f"(secuencial: {sum(m['segundos'] for m in self.ultimas_metricas):.3f} s)")
+        return [resultado for resultado, _ in salidas]
 
-            try:
-                # Si la tool es async
-                if callable(getattr(tool, "__call__", None)) and hasattr(tool, "__call__") and getattr(tool, "__call__").__class__.__name__ == "coroutine":
-                    # ⚠️ Si usas asyncio deberías hacer await aquí, pero para mantener compatibilidad:
-                    results.append("Error: Async tools need explicit await handling")
-                else:
-                    results.append(tool(**args) if args else tool())
-            except Exception as e:
-                results.append(f"Error ejecutando {name}: {str(e)}")
-        return results
+    def batch(self, calls: list[tuple[str, dict]]):
+        """
+        Versión síncrona de `abatch` para nodos síncronos. Si el hilo actual ya tiene un event loop
+        en marcha, el lote se ejecuta en un loop propio dentro de otro hilo.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.abatch(calls))
+        with ThreadPoolExecutor(max_workers=1) as hilo:
+            return hilo.submit(asyncio.run, self.abatch(calls)).result()
+
+    def close(self):
+        """Libera los hilos del pool."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
@@ -1,3 +1,4 @@
+import asyncio
 import flet as ft
 from typing import TypedDict, Annotated, Sequence
 from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
@@ -5,6 +6,7 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
+from utils.micro_graph import transmitir_eventos
 
 # --- Importar Capitanes ---
 from .capitanes.capitan_matriz_peligros import CapitanMatrizPeligros
@@ -68,6 +70,15 @@ class GeneralSGSST:
         print(f"General de SG-SST: Misión completada. Resultado: {result}")
         return result
 
+    async def stream_command(self, query: str):
+        """
+        Versión en streaming de process_command: ejecuta la orden en un hilo y entrega como iterador
+        asíncrono los tokens del LLM a medida que llegan ({"tipo": "token", "texto": ...}). El último
+        evento es {"tipo": "fin", "resultado": <respuesta final>}.
+        """
+        async for evento in transmitir_eventos(asyncio.to_thread(self.process_command, query)):
+            yield evento
+
 # Bloque de prueba principal (no se usa en la app Flet)
 if __name__ == '__main__':
     # Esta prueba ahora requeriría un objeto 'page' falso (mock),
@@ -5,6 +5,7 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_ollama import ChatOllama
 from langchain_community.llms import LlamaCpp
 from typing import Dict, Any, Union
+from utils.cache_llm import obtener_cache_llm
 
 # Singleton instance for the LLM
 _llm_instance = None
@@ -56,6 +57,8 @@ def initialize_llm(page: ft.Page, config: Dict[str, Any]) -> None:
         _llm_status = "error_unknown_provider"
 
     if llm:
+        # La caché se activa después de la prueba de conexión de Ollama para que esta llegue al servidor.
+        llm.cache = obtener_cache_llm()
         _llm_instance = llm
         _llm_status = "initialized"
         print(f"--- ✅ LLM del proveedor '{provider}' inicializado correctamente. ---")
@@ -1,6 +1,8 @@
 # inventario/agents/corps/general_inventario.py
 import os
+import asyncio
 from dotenv import load_dotenv
+from utils.micro_graph import transmitir_eventos
 from inventario.agents.corps.units.capitan_inventario import InventarioCaptain
 
 # Cargar variables de entorno
@@ -32,6 +34,15 @@ class InventarioGeneral:
         print(f"General de Inventario: Misión completada. Respuesta final: {response}")
         return response
 
+    async def stream_command(self, query: str):
+        """
+        Versión en streaming de process_command: ejecuta la orden en un hilo y entrega como iterador
+        asíncrono los tokens del LLM a medida que llegan ({"tipo": "token", "texto": ...}). El último
+        evento es {"tipo": "fin", "resultado": <respuesta final>}.
+        """
+        async for evento in transmitir_eventos(asyncio.to_thread(self.process_command, query)):
+            yield evento
+
 # Ejemplo de uso (para pruebas directas)
 if __name__ == '__main__':
     general = InventarioGeneral()
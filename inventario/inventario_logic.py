@@ -4,6 +4,8 @@ Módulo para la lógica de negocio relacionada con el Inventario.
 """
 import logging
 import csv
+import itertools
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from database import db_manager
 import datetime
@@ -70,50 +72,24 @@ import json
 # Se renombra a una versión interna para evitar confusión con la herramienta
 def _registrar_movimiento_interno(producto_id: int, tipo_movimiento: str, cantidad: float, costo_unitario: float, fecha: str, comprobante_id: Optional[int] = None) -> Tuple[bool, str]:
     """Lógica interna para registrar un movimiento y actualizar el stock."""
-    producto_actual = db_manager.obtener_producto_por_id_db(producto_id)
-    if not producto_actual:
-        msg = f"No se puede registrar movimiento. Producto con ID {producto_id} no encontrado."
-        logger.error(msg)
-        return False, msg
-
-    cantidad_anterior = producto_actual['cantidad_disponible']
-    costo_anterior = producto_actual['costo_unitario_promedio']
-
-    cantidad_cambio = cantidad if tipo_movimiento in ['compra', 'ajuste_positivo'] else -cantidad
-
-    if cantidad_anterior + cantidad_cambio < 0:
-        msg = "Stock insuficiente"
-        logger.error(f"{msg} para el producto ID {producto_id}. Stock actual: {cantidad_anterior}, se intenta sacar: {cantidad}")
-        return False, msg
-
-    cantidad_nueva = cantidad_anterior + cantidad_cambio
-    costo_nuevo_promedio = costo_anterior
-
-    if tipo_movimiento in ['compra', 'ajuste_positivo']:
-        if cantidad_nueva > 0:
-            numerador = (cantidad_anterior * costo_anterior) + (cantidad * costo_unitario)
-            denominador = cantidad_nueva
-            costo_nuevo_promedio = numerador / denominador
-        else:
-            costo_nuevo_promedio = costo_unitario
-
-    conn = db_manager.get_db_connection(db_manager.DB_CONTABILIDAD_PATH)
-    try:
-        with conn:
-            db_manager.crear_movimiento_inventario_db(
-                conn, producto_id, fecha, tipo_movimiento, cantidad, costo_unitario, comprobante_id
-            )
-            db_manager.actualizar_stock_producto_db(
-                conn, producto_id, cantidad_nueva, costo_nuevo_promedio
-            )
-        logger.info(f"Movimiento '{tipo_movimiento}' registrado para producto ID {producto_id}. Nuevo stock: {cantidad_nueva}, nuevo costo prom: {costo_nuevo_promedio:.2f}")
-        return True, "Éxito"
-    except Exception as e:
-        msg = f"Error en la transacción de movimiento de inventario: {e}"
-        logger.error(msg)
-        return False, msg
-    finally:
-        db_manager.close_connection(conn)
+    success, resultado = registrar_movimientos_lote([{
+        'producto_id': producto_id, 'tipo_movimiento': tipo_movimiento, 'cantidad': cantidad,
+        'costo_unitario': costo_unitario, 'fecha': fecha, 'comprobante_id': comprobante_id,
+    }])
+    return (True, "Éxito") if success else (False, resultado)
+
+def registrar_movimientos_lote(movimientos: List[Dict[str, Any]]) -> Tuple[bool, Any]:
+    """
+    Registra varios movimientos de Kardex (de uno o muchos productos) en una sola transacción.
+    Todos se aplican o ninguno. Devuelve (True, costos unitarios registrados por movimiento)
+    o (False, mensaje de error).
+    """
+    success, resultado = db_manager.aplicar_movimientos_inventario_db(movimientos)
+    if success:
+        logger.info(f"Lote de {len(movimientos)} movimientos de inventario registrado.")
+    else:
+        logger.error(f"No se pudo registrar el lote de movimientos de inventario: {resultado}")
+    return success, resultado
 
 @tool
 def registrar_movimiento_inventario(producto_id: int, tipo_movimiento: str, cantidad: float, costo_unitario: float) -> str:
@@ -148,52 +124,101 @@ def obtener_kardex_producto(producto_id: int) -> List[Dict[str, Any]]:
     """
     return db_manager.obtener_movimientos_de_un_producto_db(producto_id)
 
-def importar_productos_csv(filepath: str) -> Dict[str, Any]:
+def obtener_existencias_a_fecha(producto_id: int, fecha: str) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve cantidad, costo promedio y valor de un producto al cierre de `fecha`,
+    según su Kardex.
+    """
+    existencias = db_manager.obtener_existencias_a_fecha_db(fecha, [producto_id])
+    return existencias[0] if existencias else None
+
+def obtener_valoracion_inventario(fecha_corte: str) -> Dict[str, Any]:
+    """
+    Valoración del inventario al cierre de `fecha_corte`: existencias por producto y valor total.
+    Parte de los cortes del Kardex, por lo que su costo depende del número de productos y no
+    del historial de movimientos.
+    """
+    productos = db_manager.obtener_existencias_a_fecha_db(fecha_corte)
+    return {"fecha_corte": fecha_corte, "productos": productos, "valor_total": sum(p['valor'] for p in productos)}
+
+def registrar_cierre_mensual_inventario(fecha_corte: str) -> int:
+    """
+    Guarda los cortes del Kardex al cierre de `fecha_corte` (último día del mes) para que las
+    consultas posteriores a esa fecha solo reproduzcan los movimientos siguientes.
+    Devuelve el número de productos con corte.
+    """
+    cortes = db_manager.registrar_cortes_kardex_db(fecha_corte)
+    logger.info(f"Cierre de inventario al {fecha_corte}: {cortes} cortes de Kardex guardados.")
+    return cortes
+
+def importar_productos_csv(filepath: str, tamano_lote: int = 1000) -> Dict[str, Any]:
     """
     Importa productos desde un archivo CSV.
     Espera un encabezado: nombre,sku,descripcion,costo_inicial,cantidad_inicial
-    Devuelve un diccionario con un resumen de la importación.
+    El archivo se lee por bloques de `tamano_lote` filas; cada bloque válido se inserta en una
+    sola transacción junto con los movimientos de stock inicial. Los SKUs repetidos (en la base
+    de datos o dentro del mismo archivo) se reportan como errores de su fila.
+    Devuelve un diccionario con un resumen de la importación y las filas procesadas por segundo.
     """
     productos_creados = 0
     errores = []
+    filas_leidas = 0
+    inicio = time.perf_counter()
+
+    def resumen_final() -> Dict[str, Any]:
+        duracion = time.perf_counter() - inicio
+        return {"creados": productos_creados, "errores": errores,
+                "filas_por_segundo": filas_leidas / duracion if duracion > 0 else 0.0}
 
     try:
-        with open(filepath, mode='r', encoding='utf-8') as csvfile:
-            # Usar DictReader para leer filas como diccionarios
+        skus_existentes = db_manager.obtener_skus_productos_db()
+        fecha = datetime.date.today().isoformat()
+        with open(filepath, mode='r', encoding='utf-8', newline='') as csvfile:
             reader = csv.DictReader(csvfile)
-            for i, row in enumerate(reader):
-                try:
-                    # Limpiar y convertir datos
-                    nombre = row.get('nombre', '').strip()
-                    sku = row.get('sku', '').strip()
-
-                    if not nombre or not sku:
-                        errores.append(f"Fila {i+2}: 'nombre' y 'sku' son campos obligatorios.")
+            while True:
+                bloque = list(itertools.islice(reader, tamano_lote))
+                if not bloque:
+                    break
+                lote = []
+                for row in bloque:
+                    filas_leidas += 1
+                    numero_fila = filas_leidas + 1
+                    try:
+                        nombre = (row.get('nombre') or '').strip()
+                        sku = (row.get('sku') or '').strip()
+                        if not nombre or not sku:
+                            errores.append(f"Fila {numero_fila}: 'nombre' y 'sku' son campos obligatorios.")
+                            continue
+                        costo = float(row.get('costo_inicial', 0.0) or 0.0)
+                        cantidad = float(row.get('cantidad_inicial', 0.0) or 0.0)
+                        if costo < 0 or cantidad < 0:
+                            errores.append(f"Fila {numero_fila}: El costo y la cantidad iniciales no pueden ser negativos.")
+                            continue
+                    except (KeyError, TypeError, ValueError) as e:
+                        errores.append(f"Fila {numero_fila}: Error de formato o dato faltante - {e}")
                         continue
-
-                    costo = float(row.get('costo_inicial', 0.0) or 0.0)
-                    cantidad = float(row.get('cantidad_inicial', 0.0) or 0.0)
-
-                    success, result = crear_producto(
-                        nombre=nombre,
-                        sku=sku,
-                        descripcion=row.get('descripcion', ''),
-                        costo_inicial=costo,
-                        cantidad_inicial=cantidad
-                    )
-                    if success:
-                        productos_creados += 1
-                    else:
-                        errores.append(f"Fila {i+2}: No se pudo crear el producto con SKU '{sku}' (puede que ya exista).")
-                except (KeyError, TypeError, ValueError) as e:
-                    errores.append(f"Fila {i+2}: Error de formato o dato faltante - {e}")
-
-        resumen = {"creados": productos_creados, "errores": errores}
-        logger.info(f"Importación CSV completada: {resumen}")
+                    if sku in skus_existentes:
+                        errores.append(f"Fila {numero_fila}: No se pudo crear el producto con SKU '{sku}' (puede que ya exista).")
+                        continue
+                    skus_existentes.add(sku)
+                    lote.append({"fila": numero_fila, "nombre": nombre, "sku": sku,
+                                 "descripcion": row.get('descripcion') or '', "costo": costo, "cantidad": cantidad})
+
+                insertados = set(db_manager.insertar_lote_productos_db(lote, fecha))
+                productos_creados += len(insertados)
+                for producto in lote:
+                    # Solo ocurre si otro proceso creó el SKU después de leer el conjunto inicial.
+                    if producto['sku'] not in insertados:
+                        errores.append(f"Fila {producto['fila']}: No se pudo crear el producto con SKU '{producto['sku']}' (puede que ya exista).")
+
+        resumen = resumen_final()
+        logger.info(f"Importación CSV completada: {productos_creados} creados, {len(errores)} errores, {resumen['filas_por_segundo']:.0f} filas/s")
         return resumen
 
     except FileNotFoundError:
-        return {"creados": 0, "errores": [f"El archivo no fue encontrado en la ruta: {filepath}"]}
+        return {"creados": 0, "errores": [f"El archivo no fue encontrado en la ruta: {filepath}"], "filas_por_segundo": 0.0}
     except Exception as e:
         logger.error(f"Error inesperado al procesar el archivo CSV: {e}")
-        return {"creados": 0, "errores": [f"Error inesperado al leer el archivo: {e}"]}
+        resumen = resumen_final()
+        resumen["errores"] = errores + [f"Error inesperado al leer el archivo: {e}"]
+        return resumen
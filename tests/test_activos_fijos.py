@@ -2,11 +2,14 @@ import unittest
 import sys
 import os
 import datetime
+import json
+from unittest.mock import patch
 
 # Añadir el directorio raíz del proyecto al sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from activos_fijos import logic as activos_fijos_logic
+from analisis_financiero import logic as analisis_logic
 from contabilidad import contabilidad_logic
 from database import db_manager
 
@@ -81,7 +84,7 @@ class TestActivosFijosLogic(unittest.TestCase):
         self.assertEqual(len(activos), 1)
         activo = activos[0]
 
-        depreciacion_mensual = activos_fijos_logic._calcular_depreciacion_un_mes(activo)
+        depreciacion_mensual = activos_fijos_logic._calcular_cargo_periodo(activo, acumulada=0.0, meses=0)
 
         # (100000 - 10000) / 60 = 90000 / 60 = 1500
         self.assertAlmostEqual(depreciacion_mensual, 1500.0)
@@ -112,5 +115,275 @@ class TestActivosFijosLogic(unittest.TestCase):
         dep_acum = next(m for m in movimientos if m['cuenta_codigo'] == "1592")
         self.assertEqual(dep_acum['credito'], 1500.0)
 
+class BaseDepreciacion(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con las cuentas de depreciación."""
+        self.db_path = "test_motor_depreciacion.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        for cta in [("1540", "Flota y Equipo de Transporte", "Debito", "Activo"),
+                    ("1592", "Depreciación Acumulada", "Credito", "Activo"),
+                    ("5160", "Gasto Depreciación", "Debito", "Gasto")]:
+            db_manager.agregar_cuenta_puc(*cta)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _activo(self, fecha, costo, residual, vida, metodo="linea_recta", unidades_totales=None):
+        success, activo_id = db_manager.crear_activo_fijo_db(
+            nombre=f"Activo {metodo}", descripcion="", fecha_adquisicion=fecha, costo_adquisicion=costo,
+            valor_residual=residual, vida_util_meses=vida, metodo_depreciacion=metodo, cuenta_activo="1540",
+            cuenta_depreciacion_acumulada="1592", cuenta_gasto_depreciacion="5160", unidades_totales=unidades_totales
+        )
+        self.assertTrue(success)
+        return activo_id
+
+class TestMotorDepreciacion(BaseDepreciacion):
+
+    def test_linea_recta_se_detiene_en_la_base_depreciable(self):
+        """Un activo no se deprecia más allá de su base aunque el rango supere su vida útil."""
+        activo_id = self._activo("2020-01-15", 12000.0, 0.0, 12)
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2020-01", "2021-06")
+        self.assertTrue(success)
+        self.assertEqual(len(resumen['periodos']), 12)
+        self.assertAlmostEqual(resumen['total'], 12000.0)
+        libro = db_manager.obtener_depreciacion_acumulada_db(activo_id)
+        self.assertEqual(libro[-1]['periodo'], "2020-12")
+        self.assertAlmostEqual(libro[-1]['acumulada'], 12000.0)
+
+    def test_linea_recta_cierra_el_redondeo_en_el_ultimo_mes(self):
+        """Los centavos del redondeo se cargan en el último mes de la vida útil, no después."""
+        activo_id = self._activo("2024-01-01", 1000.0, 0.0, 3)
+        self.assertTrue(activos_fijos_logic.ejecutar_depreciacion("2024-01", "2024-06")[0])
+        libro = db_manager.obtener_depreciacion_acumulada_db(activo_id)
+        self.assertEqual([(f['periodo'], f['cargo']) for f in libro], [("2024-01", 333.33), ("2024-02", 333.33), ("2024-03", 333.34)])
+        self.assertAlmostEqual(sum(f['cargo'] for f in libro), 1000.0)
+        self.assertEqual([f['periodo'] for f in activos_fijos_logic.obtener_programa_depreciacion(activo_id)], ["2024-01", "2024-02", "2024-03"])
+
+    def test_repetir_el_proceso_no_duplica_cargos(self):
+        """Los períodos ya depreciados se omiten al repetir o ampliar el rango."""
+        self._activo("2023-01-01", 100000.0, 10000.0, 60)
+        self.assertTrue(activos_fijos_logic.ejecutar_depreciacion("2023-01", "2023-03")[0])
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2023-01", "2023-06")
+        self.assertTrue(success)
+        self.assertEqual([p['periodo'] for p in resumen['periodos']], ["2023-04", "2023-05", "2023-06"])
+        self.assertEqual(activos_fijos_logic.ejecutar_depreciacion("2023-06", "2023-06")[1]['periodos'], [])
+        self.assertEqual(len(db_manager.obtener_comprobantes(filtro_tipo="Depreciación")), 6)
+
+    def test_saldo_decreciente_termina_en_el_residual(self):
+        """El doble saldo decreciente arranca con el doble de la tasa y cierra exactamente en el valor residual."""
+        activo_id = self._activo("2024-01-01", 10000.0, 1000.0, 10, metodo="saldo_decreciente")
+        self.assertTrue(activos_fijos_logic.ejecutar_depreciacion("2024-01", "2024-12")[0])
+        libro = db_manager.obtener_depreciacion_acumulada_db(activo_id)
+        self.assertAlmostEqual(libro[0]['cargo'], 2000.0)
+        self.assertTrue(all(a['cargo'] >= b['cargo'] for a, b in zip(libro, libro[1:])))
+        self.assertEqual(len(libro), 10)
+        self.assertAlmostEqual(libro[-1]['acumulada'], 9000.0)
+
+    def test_unidades_de_produccion(self):
+        """El cargo es proporcional a las unidades del período; sin uso no hay cargo."""
+        activo_id = self._activo("2024-01-01", 6000.0, 1000.0, 60, metodo="unidades_produccion", unidades_totales=1000.0)
+        db_manager.registrar_uso_activo_db(activo_id, "2024-01", 100.0)
+        db_manager.registrar_uso_activo_db(activo_id, "2024-03", 300.0)
+        self.assertTrue(activos_fijos_logic.ejecutar_depreciacion("2024-01", "2024-03")[0])
+        libro = db_manager.obtener_depreciacion_acumulada_db(activo_id)
+        self.assertEqual([(f['periodo'], f['cargo']) for f in libro], [("2024-01", 500.0), ("2024-03", 1500.0)])
+
+    def test_puesta_al_dia_un_comprobante_por_mes(self):
+        """Una corrida de varios años genera un comprobante por mes, fechado el último día, en una transacción."""
+        self._activo("2019-06-10", 36000.0, 0.0, 36)
+        self._activo("2021-03-01", 50000.0, 5000.0, 48, metodo="saldo_decreciente")
+        self._activo("2026-10-01", 1000.0, 0.0, 10)
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2020-01", "2026-09")
+        self.assertTrue(success)
+
+        periodos = [p['periodo'] for p in resumen['periodos']]
+        self.assertEqual(periodos[0], "2020-01")
+        self.assertEqual(len(periodos), len(set(periodos)))
+        comprobantes = {c['fecha'][:7]: c for c in db_manager.obtener_comprobantes(limit=1000, filtro_tipo="Depreciación")}
+        self.assertEqual(len(comprobantes), len(periodos))
+        self.assertEqual(comprobantes["2024-02"]['fecha'], "2024-02-29")
+        # El primer activo completa su base aunque 2019 no se corrió; el tercero aún no se ha adquirido.
+        self.assertAlmostEqual(resumen['total'], 36000.0 + 45000.0)
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+
+    def test_anular_comprobante_retira_sus_cargos(self):
+        """Anular un comprobante de depreciación lo saca del libro y del programa, y el mes puede volver a depreciarse."""
+        activo_id = self._activo("2024-01-01", 12000.0, 0.0, 12)
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2024-01", "2024-03")
+        self.assertTrue(success)
+        self.assertEqual(activos_fijos_logic.actualizar_programas_depreciacion(), 1)
+
+        self.assertTrue(db_manager.anular_comprobante(resumen['periodos'][1]['comprobante_id']))
+        libro = db_manager.obtener_depreciacion_acumulada_db(activo_id)
+        self.assertEqual([(f['periodo'], f['acumulada']) for f in libro], [("2024-01", 1000.0), ("2024-03", 2000.0)])
+        programa = {f['periodo']: f['registrado'] for f in activos_fijos_logic.obtener_programa_depreciacion(activo_id)}
+        self.assertNotIn("2024-02", programa)
+
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2024-01", "2024-03")
+        self.assertEqual([(p['periodo'], p['total']) for p in resumen['periodos']], [("2024-02", 1000.0)])
+
+    def _actualizar_desde_version_9(self, comprobantes_anteriores):
+        """Simula una base anterior al libro: registra comprobantes del proceso mensual antiguo y vuelve a migrar."""
+        for periodo, monto in comprobantes_anteriores:
+            success, _ = db_manager.agregar_comprobante_y_movimientos(
+                f"{periodo}-28", "Depreciación", f"Depreciación para el período {periodo}",
+                [{"cuenta_codigo": "5160", "debito": monto, "credito": 0}, {"cuenta_codigo": "1592", "debito": 0, "credito": monto}], 1)
+            self.assertTrue(success)
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("DELETE FROM esquema_migraciones WHERE version >= 10")
+            conn.commit()
+        db_manager.init_db()
+
+    def test_actualizacion_siembra_el_libro_con_comprobantes_anteriores(self):
+        """Tras migrar una base con depreciación del proceso antiguo, el motor no vuelve a cargar esos meses."""
+        camioneta = self._activo("2023-01-01", 100000.0, 10000.0, 60)   # 1.500 al mes
+        equipo = self._activo("2023-01-01", 3000.0, 0.0, 36)            # 83,33 al mes
+        nuevo = self._activo("2023-04-01", 12000.0, 0.0, 12, metodo="saldo_decreciente")
+        self._actualizar_desde_version_9([(p, 1583.33) for p in ("2023-01", "2023-02", "2023-03")])
+
+        libro = db_manager.obtener_depreciacion_acumulada_db(camioneta)
+        self.assertEqual([(f['periodo'], f['cargo'], f['acumulada']) for f in libro],
+                         [("2023-01", 1500.0, 1500.0), ("2023-02", 1500.0, 3000.0), ("2023-03", 1500.0, 4500.0)])
+        self.assertAlmostEqual(db_manager.obtener_depreciacion_acumulada_db(equipo)[-1]['acumulada'], 249.99)
+        self.assertEqual(db_manager.obtener_depreciacion_acumulada_db(nuevo), [])
+
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2023-01", "2023-04")
+        self.assertTrue(success)
+        self.assertEqual([p['periodo'] for p in resumen['periodos']], ["2023-04"])
+        self.assertAlmostEqual(db_manager.obtener_depreciacion_acumulada_db(camioneta)[-1]['acumulada'], 6000.0)
+
+        # Volver a migrar no siembra dos veces los mismos comprobantes.
+        self._actualizar_desde_version_9([])
+        self.assertEqual(len(db_manager.obtener_depreciacion_acumulada_db(camioneta)), 4)
+
+    def test_actualizacion_de_activo_al_final_de_su_vida(self):
+        """Un activo depreciado por el proceso antiguo casi hasta el final solo recibe lo pendiente, no su base completa."""
+        activo_id = self._activo("2020-01-01", 12000.0, 0.0, 12)
+        self._actualizar_desde_version_9([(f"2020-{mes:02d}", 1000.0) for mes in range(1, 12)])
+        success, resumen = activos_fijos_logic.ejecutar_depreciacion("2021-01", "2021-01")
+        self.assertTrue(success)
+        self.assertAlmostEqual(resumen['total'], 1000.0)
+        self.assertAlmostEqual(db_manager.obtener_depreciacion_acumulada_db(activo_id)[-1]['acumulada'], 12000.0)
+
+    def test_herramienta_mensual(self):
+        """La herramienta mensual delega en el motor."""
+        self._activo("2023-01-01", 100000.0, 10000.0, 60)
+        self.assertTrue(activos_fijos_logic.ejecutar_proceso_depreciacion_mensual.invoke({"ano": 2023, "mes": 1}))
+        self.assertAlmostEqual(db_manager.obtener_comprobantes(limit=1, filtro_tipo="Depreciación")[0]['total_debito'], 1500.0)
+
+    def test_registro_valida_el_metodo(self):
+        """Un método de depreciación desconocido se rechaza antes de crear el activo."""
+        argumentos = {"nombre": "Torno", "descripcion": "", "fecha_adquisicion": "2024-01-01", "costo_adquisicion": 1000.0,
+                      "valor_residual": 0.0, "vida_util_meses": 10, "metodo_depreciacion": "suma_de_digitos", "cuenta_activo": "1540",
+                      "cuenta_dep_acum": "1592", "cuenta_gasto_dep": "5160", "cuenta_contrapartida": "1540"}
+        self.assertIn("no válido", activos_fijos_logic.registrar_activo.invoke(argumentos))
+        argumentos["metodo_depreciacion"] = "unidades_produccion"
+        self.assertIn("unidades_totales", activos_fijos_logic.registrar_activo.invoke(argumentos))
+        self.assertEqual(db_manager.obtener_activos_fijos_db(), [])
+
+    def test_periodos_invalidos(self):
+        """Los períodos fuera del formato 'AAAA-MM' se rechazan con un mensaje, sin registrar nada."""
+        self._activo("2023-01-01", 100000.0, 10000.0, 60)
+        for inicio, fin in [("2023-1", "2023-03"), ("2023-01", "2023-13"), ("enero", "2023-03")]:
+            success, mensaje = activos_fijos_logic.ejecutar_depreciacion(inicio, fin)
+            self.assertFalse(success)
+            self.assertIn("Período inválido", mensaje)
+        resultado = activos_fijos_logic.ejecutar_depreciacion_atrasada.invoke({"periodo_inicio": "2023/01", "periodo_fin": "2023-03"})
+        self.assertTrue(resultado.startswith("Error: Período inválido: '2023/01'"))
+        self.assertEqual(db_manager.obtener_comprobantes(filtro_tipo="Depreciación"), [])
+
+class TestProgramaDepreciacion(BaseDepreciacion):
+
+    def test_programa_coincide_con_el_proceso(self):
+        """El programa proyectado es exactamente lo que luego registra el proceso mensual."""
+        ids = [self._activo("2024-01-20", 12000.0, 0.0, 12), self._activo("2024-03-01", 10000.0, 1000.0, 10, metodo="saldo_decreciente")]
+        programas = {activo_id: activos_fijos_logic.obtener_programa_depreciacion(activo_id) for activo_id in ids}
+        self.assertEqual(len(programas[ids[0]]), 12)
+        self.assertFalse(any(f['registrado'] for f in programas[ids[1]]))
+
+        self.assertTrue(activos_fijos_logic.ejecutar_depreciacion("2024-01", "2025-12")[0])
+        for activo_id in ids:
+            libro = [(f['periodo'], f['cargo'], f['acumulada']) for f in db_manager.obtener_depreciacion_acumulada_db(activo_id)]
+            self.assertEqual([(f['periodo'], f['cargo'], f['acumulada']) for f in programas[activo_id]], libro)
+            self.assertTrue(all(f['registrado'] for f in activos_fijos_logic.obtener_programa_depreciacion(activo_id)))
+
+    def test_proyeccion_por_cuenta_y_periodo(self):
+        """La proyección suma el gasto programado por cuenta de gasto en el rango pedido."""
+        self._activo("2023-01-01", 100000.0, 10000.0, 60)
+        activo_id = self._activo("2024-03-01", 600.0, 0.0, 6)
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("UPDATE activos_fijos SET cuenta_gasto_depreciacion = '5165' WHERE id = ?", (activo_id,))
+            conn.commit()
+
+        por_cuenta = activos_fijos_logic.proyectar_gasto_depreciacion(12, "2024-01")
+        self.assertEqual([(f['cuenta_gasto_depreciacion'], f['total']) for f in por_cuenta], [("5160", 18000.0), ("5165", 600.0)])
+        por_periodo = activos_fijos_logic.proyectar_gasto_depreciacion(3, "2024-01", por_periodo=True)
+        self.assertEqual([(f['periodo'], f['cuenta_gasto_depreciacion'], f['total']) for f in por_periodo],
+                         [("2024-01", "5160", 1500.0), ("2024-02", "5160", 1500.0), ("2024-03", "5160", 1500.0), ("2024-03", "5165", 100.0)])
+        self.assertEqual(activos_fijos_logic.obtener_valor_libros_proyectado(activo_id, "2024-04"), 400.0)
+        self.assertEqual(activos_fijos_logic.obtener_valor_libros_proyectado(activo_id, "2023-12"), 600.0)
+
+    def test_programa_se_recalcula_al_cambiar_el_activo_o_su_uso(self):
+        """Modificar un activo o registrar uso deja su programa obsoleto y la siguiente consulta lo recalcula."""
+        lineal = self._activo("2024-01-01", 12000.0, 0.0, 12)
+        unidades = self._activo("2024-01-01", 5000.0, 0.0, 24, metodo="unidades_produccion", unidades_totales=1000.0)
+        self.assertEqual(activos_fijos_logic.proyectar_gasto_depreciacion(1, "2024-06")[0]['total'], 1000.0)
+        self.assertEqual(activos_fijos_logic.actualizar_programas_depreciacion(), 0)
+
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("UPDATE activos_fijos SET costo_adquisicion = 24000 WHERE id = ?", (lineal,))
+            conn.commit()
+        db_manager.registrar_uso_activo_db(unidades, "2024-01", 40.0)
+        self.assertEqual(activos_fijos_logic.proyectar_gasto_depreciacion(1, "2024-06")[0]['total'], 2000.0 + 200.0)
+        self.assertEqual(activos_fijos_logic.actualizar_programas_depreciacion(), 0)
+
+    def test_proyeccion_lee_el_programa_precalculado(self):
+        """Con el programa al día, la proyección de 2000 activos no recalcula nada y solo lee el índice de períodos."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO activos_fijos (nombre, fecha_adquisicion, costo_adquisicion, valor_residual, vida_util_meses, metodo_depreciacion, "
+                "cuenta_activo, cuenta_depreciacion_acumulada, cuenta_gasto_depreciacion) VALUES (?, ?, ?, 0, 60, ?, '1540', '1592', ?)",
+                [(f"Activo {i}", f"{2020 + i % 6}-{i % 12 + 1:02d}-01", 6000.0 + i, ("linea_recta", "saldo_decreciente")[i % 2], f"51{60 + i % 5}")
+                 for i in range(2000)]
+            )
+            conn.commit()
+        self.assertEqual(activos_fijos_logic.actualizar_programas_depreciacion(), 2000)
+
+        sentencias, conexiones = [], []
+
+        def conectar(path, original=db_manager.get_db_connection):
+            conn = original(path)
+            conn.set_trace_callback(sentencias.append)
+            conexiones.append(conn)
+            return conn
+
+        with patch.object(activos_fijos_logic, '_programa_activo', side_effect=AssertionError("programa recalculado")), \
+             patch.object(db_manager, 'get_db_connection', side_effect=conectar):
+            proyeccion = activos_fijos_logic.proyectar_gasto_depreciacion(12, "2025-01")
+        for conn in conexiones:
+            conn.set_trace_callback(None)
+        self.assertEqual(len(proyeccion), 5)
+
+        consulta = next(s for s in sentencias if "FROM depreciacion_programada" in s)
+        with db_manager.conexion(self.db_path) as conn:
+            plan = [fila[-1] for fila in conn.execute("EXPLAIN QUERY PLAN " + consulta)]
+        self.assertTrue(any("COVERING INDEX idx_depreciacion_programada_periodo" in paso for paso in plan), plan)
+
+    def test_herramienta_de_analisis_financiero(self):
+        """El análisis financiero expone la proyección como herramienta."""
+        self._activo("2023-01-01", 100000.0, 10000.0, 60)
+        resultado = json.loads(analisis_logic.proyectar_gasto_depreciacion.invoke({"num_meses": 12, "desde": "2024-01"}))
+        self.assertEqual(resultado['por_cuenta'], {"5160": 18000.0})
+        self.assertEqual(len(resultado['por_periodo']), 12)
+        self.assertEqual(resultado['total'], 18000.0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,15 @@
 import unittest
 import sys
 import os
+import datetime
+import json
+from unittest.mock import patch
 
 # Añadir el directorio raíz del proyecto al sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from analisis_financiero import logic as analisis_logic
+from database import db_manager
 
 class TestAnalisisFinancieroLogic(unittest.TestCase):
 
@@ -60,5 +64,55 @@ class TestAnalisisFinancieroLogic(unittest.TestCase):
         ratios = analisis_logic.calcular_ratios_liquidez(datos_cero)
         self.assertEqual(ratios['ratio_liquidez_general'], 0.0)
 
+class TestHistorialDeRatio(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con asientos en varios meses."""
+        self.db_path = "test_analisis_financiero.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        for cta in [("110505", "Caja General", "Debito", "Activo"), ("1435", "Mercancías", "Debito", "Activo"),
+                    ("220501", "Proveedores Nacionales", "Credito", "Pasivo"), ("3105", "Capital Suscrito y Pagado", "Credito", "Patrimonio")]:
+            db_manager.agregar_cuenta_puc(*cta)
+        asientos = [
+            ("2024-01-10", [("110505", 1000.0, 0), ("3105", 0, 1000.0)]),
+            ("2024-02-29", [("1435", 500.0, 0), ("220501", 0, 500.0)]),
+            ("2024-03-15", [("220501", 250.0, 0), ("110505", 0, 250.0)]),
+        ]
+        for fecha, movs in asientos:
+            movimientos = [{"cuenta_codigo": c, "debito": d, "credito": cr} for c, d, cr in movs]
+            db_manager.agregar_comprobante_y_movimientos(fecha, "Diario", "Asiento de prueba", movimientos, 1)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_cierres_de_mes_exactos(self):
+        """Los cortes son el último día real de cada mes, cruzando años y bisiestos."""
+        cierres = analisis_logic._cierres_de_mes(datetime.date(2024, 3, 31), 5)
+        self.assertEqual([c.isoformat() for c in cierres], ["2023-11-30", "2023-12-31", "2024-01-31", "2024-02-29", "2024-03-31"])
+
+    def test_historial_por_cierre_de_mes(self):
+        """El historial calcula el ratio a cada cierre de mes."""
+        with patch.object(analisis_logic.datetime, 'date', wraps=datetime.date) as fecha:
+            fecha.today.return_value = datetime.date(2024, 3, 20)
+            resultado = analisis_logic.generar_historial_de_ratio.invoke(
+                {"nombre_ratio": "ratio_liquidez_general", "categoria_ratio": "Ratios de Liquidez", "num_meses": 4})
+        historial = json.loads(resultado)
+        self.assertEqual(historial["labels"], ["Dec 2023", "Jan 2024", "Feb 2024", "Mar 2024"])
+        # Dic: sin datos; Ene: sin pasivos; Feb: 1500 / 500; Mar: 1250 / 250
+        self.assertEqual(historial["values"], [0, 0.0, 3.0, 5.0])
+
+    def test_historial_ratio_inexistente(self):
+        """Un ratio desconocido devuelve un mensaje de error en lugar de ceros."""
+        resultado = analisis_logic.generar_historial_de_ratio.invoke({"nombre_ratio": "no_existe", "categoria_ratio": "Ratios de Liquidez"})
+        self.assertTrue(resultado.startswith("Error"))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import sys
+import os
+import asyncio
+import time
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from database import db_manager
+from utils.cache_llm import CacheLLMSQLite, _separar_prompt
+
+class _LLMLento(FakeListChatModel):
+    """Modelo falso que tarda `demora` segundos por respuesta y cuenta las llamadas reales."""
+    demora: float = 0.05
+    llamadas: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.llamadas += 1
+        time.sleep(self.demora)
+        return super()._call(*args, **kwargs)
+
+class _EmbeddingsPalabras:
+    """Embeddings locales de juguete: bolsa de palabras sobre un vocabulario fijo."""
+    vocabulario = ["balance", "general", "fin", "mes", "abrir", "periodo", "iva"]
+
+    def embed_query(self, texto):
+        palabras = texto.replace(":", " ").split()
+        return [float(palabras.count(p)) for p in self.vocabulario]
+
+class _EmbeddingsCaidos:
+    """Embeddings de un proveedor sin conexión."""
+    def embed_query(self, texto):
+        raise ConnectionError("proveedor de embeddings no disponible")
+
+class TestCacheLLM(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test_cache_llm.db"
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def tearDown(self):
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _cadena(self, cache, respuestas=("capitan_estados_financieros",), modelo="gpt-4o"):
+        llm = _LLMLento(responses=list(respuestas), cache=cache, name=modelo)
+        prompt = ChatPromptTemplate.from_messages([("system", "Eres el General."), ("human", "{query}")])
+        return prompt | llm, llm
+
+    def test_acierto_exacto_con_prompt_normalizado(self):
+        """La misma orden con otro espaciado no vuelve a llamar al LLM y suma la latencia ahorrada."""
+        cache = CacheLLMSQLite(self.db_path)
+        cadena, llm = self._cadena(cache)
+        primera = cadena.invoke({"query": "Genera el balance general a fin de mes"})
+        segunda = asyncio.run(cadena.ainvoke({"query": "  Genera el balance general   a fin de mes "}))
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(llm.llamadas, 1)
+
+        estadisticas = cache.estadisticas()
+        self.assertEqual((estadisticas["consultas"], estadisticas["aciertos_exactos"], estadisticas["entradas"]), (2, 1, 1))
+        self.assertAlmostEqual(estadisticas["tasa_aciertos"], 0.5)
+        self.assertGreaterEqual(estadisticas["segundos_ahorrados"], 0.05)
+
+        # La caché es persistente: otra instancia sobre el mismo archivo también acierta.
+        otra_cadena, otro_llm = self._cadena(CacheLLMSQLite(self.db_path))
+        otra_cadena.invoke({"query": "Genera el balance general a fin de mes"})
+        self.assertEqual(otro_llm.llamadas, 0)
+
+    def test_clave_respeta_mayusculas_y_llamadas_a_tools(self):
+        """Códigos con otra capitalización y historiales con otros argumentos de tools no comparten entrada."""
+        cache = CacheLLMSQLite(self.db_path)
+        cadena, llm = self._cadena(cache, respuestas=("primera", "segunda"))
+        cadena.invoke({"query": "Consulta el stock del producto AB-1"})
+        self.assertEqual(cadena.invoke({"query": "consulta el stock del producto ab-1"}).content, "segunda")
+        self.assertEqual(llm.llamadas, 2)
+
+        def historial(producto_id, cantidad):
+            llamada = AIMessage(content="", tool_calls=[{"name": "registrar_movimiento_inventario", "id": "call_1",
+                                                          "args": {"producto_id": producto_id, "cantidad": cantidad}}])
+            return dumps([SystemMessage(content="Eres el agente"), llamada, ToolMessage(content="ok", tool_call_id="call_1"), HumanMessage(content="¿y ahora?")])
+        self.assertNotEqual(_separar_prompt(historial(1, 5))[0], _separar_prompt(historial(9, 500))[0])
+
+    def test_modelos_con_tools_no_se_cachean(self):
+        """Un modelo con tools enlazadas siempre llama al LLM, salvo que se active cachear_tools."""
+        tools = [{"type": "function", "function": {"name": "cerrar_periodo", "parameters": {}}}]
+        for cachear_tools, llamadas in ((False, 2), (True, 1)):
+            cache = CacheLLMSQLite(self.db_path, cachear_tools=cachear_tools)
+            cache.clear()
+            llm = _LLMLento(responses=["cerrado", "cerrado"], cache=cache).bind(tools=tools)
+            for _ in range(2):
+                llm.invoke("cierra el periodo de fin de mes")
+            self.assertEqual(llm.bound.llamadas, llamadas)
+
+    def test_modelo_distinto_no_comparte_respuestas(self):
+        """La clave incluye el modelo: otro modelo con el mismo prompt sí llama al LLM."""
+        cache = CacheLLMSQLite(self.db_path)
+        self._cadena(cache, modelo="gpt-4o")[0].invoke({"query": "abrir el periodo"})
+        cadena, llm = self._cadena(cache, respuestas=("otra",), modelo="gpt-4o-mini")
+        self.assertEqual(cadena.invoke({"query": "abrir el periodo"}).content, "otra")
+        self.assertEqual(llm.llamadas, 1)
+
+    def test_ttl_y_desalojo_lru(self):
+        """Las entradas vencidas no se usan y al superar el máximo se desaloja la menos usada."""
+        cache = CacheLLMSQLite(self.db_path, ttl_segundos=0)
+        cadena, llm = self._cadena(cache)
+        cadena.invoke({"query": "abrir el periodo"})
+        time.sleep(0.01)
+        cadena.invoke({"query": "abrir el periodo"})
+        self.assertEqual(llm.llamadas, 2)
+
+        cache = CacheLLMSQLite(self.db_path, max_entradas=2)
+        cache.clear()
+        cadena, llm = self._cadena(cache)
+        for orden in ("primera", "segunda", "primera", "tercera"):
+            cadena.invoke({"query": orden})
+        self.assertEqual(cache.estadisticas()["entradas"], 2)
+        cadena.invoke({"query": "primera"})
+        cadena.invoke({"query": "segunda"})
+        self.assertEqual(llm.llamadas, 4)
+
+    def test_coincidencia_semantica(self):
+        """Con embeddings, una orden casi idéntica reutiliza la respuesta; una distinta no."""
+        cache = CacheLLMSQLite(self.db_path, embeddings=_EmbeddingsPalabras(), umbral_similitud=0.9)
+        cadena, llm = self._cadena(cache, respuestas=("capitan_estados_financieros", "capitan_impuestos_sobre_las_ventas_iva"))
+        cadena.invoke({"query": "genera el balance general a fin de mes"})
+        self.assertEqual(cadena.invoke({"query": "por favor, balance general de fin de mes"}).content, "capitan_estados_financieros")
+        self.assertEqual(llm.llamadas, 1)
+        self.assertEqual(cadena.invoke({"query": "declaración de iva"}).content, "capitan_impuestos_sobre_las_ventas_iva")
+        self.assertEqual(cache.estadisticas()["aciertos_semanticos"], 1)
+
+    def test_fallo_de_embeddings_es_un_fallo_de_cache(self):
+        """Si el modelo de embeddings falla, la orden va al LLM y la respuesta se guarda igual para aciertos exactos."""
+        cache = CacheLLMSQLite(self.db_path, embeddings=_EmbeddingsCaidos())
+        cadena, llm = self._cadena(cache, respuestas=("capitan_estados_financieros", "capitan_tesoreria_y_bancos"))
+        self.assertEqual(cadena.invoke({"query": "genera el balance general"}).content, "capitan_estados_financieros")
+        self.assertEqual(cadena.invoke({"query": "genera el balance general"}).content, "capitan_estados_financieros")
+        self.assertEqual(cadena.invoke({"query": "saldo en bancos"}).content, "capitan_tesoreria_y_bancos")
+        self.assertEqual(llm.llamadas, 2)
+        self.assertEqual(cache.estadisticas()["aciertos_exactos"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import sys
+import os
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contabilidad import compras_logic
+from database import db_manager
+
+class TestComprasLote(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos con las cuentas de compras, un proveedor y un producto."""
+        self.db_path = "test_compras_logic.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        cuentas = [
+            ("1435", "Mercancías", "Debito", "Activo"),
+            ("220501", "Proveedores Nacionales", "Credito", "Pasivo"),
+            ("236540", "Retención en la fuente - Compras", "Credito", "Pasivo"),
+            ("240810", "IVA Descontable", "Debito", "Pasivo"),
+            ("5135", "Servicios", "Debito", "Gasto"),
+        ]
+        for cta in cuentas:
+            db_manager.agregar_cuenta_puc(*cta)
+        with db_manager.conexion(self.db_path) as conn:
+            self.tercero_id = conn.execute("INSERT INTO terceros (nombre, nit, tipo) VALUES ('Proveedor de Prueba', '800456', 'Proveedor')").lastrowid
+            conn.commit()
+        _, self.producto_id = db_manager.crear_producto_db("Producto A", "COM-A", "", 10.0, 10.0)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _compra(self, cantidad=10.0, precio=20.0, producto_id=None):
+        return {'tercero_id': self.tercero_id, 'fecha_emision': "2024-05-10", 'concepto_retencion': "compras_generales",
+                'items': [{'producto_id': producto_id or self.producto_id, 'descripcion': "Producto A", 'cantidad': cantidad,
+                           'precio_unitario': precio, 'subtotal': cantidad * precio, 'impuesto_porcentaje': 19.0},
+                          {'descripcion': "Flete", 'cantidad': 1.0, 'precio_unitario': 50.0, 'subtotal': 50.0}]}
+
+    def test_lote_registra_compras_validas(self):
+        """Las compras válidas quedan con asiento, enlace y Kardex; las inválidas se reportan sin escribir nada."""
+        compras = [self._compra(), self._compra(cantidad=0.0), self._compra(producto_id=9999), self._compra(cantidad=20.0, precio=40.0)]
+        resumen = compras_logic.crear_compras_lote(compras, 1, tamano_lote=1)
+
+        self.assertEqual([r['exito'] for r in resumen['resultados']], [True, False, False, True])
+        self.assertIn("no encontrado", resumen['resultados'][2]['error'])
+        self.assertGreater(resumen['documentos_por_segundo'], 0)
+
+        producto = db_manager.obtener_producto_por_id_db(self.producto_id)
+        self.assertEqual(producto['cantidad_disponible'], 40.0)
+        self.assertAlmostEqual(producto['costo_unitario_promedio'], (10 * 10.0 + 10 * 20.0 + 20 * 40.0) / 40)
+        with db_manager.conexion(self.db_path) as conn:
+            enlazadas = conn.execute("SELECT COUNT(*) FROM compras c JOIN comprobantes v ON v.id = c.comprobante_id AND v.fecha = c.fecha_emision").fetchone()[0]
+            kardex = conn.execute("SELECT COUNT(*) FROM movimientos_inventario WHERE tipo_movimiento = 'compra' AND comprobante_id IS NOT NULL").fetchone()[0]
+        self.assertEqual((enlazadas, kardex), (2, 2))
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+
+    def test_cuenta_faltante_rechaza_sin_escribir(self):
+        """Si falta una cuenta del asiento la compra se rechaza en la validación previa."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("DELETE FROM plan_cuentas WHERE codigo = '5135'")
+            conn.commit()
+        db_manager.obtener_cache_puc().invalidar()
+        resumen = compras_logic.crear_compras_lote([self._compra()], 1)
+        self.assertIn("5135", resumen['resultados'][0]['error'])
+        self.assertEqual(db_manager.obtener_producto_por_id_db(self.producto_id)['cantidad_disponible'], 10.0)
+
+    def test_compra_individual_es_atomica(self):
+        """crear_nueva_compra registra todo o nada."""
+        success, compra_id = compras_logic.crear_nueva_compra(self.tercero_id, "2024-05-10", self._compra()['items'], "compras_generales", 1)
+        self.assertTrue(success)
+        self.assertIsNotNone(compra_id)
+        self.assertEqual(compras_logic.crear_nueva_compra(self.tercero_id, "2024-05-10", [], "compras_generales", 1), (False, None))
+
+if __name__ == '__main__':
+    unittest.main()
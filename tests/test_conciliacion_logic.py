@@ -0,0 +1,314 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contabilidad import conciliacion_logic
+from database import db_manager
+
+def _sugerir_referencia(transacciones, movimientos):
+    """Implementación original (búsqueda lineal por cada transacción), usada como referencia."""
+    sugerencias = []
+    movimientos_disponibles = list(movimientos)
+    for trans in transacciones:
+        for i, mov in enumerate(movimientos_disponibles):
+            monto_movimiento = mov['debito'] if trans['monto'] < 0 else mov['credito']
+            if abs(abs(trans['monto']) - monto_movimiento) < 0.01:
+                sugerencias.append({"transaccion": trans, "movimiento": mov})
+                movimientos_disponibles.pop(i)
+                break
+    return sugerencias
+
+def _mov(id, fecha, debito=0.0, credito=0.0, detalle=None):
+    return {"id": id, "fecha": fecha, "debito": debito, "credito": credito, "descripcion_detalle": detalle}
+
+def _trans(id, fecha, monto, descripcion="", referencia=None):
+    return {"id": id, "fecha": fecha, "monto": monto, "descripcion": descripcion, "referencia": referencia}
+
+def _pares(sugerencias):
+    return [(s['transaccion']['id'], s['movimiento']['id']) for s in sugerencias]
+
+class TestSugerirCoincidencias(unittest.TestCase):
+
+    def test_importes_unicos_igual_a_referencia(self):
+        """Con importes sin repetir, el índice sugiere exactamente lo mismo que la búsqueda lineal."""
+        movimientos = [_mov(i, f"2024-03-{i % 28 + 1:02d}", debito=10.0 * i if i % 2 else 0.0, credito=0.0 if i % 2 else 10.0 * i + 0.25)
+                       for i in range(1, 60)]
+        transacciones = [_trans(100 + i, f"2024-03-{(i * 7) % 28 + 1:02d}", -10.0 * i if i % 2 else 10.0 * i + 0.25) for i in range(70, 0, -1)]
+        sugerencias = conciliacion_logic.sugerir_coincidencias(transacciones, movimientos)
+        self.assertEqual(_pares(sugerencias), _pares(_sugerir_referencia(transacciones, movimientos)))
+        self.assertIs(sugerencias[0]['movimiento'], movimientos[58])
+
+    def test_tolerancia_de_un_centavo(self):
+        movimientos = [_mov(1, "2024-03-01", credito=100.006), _mov(2, "2024-03-01", credito=100.01), _mov(3, "2024-03-01", credito=4.34)]
+        transacciones = [_trans(10, "2024-03-01", 100.0), _trans(11, "2024-03-01", 100.0), _trans(12, "2024-03-01", 4.35)]
+        self.assertEqual(_pares(conciliacion_logic.sugerir_coincidencias(transacciones, movimientos)),
+                         _pares(_sugerir_referencia(transacciones, movimientos)))
+
+    def test_desempate_por_fecha_y_ventana(self):
+        """Entre importes iguales gana la fecha más cercana; fuera de la ventana no se sugiere."""
+        movimientos = [_mov(1, "2024-03-01", credito=500.0), _mov(2, "2024-03-18", credito=500.0), _mov(3, "2024-03-09", credito=500.0)]
+        transacciones = [_trans(10, "2024-03-10", 500.0), _trans(11, "2024-03-20", 500.0), _trans(12, "2024-03-30", 500.0)]
+        self.assertEqual(_pares(conciliacion_logic.sugerir_coincidencias(transacciones, movimientos)), [(10, 3), (11, 2), (12, 1)])
+        self.assertEqual(_pares(conciliacion_logic.sugerir_coincidencias(transacciones, movimientos, dias_tolerancia=5)), [(10, 3), (11, 2)])
+
+    def test_desempate_por_descripcion(self):
+        """A igual importe y distancia en días, gana el movimiento con descripción más parecida."""
+        movimientos = [_mov(1, "2024-03-05", debito=80.0, detalle="Pago nómina marzo"),
+                       _mov(2, "2024-03-05", debito=80.0, detalle="Pago factura proveedor Acme 1234"),
+                       _mov(3, "2024-03-05", debito=80.0, detalle="Transferencia a Ahorros")]
+        transacciones = [_trans(10, "2024-03-05", -80.0, "PAGO PROVEEDOR ACME", "FAC-1234"),
+                         _trans(11, "2024-03-05", -80.0, "Nomina Marzo")]
+        self.assertEqual(_pares(conciliacion_logic.sugerir_coincidencias(transacciones, movimientos)), [(10, 2), (11, 1)])
+
+    def test_fechas_fuera_de_iso_o_ilegibles(self):
+        """Las fechas DD/MM/AAAA se leen y las ilegibles no detienen la sugerencia: se comparan sin cercanía."""
+        movimientos = [_mov(1, "2024-03-01", credito=500.0), _mov(2, "2024-03-15", credito=500.0),
+                       _mov(3, "sin fecha", debito=80.0), _mov(4, "2024-03-02", credito=70.0)]
+        transacciones = [_trans(10, "14/03/2024", 500.0), _trans(11, "??", 500.0), _trans(12, "2024-03-05", -80.0),
+                         _trans(13, "", 70.0)]
+        self.assertEqual(_pares(conciliacion_logic.sugerir_coincidencias(transacciones, movimientos)), [(10, 2), (11, 1), (12, 3), (13, 4)])
+        self.assertEqual(_pares(conciliacion_logic.sugerir_coincidencias(transacciones, movimientos, dias_tolerancia=5)), [(10, 2)])
+        grupos = conciliacion_logic.sugerir_coincidencias_agrupadas(transacciones, movimientos)
+        self.assertEqual(_grupos(grupos), [([10], [2]), ([11], [1]), ([12], [3]), ([13], [4])])
+
+    def test_extracto_grande(self):
+        """Un extracto de decenas de miles de líneas se procesa en pocos segundos."""
+        n = 20000
+        movimientos = [_mov(i, f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", credito=float(i % 500 + 1)) for i in range(n)]
+        transacciones = [_trans(i, f"2024-{i % 12 + 1:02d}-{(i + 3) % 28 + 1:02d}", float(i % 500 + 1)) for i in range(n)]
+        inicio = time.perf_counter()
+        sugerencias = conciliacion_logic.sugerir_coincidencias(transacciones, movimientos, dias_tolerancia=10)
+        self.assertLess(time.perf_counter() - inicio, 5.0)
+        self.assertEqual(len({s['movimiento']['id'] for s in sugerencias}), len(sugerencias))
+        self.assertGreater(len(sugerencias), n // 2)
+
+def _grupos(grupos):
+    return [(sorted(t['id'] for t in g['transacciones']), sorted(m['id'] for m in g['movimientos'])) for g in grupos]
+
+class TestSugerirCoincidenciasAgrupadas(unittest.TestCase):
+
+    def test_varios_movimientos_contra_una_consignacion(self):
+        movimientos = [_mov(1, "2024-03-01", credito=100.0), _mov(2, "2024-03-02", credito=250.5), _mov(3, "2024-03-03", credito=49.5),
+                       _mov(4, "2024-03-03", credito=999.0), _mov(5, "2024-03-03", credito=70.0)]
+        transacciones = [_trans(10, "2024-03-04", 400.0), _trans(11, "2024-03-04", 999.0)]
+        self.assertEqual(_grupos(conciliacion_logic.sugerir_coincidencias_agrupadas(transacciones, movimientos)),
+                         [([11], [4]), ([10], [1, 2, 3])])
+
+    def test_un_pago_partido_en_varias_lineas(self):
+        """Un pago contable que el banco registra como valor más comisión e impuesto."""
+        movimientos = [_mov(1, "2024-03-10", debito=1000.0)]
+        transacciones = [_trans(10, "2024-03-10", -985.0), _trans(11, "2024-03-11", -12.0), _trans(12, "2024-03-11", -3.0), _trans(13, "2024-03-11", 15.0)]
+        self.assertEqual(_grupos(conciliacion_logic.sugerir_coincidencias_agrupadas(transacciones, movimientos)), [([10, 11, 12], [1])])
+
+    def test_respeta_ventana_y_tamano_maximo(self):
+        movimientos = [_mov(1, "2024-03-01", credito=75.0), _mov(7, "2024-03-01", credito=25.0), _mov(2, "2024-03-20", credito=300.0),
+                       _mov(3, "2024-03-20", credito=10.0), _mov(4, "2024-03-20", credito=20.0), _mov(5, "2024-03-20", credito=30.0), _mov(6, "2024-03-20", credito=40.0)]
+        transacciones = [_trans(10, "2024-03-21", 400.0), _trans(11, "2024-03-21", 100.0)]
+        sugerir = conciliacion_logic.sugerir_coincidencias_agrupadas
+        self.assertEqual(_grupos(sugerir(transacciones, movimientos, max_elementos=3, dias_tolerancia=5)), [])
+        self.assertEqual(_grupos(sugerir(transacciones, movimientos, max_elementos=4, dias_tolerancia=5)), [([11], [3, 4, 5, 6])])
+        self.assertEqual(_grupos(sugerir(transacciones, movimientos, max_elementos=4, dias_tolerancia=30)), [([10], [1, 2, 7]), ([11], [3, 4, 5, 6])])
+
+    def test_ventana_solo_para_grupos(self):
+        """La ventana de días limita las combinaciones, no las coincidencias 1:1 de importe exacto."""
+        movimientos = [_mov(1, "2024-01-05", credito=500.0), _mov(2, "2024-03-20", credito=60.0), _mov(3, "2024-03-20", credito=40.0)]
+        transacciones = [_trans(10, "2024-03-30", 500.0), _trans(11, "2024-03-21", 100.0)]
+        self.assertEqual(_grupos(conciliacion_logic.sugerir_coincidencias_agrupadas(transacciones, movimientos, dias_tolerancia=3)),
+                         [([10], [1]), ([11], [2, 3])])
+
+    def test_presupuesto_de_tiempo(self):
+        """Una línea sin solución entre muchos candidatos se abandona al agotar su presupuesto."""
+        movimientos = [_mov(i, "2024-03-01", credito=float(2 * i + 2)) for i in range(200)]
+        transacciones = [_trans(10, "2024-03-01", 1000001.0)]
+        inicio = time.perf_counter()
+        grupos = conciliacion_logic.sugerir_coincidencias_agrupadas(transacciones, movimientos, max_elementos=6, max_candidatos=200, presupuesto_ms=50)
+        self.assertEqual(grupos, [])
+        self.assertLess(time.perf_counter() - inicio, 1.0)
+
+    def test_extracto_completo_en_segundos(self):
+        """Un extracto de miles de líneas, con consignaciones agrupadas y líneas sin pareja, termina en segundos."""
+        movimientos, transacciones = [], []
+        for i in range(1500):
+            fecha = f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+            movimientos += [_mov(3 * i, fecha, credito=float(i % 97 + 1)), _mov(3 * i + 1, fecha, credito=float(i % 89 + 5) + 0.25)]
+            transacciones += [_trans(2 * i, fecha, float(i % 97 + 1) + float(i % 89 + 5) + 0.25), _trans(2 * i + 1, fecha, 100000.0 + i)]
+        inicio = time.perf_counter()
+        grupos = conciliacion_logic.sugerir_coincidencias_agrupadas(transacciones, movimientos)
+        self.assertLess(time.perf_counter() - inicio, 10.0)
+        self.assertGreater(len(grupos), 1000)
+
+class TestReconciliarGrupo(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con movimientos en la cuenta de bancos y un extracto."""
+        self.db_path = "test_conciliacion_logic.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        db_manager.agregar_cuenta_puc("111005", "Bancos Moneda Nacional", "Debito", "Activo")
+        db_manager.agregar_cuenta_puc("130505", "Clientes Nacionales", "Debito", "Activo")
+        for fecha, valor in [("2024-03-01", 100.0), ("2024-03-02", 250.5), ("2024-03-02", 49.5)]:
+            movimientos = [{"cuenta_codigo": "111005", "debito": valor, "credito": 0}, {"cuenta_codigo": "130505", "debito": 0, "credito": valor}]
+            db_manager.agregar_comprobante_y_movimientos(fecha, "Recibo de Caja", "Recaudo", movimientos, 1)
+        # Montos negativos frente a débitos de la cuenta de bancos, como compara sugerir_coincidencias
+        db_manager.insertar_transacciones_bancarias([
+            {"fecha": "2024-03-03", "descripcion": "Consignación", "monto": -400.0, "referencia": "C-1"},
+            {"fecha": "2024-03-03", "descripcion": "Consignación", "monto": -50.0, "referencia": "C-2"},
+        ])
+        # Filas compactas, como las entrega obtener_datos_para_conciliacion a la vista
+        self.transacciones, self.movimientos = conciliacion_logic.obtener_datos_para_conciliacion("111005")
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_reconciliar_grupo_sugerido(self):
+        """La sugerencia agrupada se reconcilia de una vez y deja registradas sus partidas."""
+        grupos = conciliacion_logic.sugerir_coincidencias_agrupadas(self.transacciones, self.movimientos)
+        self.assertEqual(len(grupos), 1)
+        grupo = grupos[0]
+        mov_ids = [m['id'] for m in grupo['movimientos']]
+        self.assertTrue(conciliacion_logic.reconciliar_grupo(mov_ids, [t['id'] for t in grupo['transacciones']]))
+
+        self.assertEqual(db_manager.obtener_movimientos_contables_no_reconciliados("111005"), [])
+        self.assertEqual([t['referencia'] for t in db_manager.obtener_transacciones_bancarias_no_reconciliadas()], ["C-2"])
+        with db_manager.conexion(self.db_path) as conn:
+            partidas = conn.execute("SELECT movimiento_id FROM conciliacion_partidas ORDER BY movimiento_id").fetchall()
+        self.assertEqual([p[0] for p in partidas], sorted(mov_ids))
+
+    def test_grupo_con_elemento_ya_reconciliado_no_cambia_nada(self):
+        mov_ids = [m['id'] for m in self.movimientos]
+        c1, c2 = (t['id'] for t in self.transacciones)
+        self.assertTrue(conciliacion_logic.reconciliar_par(mov_ids[0], c2))
+        self.assertFalse(conciliacion_logic.reconciliar_grupo(mov_ids, [c1]))
+        self.assertEqual([m['id'] for m in db_manager.obtener_movimientos_contables_no_reconciliados("111005")], mov_ids[1:])
+        self.assertEqual([t['id'] for t in db_manager.obtener_transacciones_bancarias_no_reconciliadas()], [c1])
+
+class TestImportarExtracto(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba y un directorio para los extractos."""
+        self.db_path = "test_importar_extracto.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        self.directorio = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        self.directorio.cleanup()
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _archivo(self, nombre, contenido):
+        ruta = os.path.join(self.directorio.name, nombre)
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write(contenido)
+        return ruta
+
+    def test_normalizacion_de_importes_y_fechas(self):
+        self.assertEqual(conciliacion_logic.normalizar_monto("$ -1.234,56"), -1234.56)
+        self.assertEqual(conciliacion_logic.normalizar_monto("1,234.5"), 1234.5)
+        self.assertEqual(conciliacion_logic.normalizar_monto("(80.00)"), -80.0)
+        self.assertEqual(conciliacion_logic.normalizar_monto("1234.5678"), 1234.5678)
+        self.assertEqual(conciliacion_logic.normalizar_monto("0.125"), 0.125)
+        self.assertEqual(conciliacion_logic.normalizar_monto("1,234.567"), 1234.567)
+        self.assertEqual(conciliacion_logic.normalizar_monto("15.000"), 15000.0)
+        self.assertEqual(conciliacion_logic.normalizar_monto("1,234,567"), 1234567.0)
+        self.assertEqual(conciliacion_logic.normalizar_fecha("05/03/2024"), "2024-03-05")
+        self.assertEqual(conciliacion_logic.normalizar_fecha("20240305120000[-5:EST]"), "2024-03-05")
+        with self.assertRaises(ValueError):
+            conciliacion_logic.normalizar_fecha("31/02/2024")
+
+    def test_importar_extracto_normaliza_fechas(self):
+        """Las fechas del extracto se guardan como AAAA-MM-DD; las ilegibles se conservan."""
+        self.assertTrue(conciliacion_logic.importar_extracto_bancario([
+            {"fecha": "15/03/2024", "descripcion": "Consignación", "monto": 100.0, "referencia": "A-1"},
+            {"fecha": "pendiente", "descripcion": "Consignación", "monto": 50.0, "referencia": "A-2"},
+        ]))
+        fechas = [t['fecha'] for t in db_manager.obtener_transacciones_bancarias_no_reconciliadas()]
+        self.assertEqual(sorted(fechas), ["2024-03-15", "pendiente"])
+
+    def test_csv_por_lotes_sin_duplicar(self):
+        """Se importa por bloques con progreso; reimportar el mismo extracto no duplica, aun sin referencia."""
+        lineas = ["Fecha;Descripción;Débito;Crédito;Referencia"]
+        lineas += [f"{i % 28 + 1:02d}/03/2024;Movimiento {i};{'1.000,50' if i % 2 else ''};{'' if i % 2 else '2.000'};{'R' + str(i) if i % 3 else ''}" for i in range(250)]
+        lineas += ["fecha mala;Error;10;;X1", "01/03/2024;Cuota de manejo;15.000;;", "01/03/2024;Cuota de manejo;15.000;;"]
+        ruta = self._archivo("extracto.csv", "\n".join(lineas) + "\n")
+
+        avances = list(conciliacion_logic.importar_extracto_por_lotes(ruta, tamano_lote=100))
+        self.assertEqual(len(avances), 4)
+        self.assertTrue(avances[-1]['completado'])
+        self.assertEqual([a['leidas'] for a in avances], [100, 200, 253, 253])
+        self.assertEqual(avances[-1]['insertadas'], 252)
+        self.assertEqual(avances[-1]['errores'], 1)
+        self.assertTrue(all(a['fraccion'] <= b['fraccion'] for a, b in zip(avances, avances[1:])))
+
+        transacciones = {t['descripcion']: t for t in db_manager.obtener_transacciones_bancarias_no_reconciliadas()}
+        self.assertEqual(transacciones["Movimiento 1"]['monto'], -1000.5)
+        self.assertEqual(transacciones["Movimiento 2"]['monto'], 2000.0)
+        self.assertEqual(transacciones["Movimiento 1"]['fecha'], "2024-03-02")
+
+        final = list(conciliacion_logic.importar_extracto_por_lotes(ruta, tamano_lote=100))[-1]
+        self.assertEqual((final['insertadas'], final['duplicadas']), (0, 252))
+
+    def test_ofx(self):
+        contenido = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240305120000[-5:EST]
+<TRNAMT>-150.25
+<FITID>F-001
+<NAME>Pago proveedor
+<MEMO>Factura 123
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240306</DTPOSTED><TRNAMT>500.00</TRNAMT><FITID>F-002</FITID><NAME>Consignación</NAME></STMTTRN>
+<STMTTRN><TRNTYPE>INT</TRNTYPE><DTPOSTED>20240307</DTPOSTED><TRNAMT>1.125</TRNAMT><FITID>F-003</FITID><NAME>Intereses</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+        avances = list(conciliacion_logic.importar_extracto_por_lotes(self._archivo("extracto.ofx", contenido)))
+        self.assertEqual(avances[-1]['insertadas'], 3)
+        transacciones = db_manager.obtener_transacciones_bancarias_no_reconciliadas()
+        # TRNAMT con tres decimales es un importe, no un grupo de miles.
+        self.assertEqual([(t['fecha'], t['monto'], t['referencia'], t['descripcion'], t['tipo']) for t in transacciones], [
+            ("2024-03-05", -150.25, "F-001", "Pago proveedor - Factura 123", "DEBIT"),
+            ("2024-03-06", 500.0, "F-002", "Consignación", "CREDIT"),
+            ("2024-03-07", 1.12, "F-003", "Intereses", "INT"),
+        ])
+
+    def test_confirmacion_masiva(self):
+        """Miles de pares aceptados se reconcilian en una sola transacción, omitiendo los repetidos."""
+        db_manager.agregar_cuenta_puc("111005", "Bancos Moneda Nacional", "Debito", "Activo")
+        db_manager.agregar_cuenta_puc("130505", "Clientes Nacionales", "Debito", "Activo")
+        movimientos = []
+        for i in range(1000):
+            movimientos += [{"cuenta_codigo": "111005", "debito": i + 1.0, "credito": 0}, {"cuenta_codigo": "130505", "debito": 0, "credito": i + 1.0}]
+        db_manager.agregar_comprobante_y_movimientos("2024-03-01", "Recibo de Caja", "Recaudos", movimientos, 1)
+        db_manager.insertar_transacciones_bancarias([{"fecha": "2024-03-01", "descripcion": "Recaudo", "monto": -(i + 1.0), "referencia": f"R{i}"} for i in range(1000)])
+
+        sugerencias = conciliacion_logic.sugerir_coincidencias(db_manager.obtener_transacciones_bancarias_no_reconciliadas(),
+                                                               db_manager.obtener_movimientos_contables_no_reconciliados("111005"))
+        pares = [(s['movimiento']['id'], s['transaccion']['id']) for s in sugerencias]
+        self.assertEqual(len(pares), 1000)
+        self.assertEqual(db_manager.marcar_pares_como_reconciliados(pares[:10] + pares[:10]), 10)
+        grupos = [{"transacciones": [s['transaccion']], "movimientos": [s['movimiento']]} for s in sugerencias]
+        self.assertEqual(conciliacion_logic.confirmar_grupos(grupos), 990)
+        self.assertEqual(db_manager.obtener_transacciones_bancarias_no_reconciliadas(), [])
+        self.assertEqual(db_manager.obtener_movimientos_contables_no_reconciliados("111005"), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+import unittest
+import sys
+import os
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import db_manager, benchmark_memoria
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba en un archivo temporal."""
+        self.db_path = "test_db_manager.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_conexion_reutilizada(self):
+        """Una conexión devuelta al pool se reutiliza en el siguiente checkout."""
+        conn1 = db_manager.get_db_connection(self.db_path)
+        db_manager.close_connection(conn1)
+        conn2 = db_manager.get_db_connection(self.db_path)
+        self.assertIs(conn1, conn2)
+        db_manager.close_connection(conn2)
+
+    def test_pragmas_aplicados(self):
+        """Las conexiones del pool usan WAL, synchronous=NORMAL y claves foráneas."""
+        with db_manager.conexion(self.db_path) as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode;").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous;").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA foreign_keys;").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA busy_timeout;").fetchone()[0], db_manager.DB_BUSY_TIMEOUT_MS)
+
+    def test_checkouts_simultaneos_son_distintos(self):
+        """Dos checkouts activos nunca comparten la misma conexión."""
+        with db_manager.conexion(self.db_path) as conn1, db_manager.conexion(self.db_path) as conn2:
+            self.assertIsNot(conn1, conn2)
+
+    def test_transaccion_pendiente_se_descarta(self):
+        """Una transacción sin commit no sobrevive a la devolución de la conexión."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("BEGIN TRANSACTION;")
+            conn.execute("INSERT INTO plan_cuentas (codigo, nombre, naturaleza, clase) VALUES ('1105', 'Caja', 'Debito', 'Activo')")
+        self.assertIsNone(db_manager.obtener_cuenta_puc_por_codigo('1105'))
+
+    def test_archivo_reemplazado_descarta_conexiones(self):
+        """Si el archivo de la BD se borra, el pool no reutiliza conexiones al archivo anterior."""
+        self.assertTrue(db_manager.agregar_cuenta_puc('1105', 'Caja', 'Debito', 'Activo'))
+        os.remove(self.db_path)
+        db_manager.init_db()
+        self.assertIsNone(db_manager.obtener_cuenta_puc_por_codigo('1105'))
+
+class TestMigraciones(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba en un archivo temporal."""
+        self.db_path = "test_migraciones.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_version_registrada(self):
+        """init_db deja el esquema en la última versión y es idempotente."""
+        ultima_version = db_manager.MIGRACIONES[-1][0]
+        db_manager.init_db()
+        with db_manager.conexion(self.db_path) as conn:
+            self.assertEqual(db_manager.obtener_version_esquema(conn), ultima_version)
+            filas = conn.execute("SELECT COUNT(*) FROM esquema_migraciones").fetchone()[0]
+        self.assertEqual(filas, len(db_manager.MIGRACIONES))
+
+    def _sentencias_ejecutadas(self, funcion, *args) -> list:
+        """Ejecuta una función de db_manager y captura el SQL (con parámetros) que envía a SQLite."""
+        sentencias = []
+        with db_manager.conexion(self.db_path) as conn:
+            conn.set_trace_callback(sentencias.append)
+        # El pool entrega de nuevo la misma conexión (la última devuelta) a la función.
+        try:
+            funcion(*args)
+        finally:
+            with db_manager.conexion(self.db_path) as conn:
+                conn.set_trace_callback(None)
+        return [s for s in sentencias if s.lstrip().upper().startswith("SELECT")]
+
+    def _assert_sin_scan(self, funcion, *args):
+        sentencias = self._sentencias_ejecutadas(funcion, *args)
+        self.assertTrue(sentencias, f"{funcion.__name__} no ejecutó ninguna consulta.")
+        with db_manager.conexion(self.db_path) as conn:
+            for sql in sentencias:
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                recorridos = [paso for paso in plan if paso.startswith("SCAN ")]
+                self.assertEqual(recorridos, [], f"{funcion.__name__} recorre tablas completas: {plan}")
+
+    def test_libro_diario_por_rango_usa_indice(self):
+        self._assert_sin_scan(db_manager.obtener_libro_diario, "2024-01-01", "2024-12-31")
+
+    def test_kardex_producto_usa_indice(self):
+        self._assert_sin_scan(db_manager.obtener_movimientos_de_un_producto_db, 1)
+
+    def test_movimientos_no_reconciliados_usa_indice(self):
+        self._assert_sin_scan(db_manager.obtener_movimientos_contables_no_reconciliados, "111005")
+
+    def test_transacciones_no_reconciliadas_usa_indice(self):
+        self._assert_sin_scan(db_manager.obtener_transacciones_bancarias_no_reconciliadas)
+
+    def test_movimientos_por_comprobante_usa_indice(self):
+        self._assert_sin_scan(db_manager.obtener_movimientos_por_comprobante, 1)
+
+    def test_busqueda_puc_por_codigo_usa_indice(self):
+        self._assert_sin_scan(db_manager.buscar_cuentas_puc, "1105")
+
+    def test_totales_por_cuenta_usa_indice(self):
+        self._assert_sin_scan(db_manager.obtener_totales_por_cuenta, "2024-01-01", "2024-12-31")
+
+    def test_paginas_profundas_usan_indice(self):
+        """Las páginas posteriores a la primera saltan a la clave con el índice, sin recorrer las anteriores."""
+        consultas = [
+            lambda: list(db_manager.paginar_libro_diario("2024-01-01", None, 10, ("2024-06-01", 50, 120))),
+            lambda: list(db_manager.paginar_comprobantes(None, "Diario", 10, ("2024-06-01", 50))),
+            lambda: list(db_manager.paginar_facturas(10, ("2024-06-01", 50))),
+            lambda: list(db_manager.paginar_compras(10, ("2024-06-01", 50))),
+            lambda: list(db_manager.paginar_kardex_producto(1, 10, ("2024-06-01", 50))),
+        ]
+        for consulta in consultas:
+            self._assert_sin_scan(consulta)
+
+class TestPaginacion(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con comprobantes, facturas, compras y Kardex."""
+        self.db_path = "test_paginacion.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        db_manager.agregar_cuenta_puc("110505", "Caja General", "Debito", "Activo")
+        db_manager.agregar_cuenta_puc("4135", "Comercio", "Credito", "Ingreso")
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("INSERT INTO terceros (nombre, nit, tipo) VALUES ('Cliente', '900', 'Cliente')")
+            conn.commit()
+        # Fechas repetidas e insertadas fuera de orden para ejercitar el desempate por id.
+        for i in range(37):
+            fecha = f"2024-{(i * 7) % 12 + 1:02d}-{(i % 3) + 1:02d}"
+            movimientos = [{"cuenta_codigo": "110505", "debito": 100.0 + i, "credito": 0},
+                           {"cuenta_codigo": "4135", "debito": 0, "credito": 60.0 + i},
+                           {"cuenta_codigo": "4135", "debito": 0, "credito": 40.0}]
+            self.assertTrue(db_manager.agregar_comprobante_y_movimientos(fecha, "Diario" if i % 2 else "Ingreso", f"Comprobante {i}", movimientos, 1)[0])
+            db_manager.crear_factura_db(1, fecha, None, 100.0 + i, "Enviada", [])
+            db_manager.crear_compra_db(1, fecha, None, 50.0 + i, "Recibida", [])
+        _, self.producto_id = db_manager.crear_producto_db("Tornillo", "TOR-001", "", 0.0, 0.0)
+        self.assertTrue(db_manager.aplicar_movimientos_inventario_db([
+            {'producto_id': self.producto_id, 'tipo_movimiento': 'compra', 'cantidad': 1, 'costo_unitario': 10.0,
+             'fecha': f"2024-01-{(i * 5) % 28 + 1:02d}"} for i in range(23)])[0])
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _concatenar(self, paginas, tamano):
+        filas = []
+        for pagina in paginas:
+            self.assertLessEqual(len(pagina), tamano)
+            filas.extend(dict(fila) for fila in pagina)
+        return filas
+
+    def test_paginas_igual_a_lectura_completa(self):
+        for tamano in (1, 4, 10, 500):
+            with self.subTest(tamano=tamano):
+                diario = self._concatenar(db_manager.paginar_libro_diario("2024-03-01", "2024-10-31", tamano), tamano)
+                self.assertEqual([{k: v for k, v in f.items() if k != 'movimiento_id'} for f in diario],
+                                 db_manager.obtener_libro_diario("2024-03-01", "2024-10-31"))
+                self.assertEqual(self._concatenar(db_manager.paginar_comprobantes(None, "Diario", tamano), tamano),
+                                 db_manager.obtener_comprobantes(limit=1000, filtro_tipo="Diario"))
+                self.assertEqual(self._concatenar(db_manager.paginar_facturas(tamano), tamano), db_manager.obtener_facturas(limit=1000))
+                self.assertEqual(self._concatenar(db_manager.paginar_compras(tamano), tamano), db_manager.obtener_compras(limit=1000))
+                self.assertEqual(self._concatenar(db_manager.paginar_kardex_producto(self.producto_id, tamano), tamano),
+                                 db_manager.obtener_movimientos_de_un_producto_db(self.producto_id))
+
+    def test_continuar_desde_clave(self):
+        """Con la clave de la última fila se retoma la lectura donde quedó."""
+        primera = next(db_manager.paginar_libro_diario(tamano_pagina=7))
+        ultima = primera[-1]
+        resto = self._concatenar(db_manager.paginar_libro_diario(tamano_pagina=7, despues_de=(ultima['fecha'], ultima['comprobante_id'], ultima['movimiento_id'])), 7)
+        self.assertEqual([dict(f) for f in primera] + resto, self._concatenar(db_manager.paginar_libro_diario(tamano_pagina=1000), 1000))
+
+class TestFormatosCompactos(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con un libro diario sintético."""
+        self.db_path = "test_formatos_compactos.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        benchmark_memoria.generar_libro_sintetico(4000, num_cuentas=20)
+        db_manager.insertar_lote_transacciones_bancarias([
+            {"fecha": f"2022-01-{d:02d}", "descripcion": f"Pago {d}", "monto": -10.0 * d, "tipo": None if d % 2 else "ND", "referencia": f"REF-{d}"}
+            for d in range(1, 29)])
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_formatos_equivalentes(self):
+        """'filas' y 'columnas' contienen exactamente los mismos datos que 'dict'."""
+        lecturas = [
+            lambda formato: db_manager.obtener_libro_diario("2022-03-01", "2023-06-30", formato=formato),
+            lambda formato: db_manager.obtener_movimientos_contables_no_reconciliados("110500", formato=formato),
+            lambda formato: db_manager.obtener_transacciones_bancarias_no_reconciliadas(formato=formato),
+        ]
+        for leer in lecturas:
+            como_dict = leer('dict')
+            filas = leer('filas')
+            columnas = leer('columnas')
+            self.assertGreater(len(como_dict), 0)
+            self.assertEqual([dict(f) for f in filas], como_dict)
+            self.assertEqual(list(columnas.filas()), como_dict)
+            self.assertEqual(len(columnas), len(como_dict))
+
+    def test_filas_se_leen_como_diccionarios(self):
+        fila = db_manager.obtener_libro_diario(formato='filas')[0]
+        self.assertFalse(hasattr(fila, '__dict__'))
+        self.assertEqual(fila['cuenta_codigo'], fila.cuenta_codigo)
+        self.assertEqual(fila.get('no_existe', 'x'), 'x')
+        with self.assertRaises(KeyError):
+            fila['no_existe']
+        columnas = db_manager.obtener_libro_diario(formato='columnas')
+        self.assertEqual(columnas['debito'].typecode, 'd')
+        self.assertAlmostEqual(sum(columnas['debito']), sum(columnas['credito']))
+        with self.assertRaises(ValueError):
+            db_manager.obtener_libro_diario(formato='pandas')
+
+    def test_memoria_menor_que_dict(self):
+        resultados = benchmark_memoria.medir_formatos()
+        self.assertLess(resultados['filas']['memoria_retenida'], resultados['dict']['memoria_retenida'] * 0.6)
+        self.assertLess(resultados['columnas']['memoria_retenida'], resultados['filas']['memoria_retenida'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import asyncio
+from contextlib import redirect_stdout
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contabilidad.agents.corps.enrutador_local import (EnrutadorLocal, EJEMPLOS_GENERAL, REGLAS_GENERAL,
+                                                        EJEMPLOS_PERIODOS, REGLAS_PERIODOS, normalizar_texto, _ngramas)
+from contabilidad.agents.corps.capitanes.capitan_periodos_contables import CapitanPeriodosContablesNode
+
+class TestEnrutadorLocal(unittest.TestCase):
+
+    def setUp(self):
+        self.general = EnrutadorLocal(EJEMPLOS_GENERAL, REGLAS_GENERAL)
+        self.periodos = EnrutadorLocal(EJEMPLOS_PERIODOS, REGLAS_PERIODOS)
+
+    def test_reglas_resuelven_ordenes_claras(self):
+        """Las órdenes con palabras clave inequívocas se resuelven por regla, con o sin tildes."""
+        casos = {
+            "Necesito abrir el periodo contable de Diciembre 2025": "capitan_periodos_contables",
+            "Liquida la DEPRECIACIÓN de los vehículos": "capitan_activos_fijos_contabilidad",
+            "prepara la declaracion de iva": "capitan_impuestos_sobre_las_ventas_iva",
+            "Haz la conciliación bancaria de mayo": "capitan_tesoreria_y_bancos",
+        }
+        for orden, esperado in casos.items():
+            self.assertEqual(self.general.clasificar(orden), (esperado, 1.0, "regla"), orden)
+        self.assertEqual(self.periodos.clasificar("Reabre el periodo de marzo")[0], "equipo_tactico_bloqueo_desbloqueo_de_periodos")
+        self.assertEqual(self.periodos.clasificar("Necesito abrir el periodo contable de Diciembre 2025")[0], "equipo_tactico_apertura_de_periodos")
+
+    def test_clasificador_y_respaldo_al_llm(self):
+        """Sin regla decide el clasificador de n-gramas; las órdenes dudosas o compuestas van al LLM."""
+        self.assertEqual(self.general.clasificar("Cuánto debemos a los acreedores")[::2], ("capitan_cuentas_por_pagar_proveedores", "clasificador"))
+        self.assertEqual(self.periodos.clasificar("Termina el periodo de abril")[::2], ("equipo_tactico_cierre_de_periodos", "clasificador"))
+        self.assertEqual(self.general.clasificar("Hola, ¿cómo estás?")[::2], (None, "llm"))
+        self.assertEqual(self.general.clasificar("Cierra el periodo y genera el balance general")[::2], (None, "llm"))
+
+    def test_tasa_de_aciertos(self):
+        """Las estadísticas cuentan aciertos por fuente."""
+        for orden in ["abrir el periodo contable de enero", "Cuánto debemos a los acreedores", "Hola", "Genera el balance general"]:
+            self.general.enrutar(orden)
+        estadisticas = self.general.estadisticas()
+        self.assertEqual((estadisticas["consultas"], estadisticas["aciertos_reglas"], estadisticas["aciertos_clasificador"],
+                          estadisticas["consultas_llm"]), (4, 2, 1, 1))
+        self.assertAlmostEqual(self.general.tasa_aciertos, 0.75)
+        self.assertIn("microsegundos_promedio", estadisticas)
+
+    def test_clasificador_solo_recorre_los_ngramas_de_la_orden(self):
+        """El índice invertido se consulta una vez por n-grama conocido de la orden, no por cada n-grama entrenado."""
+        class IndiceContado(dict):
+            lecturas = 0
+
+            def __getitem__(self, ngrama):
+                IndiceContado.lecturas += 1
+                return super().__getitem__(ngrama)
+
+        orden = "Cuánto debemos a los acreedores"
+        self.general.indice = IndiceContado(self.general.indice)
+        self.assertEqual(self.general.clasificar(orden)[2], "clasificador")
+        conocidos = [n for n in _ngramas(normalizar_texto(orden)) if n in self.general.idf]
+        self.assertEqual(IndiceContado.lecturas, len(conocidos))
+        self.assertLess(IndiceContado.lecturas, len(self.general.indice) / 10)
+
+    def test_reglas_validan_destinos(self):
+        """Una regla hacia un destino sin ejemplos es un error de configuración."""
+        with self.assertRaises(ValueError):
+            EnrutadorLocal(EJEMPLOS_PERIODOS, [(r"\bcerrar\b", "equipo_inexistente")])
+        self.assertEqual(normalizar_texto("  Depreciación   ÁÑO "), "depreciacion ano")
+
+class TestCapitanConRutaRapida(unittest.TestCase):
+
+    def _ejecutar(self, capitan, orden):
+        with redirect_stdout(StringIO()):
+            return asyncio.run(capitan.execute({"messages": [SimpleNamespace(content=orden)], "next": ""}))
+
+    def test_llm_solo_por_debajo_del_umbral(self):
+        """El Capitán solo consulta al LLM cuando el enrutador local no tiene confianza."""
+        capitan = CapitanPeriodosContablesNode(llm=lambda prompt: prompt)
+        capitan.chain = SimpleNamespace(ainvoke=AsyncMock(return_value=SimpleNamespace(content="equipo_tactico_cierre_de_periodos")))
+
+        self.assertEqual(self._ejecutar(capitan, "Bloquea el periodo de enero"), {"next": "equipo_tactico_bloqueo_desbloqueo_de_periodos"})
+        capitan.chain.ainvoke.assert_not_called()
+
+        self.assertEqual(self._ejecutar(capitan, "¿Qué pasa con el periodo?"), {"next": "equipo_tactico_cierre_de_periodos"})
+        capitan.chain.ainvoke.assert_awaited_once()
+        self.assertAlmostEqual(capitan.enrutador.tasa_aciertos, 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contabilidad import facturacion_logic
+from database import db_manager
+
+class BaseFacturacion(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos con las cuentas de venta, un cliente y dos productos."""
+        self.db_path = "test_facturacion_logic.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        cuentas = [
+            ("130505", "Clientes Nacionales", "Debito", "Activo"),
+            ("1435", "Mercancías", "Debito", "Activo"),
+            ("240801", "IVA Generado", "Credito", "Pasivo"),
+            ("4135", "Comercio al por mayor y al por menor", "Credito", "Ingreso"),
+            ("6135", "Costo de Ventas", "Debito", "Costo Venta"),
+        ]
+        for cta in cuentas:
+            db_manager.agregar_cuenta_puc(*cta)
+        with db_manager.conexion(self.db_path) as conn:
+            self.tercero_id = conn.execute("INSERT INTO terceros (nombre, nit, tipo) VALUES ('Cliente de Prueba', '900123', 'Cliente')").lastrowid
+            conn.commit()
+        _, self.producto_a = db_manager.crear_producto_db("Producto A", "FAC-A", "", 10.0, 5.0)
+        _, self.producto_b = db_manager.crear_producto_db("Producto B", "FAC-B", "", 4.0, 20.0)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _items(self, cantidad_a=2.0, cantidad_b=5.0):
+        return [
+            {'producto_id': self.producto_a, 'descripcion': "Producto A", 'cantidad': cantidad_a, 'precio_unitario': 25.0,
+             'subtotal': 25.0 * cantidad_a, 'impuesto_porcentaje': 19.0},
+            {'producto_id': self.producto_b, 'descripcion': "Producto B", 'cantidad': cantidad_b, 'precio_unitario': 8.0,
+             'subtotal': 8.0 * cantidad_b, 'impuesto_porcentaje': 0.0},
+            {'descripcion': "Servicio de instalación", 'cantidad': 1.0, 'precio_unitario': 30.0, 'subtotal': 30.0},
+        ]
+
+    def _contar(self, tabla):
+        with db_manager.conexion(self.db_path) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+class TestFacturaAtomica(BaseFacturacion):
+
+    def test_factura_completa_en_una_transaccion(self):
+        """La factura, ambos asientos, el Kardex y el enlace quedan registrados y consistentes."""
+        tiempos = {}
+        success, factura_id = facturacion_logic.crear_nueva_factura(self.tercero_id, "2024-05-10", self._items(), 1, tiempos=tiempos)
+        self.assertTrue(success)
+
+        with db_manager.conexion(self.db_path) as conn:
+            factura = conn.execute("SELECT * FROM facturas WHERE id = ?", (factura_id,)).fetchone()
+            num_items = conn.execute("SELECT COUNT(*) FROM factura_items WHERE factura_id = ?", (factura_id,)).fetchone()[0]
+            comprobantes = {row['tipo']: row for row in conn.execute("SELECT * FROM comprobantes")}
+            salidas = conn.execute("SELECT comprobante_id, costo_unitario FROM movimientos_inventario WHERE tipo_movimiento = 'venta' ORDER BY producto_id").fetchall()
+        self.assertAlmostEqual(factura['total'], 50.0 * 1.19 + 40.0 + 30.0)
+        self.assertEqual(num_items, 3)
+        self.assertEqual(comprobantes["Factura de Venta"]['id'], factura['comprobante_id'])
+        self.assertAlmostEqual(comprobantes["Factura de Venta"]['total_debito'], factura['total'])
+        self.assertAlmostEqual(comprobantes["Costo de Venta"]['total_debito'], 2 * 10.0 + 5 * 4.0)
+        self.assertEqual([(s['comprobante_id'], s['costo_unitario']) for s in salidas],
+                         [(factura['comprobante_id'], 10.0), (factura['comprobante_id'], 4.0)])
+        self.assertEqual(db_manager.obtener_producto_por_id_db(self.producto_a)['cantidad_disponible'], 3.0)
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+
+        self.assertEqual(set(tiempos), {'factura', 'asiento_venta', 'inventario', 'costo_venta', 'enlace', 'commit', 'total'})
+        self.assertTrue(all(segundos >= 0 for segundos in tiempos.values()))
+
+    def test_stock_insuficiente_revierte_todo(self):
+        """Si el inventario falla no queda ni la factura ni el asiento de venta ni saldos parciales."""
+        kardex_antes = self._contar("movimientos_inventario")
+        success, factura_id = facturacion_logic.crear_nueva_factura(self.tercero_id, "2024-05-10", self._items(cantidad_a=6.0), 1)
+        self.assertFalse(success)
+        self.assertIsNone(factura_id)
+        for tabla in ("facturas", "factura_items", "comprobantes", "movimientos", "saldos_periodo"):
+            self.assertEqual(self._contar(tabla), 0, tabla)
+        self.assertEqual(self._contar("movimientos_inventario"), kardex_antes)
+        self.assertEqual(db_manager.obtener_producto_por_id_db(self.producto_b)['cantidad_disponible'], 20.0)
+
+    def test_cuenta_inexistente_revierte_todo(self):
+        """Un fallo del asiento de costo (cuenta sin crear) revierte también la venta y el Kardex."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("DELETE FROM plan_cuentas WHERE codigo = '6135'")
+            conn.commit()
+        success, _ = facturacion_logic.crear_nueva_factura(self.tercero_id, "2024-05-10", self._items(), 1)
+        self.assertFalse(success)
+        self.assertEqual(self._contar("facturas"), 0)
+        self.assertEqual(self._contar("comprobantes"), 0)
+        self.assertEqual(db_manager.obtener_producto_por_id_db(self.producto_a)['cantidad_disponible'], 5.0)
+
+    def test_items_invalidos_se_rechazan_antes_de_escribir(self):
+        """Los ítems se validan antes de abrir la transacción."""
+        self.assertEqual(facturacion_logic.crear_nueva_factura(self.tercero_id, "2024-05-10", [], 1), (False, None))
+        self.assertEqual(facturacion_logic.crear_nueva_factura(self.tercero_id, "2024-05-10", self._items(cantidad_b=0.0), 1), (False, None))
+        self.assertEqual(self._contar("facturas"), 0)
+
+class TestFacturasLote(BaseFacturacion):
+
+    def _factura(self, cantidad_a=1.0, cantidad_b=1.0, fecha="2024-05-10"):
+        return {'tercero_id': self.tercero_id, 'fecha_emision': fecha, 'items': self._items(cantidad_a, cantidad_b)}
+
+    def test_lote_valida_stock_acumulado(self):
+        """El stock se valida acumulando las salidas del lote; solo se rechaza la factura que lo excede."""
+        facturas = [self._factura(2.0), self._factura(2.0), self._factura(2.0), self._factura(1.0),
+                    {'tercero_id': self.tercero_id, 'fecha_emision': "2024-05-10", 'items': []}]
+        resumen = facturacion_logic.crear_facturas_lote(facturas, 1, tamano_lote=2)
+
+        self.assertEqual([r['exito'] for r in resumen['resultados']], [True, True, False, True, False])
+        self.assertIn("Stock insuficiente", resumen['resultados'][2]['error'])
+        self.assertEqual((resumen['registrados'], resumen['rechazados']), (3, 2))
+        self.assertGreater(resumen['documentos_por_segundo'], 0)
+        self.assertEqual(db_manager.obtener_producto_por_id_db(self.producto_a)['cantidad_disponible'], 0.0)
+        self.assertEqual(self._contar("facturas"), 3)
+        self.assertEqual(self._contar("comprobantes"), 6)
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+
+    def test_lote_igual_a_facturas_individuales(self):
+        """El lote deja los mismos totales contables que registrar cada factura por separado."""
+        fechas = ["2024-05-10", "2024-05-31", "2024-06-01"]
+        resumen = facturacion_logic.crear_facturas_lote([self._factura(fecha=f) for f in fechas], 1)
+        self.assertEqual(resumen['registrados'], 3)
+        with db_manager.conexion(self.db_path) as conn:
+            en_lote = conn.execute("SELECT periodo, cuenta_codigo, total_debito, total_credito FROM saldos_periodo ORDER BY 1, 2").fetchall()
+            enlaces = conn.execute("SELECT COUNT(*) FROM facturas f JOIN comprobantes c ON c.id = f.comprobante_id AND c.tipo = 'Factura de Venta'").fetchone()[0]
+        self.assertEqual(enlaces, 3)
+
+        self.tearDown()
+        self.setUp()
+        for fecha in fechas:
+            self.assertTrue(facturacion_logic.crear_nueva_factura(self.tercero_id, fecha, self._items(1.0, 1.0), 1)[0])
+        with db_manager.conexion(self.db_path) as conn:
+            individuales = conn.execute("SELECT periodo, cuenta_codigo, total_debito, total_credito FROM saldos_periodo ORDER BY 1, 2").fetchall()
+        self.assertEqual([tuple(r) for r in en_lote], [tuple(r) for r in individuales])
+
+    def test_bloque_fallido_no_afecta_a_los_demas(self):
+        """Si un bloque falla al escribir se revierte solo ese bloque y sus facturas quedan con el error."""
+        original = db_manager.registrar_movimientos_inventario_db
+        llamadas = []
+
+        def falla_segundo_bloque(conn, movimientos):
+            llamadas.append(len(movimientos))
+            if len(llamadas) == 2:
+                raise ValueError("Stock insuficiente")
+            return original(conn, movimientos)
+
+        with patch.object(db_manager, 'registrar_movimientos_inventario_db', side_effect=falla_segundo_bloque):
+            resumen = facturacion_logic.crear_facturas_lote([self._factura() for _ in range(3)], 1, tamano_lote=2)
+        self.assertEqual([r['exito'] for r in resumen['resultados']], [True, True, False])
+        self.assertEqual(self._contar("facturas"), 2)
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+
+    def test_rendimiento_lote(self):
+        """Mil facturas de tres ítems se registran a más de 500 documentos por segundo."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("UPDATE productos SET cantidad_disponible = 100000")
+            conn.commit()
+        resumen = facturacion_logic.crear_facturas_lote([self._factura() for _ in range(1000)], 1)
+        self.assertEqual(resumen['registrados'], 1000)
+        self.assertGreater(resumen['documentos_por_segundo'], 500)
+        self.assertEqual(db_manager.obtener_producto_por_id_db(self.producto_b)['cantidad_disponible'], 99000.0)
+
+if __name__ == '__main__':
+    unittest.main()
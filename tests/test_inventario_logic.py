@@ -4,6 +4,7 @@ import os
 import sqlite3
 import datetime
 import csv
+from unittest.mock import patch
 
 # Añadir el directorio raíz del proyecto al sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -135,5 +136,252 @@ class TestInventarioLogic(unittest.TestCase):
         # Limpiar el archivo CSV de prueba
         os.remove(csv_path)
 
+class TestKardexPorLotes(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con dos productos sin stock."""
+        self.db_path = "test_kardex_lotes.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        _, self.tornillo = db_manager.crear_producto_db("Tornillo", "TOR-001", "", 0.0, 0.0)
+        _, self.tuerca = db_manager.crear_producto_db("Tuerca", "TUE-001", "", 0.0, 0.0)
+        self.fecha = "2024-05-10"
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _mov(self, producto_id, tipo, cantidad, costo=None):
+        return {'producto_id': producto_id, 'tipo_movimiento': tipo, 'cantidad': cantidad,
+                'costo_unitario': costo, 'fecha': self.fecha}
+
+    def test_lote_varios_productos_promedio_corriente(self):
+        """El lote recalcula el promedio en orden y las salidas salen al promedio vigente."""
+        success, costos = inventario_logic.registrar_movimientos_lote([
+            self._mov(self.tornillo, 'compra', 10, 100.0),
+            self._mov(self.tuerca, 'compra', 4, 5.0),
+            self._mov(self.tornillo, 'compra', 10, 120.0),
+            self._mov(self.tornillo, 'venta', 5),
+            self._mov(self.tornillo, 'compra', 5, 140.0),
+            self._mov(self.tuerca, 'ajuste_negativo', 4),
+        ])
+        self.assertTrue(success)
+        self.assertEqual(costos, [100.0, 5.0, 120.0, 110.0, 140.0, 5.0])
+
+        tornillo = db_manager.obtener_producto_por_id_db(self.tornillo)
+        self.assertAlmostEqual(tornillo['cantidad_disponible'], 20.0)
+        self.assertAlmostEqual(tornillo['costo_unitario_promedio'], (15 * 110.0 + 5 * 140.0) / 20)
+        tuerca = db_manager.obtener_producto_por_id_db(self.tuerca)
+        self.assertAlmostEqual(tuerca['cantidad_disponible'], 0.0)
+        self.assertEqual([m['tipo_movimiento'] for m in inventario_logic.obtener_kardex_producto(self.tornillo)],
+                         ['compra', 'compra', 'venta', 'compra'])
+
+    def test_lote_con_faltante_no_aplica_nada(self):
+        """Si una salida deja un producto en negativo en cualquier punto, el lote completo se rechaza."""
+        success, msg = inventario_logic.registrar_movimientos_lote([
+            self._mov(self.tuerca, 'compra', 4, 5.0),
+            self._mov(self.tornillo, 'venta', 1),
+            self._mov(self.tornillo, 'compra', 10, 100.0),
+        ])
+        self.assertFalse(success)
+        self.assertEqual(msg, "Stock insuficiente")
+        self.assertAlmostEqual(db_manager.obtener_producto_por_id_db(self.tuerca)['cantidad_disponible'], 0.0)
+        self.assertEqual(inventario_logic.obtener_kardex_producto(self.tuerca), [])
+
+    def test_producto_inexistente_rechaza_lote(self):
+        success, msg = inventario_logic.registrar_movimientos_lote([
+            self._mov(self.tornillo, 'compra', 1, 1.0), self._mov(9999, 'compra', 1, 1.0)])
+        self.assertFalse(success)
+        self.assertIn("9999", msg)
+        self.assertEqual(inventario_logic.obtener_kardex_producto(self.tornillo), [])
+
+    def test_update_condicional_protege_el_stock(self):
+        """Un cambio de stock concurrente que deja el producto corto hace fallar el UPDATE condicional."""
+        self.assertTrue(inventario_logic._registrar_movimiento_interno(self.tornillo, 'compra', 5, 10.0, self.fecha)[0])
+        original = db_manager.get_db_connection
+
+        def conexion_con_venta_concurrente(path):
+            conn = original(path)
+            # Simula otro proceso que vende el stock justo antes de que este lote escriba.
+            conn.execute("CREATE TEMP TRIGGER IF NOT EXISTS venta_concurrente BEFORE UPDATE ON productos "
+                         "BEGIN UPDATE productos SET cantidad_disponible = 0 WHERE id = OLD.id AND cantidad_disponible > 0; END;")
+            return conn
+
+        with patch.object(db_manager, 'get_db_connection', side_effect=conexion_con_venta_concurrente):
+            success, msg = inventario_logic.registrar_movimientos_lote([self._mov(self.tornillo, 'venta', 3)])
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("DROP TRIGGER temp.venta_concurrente")
+        self.assertFalse(success)
+        self.assertEqual(msg, "Stock insuficiente")
+        self.assertAlmostEqual(db_manager.obtener_producto_por_id_db(self.tornillo)['cantidad_disponible'], 5.0)
+
+class TestImportacionMasiva(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con un producto ya registrado."""
+        self.db_path = "test_importacion_masiva.db"
+        self.csv_path = "test_importacion_masiva.csv"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        db_manager.crear_producto_db("Existente", "EXI-001", "", 0.0, 0.0)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos y el CSV de prueba."""
+        db_manager.cerrar_pools()
+        for ruta in (self.db_path, self.db_path + "-wal", self.db_path + "-shm", self.csv_path):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _escribir_csv(self, filas):
+        with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["nombre", "sku", "descripcion", "costo_inicial", "cantidad_inicial"])
+            writer.writerows(filas)
+
+    def test_importa_por_lotes_y_reporta_errores_por_fila(self):
+        self._escribir_csv([
+            ["Martillo", "FER-001", "Mango de madera", "150.50", "50"],
+            ["Repetido en BD", "EXI-001", "", "1", "1"],
+            ["Sin SKU", "", "", "1", "1"],
+            ["Costo ilegible", "FER-002", "", "abc", "1"],
+            ["Sin stock", "FER-003", "", "10", ""],
+            ["Repetido en archivo", "FER-001", "", "1", "1"],
+            ["Negativo", "FER-004", "", "5", "-2"],
+            ["Alicate", "FER-005", "", "80", "3"],
+        ])
+        resumen = inventario_logic.importar_productos_csv(self.csv_path, tamano_lote=3)
+
+        self.assertEqual(resumen['creados'], 3)
+        self.assertEqual([e.split(':')[0] for e in resumen['errores']], ["Fila 3", "Fila 4", "Fila 5", "Fila 7", "Fila 8"])
+        self.assertGreater(resumen['filas_por_segundo'], 0)
+
+        productos = {p['sku']: p for p in db_manager.obtener_productos_db()}
+        self.assertEqual(sorted(productos), ["EXI-001", "FER-001", "FER-003", "FER-005"])
+        self.assertAlmostEqual(productos["FER-001"]['cantidad_disponible'], 50.0)
+        self.assertAlmostEqual(productos["FER-001"]['costo_unitario_promedio'], 150.5)
+        self.assertAlmostEqual(productos["FER-003"]['costo_unitario_promedio'], 0.0)
+        kardex = inventario_logic.obtener_kardex_producto(productos["FER-001"]['id'])
+        self.assertEqual([(m['tipo_movimiento'], m['cantidad'], m['costo_unitario']) for m in kardex], [('ajuste_positivo', 50.0, 150.5)])
+        self.assertEqual(inventario_logic.obtener_kardex_producto(productos["FER-003"]['id']), [])
+
+    def test_catalogo_grande(self):
+        """Un catálogo de 20.000 filas se importa en pocas transacciones."""
+        self._escribir_csv([[f"Producto {i}", f"SKU-{i:05d}", "", "12.5", str(i % 7)] for i in range(20000)])
+        resumen = inventario_logic.importar_productos_csv(self.csv_path)
+        self.assertEqual(resumen['creados'], 20000)
+        self.assertEqual(resumen['errores'], [])
+        self.assertGreater(resumen['filas_por_segundo'], 5000)
+        with db_manager.conexion(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM movimientos_inventario").fetchone()[0],
+                             sum(1 for i in range(20000) if i % 7))
+
+    def test_archivo_inexistente(self):
+        resumen = inventario_logic.importar_productos_csv("no_existe.csv")
+        self.assertEqual(resumen['creados'], 0)
+        self.assertIn("no_existe.csv", resumen['errores'][0])
+
+class TestCortesKardex(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con dos productos y movimientos en varios meses."""
+        self.db_path = "test_cortes_kardex.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+        _, self.tornillo = db_manager.crear_producto_db("Tornillo", "TOR-001", "", 0.0, 0.0)
+        _, self.tuerca = db_manager.crear_producto_db("Tuerca", "TUE-001", "", 0.0, 0.0)
+        movimientos = [
+            (self.tornillo, 'compra', 10, 100.0, "2024-01-05"),
+            (self.tuerca, 'compra', 50, 2.0, "2024-01-09"),
+            (self.tornillo, 'venta', 4, None, "2024-01-20"),
+            (self.tornillo, 'compra', 6, 130.0, "2024-01-31"),
+            (self.tuerca, 'venta', 20, None, "2024-02-03"),
+            (self.tornillo, 'compra', 8, 90.0, "2024-02-14"),
+            (self.tornillo, 'ajuste_negativo', 1, None, "2024-03-01"),
+        ]
+        for producto_id, tipo, cantidad, costo, fecha in movimientos:
+            success, _ = inventario_logic.registrar_movimientos_lote([{'producto_id': producto_id, 'tipo_movimiento': tipo,
+                                                                       'cantidad': cantidad, 'costo_unitario': costo, 'fecha': fecha}])
+            self.assertTrue(success)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _referencia(self, producto_id, fecha):
+        """Reproduce el Kardex completo hasta `fecha`."""
+        cantidad, costo = 0.0, 0.0
+        for mov in inventario_logic.obtener_kardex_producto(producto_id):
+            if mov['fecha'] > fecha:
+                break
+            if mov['tipo_movimiento'] in ('compra', 'ajuste_positivo'):
+                nueva = cantidad + mov['cantidad']
+                costo = (cantidad * costo + mov['cantidad'] * mov['costo_unitario']) / nueva
+                cantidad = nueva
+            else:
+                cantidad -= mov['cantidad']
+        return cantidad, costo
+
+    def _assert_igual_a_referencia(self):
+        for fecha in ["2023-12-31", "2024-01-20", "2024-01-31", "2024-02-10", "2024-02-29", "2024-12-31"]:
+            for producto_id in (self.tornillo, self.tuerca):
+                with self.subTest(fecha=fecha, producto_id=producto_id):
+                    existencias = inventario_logic.obtener_existencias_a_fecha(producto_id, fecha)
+                    cantidad, costo = self._referencia(producto_id, fecha)
+                    self.assertAlmostEqual(existencias['cantidad'], cantidad)
+                    self.assertAlmostEqual(existencias['costo_promedio'], costo)
+                    self.assertAlmostEqual(existencias['valor'], cantidad * costo)
+
+    def test_existencias_sin_y_con_cortes(self):
+        self._assert_igual_a_referencia()
+        self.assertEqual(inventario_logic.registrar_cierre_mensual_inventario("2024-01-31"), 2)
+        self.assertEqual(inventario_logic.registrar_cierre_mensual_inventario("2024-02-29"), 2)
+        self._assert_igual_a_referencia()
+
+        with db_manager.conexion(self.db_path) as conn:
+            estados = db_manager._estado_kardex_a_fecha(conn.cursor(), "2024-12-31")
+        self.assertEqual(estados[self.tornillo]['reproducidos'], 1)
+        self.assertEqual(estados[self.tuerca]['reproducidos'], 0)
+
+    def test_movimiento_con_fecha_anterior_invalida_cortes(self):
+        inventario_logic.registrar_cierre_mensual_inventario("2024-01-31")
+        inventario_logic.registrar_cierre_mensual_inventario("2024-02-29")
+        success, _ = inventario_logic.registrar_movimientos_lote([
+            {'producto_id': self.tornillo, 'tipo_movimiento': 'compra', 'cantidad': 5, 'costo_unitario': 200.0, 'fecha': "2024-02-01"},
+            {'producto_id': self.tuerca, 'tipo_movimiento': 'compra', 'cantidad': 5, 'costo_unitario': 3.0, 'fecha': "2024-01-31"},
+        ])
+        self.assertTrue(success)
+        with db_manager.conexion(self.db_path) as conn:
+            cortes = conn.execute("SELECT producto_id, fecha FROM kardex_cortes ORDER BY producto_id, fecha").fetchall()
+        self.assertEqual([tuple(c) for c in cortes], [(self.tornillo, "2024-01-31"), (self.tuerca, "2024-01-31")])
+        self._assert_igual_a_referencia()
+
+    def test_corte_automatico_cada_n_movimientos(self):
+        with patch.object(db_manager, 'KARDEX_MOVIMIENTOS_POR_CORTE', 3):
+            inventario_logic.registrar_movimientos_lote([
+                {'producto_id': self.tuerca, 'tipo_movimiento': 'venta', 'cantidad': 1, 'costo_unitario': None, 'fecha': "2024-03-10"}])
+        with db_manager.conexion(self.db_path) as conn:
+            cortes = conn.execute("SELECT producto_id, fecha, cantidad FROM kardex_cortes").fetchall()
+        # El tornillo ya acumulaba 5 movimientos; la tuerca llega a 3 con este.
+        self.assertEqual(sorted(tuple(c) for c in cortes), [(self.tuerca, "2024-03-10", 29.0)])
+        self._assert_igual_a_referencia()
+
+    def test_valoracion_inventario(self):
+        inventario_logic.registrar_cierre_mensual_inventario("2024-01-31")
+        valoracion = inventario_logic.obtener_valoracion_inventario("2024-01-31")
+        self.assertEqual([p['sku'] for p in valoracion['productos']], ["TOR-001", "TUE-001"])
+        self.assertAlmostEqual(valoracion['valor_total'], (6 * 100.0 + 6 * 130.0) + 50 * 2.0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,211 @@
+import unittest
+import sys
+import os
+import asyncio
+import operator
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from utils.micro_graph import MicroGraph, END, ESTADO_RAMAS, emitir_evento, transmitir_eventos
+
+def _capitan(nombre, demora=0.0, error=None, cancelados=None):
+    """Nodo de prueba que espera `demora` segundos y aporta un mensaje y su propio resultado."""
+    async def execute(state):
+        try:
+            await asyncio.sleep(demora)
+        except asyncio.CancelledError:
+            if cancelados is not None:
+                cancelados.append(nombre)
+            raise
+        if error:
+            raise RuntimeError(error)
+        return {"messages": [f"respuesta de {nombre}"], f"resultado_{nombre}": len(state["messages"]), "ultimo": nombre}
+    return execute
+
+class TestMicroGraphFanOut(unittest.TestCase):
+
+    def _grafo(self, ramas, **opciones_fan_out):
+        grafo = MicroGraph()
+
+        async def general(state):
+            return {"next": "cierre"}
+
+        async def consolidar(state):
+            return {"resumen": sorted(state[ESTADO_RAMAS].items())}
+
+        grafo.add_node("general", general)
+        grafo.add_join("union", consolidar, reducers={"messages": operator.add})
+        for nombre, nodo in ramas.items():
+            grafo.add_node(nombre, nodo)
+            grafo.add_edge(nombre, "union")
+        grafo.set_entry_point("general")
+        grafo.add_fan_out("general", list(ramas), "union", **opciones_fan_out)
+        grafo.add_edge("union", END)
+        return grafo
+
+    def _ejecutar(self, grafo, estado=None):
+        with redirect_stdout(StringIO()):
+            return asyncio.run(grafo.run(estado or {"messages": ["orden de cierre mensual"]}))
+
+    def test_ramas_concurrentes_y_reductor(self):
+        """Las ramas corren a la vez (latencia de la más lenta) y 'messages' se fusiona con operator.add."""
+        with redirect_stdout(StringIO()):
+            grafo = self._grafo({"iva": _capitan("iva", 0.2), "retenciones": _capitan("retenciones", 0.2),
+                                 "estados": _capitan("estados", 0.2)})
+        inicio = time.perf_counter()
+        estado = self._ejecutar(grafo)
+        self.assertLess(time.perf_counter() - inicio, 0.4)
+
+        self.assertEqual(estado["messages"], ["orden de cierre mensual", "respuesta de iva", "respuesta de retenciones", "respuesta de estados"])
+        # Cada rama vio el estado original, no las respuestas de las otras.
+        self.assertEqual((estado["resultado_iva"], estado["resultado_estados"]), (1, 1))
+        # Sin reductor gana la última rama declarada.
+        self.assertEqual(estado["ultimo"], "estados")
+        self.assertEqual(estado["resumen"], [("estados", "completada"), ("iva", "completada"), ("retenciones", "completada")])
+
+    def test_tiempo_limite_cancela_la_rama(self):
+        """Una rama que supera su tiempo límite se cancela y sus actualizaciones se descartan."""
+        cancelados = []
+        with redirect_stdout(StringIO()):
+            grafo = self._grafo({"iva": _capitan("iva", 0.05), "estados": _capitan("estados", 5.0, cancelados=cancelados)},
+                                timeout=1.0, branch_timeouts={"estados": 0.1})
+        inicio = time.perf_counter()
+        estado = self._ejecutar(grafo)
+        self.assertLess(time.perf_counter() - inicio, 0.5)
+        self.assertEqual(cancelados, ["estados"])
+        self.assertEqual(estado[ESTADO_RAMAS], {"iva": "completada", "estados": "tiempo_agotado"})
+        self.assertNotIn("resultado_estados", estado)
+        self.assertEqual(estado["messages"], ["orden de cierre mensual", "respuesta de iva"])
+
+    def test_error_en_una_rama(self):
+        """Por defecto un error queda registrado; con cancel_on_error cancela las demás ramas y se propaga."""
+        with redirect_stdout(StringIO()):
+            grafo = self._grafo({"iva": _capitan("iva", 0.0, error="sin datos"), "estados": _capitan("estados", 0.05)})
+        estado = self._ejecutar(grafo)
+        self.assertEqual(estado[ESTADO_RAMAS], {"iva": "error: sin datos", "estados": "completada"})
+
+        cancelados = []
+        with redirect_stdout(StringIO()):
+            grafo = self._grafo({"iva": _capitan("iva", 0.0, error="sin datos"), "estados": _capitan("estados", 5.0, cancelados=cancelados)},
+                                cancel_on_error=True)
+        inicio = time.perf_counter()
+        with self.assertRaisesRegex(RuntimeError, "sin datos"):
+            self._ejecutar(grafo)
+        self.assertLess(time.perf_counter() - inicio, 0.5)
+        self.assertEqual(cancelados, ["estados"])
+
+    def test_enrutador_elige_ramas_y_ramas_de_varios_nodos(self):
+        """El enrutador del fan-out elige qué ramas lanzar; cada rama sigue sus aristas hasta la unión."""
+        grafo = MicroGraph()
+        with redirect_stdout(StringIO()):
+            async def general(state):
+                return None
+
+            async def soldado_iva(state):
+                return {"messages": ["declaración de IVA preparada"], "mensajes_vistos_soldado": len(state["messages"])}
+
+            grafo.add_node("general", general)
+            grafo.add_node("iva", _capitan("iva"))
+            grafo.add_node("soldado_iva", soldado_iva)
+            grafo.add_node("retenciones", _capitan("retenciones"))
+            grafo.add_node("estados", _capitan("estados"))
+            grafo.add_join("union", reducers={"messages": operator.add})
+            grafo.add_edge("iva", "soldado_iva")
+            grafo.add_edge("soldado_iva", "union")
+            grafo.add_edge("retenciones", "union")
+            grafo.add_edge("estados", "union")
+            grafo.set_entry_point("general")
+            grafo.add_fan_out("general", ["iva", "retenciones", "estados"], "union", router_function=lambda state: ["estados", "iva"])
+
+        estado = self._ejecutar(grafo)
+        self.assertEqual(estado[ESTADO_RAMAS], {"iva": "completada", "estados": "completada"})
+        # Dentro de una rama los nodos sucesivos también combinan 'messages' con el reductor de la unión.
+        self.assertEqual(estado["messages"], ["orden de cierre mensual", "respuesta de iva", "declaración de IVA preparada", "respuesta de estados"])
+        self.assertEqual(estado["mensajes_vistos_soldado"], 2)
+
+    def test_validaciones(self):
+        """El fan-out exige nodos existentes y una unión registrada con add_join."""
+        grafo = MicroGraph()
+        with redirect_stdout(StringIO()):
+            grafo.add_node("general", _capitan("general"))
+            grafo.add_node("iva", _capitan("iva"))
+            grafo.add_node("union", _capitan("union"))
+        with self.assertRaises(ValueError):
+            grafo.add_fan_out("general", ["iva"], "union")
+        with redirect_stdout(StringIO()):
+            grafo.add_join("union_real")
+        with self.assertRaises(ValueError):
+            grafo.add_fan_out("general", ["iva", "no_existe"], "union_real")
+
+class TestMicroGraphStreaming(unittest.TestCase):
+
+    def _cadena(self, *respuestas):
+        llm = GenericFakeChatModel(messages=iter([AIMessage(content=r) for r in respuestas]))
+        return ChatPromptTemplate.from_messages([("human", "{query}")]) | llm
+
+    def _recoger(self, iterador):
+        async def recoger():
+            return [evento async for evento in iterador]
+        with redirect_stdout(StringIO()):
+            return asyncio.run(recoger())
+
+    def test_eventos_de_nodos_y_tokens(self):
+        """stream entrega nodos, transiciones y los tokens del LLM de cada nodo, y termina con el estado final."""
+        cadena = self._cadena("capitan_periodos_contables", "Periodo abierto con éxito")
+        grafo = MicroGraph()
+        with redirect_stdout(StringIO()):
+            async def general(state):
+                respuesta = await cadena.ainvoke({"query": state["messages"][-1]})
+                return {"next": respuesta.content}
+
+            async def capitan(state):
+                emitir_evento("progreso", detalle="abriendo periodo")
+                respuesta = await cadena.ainvoke({"query": state["messages"][-1]})
+                return {"messages": state["messages"] + [respuesta.content]}
+
+            grafo.add_node("general", general)
+            grafo.add_node("capitan_periodos_contables", capitan)
+            grafo.set_entry_point("general")
+            grafo.add_conditional_edge("general", lambda state: state["next"], {"capitan_periodos_contables": "capitan_periodos_contables", END: END})
+            grafo.add_edge("capitan_periodos_contables", END)
+
+        eventos = self._recoger(grafo.stream({"messages": ["abrir el periodo de enero"]}))
+        self.assertEqual([(e["tipo"], e["nodo"]) for e in eventos if e["tipo"] != "token"], [
+            ("nodo_inicio", "general"), ("nodo_fin", "general"), ("transicion", "general"),
+            ("nodo_inicio", "capitan_periodos_contables"), ("progreso", "capitan_periodos_contables"),
+            ("nodo_fin", "capitan_periodos_contables"), ("transicion", "capitan_periodos_contables"), ("fin", None),
+        ])
+        tokens = {}
+        for evento in eventos:
+            if evento["tipo"] == "token":
+                tokens[evento["nodo"]] = tokens.get(evento["nodo"], "") + evento["texto"]
+        self.assertEqual(tokens, {"general": "capitan_periodos_contables", "capitan_periodos_contables": "Periodo abierto con éxito"})
+        self.assertGreater(sum(1 for e in eventos if e["tipo"] == "token" and e["nodo"] == "capitan_periodos_contables"), 1)
+        self.assertEqual(eventos[-1]["resultado"]["messages"][-1], "Periodo abierto con éxito")
+
+    def test_trabajo_sincrono_en_hilo_y_errores(self):
+        """Los tokens de un process_command síncrono llegan desde su hilo; los errores se relanzan."""
+        cadena = self._cadena("Razón corriente: 1.8")
+
+        def process_command(query):
+            return cadena.invoke({"query": query}).content
+
+        eventos = self._recoger(transmitir_eventos(asyncio.to_thread(process_command, "ratios")))
+        self.assertEqual("".join(e["texto"] for e in eventos if e["tipo"] == "token"), "Razón corriente: 1.8")
+        self.assertEqual(eventos[-1], {"tipo": "fin", "nodo": None, "resultado": "Razón corriente: 1.8"})
+
+        async def falla():
+            raise RuntimeError("sin datos")
+        with self.assertRaisesRegex(RuntimeError, "sin datos"):
+            self._recoger(transmitir_eventos(falla()))
+
+if __name__ == '__main__':
+    unittest.main()
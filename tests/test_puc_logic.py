@@ -0,0 +1,189 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contabilidad import puc_logic
+from database import db_manager
+
+class TestBusquedaPUC(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con un plan de cuentas pequeño."""
+        self.db_path = "test_puc_logic.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        cuentas = [
+            ("11", "Efectivo y equivalentes al efectivo", "Debito", "Activo"),
+            ("1105", "Caja", "Debito", "Activo"),
+            ("110505", "Caja General", "Debito", "Activo"),
+            ("110510", "Cajas Menores", "Debito", "Activo"),
+            ("1435", "Mercancías no fabricadas por la empresa", "Debito", "Activo"),
+            ("211105", "Créditos de bancos nacionales", "Credito", "Pasivo"),
+            ("2408", "Impuesto sobre las ventas por pagar", "Credito", "Pasivo"),
+        ]
+        for cta in cuentas:
+            db_manager.agregar_cuenta_puc(*cta)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def _codigos(self, filtro, limite=None):
+        return [c['codigo'] for c in puc_logic.buscar_cuentas(filtro, limite)]
+
+    def test_prefijo_de_codigo_sigue_la_jerarquia(self):
+        """Un código devuelve la cuenta y sus subcuentas, nunca coincidencias en medio del código."""
+        self.assertEqual(self._codigos("1105"), ["1105", "110505", "110510"])
+        self.assertEqual(self._codigos("11"), ["11", "1105", "110505", "110510"])
+
+    def test_nombre_sin_tildes_y_por_prefijo(self):
+        """Las palabras se buscan sin distinguir tildes ni mayúsculas y como comienzo de palabra."""
+        self.assertEqual(self._codigos("creditos"), ["211105"])
+        self.assertEqual(self._codigos("MERC"), ["1435"])
+        self.assertEqual(self._codigos("caja gen"), ["110505"])
+
+    def test_codigo_y_nombre_combinados(self):
+        self.assertEqual(self._codigos("11 caja"), ["1105", "110505", "110510"])
+        self.assertEqual(self._codigos("24 caja"), [])
+
+    def test_relevancia_y_limite(self):
+        """A igual relevancia, primero las cuentas de mayor nivel; el límite se respeta."""
+        self.assertEqual(self._codigos("caja")[0], "1105")
+        self.assertEqual(len(self._codigos("caja", 2)), 2)
+        self.assertEqual(len(self._codigos(None, 3)), 3)
+
+    def test_indice_sincronizado_con_cambios(self):
+        """Actualizar o eliminar una cuenta se refleja en la búsqueda por nombre."""
+        self.assertTrue(db_manager.actualizar_cuenta_puc("110510", "Fondo Rotatorio", "Debito", "Activo"))
+        self.assertEqual(self._codigos("cajas"), [])
+        self.assertEqual(self._codigos("rotatorio"), ["110510"])
+
+        self.assertTrue(db_manager.eliminar_cuenta_puc("110510"))
+        self.assertEqual(self._codigos("rotatorio"), [])
+        self.assertIsNone(db_manager.obtener_cuenta_puc_por_codigo("110510"))
+
+    def test_no_elimina_cuenta_con_movimientos(self):
+        movimientos = [{"cuenta_codigo": "110505", "debito": 100.0, "credito": 0}, {"cuenta_codigo": "2408", "debito": 0, "credito": 100.0}]
+        db_manager.agregar_comprobante_y_movimientos("2024-01-10", "Diario", "Asiento de prueba", movimientos, 1)
+        self.assertFalse(db_manager.eliminar_cuenta_puc("110505"))
+        self.assertIsNotNone(db_manager.obtener_cuenta_puc_por_codigo("110505"))
+
+    def test_herramienta_del_agente(self):
+        resultado = puc_logic.obtener_cuentas.invoke({"filtro": "impuesto"})
+        self.assertIn("2408", resultado)
+        self.assertEqual(puc_logic.obtener_cuentas.invoke({"filtro": "inexistente"}), "No se encontraron cuentas con ese filtro.")
+
+    def test_busqueda_en_plan_completo_usa_indices(self):
+        """Con un plan de 5.000 cuentas, cada búsqueda usa la clave primaria o el índice FTS5, nunca un recorrido completo."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO plan_cuentas (codigo, nombre, naturaleza, clase) VALUES (?, ?, 'Debito', 'Activo')",
+                [(f"15{i:05d}", f"Subcuenta {i} de tema{i % 250}") for i in range(5000)]
+            )
+            conn.commit()
+        for filtro in ("1500", "tema12", "caja", "15 tema7"):
+            sentencias, conexiones = [], []
+
+            def conectar(path, original=db_manager.get_db_connection):
+                conn = original(path)
+                conn.set_trace_callback(sentencias.append)
+                conexiones.append(conn)
+                return conn
+
+            with patch.object(db_manager, 'get_db_connection', side_effect=conectar):
+                self.assertTrue(puc_logic.buscar_cuentas(filtro, 20), filtro)
+            for conn in conexiones:
+                conn.set_trace_callback(None)
+            consultas = [s for s in sentencias if s.lstrip().upper().startswith("SELECT")]
+            self.assertEqual(len(consultas), 1, filtro)
+            with db_manager.conexion(self.db_path) as conn:
+                plan = [fila[-1] for fila in conn.execute("EXPLAIN QUERY PLAN " + consultas[0])]
+            self.assertFalse([paso for paso in plan if paso in ("SCAN plan_cuentas", "SCAN p")], (filtro, plan))
+            self.assertTrue(any("sqlite_autoindex_plan_cuentas_1" in paso or "plan_cuentas_fts VIRTUAL TABLE" in paso for paso in plan), (filtro, plan))
+
+class TestCachePUC(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con una jerarquía de cuentas."""
+        self.db_path = "test_cache_puc.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        for cta in [("1", "Activo", "Debito", "Activo"), ("11", "Disponible", "Debito", "Activo"), ("1105", "Caja", "Debito", "Activo"),
+                    ("110505", "Caja General", "Debito", "Activo"), ("110510", "Cajas Menores", "Debito", "Activo"),
+                    ("111005", "Moneda Nacional", "Debito", "Activo"), ("2408", "IVA por pagar", "Credito", "Pasivo")]:
+            db_manager.agregar_cuenta_puc(*cta)
+        self.cache = db_manager.obtener_cache_puc()
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_lecturas_repetidas_no_consultan_la_bd(self):
+        """Tras la primera carga, las consultas por código se sirven desde memoria."""
+        inicial = db_manager.estadisticas_cache_puc()
+        self.assertEqual(db_manager.obtener_cuenta_puc_por_codigo("110505")['nombre'], "Caja General")
+        with patch.object(db_manager, 'get_db_connection', side_effect=AssertionError("consulta a la BD")):
+            for _ in range(10):
+                self.assertEqual(db_manager.obtener_cuenta_puc_por_codigo("2408")['naturaleza'], "Credito")
+            self.assertIsNone(db_manager.obtener_cuenta_puc_por_codigo("9999"))
+            self.assertEqual(len(db_manager.obtener_cuentas_puc()), 7)
+        estadisticas = db_manager.estadisticas_cache_puc()
+        self.assertEqual(estadisticas['fallos'] - inicial['fallos'], 1)
+        self.assertEqual(estadisticas['aciertos'] - inicial['aciertos'], 12)
+
+    def test_escrituras_invalidan_la_cache(self):
+        self.assertEqual(db_manager.obtener_cuenta_puc_por_codigo("110510")['nombre'], "Cajas Menores")
+        db_manager.actualizar_cuenta_puc("110510", "Fondo Rotatorio", "Debito", "Activo")
+        self.assertEqual(db_manager.obtener_cuenta_puc_por_codigo("110510")['nombre'], "Fondo Rotatorio")
+        db_manager.eliminar_cuenta_puc("110510")
+        self.assertIsNone(db_manager.obtener_cuenta_puc_por_codigo("110510"))
+        db_manager.agregar_cuenta_puc("110515", "Caja Auxiliar", "Debito", "Activo")
+        self.assertIsNotNone(db_manager.obtener_cuenta_puc_por_codigo("110515"))
+
+    def test_lectura_sobre_la_foto_tomada_bajo_el_lock(self):
+        """Una invalidación justo después de cargar no hace que una cuenta existente se lea como inexistente."""
+        asegurar = self.cache._asegurar_cargada
+
+        def asegurar_e_invalidar():
+            foto = asegurar()
+            self.cache.invalidar() # Otro hilo escribe en el PUC en ese instante
+            return foto
+
+        with patch.object(self.cache, '_asegurar_cargada', side_effect=asegurar_e_invalidar):
+            self.assertEqual(self.cache.obtener("1105")['nombre'], "Caja")
+            self.assertEqual(self.cache.padre("110505")['codigo'], "1105")
+            self.assertEqual([c['codigo'] for c in self.cache.hijas("1105")], ["110505", "110510"])
+
+    def test_copias_no_alteran_la_cache(self):
+        db_manager.obtener_cuenta_puc_por_codigo("1105")['nombre'] = "Modificado"
+        self.assertEqual(db_manager.obtener_cuenta_puc_por_codigo("1105")['nombre'], "Caja")
+
+    def test_jerarquia(self):
+        """Padre, hijas y descendientes siguen los prefijos del código aunque falten niveles intermedios."""
+        self.assertEqual(self.cache.padre("110505")['codigo'], "1105")
+        self.assertEqual(self.cache.padre("111005")['codigo'], "11")
+        self.assertIsNone(self.cache.padre("2408"))
+        self.assertEqual([c['codigo'] for c in self.cache.hijas("11")], ["1105", "111005"])
+        self.assertEqual([c['codigo'] for c in self.cache.hijas("1105")], ["110505", "110510"])
+        self.assertEqual([c['codigo'] for c in self.cache.descendientes("1")], ["1", "11", "1105", "110505", "110510", "111005"])
+        self.assertEqual([c['codigo'] for c in self.cache.descendientes("24")], ["2408"])
+        self.assertEqual(self.cache.descendientes("3"), [])
+
+if __name__ == '__main__':
+    unittest.main()
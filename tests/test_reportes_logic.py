@@ -0,0 +1,197 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contabilidad import reportes_logic
+from database import db_manager
+
+def _balance_comprobacion_referencia(fecha_inicio=None, fecha_fin=None):
+    """
+    Implementación original (acumulación en Python sobre el libro diario), usada como referencia,
+    con el mismo redondeo a centavos que los informes.
+    """
+    saldos = {c['codigo']: {'debito': 0.0, 'credito': 0.0, **c} for c in db_manager.obtener_cuentas_puc()}
+    for mov in db_manager.obtener_libro_diario(fecha_inicio, fecha_fin):
+        if mov['cuenta_codigo'] in saldos:
+            saldos[mov['cuenta_codigo']]['debito'] += mov.get('debito', 0.0)
+            saldos[mov['cuenta_codigo']]['credito'] += mov.get('credito', 0.0)
+    balance = []
+    for codigo, data in saldos.items():
+        data['debito'], data['credito'] = round(data['debito'], 2), round(data['credito'], 2)
+        saldo = round(data['debito'] - data['credito'] if data['naturaleza'] == 'Debito' else data['credito'] - data['debito'], 2)
+        if data['debito'] > 0 or data['credito'] > 0:
+            balance.append({'codigo': codigo, 'nombre': data['nombre'], 'naturaleza': data['naturaleza'],
+                            'total_debito': data['debito'], 'total_credito': data['credito'], 'saldo_final': saldo})
+    return sorted(balance, key=lambda x: x['codigo'])
+
+class TestReportesLogic(unittest.TestCase):
+
+    def setUp(self):
+        """Configura una base de datos de prueba con un plan de cuentas y varios asientos."""
+        self.db_path = "test_reportes_logic.db"
+        db_manager.DB_CONTABILIDAD_PATH = self.db_path
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        db_manager.init_db()
+
+        cuentas = [
+            ("110505", "Caja General", "Debito", "Activo"),
+            ("130505", "Clientes Nacionales", "Debito", "Activo"),
+            ("1435", "Mercancías", "Debito", "Activo"),
+            ("220501", "Proveedores Nacionales", "Credito", "Pasivo"),
+            ("3105", "Capital Suscrito y Pagado", "Credito", "Patrimonio"),
+            ("4135", "Comercio al por mayor y al por menor", "Credito", "Ingreso"),
+            ("5135", "Servicios", "Debito", "Gasto"),
+            ("6135", "Costo de Ventas", "Debito", "Costo Venta"),
+        ]
+        for cta in cuentas:
+            db_manager.agregar_cuenta_puc(*cta)
+
+        asientos = [
+            ("2023-12-15", [("110505", 5000.0, 0), ("3105", 0, 5000.0)]),
+            ("2024-01-10", [("1435", 1200.5, 0), ("220501", 0, 1200.5)]),
+            ("2024-03-02", [("130505", 2380.25, 0), ("4135", 0, 2380.25)]),
+            ("2024-02-20", [("6135", 800.75, 0), ("1435", 0, 800.75)]),
+            ("2024-03-31", [("5135", 150.0, 0), ("110505", 0, 150.0)]),
+            ("2024-04-05", [("110505", 2380.25, 0), ("130505", 0, 2380.25)]),
+        ]
+        for fecha, movs in asientos:
+            movimientos = [{"cuenta_codigo": c, "debito": d, "credito": cr} for c, d, cr in movs]
+            success, _ = db_manager.agregar_comprobante_y_movimientos(fecha, "Diario", "Asiento de prueba", movimientos, 1)
+            self.assertTrue(success)
+
+    def tearDown(self):
+        """Cierra los pools y elimina la base de datos de prueba."""
+        db_manager.cerrar_pools()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + sufijo):
+                os.remove(self.db_path + sufijo)
+
+    def test_balance_comprobacion_igual_a_referencia(self):
+        """El balance agregado en SQL coincide exactamente con la acumulación original en Python."""
+        rangos = [(None, None), (None, "2024-02-29"), ("2024-01-01", "2024-03-31"), ("2024-03-01", None), ("2025-01-01", "2025-12-31"),
+                  ("2024-01-15", "2024-03-10"), ("2024-02-10", "2024-03-31"), ("2024-03-01", "2024-03-31"), ("2024-03-02", "2024-03-02"), (None, "2024-03-15")]
+        for rango in rangos:
+            with self.subTest(rango=rango):
+                self.assertEqual(reportes_logic.generar_balance_comprobacion(*rango), _balance_comprobacion_referencia(*rango))
+
+    def test_balance_comprobacion_decimales_no_representables(self):
+        """Diez movimientos de 0.1 en dos meses dan 1.0 por cualquier camino, aunque la suma en coma flotante no coincida."""
+        for fecha in [f"2025-0{mes}-{dia:02d}" for mes in (1, 2) for dia in range(1, 6)]:
+            success, _ = db_manager.agregar_comprobante_y_movimientos(fecha, "Diario", "Centavos", [
+                {"cuenta_codigo": "5135", "debito": 0.1, "credito": 0}, {"cuenta_codigo": "110505", "debito": 0, "credito": 0.1}], 1)
+            self.assertTrue(success)
+        self.assertNotEqual(sum([0.1] * 10), 1.0)
+        for rango in [("2025-01-01", "2025-02-28"), ("2025-01-03", "2025-02-28"), ("2025-01-01", None)]:
+            with self.subTest(rango=rango):
+                balance = reportes_logic.generar_balance_comprobacion(*rango)
+                self.assertEqual(balance, _balance_comprobacion_referencia(*rango))
+        balance = {c['codigo']: c for c in reportes_logic.generar_balance_comprobacion("2025-01-01", "2025-02-28")}
+        self.assertEqual((balance["5135"]['total_debito'], balance["5135"]['saldo_final']), (1.0, 1.0))
+        self.assertEqual(balance["110505"]['saldo_final'], -1.0)
+
+    def test_balance_comprobacion_saldos_por_naturaleza(self):
+        """El saldo final respeta la naturaleza de cada cuenta."""
+        balance = {c['codigo']: c for c in reportes_logic.generar_balance_comprobacion(None, "2024-12-31")}
+        self.assertAlmostEqual(balance["110505"]['saldo_final'], 7230.25)
+        self.assertAlmostEqual(balance["1435"]['saldo_final'], 399.75)
+        self.assertAlmostEqual(balance["4135"]['saldo_final'], 2380.25)
+        self.assertNotIn("999999", balance)
+
+    def test_saldos_periodo_se_mantienen_al_registrar(self):
+        """Cada comprobante actualiza la tabla materializada en la misma transacción."""
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+        with db_manager.conexion(self.db_path) as conn:
+            row = conn.execute("SELECT total_debito, total_credito FROM saldos_periodo WHERE periodo = '2024-03' AND cuenta_codigo = '110505'").fetchone()
+        self.assertEqual((row['total_debito'], row['total_credito']), (0.0, 150.0))
+
+    def test_anular_comprobante_actualiza_saldos(self):
+        """Anular un comprobante lo excluye de los informes y de los saldos por período."""
+        comprobante_id = db_manager.obtener_comprobantes(filtro_fecha="2024-03-31")[0]['id']
+        self.assertTrue(db_manager.anular_comprobante(comprobante_id))
+        self.assertFalse(db_manager.anular_comprobante(comprobante_id))
+
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+        balance = {c['codigo']: c for c in reportes_logic.generar_balance_comprobacion(None, "2024-12-31")}
+        self.assertNotIn("5135", balance)
+        self.assertAlmostEqual(balance["110505"]['saldo_final'], 7380.25)
+        self.assertEqual(reportes_logic.generar_balance_comprobacion(), _balance_comprobacion_referencia())
+
+    def test_verificar_y_reconstruir_saldos(self):
+        """La verificación detecta una tabla desincronizada y la reconstrucción la corrige."""
+        with db_manager.conexion(self.db_path) as conn:
+            conn.execute("UPDATE saldos_periodo SET total_debito = total_debito + 10 WHERE periodo = '2024-01' AND cuenta_codigo = '1435'")
+            conn.execute("DELETE FROM saldos_periodo WHERE periodo = '2023-12'")
+            conn.commit()
+        diferencias = db_manager.verificar_saldos_periodo()
+        self.assertEqual({(d['periodo'], d['cuenta_codigo']) for d in diferencias},
+                         {("2024-01", "1435"), ("2023-12", "110505"), ("2023-12", "3105")})
+
+        db_manager.reconstruir_saldos_periodo()
+        self.assertEqual(db_manager.verificar_saldos_periodo(), [])
+
+    def test_estados_financieros_en_una_pasada(self):
+        """El paquete de estados coincide con los estados generados por separado."""
+        for fecha_corte in ["2024-03-31", "2024-03-15", "2024-12-31", "2023-12-31"]:
+            with self.subTest(fecha_corte=fecha_corte):
+                estados = reportes_logic.generar_estados_financieros(fecha_corte)
+                inicio_ejercicio = f"{fecha_corte[:4]}-01-01"
+                self.assertEqual(estados['balance_comprobacion'], reportes_logic.generar_balance_comprobacion(None, fecha_corte))
+                self.assertEqual(estados['estado_resultados'], reportes_logic.generar_estado_resultados(inicio_ejercicio, fecha_corte))
+                self.assertEqual(estados['balance_general'], reportes_logic.generar_balance_general(fecha_corte))
+
+    def test_estados_financieros_totales_corrientes(self):
+        """El Balance General separa activos y pasivos corrientes y cuadra la ecuación contable."""
+        estados = reportes_logic.generar_estados_financieros("2024-03-31")
+        balance = estados['balance_general']
+        # Caja 4850 + Clientes 2380.25 + Mercancías 399.75
+        self.assertAlmostEqual(balance['total_activos_corrientes'], 7630.0)
+        self.assertAlmostEqual(balance['total_pasivos_corrientes'], 1200.5)
+        self.assertAlmostEqual(balance['resultado_del_ejercicio'], 2380.25 - 800.75 - 150.0)
+        self.assertAlmostEqual(balance['verificacion_ecuacion'], 0.0)
+        self.assertAlmostEqual(estados['totales_por_grupo']['11'], 4850.0)
+        self.assertAlmostEqual(estados['totales_por_grupo']['14'], 399.75)
+
+    def test_estados_financieros_consulta_una_vez(self):
+        """El paquete hace una única consulta de totales a la base de datos."""
+        with patch.object(db_manager, 'obtener_totales_por_cuenta_al_corte', wraps=db_manager.obtener_totales_por_cuenta_al_corte) as al_corte, \
+             patch.object(db_manager, 'obtener_totales_por_cuenta', wraps=db_manager.obtener_totales_por_cuenta) as por_rango:
+            reportes_logic.generar_balance_general("2024-03-31")
+        self.assertEqual(al_corte.call_count, 1)
+        self.assertEqual(por_rango.call_count, 0)
+
+    def test_serie_estados_financieros_igual_a_cortes_individuales(self):
+        """La serie mensual acumulada en una pasada coincide con cada paquete calculado por separado."""
+        fechas = ["2024-04-30", "2023-11-30", "2024-02-29", "2024-03-15", "2023-12-31", "2024-01-31", "2024-02-29"]
+        with patch.object(db_manager, 'obtener_saldos_mensuales', wraps=db_manager.obtener_saldos_mensuales) as saldos:
+            serie = reportes_logic.generar_serie_estados_financieros(fechas)
+        self.assertEqual(saldos.call_count, 1)
+        self.assertEqual(len(serie), len(fechas))
+        for fecha_corte, estados in zip(fechas, serie):
+            with self.subTest(fecha_corte=fecha_corte):
+                self.assertEqual(estados, reportes_logic.generar_estados_financieros(fecha_corte))
+
+    def test_balance_por_nivel(self):
+        """El balance se agrupa por clase y grupo usando la caché del PUC, sin nuevas consultas."""
+        db_manager.agregar_cuenta_puc("11", "Disponible", "Debito", "Activo")
+        balance = reportes_logic.generar_balance_comprobacion(None, "2024-12-31")
+        db_manager.obtener_cache_puc().todas()
+        with patch.object(db_manager, 'get_db_connection', side_effect=AssertionError("consulta a la BD")):
+            por_clase = {c['codigo']: c for c in reportes_logic.consolidar_balance_por_nivel(balance, 'clase')}
+            por_grupo = {c['codigo']: c for c in reportes_logic.consolidar_balance_por_nivel(balance, 'grupo')}
+
+        self.assertEqual(sorted(por_clase), ["1", "2", "3", "4", "5", "6"])
+        self.assertAlmostEqual(por_clase["1"]['saldo_final'], 7630.0)
+        self.assertAlmostEqual(por_clase["1"]['total_debito'], 5000.0 + 1200.5 + 2380.25 + 2380.25)
+        self.assertEqual(por_clase["1"]['nombre'], "")
+        self.assertEqual(por_grupo["11"]['nombre'], "Disponible")
+        self.assertAlmostEqual(por_grupo["11"]['saldo_final'], 7230.25)
+        self.assertAlmostEqual(por_grupo["22"]['saldo_final'], 1200.5)
+        self.assertEqual(reportes_logic.generar_balance_comprobacion_por_nivel('grupo', None, "2024-12-31"), list(por_grupo.values()))
+
+if __name__ == '__main__':
+    unittest.main()
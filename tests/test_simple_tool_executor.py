@@ -0,0 +1,92 @@
+import unittest
+import sys
+import os
+import asyncio
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+# Añadir el directorio raíz del proyecto al sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.tools import tool
+
+from contabilidad.agent.simple_tool_executor import SimpleToolExecutor
+from contabilidad.agents.tools.contabilidad_tools import abrir_periodo_contable_tool
+
+@tool
+def consultar_saldo(cuenta: str) -> str:
+    """Tool síncrona de prueba que simula una consulta lenta a la base de datos."""
+    time.sleep(0.2)
+    return f"saldo de {cuenta}"
+
+@tool
+async def generar_reporte(nombre: str) -> str:
+    """Tool asíncrona de prueba."""
+    await asyncio.sleep(0.2)
+    return f"reporte {nombre}"
+
+def falla():
+    raise ValueError("sin conexión")
+
+class TestSimpleToolExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = SimpleToolExecutor({
+            "consultar_saldo": consultar_saldo,
+            "generar_reporte": generar_reporte,
+            "abrir_periodo_contable_tool": abrir_periodo_contable_tool,
+            "lenta": lambda: time.sleep(1.0),
+            "falla": falla,
+        }, max_workers=4, tool_timeouts={"lenta": 0.1})
+
+    def tearDown(self):
+        self.executor.close()
+
+    def _batch(self, calls):
+        with redirect_stdout(StringIO()):
+            return self.executor.batch(calls)
+
+    def test_llamadas_concurrentes_en_orden(self):
+        """Tools síncronas y asíncronas corren a la vez y los resultados respetan el orden de las llamadas."""
+        calls = [("consultar_saldo", {"cuenta": "1105"}), ("generar_reporte", {"nombre": "balance"}),
+                 ("consultar_saldo", {"cuenta": "1110"}), ("abrir_periodo_contable_tool", {"query": "Abrir el periodo de Octubre 2025"})]
+        inicio = time.perf_counter()
+        resultados = self._batch(calls)
+        self.assertLess(time.perf_counter() - inicio, 0.5)
+        self.assertEqual(resultados[:3], ["saldo de 1105", "reporte balance", "saldo de 1110"])
+        self.assertIn("Octubre 2025", resultados[3])
+        self.assertEqual([m["estado"] for m in self.executor.ultimas_metricas], ["completada"] * 4)
+        self.assertGreaterEqual(self.executor.ultimas_metricas[0]["segundos"], 0.2)
+
+    def test_errores_y_tiempo_limite(self):
+        """Los errores, las tools desconocidas y los tiempos agotados se devuelven como texto sin frenar el lote."""
+        resultados = self._batch([("lenta", {}), ("falla", {}), ("no_existe", {}), ("consultar_saldo", {"cuenta": "1105"})])
+        self.assertIn("tiempo límite", resultados[0])
+        self.assertIn("No la repitas", resultados[0])
+        self.assertEqual(resultados[1], "Error ejecutando falla: sin conexión")
+        self.assertEqual(resultados[2], "Error: Tool 'no_existe' not found")
+        self.assertEqual(resultados[3], "saldo de 1105")
+        self.assertEqual([m["estado"] for m in self.executor.ultimas_metricas], ["tiempo_agotado", "error", "no_encontrada", "completada"])
+
+    def test_sin_tiempo_limite_por_defecto(self):
+        """Sin límite configurado, una tool síncrona lenta termina y devuelve su resultado."""
+        executor = SimpleToolExecutor({"consultar_saldo": consultar_saldo})
+        self.assertIsNone(executor.timeout)
+        try:
+            with redirect_stdout(StringIO()):
+                self.assertEqual(executor.batch([("consultar_saldo", {"cuenta": "1105"})]), ["saldo de 1105"])
+        finally:
+            executor.close()
+
+    def test_batch_dentro_de_un_event_loop(self):
+        """batch funciona desde código async y abatch se puede esperar directamente."""
+        async def desde_loop():
+            with redirect_stdout(StringIO()):
+                sincrono = self.executor.batch([("generar_reporte", {"nombre": "a"})])
+                asincrono = await self.executor.abatch([("generar_reporte", {"nombre": "b"})])
+            return sincrono + asincrono
+        self.assertEqual(asyncio.run(desde_loop()), ["reporte a", "reporte b"])
+
+if __name__ == '__main__':
+    unittest.main()
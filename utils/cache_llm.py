@@ -0,0 +1,314 @@
+# utils/cache_llm.py
+"""
+Caché persistente de respuestas de los LLM de los agentes.
+
+Se conecta a cualquier modelo de LangChain a través de su campo `cache`
+(`llm.cache = obtener_cache_llm()`), por lo que cubre todas las cadenas
+`prompt | llm` construidas sobre ese modelo sin modificarlas.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from database import db_manager
+
+logger = logging.getLogger(__name__)
+
+DB_CACHE_LLM_PATH = os.path.join(db_manager.DATA_DIR, 'cache_llm.db')
+LLM_CACHE_TTL_SEGUNDOS = int(os.getenv("LLM_CACHE_TTL_SEGUNDOS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRADAS = int(os.getenv("LLM_CACHE_MAX_ENTRADAS", "5000"))
+
+_SQL_TABLA = """
+    CREATE TABLE IF NOT EXISTS respuestas_llm (
+        clave TEXT PRIMARY KEY,
+        modelo_hash TEXT NOT NULL,
+        contexto_hash TEXT NOT NULL,
+        consulta TEXT NOT NULL,
+        embedding TEXT,
+        generaciones TEXT NOT NULL,
+        creado REAL NOT NULL,
+        ultimo_uso REAL NOT NULL,
+        segundos_llm REAL NOT NULL DEFAULT 0,
+        aciertos INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+"""
+_SQL_INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_respuestas_llm_ultimo_uso ON respuestas_llm(ultimo_uso);",
+    "CREATE INDEX IF NOT EXISTS idx_respuestas_llm_contexto ON respuestas_llm(modelo_hash, contexto_hash);",
+]
+
+def normalizar_prompt(texto: str) -> str:
+    """
+    Espacios colapsados: variaciones de espaciado de la misma orden comparten entrada. No se pasa a
+    minúsculas, porque códigos y referencias ('AB-1' frente a 'ab-1') llegan tal cual a las tools.
+    """
+    return " ".join(texto.split())
+
+# Campos de un mensaje que, además del contenido, cambian lo que el modelo debe responder.
+_CAMPOS_MENSAJE = ("tool_calls", "invalid_tool_calls", "tool_call_id", "name", "additional_kwargs")
+
+def _tiene_tools(llm_string: str) -> bool:
+    """Indica si el modelo se invocó con tools enlazadas (bind_tools), según su `llm_string`."""
+    return "('tools', " in llm_string or "('functions', " in llm_string
+
+def _hash(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+def _separar_prompt(prompt: str) -> Tuple[str, str]:
+    """
+    Divide el prompt en (contexto, consulta) normalizados. Los modelos de chat entregan la lista de
+    mensajes serializada en JSON: el contexto son todos los mensajes menos el último (system prompt e
+    historial) y la consulta es el último. Cada mensaje incluye, además del contenido, sus llamadas a
+    tools y sus argumentos, para que dos historiales que solo difieren en ellos no compartan respuesta.
+    Los modelos de texto entregan el prompt plano.
+    """
+    try:
+        mensajes = json.loads(prompt)
+    except ValueError:
+        return "", normalizar_prompt(prompt)
+    if not isinstance(mensajes, list) or not mensajes:
+        return "", normalizar_prompt(prompt)
+
+    partes = []
+    for mensaje in mensajes:
+        kwargs = mensaje.get("kwargs", {}) if isinstance(mensaje, dict) else {}
+        contenido = kwargs.get("content", "")
+        if not isinstance(contenido, str):
+            contenido = json.dumps(contenido, sort_keys=True, ensure_ascii=False)
+        extras = {campo: kwargs[campo] for campo in _CAMPOS_MENSAJE if kwargs.get(campo)}
+        parte = f"{kwargs.get('type', '')}: {normalizar_prompt(contenido)}"
+        if extras:
+            parte += " " + json.dumps(extras, sort_keys=True, ensure_ascii=False, default=str)
+        partes.append(parte)
+    return "\n".join(partes[:-1]), partes[-1]
+
+def _serializar_generaciones(generaciones: Sequence[Generation]) -> str:
+    return json.dumps([
+        {"texto": g.text, "mensaje": message_to_dict(g.message) if isinstance(g, ChatGeneration) else None}
+        for g in generaciones
+    ], ensure_ascii=False)
+
+def _deserializar_generaciones(texto: str) -> List[Generation]:
+    generaciones = []
+    for g in json.loads(texto):
+        if g["mensaje"] is not None:
+            generaciones.append(ChatGeneration(message=messages_from_dict([g["mensaje"]])[0]))
+        else:
+            generaciones.append(Generation(text=g["texto"]))
+    return generaciones
+
+def _similitud_coseno(a: Sequence[float], b: Sequence[float]) -> float:
+    norma = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return sum(x * y for x, y in zip(a, b)) / norma if norma else 0.0
+
+class CacheLLMSQLite(BaseCache):
+    """
+    Caché de respuestas en SQLite con vencimiento (TTL) y desalojo LRU.
+
+    La clave exacta es el hash del modelo (el `llm_string` de LangChain: nombre y parámetros) junto con
+    el prompt normalizado. Si se indica `embeddings` (cualquier objeto con `embed_query`, p. ej. un
+    modelo de embeddings local), una orden sin coincidencia exacta puede reutilizar la respuesta de otra
+    con el mismo modelo y contexto cuya consulta tenga similitud coseno >= `umbral_similitud`.
+
+    Cada fallo de búsqueda arranca un cronómetro que se detiene al guardar la respuesta del LLM; esa
+    duración se guarda con la entrada y se suma como latencia ahorrada en cada acierto posterior.
+
+    Los modelos con tools enlazadas no se cachean salvo con `cachear_tools`: sus llamadas a tools
+    llevan argumentos que dependen del momento (p. ej. la fecha de "fin de mes") y, con un TTL de
+    días, una respuesta guardada repetiría la acción con datos de otro período.
+    """
+    def __init__(self, db_path: Optional[str] = None, ttl_segundos: int = LLM_CACHE_TTL_SEGUNDOS,
+                 max_entradas: int = LLM_CACHE_MAX_ENTRADAS, embeddings: Any = None, umbral_similitud: float = 0.95,
+                 cachear_tools: bool = False):
+        self.db_path = db_path or DB_CACHE_LLM_PATH
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.embeddings = embeddings
+        self.umbral_similitud = umbral_similitud
+        self.cachear_tools = cachear_tools
+        self._lock = threading.Lock()
+        self._pendientes: Dict[str, float] = {}
+        self._tabla_creada = False
+        self.consultas = 0
+        self.aciertos_exactos = 0
+        self.aciertos_semanticos = 0
+        self.segundos_ahorrados = 0.0
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = db_manager.get_db_connection(self.db_path)
+        if not self._tabla_creada:
+            conn.execute(_SQL_TABLA)
+            for sql in _SQL_INDICES:
+                conn.execute(sql)
+            conn.commit()
+            self._tabla_creada = True
+        return conn
+
+    def _claves(self, prompt: str, llm_string: str) -> Tuple[str, str, str, str]:
+        contexto, consulta = _separar_prompt(prompt)
+        modelo_hash = _hash(llm_string)
+        contexto_hash = _hash(contexto)
+        return _hash(f"{modelo_hash}\x00{contexto_hash}\x00{consulta}"), modelo_hash, contexto_hash, consulta
+
+    def _embedding(self, consulta: str) -> Optional[List[float]]:
+        """
+        Vector de la consulta, o None si no hay `embeddings` o el modelo falla: un proveedor de
+        embeddings caído o sin red no debe impedir llamar al LLM, solo la búsqueda semántica.
+        """
+        if self.embeddings is None:
+            return None
+        try:
+            return list(self.embeddings.embed_query(consulta))
+        except Exception as e:
+            logger.warning(f"No se pudo calcular el embedding para la caché de LLM: {e}")
+            return None
+
+    def _buscar_similar(self, conn: sqlite3.Connection, modelo_hash: str, contexto_hash: str,
+                        consulta: str, vigente_desde: float) -> Optional[sqlite3.Row]:
+        vector = self._embedding(consulta)
+        if vector is None:
+            return None
+        mejor, mejor_similitud = None, self.umbral_similitud
+        for fila in conn.execute(
+            "SELECT clave, embedding, generaciones, segundos_llm FROM respuestas_llm "
+            "WHERE modelo_hash = ? AND contexto_hash = ? AND creado >= ? AND embedding IS NOT NULL",
+            (modelo_hash, contexto_hash, vigente_desde)
+        ):
+            similitud = _similitud_coseno(vector, json.loads(fila['embedding']))
+            if similitud >= mejor_similitud:
+                mejor, mejor_similitud = fila, similitud
+        return mejor
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if not self.cachear_tools and _tiene_tools(llm_string):
+            return None
+        clave, modelo_hash, contexto_hash, consulta = self._claves(prompt, llm_string)
+        ahora = time.time()
+        vigente_desde = ahora - self.ttl_segundos
+        conn = None
+        try:
+            conn = self._conexion()
+            fila = conn.execute(
+                "SELECT clave, generaciones, segundos_llm FROM respuestas_llm WHERE clave = ? AND creado >= ?",
+                (clave, vigente_desde)
+            ).fetchone()
+            semantico = False
+            if fila is None and self.embeddings is not None:
+                fila = self._buscar_similar(conn, modelo_hash, contexto_hash, consulta, vigente_desde)
+                semantico = fila is not None
+            if fila is not None:
+                conn.execute("UPDATE respuestas_llm SET ultimo_uso = ?, aciertos = aciertos + 1 WHERE clave = ?", (ahora, fila['clave']))
+                conn.commit()
+                generaciones = _deserializar_generaciones(fila['generaciones'])
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            logger.error(f"Error al consultar la caché de LLM: {e}")
+            fila = None
+        finally:
+            db_manager.close_connection(conn)
+
+        with self._lock:
+            self.consultas += 1
+            if fila is None:
+                self._pendientes[clave] = time.perf_counter()
+                return None
+            if semantico:
+                self.aciertos_semanticos += 1
+            else:
+                self.aciertos_exactos += 1
+            self.segundos_ahorrados += fila['segundos_llm']
+        return generaciones
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if not self.cachear_tools and _tiene_tools(llm_string):
+            return
+        clave, modelo_hash, contexto_hash, consulta = self._claves(prompt, llm_string)
+        with self._lock:
+            inicio = self._pendientes.pop(clave, None)
+        segundos_llm = time.perf_counter() - inicio if inicio is not None else 0.0
+        ahora = time.time()
+        conn = None
+        try:
+            vector = self._embedding(consulta)
+            embedding = json.dumps(vector) if vector is not None else None
+            conn = self._conexion()
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas_llm (clave, modelo_hash, contexto_hash, consulta, embedding, generaciones, "
+                "creado, ultimo_uso, segundos_llm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (clave, modelo_hash, contexto_hash, consulta, embedding, _serializar_generaciones(return_val), ahora, ahora, segundos_llm)
+            )
+            conn.execute("DELETE FROM respuestas_llm WHERE creado < ?", (ahora - self.ttl_segundos,))
+            # Desalojo LRU: se conservan las `max_entradas` usadas más recientemente.
+            conn.execute(
+                "DELETE FROM respuestas_llm WHERE clave IN (SELECT clave FROM respuestas_llm ORDER BY ultimo_uso DESC LIMIT -1 OFFSET ?)",
+                (self.max_entradas,)
+            )
+            conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"Error al guardar en la caché de LLM: {e}")
+        finally:
+            db_manager.close_connection(conn)
+
+    def clear(self, **kwargs: Any) -> None:
+        conn = None
+        try:
+            conn = self._conexion()
+            conn.execute("DELETE FROM respuestas_llm;")
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error al vaciar la caché de LLM: {e}")
+        finally:
+            db_manager.close_connection(conn)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Aciertos (exactos y por similitud), tasa de aciertos, latencia ahorrada y entradas guardadas."""
+        entradas = 0
+        conn = None
+        try:
+            conn = self._conexion()
+            entradas = conn.execute("SELECT COUNT(*) FROM respuestas_llm").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error al contar las entradas de la caché de LLM: {e}")
+        finally:
+            db_manager.close_connection(conn)
+        with self._lock:
+            aciertos = self.aciertos_exactos + self.aciertos_semanticos
+            return {
+                "consultas": self.consultas,
+                "aciertos_exactos": self.aciertos_exactos,
+                "aciertos_semanticos": self.aciertos_semanticos,
+                "tasa_aciertos": aciertos / self.consultas if self.consultas else 0.0,
+                "segundos_ahorrados": self.segundos_ahorrados,
+                "entradas": entradas,
+            }
+
+_cache_llm: Optional[CacheLLMSQLite] = None
+_cache_llm_lock = threading.Lock()
+
+def configurar_cache_llm(**opciones: Any) -> CacheLLMSQLite:
+    """Reemplaza la caché compartida (p. ej. para activar `embeddings` o cambiar TTL y tamaño)."""
+    global _cache_llm
+    with _cache_llm_lock:
+        _cache_llm = CacheLLMSQLite(**opciones)
+        return _cache_llm
+
+def obtener_cache_llm() -> CacheLLMSQLite:
+    """Devuelve la caché compartida por todos los agentes, creándola la primera vez."""
+    global _cache_llm
+    if _cache_llm is None:
+        with _cache_llm_lock:
+            if _cache_llm is None:
+                _cache_llm = CacheLLMSQLite()
+    return _cache_llm
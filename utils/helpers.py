@@ -1,4 +1,6 @@
 # utils/helpers.py
+import time
+from typing import Any, Callable
 import flet as ft
 
 def mostrar_snackbar(page: ft.Page, mensaje: str, color: str = ft.Colors.RED):
@@ -18,4 +20,31 @@ def format_currency(value: float) -> str:
     except (ValueError, TypeError):
         return "$ 0"
 
+class ActualizadorPorLotes:
+    """
+    Agrupa muchos cambios pequeños de la interfaz (p. ej. un token del LLM cada pocos milisegundos)
+    en una llamada a `actualizar` (el `update()` de la página o del control) como máximo cada
+    `intervalo` segundos. `vaciar()` aplica lo que haya quedado pendiente.
+    """
+    def __init__(self, actualizar: Callable[[], Any], intervalo: float = 0.05):
+        self.actualizar = actualizar
+        self.intervalo = intervalo
+        self._ultima = 0.0
+        self._pendiente = False
+
+    def solicitar(self):
+        ahora = time.monotonic()
+        if ahora - self._ultima >= self.intervalo:
+            self.actualizar()
+            self._ultima = ahora
+            self._pendiente = False
+        else:
+            self._pendiente = True
+
+    def vaciar(self):
+        if self._pendiente:
+            self.actualizar()
+            self._ultima = time.monotonic()
+            self._pendiente = False
+
 # Puedes añadir más funciones de utilidad aquí
\ No newline at end of file
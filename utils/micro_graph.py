@@ -1,9 +1,104 @@
 import asyncio
-from typing import Any, Callable, Dict, Optional
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
 
 # Constante para representar el final del grafo, igual que en langgraph
 END = "__end__"
 
+# Clave del estado donde un nodo de unión deja el resultado de cada rama:
+# "completada", "tiempo_agotado" o "error: <mensaje>".
+ESTADO_RAMAS = "estado_ramas"
+
+def _fusionar(destino: Dict[str, Any], cambios: Dict[str, Any], reducers: Dict[str, Callable[[Any, Any], Any]]) -> None:
+    """Aplica `cambios` sobre `destino`: las claves con reductor se combinan y las demás se sobrescriben."""
+    for clave, valor in cambios.items():
+        destino[clave] = reducers[clave](destino[clave], valor) if clave in reducers and clave in destino else valor
+
+# --- Streaming de eventos ---
+
+# Canal (loop, cola) de la transmisión en curso y nodo que se está ejecutando. Al ser ContextVars,
+# cada rama de un fan-out y cada hilo lanzado con asyncio.to_thread ven sus propios valores.
+_canal_eventos: ContextVar[Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = ContextVar("canal_eventos_micro_graph", default=None)
+_nodo_actual: ContextVar[Optional[str]] = ContextVar("nodo_actual_micro_graph", default=None)
+
+def emitir_evento(tipo: str, **datos: Any) -> None:
+    """
+    Publica un evento {"tipo", "nodo", ...} en la transmisión en curso; sin transmisión no hace nada.
+    Se puede llamar desde el event loop o desde un hilo de trabajo.
+    """
+    canal = _canal_eventos.get()
+    if canal is None:
+        return
+    loop, cola = canal
+    evento = {"tipo": tipo, "nodo": datos.pop("nodo", _nodo_actual.get()), **datos}
+    try:
+        en_el_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        en_el_loop = False
+    if en_el_loop:
+        cola.put_nowait(evento)
+    else:
+        loop.call_soon_threadsafe(cola.put_nowait, evento)
+
+class _ManejadorTokens(BaseCallbackHandler):
+    """
+    Callback de LangChain que publica cada token del LLM como evento "token". Implementa
+    tap_output_aiter/tap_output_iter, que es como LangChain reconoce a un manejador de streaming:
+    así `ainvoke`/`invoke` piden la respuesta al proveedor en modo streaming sin cambiar los nodos.
+    """
+    run_inline = True
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            emitir_evento("token", texto=token)
+
+    def tap_output_aiter(self, run_id, output):
+        return output
+
+    def tap_output_iter(self, run_id, output):
+        return output
+
+# Mientras esta variable tenga un manejador, LangChain lo añade a todas las llamadas del contexto.
+_manejador_tokens: ContextVar[Optional[_ManejadorTokens]] = ContextVar("manejador_tokens_micro_graph", default=None)
+register_configure_hook(_manejador_tokens, inheritable=True)
+
+async def transmitir_eventos(trabajo: Awaitable) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Ejecuta `trabajo` (p. ej. `grafo.run(estado)` o `asyncio.to_thread(general.process_command, orden)`)
+    y entrega como iterador asíncrono los eventos que produce: "nodo_inicio", "nodo_fin", "transicion",
+    "token" y los que publiquen los nodos con `emitir_evento`. El último evento es
+    {"tipo": "fin", "resultado": <valor de trabajo>}; si el trabajo falla, la excepción se relanza aquí.
+    """
+    loop = asyncio.get_running_loop()
+    cola: asyncio.Queue = asyncio.Queue()
+
+    async def _ejecutar():
+        _canal_eventos.set((loop, cola))
+        _manejador_tokens.set(_ManejadorTokens())
+        try:
+            resultado = await trabajo
+        except Exception as e:
+            cola.put_nowait({"tipo": "error", "nodo": None, "error": e})
+            return
+        cola.put_nowait({"tipo": "fin", "nodo": None, "resultado": resultado})
+
+    tarea = asyncio.create_task(_ejecutar())
+    try:
+        while True:
+            evento = await cola.get()
+            if evento["tipo"] == "error":
+                raise evento["error"]
+            yield evento
+            if evento["tipo"] == "fin":
+                return
+    finally:
+        if not tarea.done():
+            tarea.cancel()
+            await asyncio.gather(tarea, return_exceptions=True)
+
 class MicroGraph:
     """
     Una emulación ligera de langgraph.StateGraph para entornos donde
@@ -14,6 +109,8 @@ class MicroGraph:
         self.nodes: Dict[str, Callable] = {}
         self.edges: Dict[str, str] = {}
         self.conditional_edges: Dict[str, tuple[Callable, Dict[str, str]]] = {}
+        self.fan_outs: Dict[str, Dict[str, Any]] = {}
+        self.reducers: Dict[str, Dict[str, Callable[[Any, Any], Any]]] = {}
         self.entry_point: Optional[str] = None
 
     def add_node(self, name: str, node_function: Callable):
@@ -52,17 +149,58 @@ class MicroGraph:
         self.conditional_edges[start_node] = (router_function, path_map)
         print(f"[MicroGraph] Arista condicional añadida desde '{start_node}'.")
 
-    async def run(self, initial_state: Dict[str, Any]):
+    def add_join(self, name: str, node_function: Optional[Callable] = None, reducers: Optional[Dict[str, Callable[[Any, Any], Any]]] = None):
         """
-        Ejecuta el grafo de forma asíncrona, pasando el estado entre nodos.
+        Registra un nodo de unión para un fan-out. Antes de ejecutarlo se fusionan en el estado las
+        actualizaciones de cada rama, en el orden en que se declararon las ramas: las claves con un
+        reductor (p. ej. `operator.add` para 'messages', como la anotación de AgentState) se combinan
+        con `reductor(valor_actual, valor_rama)`; las demás las sobrescribe la última rama que las escribió.
+        Sin `node_function` el nodo solo fusiona y continúa por sus aristas.
         """
-        if not self.entry_point:
-            raise ValueError("El punto de entrada no ha sido establecido.")
+        async def _unir(state: Dict[str, Any]) -> None:
+            return None
 
-        current_node_name = self.entry_point
-        state = dict(initial_state)
+        self.add_node(name, node_function or _unir)
+        self.reducers[name] = dict(reducers or {})
 
-        while current_node_name != END:
+    def add_fan_out(self, start_node: str, branch_nodes: List[str], join_node: str,
+                    router_function: Optional[Callable[[Dict[str, Any]], List[str]]] = None,
+                    timeout: Optional[float] = None, branch_timeouts: Optional[Dict[str, float]] = None,
+                    cancel_on_error: bool = False):
+        """
+        Añade una arista de fan-out: al terminar `start_node` se ejecutan concurrentemente (con
+        `asyncio.gather`) las ramas que empiezan en `branch_nodes`, y el grafo continúa en `join_node`.
+
+        Cada rama recibe una copia del estado y sigue sus propias aristas hasta llegar a `join_node`
+        (o a END). Si se da `router_function`, esta elige en cada ejecución qué ramas de `branch_nodes`
+        lanzar. `timeout` (o `branch_timeouts[rama]`) limita en segundos cada rama: al vencer se
+        cancela y sus actualizaciones se descartan. Con `cancel_on_error`, el primer error cancela las
+        demás ramas y se propaga; si no, se registra en `estado_ramas` y el resto continúa.
+        """
+        if start_node not in self.nodes:
+            raise ValueError(f"El nodo de inicio '{start_node}' no existe.")
+        if join_node not in self.reducers:
+            raise ValueError(f"El nodo de unión '{join_node}' no existe; regístrelo con add_join.")
+        for branch_node in branch_nodes:
+            if branch_node not in self.nodes:
+                raise ValueError(f"El nodo de rama '{branch_node}' no existe.")
+        self.fan_outs[start_node] = {
+            "branches": list(branch_nodes), "join": join_node, "router": router_function,
+            "timeout": timeout, "branch_timeouts": dict(branch_timeouts or {}), "cancel_on_error": cancel_on_error,
+        }
+        print(f"[MicroGraph] Fan-out añadido desde '{start_node}' hacia {branch_nodes}, unión en '{join_node}'.")
+
+    async def _ejecutar_camino(self, current_node_name: str, state: Dict[str, Any], stop_at: Optional[str] = None,
+                               reducers: Optional[Dict[str, Callable[[Any, Any], Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Ejecuta nodos desde `current_node_name` hasta llegar a END, a un nodo sin salida o a `stop_at`.
+        Devuelve el nodo donde se detuvo y las actualizaciones que hicieron los nodos ejecutados.
+        Dentro de una rama, `reducers` son los del nodo de unión: las salidas de nodos sucesivos se
+        combinan con ellos en vez de sobrescribirse, tanto en el estado como en las actualizaciones.
+        """
+        reducers = reducers or {}
+        actualizaciones: Dict[str, Any] = {}
+        while current_node_name != END and current_node_name != stop_at:
             print(f"[MicroGraph] Ejecutando nodo: '{current_node_name}'")
 
             node_function = self.nodes.get(current_node_name)
@@ -70,14 +208,26 @@ class MicroGraph:
                 raise ValueError(f"Nodo '{current_node_name}' no encontrado en el grafo.")
 
             # Ejecuta la lógica del nodo actual
-            result = await node_function(state)
+            marca = _nodo_actual.set(current_node_name)
+            emitir_evento("nodo_inicio")
+            try:
+                result = await node_function(state)
+            finally:
+                _nodo_actual.reset(marca)
+            emitir_evento("nodo_fin", nodo=current_node_name, actualizacion=result)
+            nodo_anterior = current_node_name
 
             # Actualiza el estado con el resultado del nodo
             if isinstance(result, dict):
-                state.update(result)
+                _fusionar(state, result, reducers)
+                _fusionar(actualizaciones, result, reducers)
 
             # Determina el siguiente nodo
-            if current_node_name in self.conditional_edges:
+            if current_node_name in self.fan_outs:
+                current_node_name, fusionadas = await self._ejecutar_fan_out(self.fan_outs[current_node_name], state)
+                _fusionar(actualizaciones, fusionadas, reducers)
+
+            elif current_node_name in self.conditional_edges:
                 router_function, path_map = self.conditional_edges[current_node_name]
                 next_path = router_function(state)
 
@@ -93,10 +243,87 @@ class MicroGraph:
             else:
                 print(f"[MicroGraph] El nodo '{current_node_name}' no tiene aristas de salida. Finalizando.")
                 break
+            emitir_evento("transicion", nodo=nodo_anterior, hacia=current_node_name)
+        return current_node_name, actualizaciones
+
+    async def _ejecutar_rama(self, branch_node: str, state: Dict[str, Any], join_node: str, timeout: Optional[float]) -> Dict[str, Any]:
+        """Ejecuta una rama sobre su copia del estado y devuelve sus actualizaciones."""
+        camino = self._ejecutar_camino(branch_node, state, stop_at=join_node, reducers=self.reducers[join_node])
+        _, actualizaciones = await (asyncio.wait_for(camino, timeout) if timeout is not None else camino)
+        return actualizaciones
+
+    async def _ejecutar_fan_out(self, fan_out: Dict[str, Any], state: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Lanza las ramas de un fan-out, espera a todas y fusiona sus actualizaciones en `state`."""
+        branches = fan_out["branches"]
+        if fan_out["router"]:
+            elegidas = set(fan_out["router"](state))
+            invalidas = elegidas - set(branches)
+            if invalidas:
+                raise ValueError(f"Ramas no válidas devueltas por el enrutador del fan-out: {sorted(invalidas)}. Ramas disponibles: {branches}")
+            branches = [b for b in branches if b in elegidas]
+        join_node = fan_out["join"]
+        print(f"[MicroGraph] Fan-out concurrente hacia {branches}.")
+
+        tareas = [
+            asyncio.ensure_future(self._ejecutar_rama(b, dict(state), join_node, fan_out["branch_timeouts"].get(b, fan_out["timeout"])))
+            for b in branches
+        ]
+        pendientes = set(tareas) if fan_out["cancel_on_error"] else set()
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_EXCEPTION)
+            # Un tiempo agotado solo descarta su rama; cualquier otro error cancela todas.
+            fallida = next((t for t in hechas if not t.cancelled() and t.exception() is not None
+                            and not isinstance(t.exception(), asyncio.TimeoutError)), None)
+            if fallida is not None:
+                for tarea in tareas:
+                    tarea.cancel()
+                await asyncio.gather(*tareas, return_exceptions=True)
+                raise fallida.exception()
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+
+        reducers = self.reducers[join_node]
+        estado_ramas: Dict[str, str] = {}
+        fusionadas: Dict[str, Any] = {}
+        for branch_node, resultado in zip(branches, resultados):
+            if isinstance(resultado, asyncio.TimeoutError):
+                estado_ramas[branch_node] = "tiempo_agotado"
+                print(f"[MicroGraph] La rama '{branch_node}' superó su tiempo límite y fue cancelada.")
+                continue
+            if isinstance(resultado, BaseException):
+                estado_ramas[branch_node] = f"error: {resultado}"
+                print(f"[MicroGraph] La rama '{branch_node}' falló: {resultado}")
+                continue
+            estado_ramas[branch_node] = "completada"
+            _fusionar(state, resultado, reducers)
+            # Hacia un fan-out exterior se propaga solo lo que aportaron las ramas.
+            _fusionar(fusionadas, resultado, reducers)
+        state[ESTADO_RAMAS] = estado_ramas
+        fusionadas[ESTADO_RAMAS] = estado_ramas
+        print(f"[MicroGraph] Unión en '{join_node}': {estado_ramas}")
+        return join_node, fusionadas
+
+    async def run(self, initial_state: Dict[str, Any]):
+        """
+        Ejecuta el grafo de forma asíncrona, pasando el estado entre nodos.
+        """
+        if not self.entry_point:
+            raise ValueError("El punto de entrada no ha sido establecido.")
+
+        state = dict(initial_state)
+        await self._ejecutar_camino(self.entry_point, state)
 
         print("[MicroGraph] Ejecución del grafo finalizada.")
         return state
 
+    async def stream(self, initial_state: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ejecuta el grafo como `run`, pero entrega los eventos a medida que ocurren: inicio y fin de
+        cada nodo, transiciones y los tokens de las llamadas al LLM hechas dentro de los nodos. El
+        último evento es {"tipo": "fin", "resultado": estado_final}.
+        """
+        async for evento in transmitir_eventos(self.run(initial_state)):
+            yield evento
+
     def compile(self):
         """
         Método de compatibilidad con la API de langgraph. Devuelve la propia